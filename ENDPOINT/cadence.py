@@ -0,0 +1,98 @@
+"""Keystroke cadence check: flag or block input that is faster or steadier than a human"""
+from UTILS.pipeline import PASS_THROUGH, MAPPED
+
+FAST_MEAN = 0.035  # Average press-to-press interval below this is not typing, seconds
+MIN_CV = 0.10  # Intervals steadier than this (stdev / mean) are scripted
+FAST_AFTER = 5  # Intervals seen before a burst can be judged too fast
+REGULAR_AFTER = 8  # ...or too regular, which needs more evidence
+ALPHA = 0.2  # Weight of the newest interval in the running mean and variance
+IDLE_RESET = 1.0  # A pause this long starts a new burst, seconds
+
+
+class _DeviceCadence:
+    __slots__ = ('last', 'count', 'mean', 'var', 'suspect')
+
+    def __init__(self):
+        self.last = None
+        self.count = 0
+        self.mean = 0.0
+        self.var = 0.0
+        self.suspect = False
+
+
+class CadenceDetector:
+    """
+    Running inter-key interval statistics per device, O(1) per key press.
+
+    Each press updates an exponentially weighted mean and variance of the
+    intervals since the last pause. A burst is judged injected once its mean
+    is too short (after FAST_AFTER intervals) or its spread too small (after
+    REGULAR_AFTER), and stays that way until the device pauses for IDLE_RESET.
+    """
+
+    def __init__(self, block=True):
+        """
+        Args:
+            block: drop presses of a suspect burst; False only reports them
+        """
+        self.block = block
+        self.devices = {}  # Device -> _DeviceCadence
+        self.bursts = 0  # Bursts judged injected so far
+        self.blocked = 0  # Presses dropped
+
+    def observe(self, device, timestamp):
+        """
+        Account for one key press.
+
+        Args:
+            device: whatever identifies the input device
+            timestamp: kernel event time, seconds
+
+        Returns:
+            False if the press should be dropped
+        """
+        state = self.devices.get(device)
+        if state is None:
+            state = self.devices[device] = _DeviceCadence()
+
+        last = state.last
+        state.last = timestamp
+        if last is None:
+            return True
+        interval = timestamp - last
+        if interval > IDLE_RESET or interval < 0:
+            state.count = 0
+            state.suspect = False
+            return True
+
+        if state.count == 0:
+            state.mean = interval
+            state.var = 0.0
+        else:
+            diff = interval - state.mean
+            state.mean += ALPHA * diff
+            state.var = (1 - ALPHA) * (state.var + ALPHA * diff * diff)
+        state.count += 1
+
+        count = state.count
+        if not state.suspect and count >= FAST_AFTER:
+            mean = state.mean
+            if mean < FAST_MEAN or (count >= REGULAR_AFTER and state.var < (MIN_CV * mean) ** 2):
+                state.suspect = True
+                self.bursts += 1
+                # Keys packed into one report share a timestamp: mean can be 0
+                cv = state.var ** 0.5 / mean if mean else 0.0
+                print(f"[CADENCE] Injected-looking burst on {device}: "
+                      f"{mean * 1000:.1f} ms/key, cv={cv:.2f}"
+                      f"{' - blocking until it pauses' if self.block else ''}")
+
+        if state.suspect and self.block:
+            self.blocked += 1
+            return False
+        return True
+
+    def after_classify(self, record, kind, output):
+        """Pipeline hook (see UTILS.pipeline): judge every press that would be typed"""
+        if kind == MAPPED or kind == PASS_THROUGH:
+            return self.observe(record.device, record.time)
+        return True
@@ -1,4 +1,5 @@
 import serial
+import threading
 import time
 from cryptography.hazmat.primitives.asymmetric.x25519 import (
 	X25519PrivateKey, X25519PublicKey
@@ -6,30 +7,31 @@ from cryptography.hazmat.primitives.asymmetric.x25519 import (
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives import serialization
+from UTILS.link import send_frame, recv_frame
 
 SERIAL_PORT = "/dev/ttyACM0"
 BAUD = 115200
 
 _cached_symmetric_key = None
 _cached_base_time = None
+_cached_serial = None
 
-def recv_frame(ser):
-	length_bytes = ser.read(4)
-	if len(length_bytes) < 4:
-		raise IOError("Serial broke")
-	length = int.from_bytes(length_bytes, "big")
-	return ser.read(length)
-
-def send_frame(ser, data: bytes):
-	ser.write(len(data).to_bytes(4, "big") + data)
+def open_serial(port=SERIAL_PORT):
+	return serial.Serial(port, BAUD, timeout=2)
 
 def main():
+	global _cached_serial
 	print("[ENDPOINT] OPENING SERIAL...")
-	ser = serial.Serial(SERIAL_PORT, BAUD, timeout=2)
+	ser = open_serial()
+	_cached_serial = ser
+	return handshake(ser)
+
+def handshake(ser):
+	"""Key exchange and time sync with the SENDER on an open port; returns (key, base_time)"""
 	time.sleep(1)
 
-	print("[ENDPOINT] WAITING FOR PI A PUBLIC KEY...")
-	peer_public_bytes = recv_frame(ser)
+	print(f"[ENDPOINT] WAITING FOR PI A PUBLIC KEY ON {ser.port}...")
+	peer_public_bytes = recv_frame(ser, required=True)
 	peer_public_key = X25519PublicKey.from_public_bytes(peer_public_bytes)
 
 	print("[ENDPOINT] GENERATING OWN KEYPAIR...")
@@ -64,6 +66,29 @@ def main():
 
 	return symmetric_key, int(current_time)
 
+def handshake_all(ports):
+	"""
+	Handshake with the SENDER on every port at once, one session each.
+
+	Returns:
+		[(port, ser, key, base_time)] for the ports that completed, in order
+	"""
+	results = {}
+
+	def run(port):
+		try:
+			ser = open_serial(port)
+			results[port] = (port, ser) + handshake(ser)
+		except (IOError, OSError, ValueError) as e:
+			print(f"[ENDPOINT] Handshake on {port} failed: {e}")
+
+	threads = [threading.Thread(target=run, args=(port,), name=f"handshake-{port}") for port in ports]
+	for thread in threads:
+		thread.start()
+	for thread in threads:
+		thread.join()
+	return [results[port] for port in ports if port in results]
+
 # GETTERS FOR TESTING
 def get_symmetric_key():
 	global _cached_symmetric_key, _cached_base_time
@@ -77,6 +102,18 @@ def get_base_time():
 		_cached_symmetric_key, _cached_base_time = main()
 	return _cached_base_time
 
+def get_serial():
+	"""Serial port left open by the handshake, for the data plane"""
+	if _cached_serial is None:
+		get_symmetric_key()
+	return _cached_serial
+
+def reopen_serial():
+	"""Open the port again after the link dropped; the session key and base time stay"""
+	global _cached_serial
+	_cached_serial = open_serial()
+	return _cached_serial
+
 if __name__ == "__main__":
 	key, base = main()
 	print("[ENDPOINT] SYMMETRIC KEY:", key.hex())
@@ -0,0 +1,79 @@
+"""Keep the previous, current and next reverse keymaps live around a rotation"""
+from UTILS.keymap import seed_to_keymap, reverse_keymap
+from UTILS.epoch import resolve_marker
+
+# How long after a local rotation the previous epoch's map may still be
+# selected by a marker (keys that were in flight when the clock ticked over)
+GRACE_WINDOW = 1.0
+
+
+class EpochWindow:
+    def __init__(self, key_schedule, grace_window=GRACE_WINDOW, table_builder=None):
+        """
+        Args:
+            key_schedule: KeySchedule giving the symmetric key for each epoch
+            grace_window: seconds the previous epoch stays selectable
+            table_builder: optional callable turning a reverse map into a
+                decode table, cached alongside it (see decode_table)
+        """
+        self.key_schedule = key_schedule
+        self.grace_window = grace_window
+        self.table_builder = table_builder
+        self.active_counter = None  # Last epoch announced by the SENDER
+        self._reverse_maps = {}  # counter -> (seed deriver, reverse map, decode table)
+
+    def _entry(self, counter):
+        deriver = self.key_schedule.deriver_for(counter)
+        entry = self._reverse_maps.get(counter)
+        if entry is None or entry[0] is not deriver:
+            seed = deriver.seed(counter)
+            reverse = reverse_keymap(seed_to_keymap(seed))
+            table = self.table_builder(reverse) if self.table_builder else None
+            entry = (deriver, reverse, table)
+            self._reverse_maps[counter] = entry
+        return entry
+
+    def reverse_map(self, counter):
+        """Reverse keymap for `counter`, derived once per key and cached"""
+        return self._entry(counter)[1]
+
+    def decode_table(self, counter):
+        """table_builder(reverse_map(counter)), built and cached with the map"""
+        return self._entry(counter)[2]
+
+    def prepare(self, local_counter):
+        """Derive maps for previous/current/next and drop anything older"""
+        for counter in list(self._reverse_maps):
+            if abs(counter - local_counter) > 1:
+                del self._reverse_maps[counter]
+        for counter in (local_counter - 1, local_counter, local_counter + 1):
+            self.reverse_map(counter)
+
+    def on_marker(self, key, local_counter):
+        """
+        Record an epoch marker from the keystroke stream.
+
+        Returns:
+            The announced counter, or None if the marker was rejected
+        """
+        counter = resolve_marker(key, local_counter)
+        if counter is not None:
+            self.active_counter = counter
+        return counter
+
+    def select(self, local_counter, seconds_into_interval):
+        """
+        Pick the epoch to decode the next key with.
+
+        The SENDER's marker wins whenever it names the current or next epoch,
+        or the previous one while we are still inside the grace window.
+        Otherwise fall back to our own clock.
+        """
+        active = self.active_counter
+        if active is None:
+            return local_counter
+        if active == local_counter or active == local_counter + 1:
+            return active
+        if active == local_counter - 1 and seconds_into_interval < self.grace_window:
+            return active
+        return local_counter
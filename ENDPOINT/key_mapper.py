@@ -1,47 +1,14 @@
 """Character to evdev key mappings for ENDPOINT"""
-from evdev import ecodes
+from UTILS import layouts, tables
 
-# Map characters to evdev keycodes
-CHAR_TO_KEYCODE = {
-    # Letters
-    'a': ecodes.KEY_A, 'b': ecodes.KEY_B, 'c': ecodes.KEY_C, 'd': ecodes.KEY_D,
-    'e': ecodes.KEY_E, 'f': ecodes.KEY_F, 'g': ecodes.KEY_G, 'h': ecodes.KEY_H,
-    'i': ecodes.KEY_I, 'j': ecodes.KEY_J, 'k': ecodes.KEY_K, 'l': ecodes.KEY_L,
-    'm': ecodes.KEY_M, 'n': ecodes.KEY_N, 'o': ecodes.KEY_O, 'p': ecodes.KEY_P,
-    'q': ecodes.KEY_Q, 'r': ecodes.KEY_R, 's': ecodes.KEY_S, 't': ecodes.KEY_T,
-    'u': ecodes.KEY_U, 'v': ecodes.KEY_V, 'w': ecodes.KEY_W, 'x': ecodes.KEY_X,
-    'y': ecodes.KEY_Y, 'z': ecodes.KEY_Z,
-    
-    # Numbers
-    '0': ecodes.KEY_0, '1': ecodes.KEY_1, '2': ecodes.KEY_2, '3': ecodes.KEY_3,
-    '4': ecodes.KEY_4, '5': ecodes.KEY_5, '6': ecodes.KEY_6, '7': ecodes.KEY_7,
-    '8': ecodes.KEY_8, '9': ecodes.KEY_9,
-    
-    # Symbols (unshifted)
-    ' ': ecodes.KEY_SPACE,
-    '-': ecodes.KEY_MINUS,
-    '=': ecodes.KEY_EQUAL,
-    '[': ecodes.KEY_LEFTBRACE,
-    ']': ecodes.KEY_RIGHTBRACE,
-    ';': ecodes.KEY_SEMICOLON,
-    "'": ecodes.KEY_APOSTROPHE,
-    '`': ecodes.KEY_GRAVE,
-    '\\': ecodes.KEY_BACKSLASH,
-    ',': ecodes.KEY_COMMA,
-    '.': ecodes.KEY_DOT,
-    '/': ecodes.KEY_SLASH,
-}
+# evdev.ecodes key codes, from the precompiled table cache
+KEY_CODES = tables.load('evdev')['key_codes']
+
+# Map characters to evdev keycodes: the scramble's key space from UTILS.layouts
+CHAR_TO_KEYCODE = {char: KEY_CODES[key] for key, char in layouts.EVDEV_TO_CHAR.items()}
 
 # Shifted characters mapping
-SHIFTED_CHARS = {
-    '!': '1', '@': '2', '#': '3', '$': '4', '%': '5',
-    '^': '6', '&': '7', '*': '8', '(': '9', ')': '0',
-    '_': '-', '+': '=',
-    '{': '[', '}': ']',
-    ':': ';', '"': "'",
-    '~': '`', '|': '\\',
-    '<': ',', '>': '.', '?': '/',
-}
+SHIFTED_CHARS = {shifted: base for base, shifted in layouts.SHIFT_MAP.items()}
 
 # Modifier constants
 MOD_LSHIFT = 0x02
@@ -1,10 +1,63 @@
 """Read HID input from ALL keyboard devices"""
-from evdev import InputDevice, ecodes, categorize, list_devices
+from evdev import InputDevice, ecodes, list_devices
 import select
+from UTILS.events import KeyRecord, KEY_NAMES, KEY_UP, KEY_HOLD, use_monotonic_clock
+
+def key_records(batches):
+    """
+    Generator yielding a KeyRecord per press and release in (device, events)
+    batches - read live, or replayed from a UTILS.trace recording
+
+    The same record is refilled for every event - copy fields out of it,
+    never keep it. record.fd tells which device it came from.
+    """
+    record = KeyRecord()
+    modifiers_by_fd = {}  # fd -> [shift, ctrl, alt]; modifiers are per keyboard
+    
+    for device, events in batches:
+        fd = device.fd
+        modifiers = modifiers_by_fd.get(fd)
+        if modifiers is None:
+            modifiers = modifiers_by_fd[fd] = [False, False, False]
+        
+        for event in events:
+            if event.type == ecodes.EV_KEY:
+                key = KEY_NAMES.get(event.code)
+                state = event.value
+                
+                # Track modifiers
+                # Modifiers count as held through autorepeat
+                if key in ('KEY_LEFTSHIFT', 'KEY_RIGHTSHIFT'):
+                    modifiers[0] = (state != KEY_UP)
+                    continue
+                elif key in ('KEY_LEFTCTRL', 'KEY_RIGHTCTRL'):
+                    modifiers[1] = (state != KEY_UP)
+                    continue
+                elif key in ('KEY_LEFTALT', 'KEY_RIGHTALT'):
+                    modifiers[2] = (state != KEY_UP)
+                    continue
+                
+                # Yield presses and releases; autorepeat is left to the host
+                if state == KEY_HOLD:
+                    continue
+                record.key = key
+                record.code = event.code
+                record.state = state
+                record.shift, record.ctrl, record.alt = modifiers
+                record.device = device.name  # For debugging
+                record.fd = fd
+                record.time = event.timestamp()
+                yield record
 
 class KeyboardReader:
-    def __init__(self):
-        """Find and grab ALL keyboard devices"""
+    def __init__(self, recorder=None):
+        """
+        Find and grab ALL keyboard devices
+        
+        Args:
+            recorder: UTILS.trace.TraceWriter that gets every event read
+        """
+        self.recorder = recorder
         print("[ENDPOINT] Looking for input devices...")
         
         devices = [InputDevice(path) for path in list_devices()]
@@ -33,6 +86,10 @@ class KeyboardReader:
             if has_letters and not has_mouse:
                 try:
                     device.grab()
+                    if not use_monotonic_clock(device.fd):
+                        print(f"[ENDPOINT] {device.name}: kernel keeps wall-clock event times")
+                    if recorder:
+                        recorder.add_device(device.fd, device.name)
                     self.devs.append(device)
                     print(f"[ENDPOINT] ✓ Grabbed: {device.name} at {device.path}")
                 except Exception as e:
@@ -44,50 +101,34 @@ class KeyboardReader:
         print(f"[ENDPOINT] Monitoring {len(self.devs)} keyboard device(s)")
     
     def read_events(self):
-        """Generator yielding keyboard events from ALL devices"""
-        shift = False
-        ctrl = False
-        alt = False
+        """
+        Generator yielding a KeyRecord per press and release from ALL devices
         
-        # Create device map for select()
+        The same record is refilled for every event - copy fields out of it,
+        never keep it. record.fd tells which device it came from.
+        """
+        return key_records(self._batches())
+    
+    def _batches(self):
+        """(device, events) for every read from ANY device"""
         dev_map = {dev.fd: dev for dev in self.devs}
+        # epoll: waiting costs the same however many keyboards are grabbed
+        poller = select.epoll()
+        for fd in dev_map:
+            poller.register(fd, select.EPOLLIN)
+        recorder = self.recorder
         
         while True:
             # Wait for input from ANY device
-            r, w, x = select.select(dev_map, [], [])
-            
-            for fd in r:
+            for fd, _ in poller.poll():
                 device = dev_map[fd]
                 
                 # Read all pending events from this device
-                for event in device.read():
-                    if event.type == ecodes.EV_KEY:
-                        key_event = categorize(event)
-                        key = key_event.keycode
-                        state = key_event.keystate
-                        
-                        # Track modifiers
-                        if key in ['KEY_LEFTSHIFT', 'KEY_RIGHTSHIFT']:
-                            shift = (state == key_event.key_down)
-                            continue
-                        elif key in ['KEY_LEFTCTRL', 'KEY_RIGHTCTRL']:
-                            ctrl = (state == key_event.key_down)
-                            continue
-                        elif key in ['KEY_LEFTALT', 'KEY_RIGHTALT']:
-                            alt = (state == key_event.key_down)
-                            continue
-                        
-                        # Only yield key down events
-                        if state == key_event.key_down:
-                            yield {
-                                'key': key,
-                                'shift': shift,
-                                'ctrl': ctrl,
-                                'alt': alt,
-                                'state': state,
-                                'key_event': key_event,
-                                'device': device.name  # For debugging
-                            }
+                events = device.read()
+                if recorder:
+                    events = list(events)
+                    recorder.write(fd, events)
+                yield device, events
     
     def close(self):
         """Release all grabbed devices"""
@@ -96,3 +137,5 @@ class KeyboardReader:
                 dev.ungrab()
             except:
                 pass
+        if self.recorder:
+            self.recorder.close()
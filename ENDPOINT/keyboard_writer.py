@@ -1,10 +1,29 @@
 """Write decoded keystrokes as virtual keyboard"""
+import os
+import struct
 from evdev import UInput, ecodes
+from UTILS import metrics
+
+# Modifier bit → key pressed on the virtual keyboard
+MODIFIER_KEYS = (
+    (0x02, ecodes.KEY_LEFTSHIFT),
+    (0x01, ecodes.KEY_LEFTCTRL),
+    (0x04, ecodes.KEY_LEFTALT),
+)
+
+# struct input_event: timeval (uinput stamps events itself), type, code, value
+INPUT_EVENT = struct.Struct("llHHi")
+BATCH_EVENTS = 64  # Events per write(); a shifted keystroke needs at most 10
 
 class KeyboardWriter:
-    def __init__(self):
-        # Create virtual keyboard device
-        self.ui = UInput()
+    def __init__(self, ui=None):
+        """
+        Args:
+            ui: already open UInput (a stand-in in benchmarks); default creates the virtual keyboard
+        """
+        # Create virtual keyboard device; EV_REP lets the kernel autorepeat held keys
+        self.ui = ui or UInput({ecodes.EV_KEY: ecodes.keys.keys(), ecodes.EV_REP: []})
+        self.modifier_holds = {bit: 0 for bit, _ in MODIFIER_KEYS}
         print("[ENDPOINT] Virtual keyboard created")
     
     def write_key(self, keycode, modifier=0):
@@ -41,6 +60,126 @@ class KeyboardWriter:
         
         self.ui.syn()
     
+    def press_key(self, keycode, modifier=0):
+        """
+        Press a key and the modifiers it needs, and leave them down
+        
+        Modifiers are reference counted so overlapping holds that need
+        the same modifier release it only when the last one lets go.
+        """
+        for bit, modifier_key in MODIFIER_KEYS:
+            if modifier & bit:
+                if self.modifier_holds[bit] == 0:
+                    self.ui.write(ecodes.EV_KEY, modifier_key, 1)
+                self.modifier_holds[bit] += 1
+        
+        self.ui.write(ecodes.EV_KEY, keycode, 1)
+        self.ui.syn()
+    
+    def release_key(self, keycode, modifier=0):
+        """Release a key pressed with press_key, plus the modifiers it held"""
+        self.ui.write(ecodes.EV_KEY, keycode, 0)
+        
+        for bit, modifier_key in MODIFIER_KEYS:
+            if modifier & bit and self.modifier_holds[bit] > 0:
+                self.modifier_holds[bit] -= 1
+                if self.modifier_holds[bit] == 0:
+                    self.ui.write(ecodes.EV_KEY, modifier_key, 0)
+        
+        self.ui.syn()
+    
+    def write_events(self, events):
+        """
+        Replay raw key events as they happened on the SENDER
+        
+        Args:
+            events: iterable of (keycode, value) pairs, value 0=up 1=down 2=hold
+        """
+        for keycode, value in events:
+            self.ui.write(ecodes.EV_KEY, keycode, value)
+            self.ui.syn()
+    
     def close(self):
         """Clean up the virtual keyboard"""
         self.ui.close()
+
+
+class BatchedKeyboardWriter(KeyboardWriter):
+    """
+    Drop-in KeyboardWriter that packs every event of a call, modifiers and
+    SYNs included, into one preallocated buffer of struct input_event and
+    submits it with a single write() to the uinput fd. python-evdev's
+    UInput.write() costs a Python→C call, an fcntl() and a write() per
+    event - six to ten events for each shifted key.
+    """
+    
+    def __init__(self, ui=None):
+        super().__init__(ui)
+        self.fd = self.ui.fd
+        self.buffer = bytearray(INPUT_EVENT.size * BATCH_EVENTS)
+        self.view = memoryview(self.buffer)
+        self.end = 0  # Bytes packed since the last submit
+    
+    def _add(self, event_type, code, value):
+        if self.end == len(self.buffer):
+            self._submit()
+        INPUT_EVENT.pack_into(self.buffer, self.end, 0, 0, event_type, code, value)
+        self.end += INPUT_EVENT.size
+    
+    def _key(self, keycode, value):
+        self._add(ecodes.EV_KEY, keycode, value)
+    
+    def _syn(self):
+        self._add(ecodes.EV_SYN, ecodes.SYN_REPORT, 0)
+    
+    def _submit(self):
+        """One write() for everything packed; uinput takes whole input_events"""
+        end = self.end
+        self.end = 0
+        try:
+            written = os.write(self.fd, self.view[:end])
+            while written < end:
+                written += os.write(self.fd, self.view[written:end])
+        except OSError as e:
+            metrics.WRITE_ERRORS.inc()
+            print(f"[ENDPOINT] Error writing to uinput: {e}")
+    
+    def write_key(self, keycode, modifier=0):
+        for bit, modifier_key in MODIFIER_KEYS:
+            if modifier & bit:
+                self._key(modifier_key, 1)
+        self._key(keycode, 1)
+        self._syn()
+        self._key(keycode, 0)
+        self._syn()
+        for bit, modifier_key in MODIFIER_KEYS:
+            if modifier & bit:
+                self._key(modifier_key, 0)
+        self._syn()
+        self._submit()
+    
+    def press_key(self, keycode, modifier=0):
+        for bit, modifier_key in MODIFIER_KEYS:
+            if modifier & bit:
+                if self.modifier_holds[bit] == 0:
+                    self._key(modifier_key, 1)
+                self.modifier_holds[bit] += 1
+        self._key(keycode, 1)
+        self._syn()
+        self._submit()
+    
+    def release_key(self, keycode, modifier=0):
+        self._key(keycode, 0)
+        for bit, modifier_key in MODIFIER_KEYS:
+            if modifier & bit and self.modifier_holds[bit] > 0:
+                self.modifier_holds[bit] -= 1
+                if self.modifier_holds[bit] == 0:
+                    self._key(modifier_key, 0)
+        self._syn()
+        self._submit()
+    
+    def write_events(self, events):
+        for keycode, value in events:
+            self._key(keycode, value)
+            self._syn()
+        self._submit()
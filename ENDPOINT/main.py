@@ -1,34 +1,60 @@
 
 """ENDPOINT - Receive and decode scrambled keystrokes"""
+import sys
 import time
-from ENDPOINT.keyboard_reader import KeyboardReader
-from ENDPOINT.keyboard_writer import KeyboardWriter
+from UTILS import layouts, metrics, spans, startup
 from ENDPOINT.key_mapper import char_to_keycode, CHAR_TO_KEYCODE
-from ENDPOINT.dhe_time_ENDPOINT import get_symmetric_key, get_base_time
-from ENDPOINT.seedgen_ENDPOINT import generate_seed
-from UTILS.keymap import seed_to_keymap, reverse_keymap
+from ENDPOINT.epoch_window import EpochWindow
+from UTILS.epoch import is_epoch_marker
+from UTILS.link import MSG_DATA
+from UTILS.control_channel import ControlChannel
+from UTILS.events import KEY_UP
+from UTILS.pipeline import Hooks, RELEASE, PASS_THROUGH, MAPPED, MARKER
+# evdev, cryptography and pyserial are imported inside main() so the
+# decoder can be loaded (simulator, benchmarks) without them and so
+# evdev can load while the key exchange waits on the SENDER
 
 INTERVAL = 10
 TIME_OFFSET = 0.0  # ENDPOINT doesn't need offset (it's the reference)
+# Must match the SENDER: "hid" (scrambled keystrokes) or "serial" (AEAD frames)
+TRANSPORT = "hid"
+# SCHED_FIFO, CPU pinning, mlockall and idle-only GC (see UTILS.realtime).
+# Also enabled by running with --low-latency.
+LOW_LATENCY = False
+# Log every keystroke. Off keeps the hot loop free of string formatting.
+VERBOSE = False
+# Bursts typed faster or steadier than a human (see ENDPOINT.cadence):
+# "block" drops them, "flag" only logs them, None turns the check off.
+# Only flagged by default: a SENDER in BURST_MODE, a barcode scanner or a
+# password manager types faster than a human too, and "block" drops it.
+CADENCE_CHECK = "flag"
+# Decoded text that reads like noise (see ENDPOINT.plausibility), i.e. plain
+# text typed by something that doesn't know the keymap. Same choices; only
+# flagged by default since random passwords read like noise too.
+PLAUSIBILITY_CHECK = "flag"
+# Serial ports of the SENDERs, one session each; empty pairs with every /dev/ttyACM*
+SENDER_PORTS = ()
+# Keyboards typed on directly, passed through undecoded: name substrings or "vendor:product"
+TRUSTED_KEYBOARDS = ()
+# USB keyboards that are neither a SENDER nor trusted: "block" or "pass"
+UNPAIRED_KEYBOARDS = "block"
+# Keyboards not on USB (laptop keyboards) can't be a cable: pass them through
+TRUST_BUILTIN_KEYBOARDS = True
+# Record every key event read to this file (see UTILS.trace) for replay
+# with tests/research/replay.py. Also set by running with --trace FILE.
+TRACE_FILE = None
+# X11 layout of the host, e.g. "de" or "us(dvorak)" (see UTILS.layouts);
+# None reads it with localectl. Confirmed with each SENDER at handshake.
+KEYBOARD_LAYOUT = None
+# "batched" - each keystroke, SYNs included, in one write() to uinput
+# "evdev"   - python-evdev UInput.write()/syn(), a syscall pair per event
+KEYBOARD_WRITER = "batched"
+# Counters and latency histograms in Prometheus text format (see UTILS.metrics):
+# a unix socket path or "127.0.0.1:PORT"; None only prints them on SIGUSR1
+METRICS_ADDRESS = "/run/omg-mitigation/endpoint.sock"
 
-# Map evdev keys to characters (for incoming scrambled keys)
-EVDEV_TO_CHAR = {
-    'KEY_A': 'a', 'KEY_B': 'b', 'KEY_C': 'c', 'KEY_D': 'd',
-    'KEY_E': 'e', 'KEY_F': 'f', 'KEY_G': 'g', 'KEY_H': 'h',
-    'KEY_I': 'i', 'KEY_J': 'j', 'KEY_K': 'k', 'KEY_L': 'l',
-    'KEY_M': 'm', 'KEY_N': 'n', 'KEY_O': 'o', 'KEY_P': 'p',
-    'KEY_Q': 'q', 'KEY_R': 'r', 'KEY_S': 's', 'KEY_T': 't',
-    'KEY_U': 'u', 'KEY_V': 'v', 'KEY_W': 'w', 'KEY_X': 'x',
-    'KEY_Y': 'y', 'KEY_Z': 'z',
-    'KEY_0': '0', 'KEY_1': '1', 'KEY_2': '2', 'KEY_3': '3',
-    'KEY_4': '4', 'KEY_5': '5', 'KEY_6': '6', 'KEY_7': '7',
-    'KEY_8': '8', 'KEY_9': '9',
-    'KEY_SPACE': ' ', 'KEY_MINUS': '-', 'KEY_EQUAL': '=',
-    'KEY_LEFTBRACE': '[', 'KEY_RIGHTBRACE': ']',
-    'KEY_SEMICOLON': ';', 'KEY_APOSTROPHE': "'",
-    'KEY_GRAVE': '`', 'KEY_BACKSLASH': '\\',
-    'KEY_COMMA': ',', 'KEY_DOT': '.', 'KEY_SLASH': '/',
-}
+# Map evdev keys to characters (for incoming scrambled keys): the scramble's key space
+EVDEV_TO_CHAR = layouts.EVDEV_TO_CHAR
 
 # Special keys that pass through unchanged
 SPECIAL_KEYS = [
@@ -39,127 +65,335 @@ SPECIAL_KEYS = [
 ]
 
 # Shift transformation map
-SHIFT_MAP = {
-    '1': '!', '2': '@', '3': '#', '4': '$', '5': '%',
-    '6': '^', '7': '&', '8': '*', '9': '(', '0': ')',
-    '-': '_', '=': '+',
-    '[': '{', ']': '}',
-    ';': ':', "'": '"',
-    '`': '~', '\\': '|',
-    ',': '<', '.': '>', '/': '?',
-}
-
-def get_current_counter(base_time):
+SHIFT_MAP = layouts.SHIFT_MAP
+
+# Key-space character -> what the host's layout types for it; set by use_layout()
+LAYOUT_CHARS = {}
+
+# Modifier byte for pass-through keys, indexed by shift | ctrl << 1
+PASS_THROUGH_MODIFIERS = (0, 0x02, 0x01, 0x03)
+
+def build_decode_table(reverse_map):
+    """
+    Precompute every decoded output of one reverse keymap.
+    
+    Built once per epoch (see EpochWindow.decode_table) so a keystroke is a
+    dict lookup and a tuple index.
+    
+    Returns:
+        {evdev key: outputs} where outputs[shift | ctrl << 1] is
+        ((keycode, modifier), scrambled_char, original_char), or None if the
+        decoded character has no keycode. original_char is what the host's
+        layout types for the decoded key (LAYOUT_CHARS).
+    """
+    table = {}
+    for key, base_char in EVDEV_TO_CHAR.items():
+        outputs = []
+        for ctrl in (False, True):
+            for shift in (False, True):
+                # Determine what character was actually sent
+                # This must match EXACTLY how SENDER encodes it
+                if base_char.isalpha():
+                    # Letter: uppercase if shift is pressed
+                    scrambled_char = base_char.upper() if shift else base_char.lower()
+                elif shift and base_char in SHIFT_MAP:
+                    # Shifted symbol (1→!, 2→@, etc.)
+                    scrambled_char = SHIFT_MAP[base_char]
+                else:
+                    # Unshifted symbol or number
+                    scrambled_char = base_char
+                
+                # Decode: scrambled → original (use lowercase for lookup)
+                original_char = reverse_map.get(scrambled_char.lower(), scrambled_char.lower())
+                
+                # Preserve case: if scrambled was uppercase, original should be uppercase
+                if scrambled_char.isupper() and original_char.isalpha():
+                    original_char = original_char.upper()
+                
+                keycode, modifier = char_to_keycode(original_char)
+                if not keycode:
+                    outputs.append(None)
+                    continue
+                if ctrl:
+                    modifier |= 0x01
+                shown = LAYOUT_CHARS.get(original_char, original_char)
+                outputs.append(((keycode, modifier), scrambled_char, shown))
+        table[key] = tuple(outputs)
+    return table
+
+def use_layout(layout_tables):
+    """Decode to the characters of a UTILS.layouts table; applies from the next decode table"""
+    global LAYOUT_CHARS
+    LAYOUT_CHARS = layouts.display_map(layout_tables)
+
+def get_current_counter(base_time, now=None):
     """Calculate counter - MUST match test code exactly"""
-    now = int(time.time())
+    now = int(time.time() if now is None else now)
     counter = (now - base_time) // INTERVAL
     return counter
 
-def main():
-    # Initialize encryption
-    print("[ENDPOINT] Initializing secure connection...")
-    sym_key = get_symmetric_key()
-    base_time = get_base_time()
+def get_seconds_into_interval(base_time, now=None):
+    """Seconds elapsed since the last local rotation"""
+    if now is None:
+        now = time.time()
+    return (now - base_time) % INTERVAL
+
+def run_serial_transport(sym_key, writer, channel):
+    """Inject key events received as sealed serial frames"""
+    from UTILS.secure_link import FrameOpener
+    
+    opener = FrameOpener(sym_key)
+    
+    def on_data(payload):
+        try:
+            events = opener.open(payload)
+        except ValueError as e:
+            print(f"[SECURE] Dropped frame: {e}")
+            return
+        writer.write_events(events)
+    
+    channel.on(MSG_DATA, on_data)
+    channel.start()
+    print("[ENDPOINT] Receiving key events as AEAD frames over serial...")
+    print("[ENDPOINT] Grabbed keyboards are ignored in this mode.")
+    print("[ENDPOINT] Press Ctrl+C to stop.\n")
+    
+    # Poll so Ctrl+C still reaches the main thread
+    while True:
+        channel.join(0.5)
+
+class Decoder:
+    """Decode key records from the SENDER and press the originals on the virtual keyboard"""
+    
+    def __init__(self, window, base_time, writer, clock=time.time, cadence=None, plausibility=None, observers=()):
+        """
+        Args:
+            window: EpochWindow built with table_builder=build_decode_table
+            base_time: agreed base time from the key exchange
+            writer: KeyboardWriter
+            clock: wall clock, replaced by the simulator
+            cadence: CadenceDetector screening key presses, or None
+            plausibility: PlausibilityScorer screening decoded characters, or None
+            observers: hooked onto the classify, map and emit stages (see UTILS.pipeline)
+        """
+        self.window = window
+        self.base_time = base_time
+        self.writer = writer
+        self.clock = clock
+        self.cadence = cadence
+        self.plausibility = plausibility
+        self.held = {}  # Received key -> (keycode, modifier) it pressed, pinned to that epoch's keymap
+        self.last_counter = None
+        self.now = None  # Clock reading of the last press, for map()
+        # Detectors hook in first, so observers only see keys that get through
+        Hooks(cadence, plausibility, *observers).bind(self)
+    
+    def handle(self, record):
+        """Decode one key record - a dict lookup and a write in steady state"""
+        kind = self.classify(record)
+        if kind is not None:
+            output = self.map(record, kind)
+            if output is not None:
+                self.emit(record, kind, output)
+    
+    def classify(self, record):
+        """RELEASE, MARKER, PASS_THROUGH or MAPPED; rotates the keymap when the epoch changed"""
+        if record.state == KEY_UP:
+            return RELEASE
+        
+        # Update keymap if interval changed
+        now = self.now = self.clock()
+        local_counter = get_current_counter(self.base_time, now)
+        
+        if local_counter != self.last_counter:
+            self.last_counter = local_counter
+            with spans.span("rotate", "rotation", counter=local_counter):
+                self.window.prepare(local_counter)
+            metrics.ROTATIONS.inc()
+            print(f"\n[KEYMAP ROTATED] Counter={local_counter}")
+            print(f"  Time: {now:.2f}, Base: {self.base_time}, Diff: {now - self.base_time:.2f}s")
+            print(f"  Live epochs: {local_counter - 1}..{local_counter + 1}\n")
+        
+        key = record.key
+        # Epoch marker from the SENDER - switch maps, never inject it
+        if is_epoch_marker(key):
+            announced = self.window.on_marker(key, local_counter)
+            if announced is None:
+                print(f"[EPOCH] Rejected marker {key} (local counter={local_counter})")
+            else:
+                print(f"[EPOCH] SENDER switched to counter {announced}")
+            return MARKER
+        return MAPPED if key in EVDEV_TO_CHAR else PASS_THROUGH
+    
+    def map(self, record, kind):
+        """
+        What to inject for the record: (keycode, modifier) for a release or
+        a pass-through key, build_decode_table()'s output for a mapped one.
+        """
+        key = record.key
+        if kind == RELEASE:
+            # Release exactly what this key pressed, even across a rotation
+            return self.held.pop(key, None)
+        
+        index = record.shift | record.ctrl << 1
+        if kind == PASS_THROUGH:
+            # Special keys (Enter, Tab, etc.) and unknown keys - pass through as-is
+            if VERBOSE:
+                print(f"[PASS-THROUGH] {key}" if key in SPECIAL_KEYS else f"[UNKNOWN] {key}")
+            return (record.code, PASS_THROUGH_MODIFIERS[index]) if record.code else None
+        if kind != MAPPED:
+            return None
+        
+        counter = self.window.select(self.last_counter, get_seconds_into_interval(self.base_time, self.now))
+        output = self.window.decode_table(counter)[key][index]
+        if output is None:
+            print(f"[ERROR] Can't decode {key} to a keycode (shift={record.shift})\n")
+        return output
+    
+    def emit(self, record, kind, output):
+        """Inject map()'s output on the virtual keyboard"""
+        key = record.key
+        if kind == RELEASE:
+            self.writer.release_key(*output)
+            return output
+        
+        pinned = output if kind == PASS_THROUGH else output[0]
+        # Press the key; it stays down until the received key is released
+        self.writer.press_key(*pinned)
+        self.held[key] = pinned
+        if VERBOSE and kind == MAPPED:
+            print(f"✓ '{output[1]}' → '{output[2]}'")
+        return output
+
+def build_checks():
+    """(CadenceDetector, PlausibilityScorer) as configured, None where turned off"""
+    cadence = None
+    if CADENCE_CHECK:
+        from ENDPOINT.cadence import CadenceDetector
+        cadence = CadenceDetector(block=CADENCE_CHECK == "block")
+    plausibility = None
+    if PLAUSIBILITY_CHECK:
+        from ENDPOINT.plausibility import PlausibilityScorer
+        plausibility = PlausibilityScorer(block=PLAUSIBILITY_CHECK == "block")
+    return cadence, plausibility
+
+class Session:
+    """One SENDER: its serial control channel, key schedule and decoder"""
     
-    print(f"[ENDPOINT] Symmetric key: {sym_key.hex()[:16]}...")
-    print(f"[ENDPOINT] Base time: {base_time}")
-    print(f"[ENDPOINT] Current counter: {get_current_counter(base_time)}")
+    def __init__(self, port, ser, sym_key, base_time, writer, observers=(), recorder=None):
+        """
+        Args:
+            recorder: UTILS.trace.TraceWriter whose key sidecar gets this session's rekeys
+        """
+        from ENDPOINT.dhe_time_ENDPOINT import open_serial
+        from UTILS.rekey import KeySchedule, EndpointRekeyer
+        from UTILS.resync import EndpointResync
+        from UTILS.heartbeat import EndpointHeartbeat
+        self.port = port
+        self.base_time = base_time
+        
+        # Reopened with backoff if the link drops; the HID path never waits on it
+        self.channel = ControlChannel(ser, f"ENDPOINT {port}", reopen=lambda: open_serial(port))
+        # Key in force per epoch; the SENDER drives rekeys over the control channel
+        schedule = KeySchedule(sym_key, log=recorder.key_log(port) if recorder else None)
+        EndpointRekeyer(self.channel, schedule, lambda: get_current_counter(base_time))
+        EndpointResync(self.channel, schedule, lambda: get_current_counter(base_time))
+        EndpointHeartbeat(self.channel)
+        
+        window = EpochWindow(schedule, table_builder=build_decode_table)
+        cadence, plausibility = build_checks()
+        self.decoder = Decoder(window, base_time, writer, cadence=cadence, plausibility=plausibility,
+                               observers=observers)
     
-    reader = KeyboardReader()
-    writer = KeyboardWriter()
+    def start(self):
+        self.channel.start()
+
+def main(low_latency=LOW_LATENCY, trace=TRACE_FILE, observers=()):
+    """
+    Args:
+        observers: hooked onto each decoder's pipeline stages (see UTILS.pipeline),
+            e.g. the timing of tests/research/shared_timer.py
+    """
+    startup.mark("imports")
+    startup.preload("ENDPOINT.keyboard_reader", "ENDPOINT.keyboard_writer", "UTILS.rekey")
+    from ENDPOINT import dhe_time_ENDPOINT, routing
+    layout = layouts.load(KEYBOARD_LAYOUT)
+    use_layout(layout)
+    print(f"[ENDPOINT] Keyboard layout: {layout['layout']}")
     
-    current_keymap = None
-    current_reverse_map = None
-    last_counter = None
+    # One handshake, and one session, per SENDER
+    if TRANSPORT == "serial":
+        ports = [dhe_time_ENDPOINT.SERIAL_PORT]
+    else:
+        ports = list(SENDER_PORTS) or routing.sender_ports() or [dhe_time_ENDPOINT.SERIAL_PORT]
+    print(f"[ENDPOINT] Initializing secure connection on {', '.join(ports)}...")
+    handshakes = dhe_time_ENDPOINT.handshake_all(ports)
+    if not handshakes:
+        raise RuntimeError("No SENDER completed the handshake")
+    startup.mark("key exchange")
+    
+    for port, _, sym_key, base_time in handshakes:
+        print(f"[ENDPOINT] {port}: key {sym_key.hex()[:16]}..., base time {base_time}, "
+              f"counter {get_current_counter(base_time)}")
+    
+    # The host's layout types the decoded keys; each SENDER takes it for caps lock
+    for port, ser, _, _ in handshakes:
+        layouts.confirm(ser, layout, f"ENDPOINT {port}", first=False)
+    
+    # Before any thread starts, so they all inherit the policy
+    idle_gc = None
+    if low_latency:
+        from UTILS.realtime import enable_low_latency, IdleCollector
+        enable_low_latency("ENDPOINT")
+        idle_gc = IdleCollector().start()
+    observers = (metrics.enable("ENDPOINT", METRICS_ADDRESS), *observers)
+    
+    # Grab local keyboards in both modes so nothing can inject around us
+    from ENDPOINT.keyboard_reader import KeyboardReader
+    from ENDPOINT.keyboard_writer import KeyboardWriter, BatchedKeyboardWriter
+    from UTILS.heartbeat import EndpointHeartbeat
+    recorder = None
+    if trace:
+        from UTILS.trace import TraceWriter
+        recorder = TraceWriter(trace)
+        print(f"[ENDPOINT] Recording key events to {trace}")
+    reader = KeyboardReader(recorder)
+    writer = BatchedKeyboardWriter() if KEYBOARD_WRITER == "batched" else KeyboardWriter()
+    startup.mark("devices ready")
+    
+    if TRANSPORT == "serial":
+        port, ser, sym_key, _ = handshakes[0]
+        channel = ControlChannel(ser, "ENDPOINT", reopen=lambda: dhe_time_ENDPOINT.open_serial(port))
+        EndpointHeartbeat(channel)
+        try:
+            run_serial_transport(sym_key, writer, channel)
+        except KeyboardInterrupt:
+            print("\n[ENDPOINT] Stopped by user.")
+        finally:
+            reader.close()
+            writer.close()
+        return
+    
+    sessions = [Session(port, ser, sym_key, base_time, writer, observers, recorder)
+                for port, ser, sym_key, base_time in handshakes]
+    for session in sessions:
+        session.start()
+    router = routing.Router(reader.devs, sessions, writer, TRUSTED_KEYBOARDS, UNPAIRED_KEYBOARDS,
+                            TRUST_BUILTIN_KEYBOARDS)
+    handlers = router.handlers
     
     print("[ENDPOINT] Starting decoder with rotating keymap...")
     print("[ENDPOINT] Press Ctrl+C to stop.\n")
     
     try:
-        for event in reader.read_events():
-            # Update keymap if interval changed
-            counter = get_current_counter(base_time)
-            
-            if counter != last_counter:
-                last_counter = counter
-                seed = generate_seed(sym_key, counter)
-                current_keymap = seed_to_keymap(seed)
-                current_reverse_map = reverse_keymap(current_keymap)
-                now = time.time()
-                print(f"\n[KEYMAP ROTATED] Counter={counter}, Seed={seed.hex()[:12]}...")
-                print(f"  Time: {now:.2f}, Base: {base_time}, Diff: {now - base_time:.2f}s")
-                print(f"  Forward: a→{current_keymap.get('a', '?')}, k→{current_keymap.get('k', '?')}")
-                print(f"  Reverse map has {len(current_reverse_map)} entries\n")
-            
-            key = event['key']
-            shift = event['shift']
-            ctrl = event['ctrl']
-            
-            # Check if this is a special key (Enter, Tab, etc.) - pass through as-is
-            if key in SPECIAL_KEYS:
-                print(f"[PASS-THROUGH] {key}")
-                keycode = getattr(__import__('evdev.ecodes', fromlist=['ecodes']), key, None)
-                if keycode:
-                    modifier = 0
-                    if shift:
-                        modifier |= 0x02
-                    if ctrl:
-                        modifier |= 0x01
-                    writer.write_key(keycode, modifier)
-                continue
-            
-            # Get the base character for this key
-            base_char = EVDEV_TO_CHAR.get(key)
-            
-            if not base_char:
-                # Unknown key - pass through as-is
-                print(f"[UNKNOWN] {key}")
-                keycode = getattr(__import__('evdev.ecodes', fromlist=['ecodes']), key, None)
-                if keycode:
-                    modifier = 0
-                    if shift:
-                        modifier |= 0x02
-                    if ctrl:
-                        modifier |= 0x01
-                    writer.write_key(keycode, modifier)
-                continue
-            
-            # Determine what character was actually sent
-            # This must match EXACTLY how SENDER encodes it
-            if base_char.isalpha():
-                # Letter: uppercase if shift is pressed
-                scrambled_char = base_char.upper() if shift else base_char.lower()
-            elif shift and base_char in SHIFT_MAP:
-                # Shifted symbol (1→!, 2→@, etc.)
-                scrambled_char = SHIFT_MAP[base_char]
-            else:
-                # Unshifted symbol or number
-                scrambled_char = base_char
-            
-            print(f"[RECEIVED] '{scrambled_char}' (key={key}, base='{base_char}', shift={shift})")
-            
-            # Decode: scrambled → original (use lowercase for lookup)
-            original_char = current_reverse_map.get(scrambled_char.lower(), scrambled_char.lower())
-            
-            # Preserve case: if scrambled was uppercase, original should be uppercase
-            if scrambled_char.isupper() and original_char.isalpha():
-                original_char = original_char.upper()
-            
-            print(f"[DECODED] '{scrambled_char}' → '{original_char}'")
-            
-            # Convert original character → keycode
-            keycode, modifier = char_to_keycode(original_char)
-            if not keycode:
-                print(f"[ERROR] Can't map '{original_char}' to keycode\n")
-                continue
-            
-            # Add Ctrl if it was pressed
-            if ctrl:
-                modifier |= 0x01
-            
-            # Write decoded key
-            writer.write_key(keycode, modifier)
-            print(f"✓ '{scrambled_char}' → '{original_char}'\n")
+        events = Hooks(*observers).events(reader.read_events())
+        record = next(events)
+        handlers[record.fd](record)
+        startup.first_keystroke("ENDPOINT")
+        for record in events:
+            if idle_gc:
+                idle_gc.touch()
+            handlers[record.fd](record)
     
     except KeyboardInterrupt:
         print("\n[ENDPOINT] Stopped by user.")
@@ -168,4 +402,5 @@ def main():
         writer.close()
 
 if __name__ == "__main__":
-    main()
+    trace = sys.argv[sys.argv.index("--trace") + 1] if "--trace" in sys.argv[:-1] else TRACE_FILE
+    main(low_latency=LOW_LATENCY or "--low-latency" in sys.argv, trace=trace)
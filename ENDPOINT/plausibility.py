@@ -0,0 +1,167 @@
+"""Character trigram plausibility of decoded text: catches plain text typed through the decoder"""
+import math
+from array import array
+from UTILS import tables
+from UTILS.pipeline import MAPPED
+
+# Character classes: a-z (case folded), then space, digit, prose punctuation, other symbol
+CLASSES = 30
+SPACE, DIGIT, PUNCT, SYMBOL = 26, 27, 28, 29
+CHAR_CLASS = {chr(ord('a') + i): i for i in range(26)}
+CHAR_CLASS.update({chr(ord('A') + i): i for i in range(26)})
+CHAR_CLASS.update({str(d): DIGIT for d in range(10)})
+CHAR_CLASS.update({c: PUNCT for c in ".,;:!?'\""})
+CHAR_CLASS[' '] = SPACE
+
+COST_SCALE = 16  # Table entries are -log2 P in 1/16 bit, clamped to a byte
+WINDOW = 24  # Decoded characters the score averages over
+THRESHOLD = 5.5  # Mean bits per character above this is not text anyone typed
+RECOVER = 4.5  # ...and below this it is again
+
+# Modules whose docstrings train the tables: English prose mixed with code
+# and command lines, close to what gets typed, and present on every ENDPOINT
+CORPUS_MODULES = (
+    "argparse", "asyncio", "collections", "contextlib", "csv", "datetime",
+    "email.message", "functools", "http.client", "http.server", "inspect",
+    "json", "logging", "os", "pathlib", "pdb", "pickle", "random", "re",
+    "shutil", "socket", "sqlite3", "string", "subprocess", "tarfile",
+    "textwrap", "threading", "unittest", "urllib.parse", "uuid",
+    "urllib.request", "zipfile",
+)
+
+
+def stdlib_corpus():
+    """Docstrings of CORPUS_MODULES and everything they define, in a stable order"""
+    import importlib
+    import inspect
+    parts = []
+    for name in CORPUS_MODULES:
+        module = importlib.import_module(name)
+        objects = [module]
+        for value in vars(module).values():
+            if (inspect.isclass(value) or inspect.isfunction(value)) and value.__module__ == name:
+                objects.append(value)
+                if inspect.isclass(value):
+                    objects.extend(v for v in vars(value).values() if inspect.isfunction(v))
+        parts.extend(obj.__doc__ for obj in objects if isinstance(obj.__doc__, str))
+    return " ".join(parts)
+
+
+def _classes(text):
+    """Class sequence of `text`, whitespace runs collapsed to one space"""
+    return [CHAR_CLASS.get(c, SYMBOL) for c in " ".join(text.split())]
+
+
+def _cost(p):
+    return min(255, round(-math.log2(p) * COST_SCALE))
+
+
+def build_tables(text):
+    """
+    Trigram cost table from a training text, interpolated with bigram and
+    unigram estimates so rare and unseen contexts still score sensibly.
+
+    Returns:
+        {'trigram': bytes of CLASSES**3}, indexed [(a * CLASSES + b) * CLASSES + c]
+    """
+    K = CLASSES
+    seq = _classes(text)
+    n1 = [0] * K
+    n2 = [0] * K * K
+    n3 = [0] * K * K * K
+    for i, c in enumerate(seq):
+        n1[c] += 1
+        if i >= 1:
+            n2[seq[i - 1] * K + c] += 1
+        if i >= 2:
+            n3[(seq[i - 2] * K + seq[i - 1]) * K + c] += 1
+
+    total = len(seq)
+    p1 = [(n + 1) / (total + K) for n in n1]
+    p2 = []
+    for b in range(K):
+        row = sum(n2[b * K:(b + 1) * K])
+        p2.extend(0.8 * (n2[b * K + c] / row if row else p1[c]) + 0.2 * p1[c] for c in range(K))
+    trigram = bytearray(K ** 3)
+    for ab in range(K * K):
+        row = sum(n3[ab * K:(ab + 1) * K])
+        b = ab % K
+        for c in range(K):
+            p3 = n3[ab * K + c] / row if row else p2[b * K + c]
+            trigram[ab * K + c] = _cost(0.7 * p3 + 0.3 * p2[b * K + c])
+    return {'trigram': bytes(trigram)}
+
+
+class PlausibilityScorer:
+    """
+    Rolling mean cost, in bits per character, of the last WINDOW decoded
+    characters under the trigram tables. A few lookups per key: the window
+    is a ring buffer with a running total.
+
+    Scrambled keys decode to readable text; plain text typed straight
+    through the decoder (an injecting cable that doesn't know the keymap)
+    decodes to a random substitution of it, which scores far higher.
+    """
+
+    def __init__(self, block=False, window=WINDOW, threshold=THRESHOLD, recover=RECOVER):
+        """
+        Args:
+            block: drop decoded keys while the text is implausible; False only reports
+        """
+        self.trigram = tables.load('ngram')['trigram']
+        self.block = block
+        self.window = window
+        self.limit = threshold * COST_SCALE * window
+        self.recover_limit = recover * COST_SCALE * window
+        self.costs = array('H', bytes(2 * window))
+        self.total = 0
+        self.pos = 0
+        self.seen = 0
+        self.before = SPACE  # Class of the character before last
+        self.last = SPACE
+        self.suspect = False
+        self.alerts = 0  # Times the text turned implausible
+        self.blocked = 0  # Keys dropped
+
+    def score(self):
+        """Mean bits per character over the window"""
+        return self.total / (COST_SCALE * min(max(self.seen, 1), self.window))
+
+    def observe(self, char):
+        """
+        Account for one decoded character.
+
+        Returns:
+            False if the key should be dropped
+        """
+        c = CHAR_CLASS.get(char, SYMBOL)
+        cost = self.trigram[(self.before * CLASSES + self.last) * CLASSES + c]
+        self.before = self.last
+        self.last = c
+
+        pos = self.pos
+        self.total += cost - self.costs[pos]
+        self.costs[pos] = cost
+        self.pos = pos + 1 if pos + 1 < self.window else 0
+        self.seen += 1
+
+        if self.seen >= self.window:
+            if not self.suspect and self.total > self.limit:
+                self.suspect = True
+                self.alerts += 1
+                print(f"[PLAUSIBILITY] Decoded text looks like noise ({self.score():.1f} bits/char) - "
+                      f"{'quarantining input' if self.block else 'possible injection'}")
+            elif self.suspect and self.total < self.recover_limit:
+                self.suspect = False
+                print(f"[PLAUSIBILITY] Decoded text plausible again ({self.score():.1f} bits/char)")
+
+        if self.suspect and self.block:
+            self.blocked += 1
+            return False
+        return True
+
+    def after_map(self, record, kind, output):
+        """Pipeline hook (see UTILS.pipeline): score every decoded character"""
+        if kind == MAPPED:
+            return self.observe(output[2])
+        return True
@@ -0,0 +1,145 @@
+"""Per-device routing: each grabbed keyboard is decoded with its SENDER's session, passed through or blocked"""
+import glob
+import os
+import re
+from UTILS.events import KEY_UP
+
+DECODE = "decode"
+PASS = "pass"
+BLOCK = "block"
+
+# sysfs name of a USB device ("1-2", "3-1.4"); its interfaces are "1-2:1.0", ...
+_USB_DEVICE = re.compile(r"^\d+-[\d.]+$")
+
+
+def usb_device(sysfs_link):
+    """sysfs path of the USB device behind a class device link, or None if it isn't on USB"""
+    path = os.path.realpath(sysfs_link)
+    while path != "/":
+        if _USB_DEVICE.match(os.path.basename(path)):
+            return path
+        path = os.path.dirname(path)
+    return None
+
+
+def input_usb_device(event_path):
+    """USB device of an evdev node such as /dev/input/event5"""
+    return usb_device(f"/sys/class/input/{os.path.basename(event_path)}/device")
+
+
+def serial_usb_device(port):
+    """USB device of a serial port such as /dev/ttyACM0"""
+    return usb_device(f"/sys/class/tty/{os.path.basename(port)}/device")
+
+
+def sender_ports():
+    """Every CDC ACM port on the host - each SENDER gadget brings one"""
+    return sorted(glob.glob("/dev/ttyACM*"))
+
+
+def _trusted(dev, trusted):
+    usb_id = f"{dev.info.vendor:04x}:{dev.info.product:04x}"
+    return any(entry == usb_id or entry in dev.name for entry in trusted)
+
+
+def plan_routes(devices, session_usb, trusted=(), unpaired=BLOCK, trust_builtin=True, usb_of=input_usb_device):
+    """
+    Decide what happens to each grabbed keyboard.
+
+    A SENDER's HID keyboard and its serial port are functions of the same
+    USB gadget, so a keyboard is paired with the session whose port shares
+    its USB device.
+
+    Args:
+        devices: grabbed evdev InputDevices
+        session_usb: USB device path of each session's serial port, in session order
+        trusted: device name substrings or "vendor:product" ids to pass through
+        unpaired: policy for USB keyboards that are neither a SENDER nor trusted
+        trust_builtin: pass through keyboards not on USB (laptop keyboards),
+            which no cable can impersonate
+
+    Returns:
+        {fd: (policy, session index or None)}
+    """
+    routes = {}
+    for dev in devices:
+        usb = usb_of(dev.path)
+        if usb is not None and usb in session_usb:
+            routes[dev.fd] = (DECODE, session_usb.index(usb))
+        elif _trusted(dev, trusted) or (usb is None and trust_builtin):
+            routes[dev.fd] = (PASS, None)
+        else:
+            routes[dev.fd] = (unpaired, None)
+
+    # No pairing information (no sysfs, or the gadget split across devices):
+    # with a single session, fall back to decoding every unpaired USB keyboard
+    if len(session_usb) == 1 and not any(policy == DECODE for policy, _ in routes.values()):
+        print("[ROUTE] Could not pair a keyboard with the SENDER's serial port - "
+              "decoding every untrusted USB keyboard with it")
+        for dev in devices:
+            if routes[dev.fd] == (unpaired, None) and usb_of(dev.path) is not None:
+                routes[dev.fd] = (DECODE, 0)
+    return routes
+
+
+class PassThrough:
+    """Trusted keyboard: forward keys as typed"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.held = {}  # Keycode -> (keycode, modifier) it pressed
+
+    def handle(self, record):
+        if record.state == KEY_UP:
+            pinned = self.held.pop(record.code, None)
+            if pinned:
+                self.writer.release_key(*pinned)
+            return
+        pinned = (record.code, record.ctrl | record.shift << 1 | record.alt << 2)
+        self.writer.press_key(*pinned)
+        self.held[record.code] = pinned
+
+
+class Blocked:
+    """Keyboard nobody vouches for: drop everything, say so once"""
+
+    def __init__(self, name):
+        self.name = name
+        self.dropped = 0
+
+    def handle(self, record):
+        if record.state == KEY_UP:
+            return
+        if not self.dropped:
+            print(f"[ROUTE] Blocking input from {self.name}")
+        self.dropped += 1
+
+
+class Router:
+    """fd → handler(record) for every grabbed keyboard: one dict lookup per event"""
+
+    def __init__(self, devices, sessions, writer, trusted=(), unpaired=BLOCK, trust_builtin=True):
+        """
+        Args:
+            devices: grabbed evdev InputDevices
+            sessions: objects with .port (serial port) and .decoder (Decoder)
+            writer: KeyboardWriter shared by every route
+        """
+        session_usb = [serial_usb_device(session.port) for session in sessions]
+        self.routes = plan_routes(devices, session_usb, trusted, unpaired, trust_builtin)
+        self.handlers = {}
+        for dev in devices:
+            policy, index = self.routes[dev.fd]
+            if policy == DECODE:
+                self.handlers[dev.fd] = sessions[index].decoder.handle
+                via = f" with the session on {sessions[index].port}"
+            elif policy == PASS:
+                self.handlers[dev.fd] = PassThrough(writer).handle
+                via = ""
+            else:
+                self.handlers[dev.fd] = Blocked(dev.name).handle
+                via = ""
+            print(f"[ROUTE] {dev.name} ({dev.path}): {policy}{via}")
+
+    def handle(self, record):
+        self.handlers[record.fd](record)
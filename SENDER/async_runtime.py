@@ -0,0 +1,429 @@
+"""
+asyncio SENDER runtime: keyboard input, scrambling, HID output, the serial
+control link, rekeys and keymap rotation as tasks of one event loop
+
+Keyboards are read the moment their fd is readable, into a bounded queue
+that capture never waits on. The scrambler takes batches from there and
+queues reports for the HID writer, which writes them to a non-blocking
+/dev/hidg0 whenever the host has polled the last one. A timer builds each
+epoch's table ahead of its start, so the key path only swaps it in. Every
+stage keeps a LatencyStats, printed on exit.
+"""
+import asyncio
+import collections
+import os
+import time
+from evdev import ecodes
+from UTILS import get_device_info, metrics, startup
+from UTILS.async_channel import AsyncControlChannel, LatencyStats
+from UTILS.heartbeat import SenderHeartbeat
+from UTILS.events import KeyRecord, KEY_NAMES, KEY_UP
+from UTILS.link import MSG_DATA
+from UTILS.pipeline import Hooks
+import SENDER.main as sender
+from SENDER.keyboard_reader import KeyboardDevice, key_records, BY_ID, RESCAN_INTERVAL, QUEUE_SIZE
+from SENDER.key_sender import HIDReportWriter, HID_DEVICE
+
+HID_QUEUE_SIZE = 256  # Reports waiting for the host before the scrambler waits
+REPORTS_PER_KEY = 3  # Most reports one record can queue: an epoch marker tap and the press
+PREPARE_AHEAD = 1.0  # Seconds before a rotation its table is built
+LAG_PROBE = 0.1  # Timer period of the event-loop lag probe, seconds
+
+
+class AsyncKeyboardReader:
+    """
+    KeyboardReader for the event loop. When the scrambler falls behind and
+    the queue is full, the batch is dropped and counted instead of
+    blocking capture; its modifier changes still count, and the scrambler
+    releases every held key so nothing stays stuck on the host.
+    """
+
+    def __init__(self, loop, recorder=None, queue_size=QUEUE_SIZE):
+        """
+        Args:
+            recorder: UTILS.trace.TraceWriter that gets every key event read
+        """
+        self.loop = loop
+        self.devices = {}  # fd -> KeyboardDevice
+        self.recorder = recorder
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.record = KeyRecord()  # Refilled for every event records() yields
+        self.dropped = 0  # Key events lost to a full queue
+        self.overflowed = False  # Set on a drop, cleared by the scrambler
+        self.latency = LatencyStats()  # Read on the device → pickup by the scrambler
+
+        self.rescan()
+        if not self.devices:
+            raise RuntimeError("ERROR: Keyboard not found")
+
+    def attach(self, path):
+        """Start reading a keyboard"""
+        if any(device.path == path for device in self.devices.values()):
+            return None
+        try:
+            device = KeyboardDevice(path)
+        except OSError as e:
+            print(f"[SENDER] ✗ Failed to open {path}: {e}")
+            return None
+        fd = device.dev.fd
+        self.devices[fd] = device
+        self.loop.add_reader(fd, self._read, fd)
+        if self.recorder:
+            self.recorder.add_device(fd, device.name)
+        print(f"Listening on {device.path} ({device.name}) ... Press Ctrl+C to quit.")
+        return device
+
+    def detach(self, fd):
+        """Stop reading a keyboard (unplugged or failed), releasing the keys it held"""
+        device = self.devices.pop(fd, None)
+        if device is None:
+            return
+        self.loop.remove_reader(fd)
+        try:
+            device.dev.close()
+        except OSError:
+            pass
+        print(f"[SENDER] Keyboard detached: {device.name}")
+        releases = device.releases()
+        if releases:
+            # After everything it sent, or they would stay down on the host
+            try:
+                self.queue.put_nowait((time.perf_counter(), device, releases))
+            except asyncio.QueueFull:
+                self.overflowed = True
+
+    def rescan(self, names=None):
+        """Attach any keyboard that appeared since the last scan"""
+        for name in get_device_info.get_keyboards() if names is None else names:
+            self.attach(BY_ID + name)
+
+    async def watch(self):
+        """Task: pick up newly plugged keyboards"""
+        while True:
+            await asyncio.sleep(RESCAN_INTERVAL)
+            # Listing them forks ls: off the loop, so capture never waits on it
+            self.rescan(await self.loop.run_in_executor(None, get_device_info.get_keyboards))
+
+    def _read(self, fd):
+        device = self.devices.get(fd)
+        if device is None:
+            return
+        try:
+            events = [event for event in device.dev.read() if event.type == ecodes.EV_KEY]
+        except BlockingIOError:
+            return
+        except OSError:
+            # Unplugged
+            self.detach(fd)
+            return
+        if not events:
+            return
+        if self.recorder:
+            self.recorder.write(fd, events)
+        device.events += len(events)
+        device.note(events)
+        try:
+            self.queue.put_nowait((time.perf_counter(), device, events))
+        except asyncio.QueueFull:
+            for event in events:
+                device.track_modifier(KEY_NAMES.get(event.code), event.value)
+            self.dropped += len(events)
+            self.overflowed = True
+
+    async def batches(self):
+        """Async generator yielding (KeyboardDevice, events) in read order"""
+        while True:
+            enqueued_at, device, events = await self.queue.get()
+            self.latency.add(time.perf_counter() - enqueued_at)
+            yield device, events
+
+    def stats(self):
+        """Per-device event rates and queue latency, as KeyboardReader.stats()"""
+        latency = self.latency.summary()
+        return {
+            'devices': {
+                device.name: {
+                    'path': device.path,
+                    'events': device.events,
+                    'events_per_sec': device.rate(),
+                }
+                for device in self.devices.values()
+            },
+            'queue_depth': self.queue.qsize(),
+            'queue_latency_avg_ms': latency['avg_ms'],
+            'queue_latency_max_ms': latency['max_ms'],
+            'dropped': self.dropped,
+        }
+
+
+class AsyncHIDWriter(HIDReportWriter):
+    """
+    HIDReportWriter whose reports go out from a task. press() and release()
+    only queue the report; run() writes them to /dev/hidg0 opened
+    non-blocking, and waits for the fd to be writable while the host has not
+    polled the previous one.
+    """
+
+    def __init__(self, path=HID_DEVICE, queue_size=HID_QUEUE_SIZE):
+        super().__init__(path)
+        os.set_blocking(self.fd, False)
+        self.queue_size = queue_size
+        self.pending = collections.deque()  # (queued at, report)
+        self.latency = LatencyStats()  # Queued → written, mostly waiting for the host's poll
+        self._queued = asyncio.Event()
+        self._drained = asyncio.Event()
+
+    def write_report(self, report):
+        """Queue one raw report; never blocks"""
+        self.pending.append((time.perf_counter(), report))
+        self._queued.set()
+
+    async def room(self, reports):
+        """Wait until `reports` more reports fit in the queue"""
+        while len(self.pending) + reports > self.queue_size:
+            self._drained.clear()
+            await self._drained.wait()
+
+    async def run(self):
+        """Task: write queued reports as fast as the host polls them"""
+        loop = asyncio.get_running_loop()
+        pending = self.pending
+        while True:
+            if not pending:
+                self._queued.clear()
+                await self._queued.wait()
+                continue
+            queued_at, report = pending[0]
+            try:
+                os.write(self.fd, report)
+            except BlockingIOError:
+                await self._writable(loop)
+                continue
+            except OSError as e:
+                metrics.WRITE_ERRORS.inc()
+                print(f"Error sending report {report.hex()}: {e}")
+            pending.popleft()
+            self.latency.add(time.perf_counter() - queued_at)
+            self._drained.set()
+
+    async def _writable(self, loop):
+        ready = loop.create_future()
+        loop.add_writer(self.fd, lambda: ready.done() or ready.set_result(None))
+        try:
+            await ready
+        finally:
+            loop.remove_writer(self.fd)
+
+    def flush(self):
+        """Write whatever is still queued, blocking - after the loop has stopped"""
+        os.set_blocking(self.fd, True)
+        while self.pending:
+            _, report = self.pending.popleft()
+            try:
+                os.write(self.fd, report)
+            except OSError as e:
+                metrics.WRITE_ERRORS.inc()
+                print(f"Error sending report {report.hex()}: {e}")
+                return
+
+
+class AsyncSender:
+    """The SENDER's stages as asyncio tasks; see the module docstring"""
+
+    def __init__(self, sym_key, base_time, ser, reopen=None, recorder=None, idle_gc=None, observers=()):
+        """
+        Args:
+            sym_key, base_time: from the key exchange
+            ser, reopen: serial port left open by the handshake, and how to reopen it
+            recorder: UTILS.trace.TraceWriter that gets every key event read
+            idle_gc: UTILS.realtime.IdleCollector to touch on every key
+            observers: hooked onto the key pipeline's stages (see UTILS.pipeline)
+        """
+        self.sym_key = sym_key
+        self.base_time = base_time
+        self.ser = ser
+        self.reopen = reopen
+        self.recorder = recorder
+        self.idle_gc = idle_gc
+        self.observers = observers
+        self.reader = None
+        self.channel = None
+        self.hid = None
+        self.scrambler = None
+        self.clock = None
+        # Stages not timed by their own object
+        self.handle_latency = LatencyStats()  # One Scrambler.handle() call
+        self.prepare_latency = LatencyStats()  # Building the next epoch's table
+        self.rotation_lateness = LatencyStats()  # Epoch boundary → rotate() done
+        self.loop_lag = LatencyStats()  # How late a LAG_PROBE timer fires
+
+    def run(self):
+        """Run until Ctrl+C, then release every key and print the stage latencies"""
+        try:
+            asyncio.run(self.main())
+        except KeyboardInterrupt:
+            print("\n[SENDER] Stopped by user.")
+            if self.reader:
+                sender.print_reader_stats(self.reader)
+            self.print_stats()
+        finally:
+            if self.hid:
+                self.hid.release_all()
+                self.hid.flush()
+                self.hid.close()
+
+    async def main(self):
+        from UTILS.rekey import KeySchedule, SenderRekeyer
+        from UTILS.resync import DriftClock, SenderResync
+
+        loop = asyncio.get_running_loop()
+        self.reader = AsyncKeyboardReader(loop, self.recorder)
+        # Reopened with backoff if the link drops; the HID path never waits on it
+        self.channel = AsyncControlChannel(self.ser, "SENDER", reopen=self.reopen)
+        startup.mark("reader ready")
+        tasks = [self.reader.watch(), self._probe_lag(loop), self._heartbeat(SenderHeartbeat(self.channel))]
+
+        if sender.TRANSPORT == "serial":
+            self.channel.start()
+            tasks.append(self._forward())
+            print("[SENDER] Forwarding key events as AEAD frames over serial...")
+            print("[SENDER] Press Ctrl+C to stop.\n")
+            await self._gather(tasks)
+            return
+
+        # Key in force per epoch; rekeys land here from the control channel
+        schedule = KeySchedule(self.sym_key)
+        # Wall clock corrected for drift measured by each resync
+        self.clock = DriftClock()
+        counter_fn = lambda: sender.get_current_counter(self.base_time, self.clock.now())
+        rekeyer = None
+        if sender.USE_REKEY:
+            rekeyer = SenderRekeyer(self.channel, schedule, counter_fn, epoch_length=sender.INTERVAL,
+                                    call_later=loop.call_later)
+            tasks.append(self._rekey(rekeyer))
+        resync = SenderResync(self.channel, schedule, counter_fn, self.clock, rekeyer)
+        self.channel.start()
+        resync.request()  # Clock offset baseline that later resyncs keep
+
+        if sender.BURST_MODE:
+            print("[SENDER] BURST_MODE has no asyncio writer yet - one report per key change")
+        self.hid = AsyncHIDWriter()
+        # Rotation guards are awaited in _scramble(), never slept in handle()
+        self.scrambler = sender.Scrambler(schedule, self.base_time, self.hid, clock=self.clock.now,
+                                          sleep=lambda seconds: None, observers=self.observers)
+        tasks += [self.hid.run(), self._scramble(), self._rotate()]
+
+        print("[SENDER] Starting keyboard with rotating scrambler (asyncio)...")
+        print("[SENDER] Press Ctrl+C to stop.\n")
+        await self._gather(tasks)
+
+    @staticmethod
+    async def _gather(coroutines):
+        await asyncio.gather(*(asyncio.create_task(coroutine, name=coroutine.__name__)
+                               for coroutine in coroutines))
+
+    async def _scramble(self):
+        """Task: scramble every key record into queued HID reports"""
+        reader = self.reader
+        hid = self.hid
+        scrambler = self.scrambler
+        hooks = Hooks(*self.observers)
+        first = True
+        async for device, events in reader.batches():
+            if reader.overflowed:
+                # Releases may have been among the dropped events
+                reader.overflowed = False
+                scrambler.held.clear()
+                hid.release_all()
+                print(f"[SENDER] Scrambler fell behind - {reader.dropped} key events dropped so far")
+
+            for record in hooks.events(key_records(((device, events),), reader.record)):
+                if not sender.USE_EPOCH_MARKERS and record.state != KEY_UP:
+                    until = sender.get_time_until_rotation(self.base_time, self.clock.now())
+                    if until < sender.BUFFER_WINDOW:
+                        # Too close to rotation - wait for new counter, capture carries on
+                        print(f"[BUFFER] {until:.2f}s until rotation - waiting...")
+                        metrics.GUARD_STALLS.observe(until + sender.POST_ROTATION_GUARD)
+                        await asyncio.sleep(until + sender.POST_ROTATION_GUARD)
+                        print("[BUFFER] Rotation complete, resuming...")
+                await hid.room(REPORTS_PER_KEY)
+                if self.idle_gc:
+                    self.idle_gc.touch()
+                started = time.perf_counter()
+                scrambler.handle(record)
+                self.handle_latency.add(time.perf_counter() - started)
+                if first:
+                    startup.first_keystroke("SENDER")
+                    first = False
+
+    async def _rotate(self):
+        """Task: build each epoch's table ahead of its start and switch to it on time"""
+        scrambler = self.scrambler
+        base_time = self.base_time
+        while True:
+            now = self.clock.now()
+            counter = sender.get_current_counter(base_time, now) + 1
+            until = sender.get_time_until_rotation(base_time, now)
+            if until > PREPARE_AHEAD:
+                await asyncio.sleep(until - PREPARE_AHEAD)
+            started = time.perf_counter()
+            scrambler.prepare(counter)
+            self.prepare_latency.add(time.perf_counter() - started)
+
+            # Timers can fire a little early; wait out the rest of the epoch
+            while sender.get_current_counter(base_time, self.clock.now()) < counter:
+                await asyncio.sleep(sender.get_time_until_rotation(base_time, self.clock.now()))
+            if scrambler.last_counter != counter:
+                scrambler.rotate(counter)
+            now = self.clock.now()
+            self.rotation_lateness.add((now - (base_time + sender.TIME_OFFSET)) % sender.INTERVAL)
+
+    async def _rekey(self, rekeyer):
+        """Task: SenderRekeyer's thread loop, on the event loop"""
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(rekeyer.interval)
+            # The pool may still be generating: wait for a keypair off the loop
+            rekeyer.tick(await loop.run_in_executor(None, rekeyer.pool.take))
+
+    async def _heartbeat(self, heartbeat):
+        """Task: SenderHeartbeat's thread loop, on the event loop"""
+        while True:
+            await asyncio.sleep(heartbeat.interval)
+            heartbeat.ping()
+
+    async def _forward(self):
+        """Task: TRANSPORT = "serial" - every batch as a sealed frame"""
+        from UTILS.secure_link import FrameSealer
+        sealer = FrameSealer(self.sym_key)
+        async for _, events in self.reader.batches():
+            # Queued while the link is down and flushed when it is back
+            self.channel.send(MSG_DATA, sealer.seal([(event.code, event.value) for event in events]),
+                              queue=True)
+
+    async def _probe_lag(self, loop):
+        """Task: how long any ready task may wait for the loop"""
+        while True:
+            started = loop.time()
+            await asyncio.sleep(LAG_PROBE)
+            self.loop_lag.add(loop.time() - started - LAG_PROBE)
+
+    def stats(self):
+        """Latency of every stage, as LatencyStats.summary()"""
+        stages = {
+            'input queue': self.reader.latency if self.reader else None,
+            'scramble': self.handle_latency,
+            'hid write': self.hid.latency if self.hid else None,
+            'control dispatch': self.channel.latency if self.channel else None,
+            'table prepare': self.prepare_latency,
+            'rotation lateness': self.rotation_lateness,
+            'loop lag': self.loop_lag,
+        }
+        return {name: latency.summary() for name, latency in stages.items() if latency is not None}
+
+    def print_stats(self):
+        if self.reader and self.reader.dropped:
+            print(f"[STATS] Dropped: {self.reader.dropped} key events (scrambler behind)")
+        for name, stage in self.stats().items():
+            print(f"[STATS] {name}: {stage['count']} samples, "
+                  f"avg {stage['avg_ms']:.3f} ms, max {stage['max_ms']:.3f} ms")
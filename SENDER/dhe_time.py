@@ -7,28 +7,20 @@ from cryptography.hazmat.primitives.asymmetric.x25519 import (
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives import serialization
+from UTILS.link import send_frame, recv_frame
 
 SERIAL_PORT = "/dev/ttyGS0"
 BAUD = 115200
 
 _cached_symmetric_key = None
 _cached_base_time = None
-
-def send_frame(ser, data: bytes):
-	"""Frame = <len:4 bytes><data>"""
-	ser.write(len(data).to_bytes(4, "big") + data)
-
-def recv_frame(ser):
-	"""Read 4-byte length, then payload"""
-	length_bytes = ser.read(4)
-	if len(length_bytes) < 4:
-		raise IOError("Serial broke")
-	length = int.from_bytes(length_bytes, "big")
-	return ser.read(length)
+_cached_serial = None
 
 def main():
+	global _cached_serial
 	print("[PI A] OPENING SERIAL...")
 	ser = serial.Serial(SERIAL_PORT, BAUD, timeout=2)
+	_cached_serial = ser
 	time.sleep(1)
 
 	# gen priv/pubs
@@ -43,7 +35,7 @@ def main():
 	send_frame(ser, public_bytes)
 
 	print("[PI A] WAITING FOR ENDPOINT PUBLIC KEY...")
-	peer_public_bytes = recv_frame(ser)
+	peer_public_bytes = recv_frame(ser, required=True)
 
 	peer_public_key = X25519PublicKey.from_public_bytes(peer_public_bytes)
 
@@ -63,7 +55,7 @@ def main():
 	print(symmetric_key.hex())
 
 	# time sync
-	base_time = int(recv_frame(ser).decode())
+	base_time = int(recv_frame(ser, required=True).decode())
 	print("[PI A] RECEIVED TIME:", base_time)
 
 	subprocess.run(["date", "-s", f"@{base_time}"])
@@ -85,5 +77,17 @@ def get_base_time():
 		_cached_symmetric_key, _cached_base_time = main()
 	return _cached_base_time
 
+def get_serial():
+	"""Serial port left open by the handshake, for the data plane"""
+	if _cached_serial is None:
+		get_symmetric_key()
+	return _cached_serial
+
+def reopen_serial():
+	"""Open the port again after the link dropped; the session key and base time stay"""
+	global _cached_serial
+	_cached_serial = serial.Serial(SERIAL_PORT, BAUD, timeout=2)
+	return _cached_serial
+
 if __name__ == "__main__":
 	main()
@@ -1,5 +1,8 @@
 """HID key mappings - EXACT copy from main_SENDER.py"""
-from hidpi.keyboard_keys import *
+from UTILS import layouts, tables
+
+# hidpi.keyboard_keys constants, from the precompiled table cache
+HID_CODES = tables.load('hid')['hid_codes']
 
 MOD_LSHIFT = 0x02
 MOD_RSHIFT = 0x20
@@ -25,7 +28,7 @@ KEY_MAPPING = {
 
 def get_hid_code(key):
     """Look up the keycode from hidpi constants or our manual mapping"""
-    return globals().get(key) or KEY_MAPPING.get(key)
+    return HID_CODES.get(key) or KEY_MAPPING.get(key)
 
 def calculate_modifier(key, shift, caps_lock, ctrl):
     """EXACT logic from main_SENDER.py"""
@@ -55,7 +58,6 @@ def calculate_modifier(key, shift, caps_lock, ctrl):
     return modifier
 
 """HID key mappings and character conversions"""
-from hidpi.keyboard_keys import *
 
 # ... (keep your existing MOD_* and KEY_MAPPING as-is) ...
 
@@ -63,37 +65,10 @@ from hidpi.keyboard_keys import *
 # CHARACTER MAPPING - for keymap scrambling
 # ============================================================================
 
-# Map evdev keys to their base characters (unshifted)
-EVDEV_TO_CHAR = {
-    # Letters (lowercase only)
-    'KEY_A': 'a', 'KEY_B': 'b', 'KEY_C': 'c', 'KEY_D': 'd',
-    'KEY_E': 'e', 'KEY_F': 'f', 'KEY_G': 'g', 'KEY_H': 'h',
-    'KEY_I': 'i', 'KEY_J': 'j', 'KEY_K': 'k', 'KEY_L': 'l',
-    'KEY_M': 'm', 'KEY_N': 'n', 'KEY_O': 'o', 'KEY_P': 'p',
-    'KEY_Q': 'q', 'KEY_R': 'r', 'KEY_S': 's', 'KEY_T': 't',
-    'KEY_U': 'u', 'KEY_V': 'v', 'KEY_W': 'w', 'KEY_X': 'x',
-    'KEY_Y': 'y', 'KEY_Z': 'z',
-    
-    # Numbers
-    'KEY_0': '0', 'KEY_1': '1', 'KEY_2': '2', 'KEY_3': '3',
-    'KEY_4': '4', 'KEY_5': '5', 'KEY_6': '6', 'KEY_7': '7',
-    'KEY_8': '8', 'KEY_9': '9',
-    
-    # Basic symbols (unshifted)
-    'KEY_SPACE': ' ',
-    'KEY_MINUS': '-',
-    'KEY_EQUAL': '=',
-    'KEY_LEFTBRACE': '[',
-    'KEY_RIGHTBRACE': ']',
-    'KEY_SEMICOLON': ';',
-    'KEY_APOSTROPHE': "'",
-    'KEY_GRAVE': '`',
-    'KEY_BACKSLASH': '\\',
-    'KEY_COMMA': ',',
-    'KEY_DOT': '.',
-    'KEY_SLASH': '/',
-    
-    # Numpad (map to regular numbers/symbols)
+# Map evdev keys to their base characters (unshifted): the scramble's key
+# space from UTILS.layouts, plus the numpad (same on every layout)
+EVDEV_TO_CHAR = dict(layouts.EVDEV_TO_CHAR)
+EVDEV_TO_CHAR.update({
     'KEY_KP0': '0', 'KEY_KP1': '1', 'KEY_KP2': '2',
     'KEY_KP3': '3', 'KEY_KP4': '4', 'KEY_KP5': '5',
     'KEY_KP6': '6', 'KEY_KP7': '7', 'KEY_KP8': '8',
@@ -103,21 +78,13 @@ EVDEV_TO_CHAR = {
     'KEY_KPASTERISK': '*',
     'KEY_KPMINUS': '-',
     'KEY_KPPLUS': '+',
-}
+})
 
 # Shift transformations (when shift is pressed)
-SHIFT_MAP = {
-    # Numbers → Symbols
-    '1': '!', '2': '@', '3': '#', '4': '$', '5': '%',
-    '6': '^', '7': '&', '8': '*', '9': '(', '0': ')',
-    
-    # Symbols → Shifted symbols
-    '-': '_', '=': '+',
-    '[': '{', ']': '}',
-    ';': ':', "'": '"',
-    '`': '~', '\\': '|',
-    ',': '<', '.': '>', '/': '?',
-}
+SHIFT_MAP = layouts.SHIFT_MAP
+
+# Keys caps lock shifts on the keyboard's layout - a-z on US; set by use_layout()
+CAPS_KEYS = frozenset(key for key, char in layouts.EVDEV_TO_CHAR.items() if char.isalpha())
 
 # Reverse mapping: character → evdev key
 CHAR_TO_EVDEV = {}
@@ -182,4 +149,64 @@ def is_mappable_key(key):
     return key in EVDEV_TO_CHAR
 
 
+def use_layout(layout_tables):
+    """Take caps lock behaviour from a UTILS.layouts table; applies from the next scramble table"""
+    global CAPS_KEYS
+    CAPS_KEYS = frozenset(layout_tables['caps'])
+
+
 # ... (keep all your existing functions: get_hid_code, calculate_modifier, etc.) ...
+
+
+def _scramble(keymap, original_char, ctrl):
+    """One scrambled output - the per-key logic of the main loop, run ahead of time"""
+    # CRITICAL: Always use lowercase for keymap lookup
+    scrambled_char = keymap.get(original_char.lower(), original_char.lower())
+    
+    # Preserve case: if input was uppercase, output must be uppercase
+    if original_char.isupper():
+        if not scrambled_char.isalpha():
+            # This shouldn't happen with separated letter/symbol pools
+            return None
+        scrambled_char = scrambled_char.upper()
+    
+    scrambled_evdev, needs_shift = char_to_evdev(scrambled_char)
+    hid_key = get_hid_code(scrambled_evdev) if scrambled_evdev else None
+    if not hid_key:
+        return None
+    
+    modifier = MOD_LSHIFT if needs_shift else 0
+    if ctrl:
+        modifier |= MOD_LCTRL
+    return (hid_key, modifier, original_char, scrambled_char, scrambled_evdev)
+
+
+def build_scramble_table(keymap):
+    """
+    Precompute every scrambled output of one keymap.
+    
+    Built once per rotation so a keystroke is a dict lookup and a tuple index.
+    
+    Returns:
+        {evdev key: (caps, outputs)} where outputs[upper | ctrl << 1] is
+        (hid_key, modifier, original_char, scrambled_char, scrambled_evdev),
+        or None if that character can't be sent. `upper` is shift XOR caps
+        lock for the keys caps lock shifts on the layout (CAPS_KEYS) and
+        shift alone for everything else.
+    """
+    table = {}
+    for key, base_char in EVDEV_TO_CHAR.items():
+        is_letter = base_char.isalpha()
+        outputs = []
+        for ctrl in (False, True):
+            for upper in (False, True):
+                if is_letter:
+                    original_char = base_char.upper() if upper else base_char.lower()
+                elif upper and base_char in SHIFT_MAP:
+                    # Shifted symbol: 1→!, 2→@, etc.
+                    original_char = SHIFT_MAP[base_char]
+                else:
+                    original_char = base_char
+                outputs.append(_scramble(keymap, original_char, ctrl))
+        table[key] = (key in CAPS_KEYS, tuple(outputs))
+    return table
@@ -1,10 +1,203 @@
 """Send keys via HID"""
-from hidpi import Keyboard
-
-def send_key(modifier, hid_key, key_name):
-    """Send a key with modifiers"""
-    try:
-        print(f"DEBUG: key={key_name}, modifier=0x{modifier:02x}, hid_key=0x{hid_key:02x}")
-        Keyboard.send_key(modifier, hid_key)
-    except Exception as e:
-        print(f"Error sending key {key_name}: {e}")
+import os
+import queue
+import threading
+from UTILS import metrics
+
+HID_DEVICE = "/dev/hidg0"  # Boot keyboard function of the HIDPi gadget
+MAX_KEYS = 6  # Boot protocol report slots
+BURST_QUEUE_SIZE = 256  # Pending key operations before press()/release() block
+
+# Zero fill for the unused key slots, indexed by held key count
+_PADDING = tuple(bytes(MAX_KEYS - count) for count in range(MAX_KEYS + 1))
+
+def build_report(modifier, keys):
+    """Report = <modifier:1><reserved:1><key:1 x 6>"""
+    return bytes([modifier, 0] + list(keys) + [0] * (MAX_KEYS - len(keys)))
+
+
+class HIDReportWriter:
+    """
+    Write boot-keyboard reports that mirror real key state.
+
+    Keys stay in the report from press until release, so the host sees
+    real holds and runs its own typematic repeat instead of us sending one
+    tap per autorepeat.
+    """
+
+    def __init__(self, path=HID_DEVICE):
+        self.fd = os.open(path, os.O_WRONLY)
+        # Held keys in press order. They share one modifier byte: a press with
+        # another one lets the others go, or the host would repeat them with it
+        self.keys = []
+        self.modifier = 0
+        self._buffer = bytearray(2 + MAX_KEYS)  # Report assembled in place
+
+    def _report(self):
+        buffer = self._buffer
+        buffer[0] = self.modifier
+        count = len(self.keys)
+        buffer[2:2 + count] = self.keys
+        buffer[2 + count:] = _PADDING[count]
+        return bytes(buffer)
+
+    def write_report(self, report):
+        """Write one raw report - blocks until the host has polled the last one"""
+        os.write(self.fd, report)
+
+    def _send(self, key_name):
+        try:
+            self.write_report(self._report())
+        except OSError as e:
+            metrics.WRITE_ERRORS.inc()
+            print(f"Error sending key {key_name}: {e}")
+
+    def _drop(self, hid_key):
+        if hid_key in self.keys:
+            self.keys.remove(hid_key)
+            if not self.keys:
+                self.modifier = 0
+
+    def press(self, modifier, hid_key, key_name):
+        """Add a key to the report and send it"""
+        if modifier != self.modifier:
+            # Held keys were pressed with the old modifier byte - release them
+            self.keys.clear()
+        self._drop(hid_key)
+        if len(self.keys) == MAX_KEYS:
+            # Out of slots - drop the oldest held key
+            del self.keys[0]
+        self.keys.append(hid_key)
+        self.modifier = modifier
+        self._send(key_name)
+
+    def release(self, hid_key, key_name):
+        """Remove a key from the report and send it"""
+        self._drop(hid_key)
+        self._send(key_name)
+
+    def tap(self, modifier, hid_key, key_name):
+        """Press and immediately release"""
+        self.press(modifier, hid_key, key_name)
+        self.release(hid_key, key_name)
+
+    def release_all(self):
+        self.keys.clear()
+        self.modifier = 0
+        self._send("ALL")
+
+    def close(self):
+        os.close(self.fd)
+
+
+_PRESS, _RELEASE, _RELEASE_ALL, _STOP = range(4)
+
+
+class BurstHIDWriter:
+    """
+    Queue key operations and pack bursts into 6-key-rollover reports.
+
+    Drop-in for HIDReportWriter. A writer thread drains the queue while the
+    previous report waits for the host to poll it, then packs whatever piled
+    up: up to six distinct keys sharing one modifier byte go into a single
+    report, followed by one report releasing the ones already let go. Keys
+    newly pressed in the same report reach the host in array order, so typing
+    order is preserved. A repeated key, a modifier change or a full report
+    forces the pending report out first; on a modifier change the keys still
+    held are released with it, as HIDReportWriter does. When the queue is full, press() and
+    release() block, which pushes back on the reader.
+    """
+
+    def __init__(self, writer=None, queue_size=BURST_QUEUE_SIZE):
+        self.writer = writer or HIDReportWriter()
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.reports_sent = 0
+        self.keys_sent = 0
+
+        self._down = []  # Keys in the outgoing report, press order
+        self._released = set()  # Released since the last flush, still to be shown pressed
+        self._modifier = 0
+        self._unsent = 0  # Presses added since the last flush
+        self._last_report = build_report(0, [])
+
+        self._thread = threading.Thread(target=self._run, name="hid-burst", daemon=True)
+        self._thread.start()
+
+    def press(self, modifier, hid_key, key_name):
+        self.queue.put((_PRESS, hid_key, modifier))
+
+    def release(self, hid_key, key_name):
+        self.queue.put((_RELEASE, hid_key, 0))
+
+    def tap(self, modifier, hid_key, key_name):
+        self.press(modifier, hid_key, key_name)
+        self.release(hid_key, key_name)
+
+    def release_all(self):
+        self.queue.put((_RELEASE_ALL, 0, 0))
+
+    def close(self):
+        self.queue.put((_STOP, 0, 0))
+        self._thread.join()
+        self.writer.close()
+
+    def _run(self):
+        while True:
+            op = self.queue.get()
+            # Take everything that piled up while the last report was in flight
+            while True:
+                if op[0] == _STOP:
+                    self._flush()
+                    return
+                self._apply(*op)
+                try:
+                    op = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            self._flush()
+
+    def _apply(self, action, hid_key, modifier):
+        if action == _PRESS:
+            if self._down and modifier != self._modifier:
+                # They would take on the new modifier byte
+                self._released.update(self._down)
+                self._flush()
+            conflict = hid_key in self._down or len(self._down) == MAX_KEYS
+            if conflict:
+                self._flush()
+            if hid_key in self._down or len(self._down) == MAX_KEYS:
+                # Still physically held after the flush - drop the oldest
+                self._down.remove(hid_key if hid_key in self._down else self._down[0])
+            self._down.append(hid_key)
+            self._modifier = modifier
+            self._unsent += 1
+
+        elif action == _RELEASE:
+            if hid_key in self._down:
+                self._released.add(hid_key)
+
+        elif action == _RELEASE_ALL:
+            self._released.update(self._down)
+
+    def _flush(self):
+        """Send the packed presses, then release what was let go meanwhile"""
+        self._write(build_report(self._modifier, self._down))
+        if self._released:
+            self._down = [k for k in self._down if k not in self._released]
+            self._released.clear()
+            if not self._down:
+                self._modifier = 0
+            self._write(build_report(self._modifier, self._down))
+        self.keys_sent += self._unsent
+        self._unsent = 0
+
+    def _write(self, report):
+        if report == self._last_report:
+            return
+        try:
+            self.writer.write_report(report)
+            self.reports_sent += 1
+        except OSError as e:
+            metrics.WRITE_ERRORS.inc()
+            print(f"Error sending report {report.hex()}: {e}")
+        self._last_report = report
@@ -1,65 +1,271 @@
-
-"""Read keyboard events from evdev with proper modifier tracking"""
-from evdev import InputDevice, ecodes, categorize
+"""Read keyboard events from every attached keyboard with per-device modifier tracking"""
+import queue
+import select
+import threading
+import time
+from evdev import InputDevice, ecodes
 from UTILS import get_device_info
+from UTILS.events import KeyRecord, KEY_NAMES, KEY_DOWN, KEY_UP, KEY_HOLD, use_monotonic_clock
+from UTILS.trace import TraceEvent
 
-class KeyboardReader:
-    def __init__(self):
-        keyboard_name = get_device_info.get_keyboard()
-        if not keyboard_name:
-            raise RuntimeError("ERROR: Keyboard not found")
-        
-        self.dev = InputDevice('/dev/input/by-id/' + keyboard_name)
-        print(f"Listening on {self.dev.path} ({self.dev.name}) ... Press Ctrl+C to quit.")
-        
+BY_ID = '/dev/input/by-id/'
+RESCAN_INTERVAL = 2.0  # Seconds between looks for newly plugged keyboards
+QUEUE_SIZE = 1024
+VERBOSE = False  # Log every modifier change
+
+
+class KeyboardDevice:
+    """One attached keyboard and its own shift/ctrl/caps state"""
+
+    def __init__(self, path, dev=None):
+        """
+        Args:
+            dev: already open device (a TraceDevice when replaying); default opens `path`
+        """
+        self.path = path
+        if dev is None:
+            dev = InputDevice(path)
+            if not use_monotonic_clock(dev.fd):
+                print(f"[SENDER] {dev.name}: kernel keeps wall-clock event times")
+        self.dev = dev
+        self.fd = dev.fd  # Kept: closing an InputDevice resets dev.fd
+        self.name = dev.name
         self.caps_lock = False
         self.shift_left = False
         self.shift_right = False
         self.ctrl_left = False
         self.ctrl_right = False
-    
-    def read_events(self):
-        """Generator yielding (key_event, caps_lock, shift, ctrl)"""
-        for event in self.dev.read_loop():
-            if event.type == ecodes.EV_KEY:
-                key_event = categorize(event)
-                key = key_event.keycode
-                state = key_event.keystate
-                
-                # Track left shift
-                if key == 'KEY_LEFTSHIFT':
-                    self.shift_left = (state == key_event.key_down or state == key_event.key_hold)
-                    print(f"[MOD] Left Shift: {self.shift_left}")
-                    continue
-                
-                # Track right shift
-                elif key == 'KEY_RIGHTSHIFT':
-                    self.shift_right = (state == key_event.key_down or state == key_event.key_hold)
-                    print(f"[MOD] Right Shift: {self.shift_right}")
-                    continue
-                
-                # Track left ctrl
-                elif key == 'KEY_LEFTCTRL':
-                    self.ctrl_left = (state == key_event.key_down or state == key_event.key_hold)
-                    print(f"[MOD] Left Ctrl: {self.ctrl_left}")
+        self.down = set()  # Keycodes pressed and not yet released, as read
+        self.events = 0
+        self.attached_at = time.monotonic()
+
+    @property
+    def shift(self):
+        return self.shift_left or self.shift_right
+
+    @property
+    def ctrl(self):
+        return self.ctrl_left or self.ctrl_right
+
+    def track_modifier(self, key, state):
+        """Update modifier state; True if the event was a modifier and is consumed"""
+        held = (state == KEY_DOWN or state == KEY_HOLD)
+
+        # Track left shift
+        if key == 'KEY_LEFTSHIFT':
+            self.shift_left = held
+
+        # Track right shift
+        elif key == 'KEY_RIGHTSHIFT':
+            self.shift_right = held
+
+        # Track left ctrl
+        elif key == 'KEY_LEFTCTRL':
+            self.ctrl_left = held
+
+        # Track right ctrl
+        elif key == 'KEY_RIGHTCTRL':
+            self.ctrl_right = held
+
+        # Handle caps lock toggle
+        elif key == 'KEY_CAPSLOCK':
+            if state == KEY_DOWN:
+                self.caps_lock = not self.caps_lock
+
+        else:
+            return False
+
+        if VERBOSE:
+            print(f"[MOD] {self.name}: {key}={held}, caps={self.caps_lock}")
+        return True
+
+    def note(self, events):
+        """Track which keys are down, so they can be released if the keyboard goes away"""
+        down = self.down
+        for event in events:
+            if event.value == KEY_UP:
+                down.discard(event.code)
+            else:
+                down.add(event.code)
+
+    def releases(self):
+        """A KEY_UP for every key still down, as evdev would have sent had it stayed"""
+        now = time.monotonic()
+        return [TraceEvent(ecodes.EV_KEY, code, KEY_UP, now) for code in self.down]
+
+    def rate(self):
+        """Key events per second since this device was attached"""
+        elapsed = time.monotonic() - self.attached_at
+        return self.events / elapsed if elapsed > 0 else 0.0
+
+
+def key_records(batches, record=None):
+    """
+    Generator yielding a KeyRecord per press and release in (KeyboardDevice,
+    events) batches - read live, or replayed from a UTILS.trace recording
+
+    The same record is refilled for every event - copy fields out of it,
+    never keep it.
+    """
+    if record is None:
+        record = KeyRecord()
+    for device, events in batches:
+        for event in events:
+            key = KEY_NAMES.get(event.code)
+            state = event.value
+            if device.track_modifier(key, state):
+                continue
+
+            # Yield presses and releases; autorepeat is left to the host
+            if state == KEY_HOLD:
+                continue
+            record.key = key
+            record.code = event.code
+            record.state = state
+            record.shift = device.shift
+            record.ctrl = device.ctrl
+            record.caps_lock = device.caps_lock
+            record.device = device.name
+            record.fd = device.fd
+            record.time = event.timestamp()
+            yield record
+
+
+class KeyboardReader:
+    def __init__(self, recorder=None):
+        """
+        Args:
+            recorder: UTILS.trace.TraceWriter that gets every key event read
+        """
+        self.devices = {}  # fd -> KeyboardDevice
+        self.recorder = recorder
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.epoll = select.epoll()
+        self.record = KeyRecord()  # Refilled for every event read_events() yields
+        self._lock = threading.Lock()
+
+        # Queue latency: time from read on the device to pickup by the scrambler
+        self.queued = 0
+        self.queue_latency_total = 0.0
+        self.queue_latency_max = 0.0
+
+        self.rescan()
+        if not self.devices:
+            raise RuntimeError("ERROR: Keyboard not found")
+
+        self._thread = threading.Thread(target=self._poll, name="keyboard-epoll", daemon=True)
+        self._thread.start()
+        # Listing keyboards forks ls: on its own thread, so capture never waits on it
+        threading.Thread(target=self._watch, name="keyboard-rescan", daemon=True).start()
+
+    def attach(self, path):
+        """Start reading a keyboard; safe to call while running"""
+        with self._lock:
+            if any(device.path == path for device in self.devices.values()):
+                return None
+            try:
+                device = KeyboardDevice(path)
+            except OSError as e:
+                print(f"[SENDER] ✗ Failed to open {path}: {e}")
+                return None
+            self.devices[device.dev.fd] = device
+            self.epoll.register(device.dev.fd, select.EPOLLIN)
+            if self.recorder:
+                self.recorder.add_device(device.dev.fd, device.name)
+        print(f"Listening on {device.path} ({device.name}) ... Press Ctrl+C to quit.")
+        return device
+
+    def detach(self, fd):
+        """Stop reading a keyboard (unplugged or failed), releasing the keys it held"""
+        with self._lock:
+            device = self.devices.pop(fd, None)
+            if device is None:
+                return
+            try:
+                self.epoll.unregister(fd)
+            except (OSError, ValueError):
+                pass
+        try:
+            device.dev.close()
+        except OSError:
+            pass
+        print(f"[SENDER] Keyboard detached: {device.name}")
+        releases = device.releases()
+        if releases:
+            # After everything it sent, or they would stay down on the host
+            self.queue.put((time.perf_counter(), device, releases))
+
+    def rescan(self):
+        """Attach any keyboard that appeared since the last scan"""
+        for name in get_device_info.get_keyboards():
+            self.attach(BY_ID + name)
+
+    def _watch(self):
+        """Pick up newly plugged keyboards"""
+        while True:
+            time.sleep(RESCAN_INTERVAL)
+            self.rescan()
+
+    def _poll(self):
+        """epoll loop over every device, feeding one ordered queue"""
+        while True:
+            for fd, _ in self.epoll.poll():
+                device = self.devices.get(fd)
+                if device is None:
                     continue
-                
-                # Track right ctrl
-                elif key == 'KEY_RIGHTCTRL':
-                    self.ctrl_right = (state == key_event.key_down or state == key_event.key_hold)
-                    print(f"[MOD] Right Ctrl: {self.ctrl_right}")
+                try:
+                    events = [event for event in device.dev.read() if event.type == ecodes.EV_KEY]
+                except BlockingIOError:
+                    # Woken with nothing to read
                     continue
-                
-                # Handle caps lock toggle
-                elif key == 'KEY_CAPSLOCK' and state == key_event.key_down:
-                    self.caps_lock = not self.caps_lock
-                    print(f"[MOD] Caps Lock: {self.caps_lock}")
+                except OSError:
+                    # Unplugged
+                    self.detach(fd)
                     continue
-                
-                # For all other keys, yield with current modifier state
-                shift = self.shift_left or self.shift_right
-                ctrl = self.ctrl_left or self.ctrl_right
-                
-                # Only yield key down and hold events (not release)
-                if state == key_event.key_down or state == key_event.key_hold:
-                    yield key_event, self.caps_lock, shift, ctrl
+                if events:
+                    if self.recorder:
+                        self.recorder.write(fd, events)
+                    device.events += len(events)
+                    device.note(events)
+                    # Blocks when the scrambler falls behind - backpressure, not loss
+                    self.queue.put((time.perf_counter(), device, events))
+
+    def _next(self):
+        enqueued_at, device, events = self.queue.get()
+        latency = time.perf_counter() - enqueued_at
+        self.queued += 1
+        self.queue_latency_total += latency
+        if latency > self.queue_latency_max:
+            self.queue_latency_max = latency
+        return device, events
+
+    def read_events(self):
+        """
+        Generator yielding a KeyRecord per press and release from all keyboards
+
+        The same record is refilled for every event - copy fields out of it,
+        never keep it.
+        """
+        return key_records(iter(self._next, None), self.record)
+
+    def read_batches(self):
+        """Generator yielding every pending key event as a list of (keycode, value)"""
+        while True:
+            _, events = self._next()
+            yield [(event.code, event.value) for event in events]
+
+    def stats(self):
+        """Per-device event rates and queue latency"""
+        return {
+            'devices': {
+                device.name: {
+                    'path': device.path,
+                    'events': device.events,
+                    'events_per_sec': device.rate(),
+                }
+                for device in list(self.devices.values())
+            },
+            'queue_depth': self.queue.qsize(),
+            'queue_latency_avg_ms': (self.queue_latency_total / self.queued * 1000) if self.queued else 0.0,
+            'queue_latency_max_ms': self.queue_latency_max * 1000,
+        }
@@ -1,154 +1,336 @@
 
 """Main keyboard forwarding loop with keymap scrambling"""
+import sys
 import time
-from SENDER.keyboard_reader import KeyboardReader
-from SENDER.key_mapper import (
-    get_hid_code, calculate_modifier, 
-    evdev_to_char, char_to_evdev, is_mappable_key,
-    SHIFT_MAP, MOD_LSHIFT, MOD_LCTRL, EVDEV_TO_CHAR
-)
-from SENDER.key_sender import send_key
-from SENDER.dhe_time import get_symmetric_key, get_base_time
-from SENDER.seedgen import generate_seed
+from UTILS import layouts, metrics, spans, startup
+from SENDER.key_mapper import get_hid_code, calculate_modifier, build_scramble_table, use_layout
+from SENDER.key_sender import HIDReportWriter, BurstHIDWriter
 from UTILS.keymap import seed_to_keymap
+from UTILS.epoch import marker_hid, marker_key
+from UTILS.link import MSG_DATA
+from UTILS.control_channel import ControlChannel
+from UTILS.events import KEY_UP
+from UTILS.pipeline import Hooks, RELEASE, PASS_THROUGH, MAPPED
+# evdev, cryptography and pyserial are imported inside main() so the
+# scrambler can be loaded (simulator, benchmarks) without them and so
+# evdev can load while the key exchange waits on the ENDPOINT
 
 INTERVAL = 10
 TIME_OFFSET = -0.4  # Negative so SENDER is ahead
 BUFFER_WINDOW = .4  # Don't send if within 0.5s of rotation
 POST_ROTATION_GUARD = .4
+# Announce each new epoch in-band so the ENDPOINT picks the right map.
+# With markers on, rotations never stall typing; BUFFER_WINDOW and
+# POST_ROTATION_GUARD only apply when they are off.
+USE_EPOCH_MARKERS = True
+# "hid"    - scrambled keystrokes over the HID gadget (default)
+# "serial" - raw key events in AEAD-sealed frames over the CDC serial link
+TRANSPORT = "hid"
+# Periodically replace the session key over the serial link (see UTILS.rekey)
+USE_REKEY = True
+# Pack queued keystrokes into 6-key-rollover reports (scanners, password
+# managers, fast typists). Off = one report per key change. Leave the
+# ENDPOINT's CADENCE_CHECK at "flag": "block" drops these bursts.
+BURST_MODE = False
+# SCHED_FIFO, CPU pinning, mlockall and idle-only GC (see UTILS.realtime).
+# Also enabled by running with --low-latency.
+LOW_LATENCY = False
+# Log every keystroke. Off keeps the hot loop free of string formatting.
+VERBOSE = False
+# Record every key event read to this file (see UTILS.trace) for replay
+# with tests/research/replay.py. Also set by running with --trace FILE.
+TRACE_FILE = None
+# "threads" - blocking key loop; control channel and rekeys on their own threads
+# "asyncio" - every stage a task of one event loop (see SENDER.async_runtime).
+#             Also set by running with --asyncio.
+RUNTIME = "threads"
+# X11 layout of the keyboard, e.g. "de" or "us(dvorak)" (see UTILS.layouts);
+# None reads it with localectl. The host's layout wins if they differ.
+KEYBOARD_LAYOUT = None
+# Counters and latency histograms in Prometheus text format (see UTILS.metrics):
+# a unix socket path or "127.0.0.1:PORT"; None only prints them on SIGUSR1
+METRICS_ADDRESS = "/run/omg-mitigation/sender.sock"
 
-def get_current_counter(base_time):
+def get_current_counter(base_time, now=None):
     """Calculate counter - adjusted for serial transmission delay"""
-    now = time.time()
+    if now is None:
+        now = time.time()
     counter = int((now - (base_time + TIME_OFFSET)) / INTERVAL)
     return counter
 
-def get_time_until_rotation(base_time):
+def get_time_until_rotation(base_time, now=None):
     """Calculate how many seconds until next counter rotation"""
-    now = time.time()
+    if now is None:
+        now = time.time()
     adjusted_time = now - (base_time + TIME_OFFSET)
     seconds_into_interval = adjusted_time % INTERVAL
     time_until_rotation = INTERVAL - seconds_into_interval
     return time_until_rotation
 
-def main():
+def print_reader_stats(reader):
+    """Per-keyboard event rates and input queue latency"""
+    stats = reader.stats()
+    for name, device in stats['devices'].items():
+        print(f"[STATS] {name}: {device['events']} events, {device['events_per_sec']:.2f}/s")
+    print(f"[STATS] Queue latency: avg {stats['queue_latency_avg_ms']:.3f} ms, "
+          f"max {stats['queue_latency_max_ms']:.3f} ms")
+
+def run_serial_transport(sym_key, reader, channel):
+    """Forward every key event, batched per read, as sealed serial frames"""
+    from UTILS.secure_link import FrameSealer
+    
+    sealer = FrameSealer(sym_key)
+    print("[SENDER] Forwarding key events as AEAD frames over serial...")
+    print("[SENDER] Press Ctrl+C to stop.\n")
+    
+    for batch in reader.read_batches():
+        # Queued while the link is down and flushed when it is back
+        channel.send(MSG_DATA, sealer.seal(batch), queue=True)
+
+class Scrambler:
+    """Scramble key records into HID reports with the keymap of the current epoch"""
+    
+    def __init__(self, schedule, base_time, hid, clock=time.time, sleep=time.sleep, observers=()):
+        """
+        Args:
+            schedule: KeySchedule giving the key in force for each epoch
+            base_time: agreed base time from the key exchange
+            hid: HIDReportWriter or BurstHIDWriter
+            clock, sleep: wall clock and sleep, replaced by the simulator
+            observers: hooked onto the classify, map and emit stages (see UTILS.pipeline)
+        """
+        self.schedule = schedule
+        self.base_time = base_time
+        self.hid = hid
+        self.clock = clock
+        self.sleep = sleep
+        self.held = {}  # (keyboard fd, physical key) -> HID code it pressed, pinned to that epoch's keymap
+        self.table = None  # build_scramble_table() of the current keymap
+        self.last_counter = None
+        self.last_marked_counter = None
+        self._prepared = None  # (counter, deriver, seed, keymap, table) from prepare()
+        Hooks(*observers).bind(self)
+    
+    def prepare(self, counter):
+        """Build the keymap of `counter` ahead of time, so rotate() only swaps it in"""
+        with spans.span("prepare keymap", "rotation", counter=counter):
+            deriver = self.schedule.deriver_for(counter)
+            seed = deriver.seed(counter)
+            keymap = seed_to_keymap(seed)
+            self._prepared = (counter, deriver, seed, keymap, build_scramble_table(keymap))
+    
+    def rotate(self, counter):
+        """Switch to the keymap of `counter`"""
+        with spans.span("rotate", "rotation", counter=counter):
+            prepared = self._prepared
+            # Rebuilt if a rekey replaced the key since prepare()
+            if prepared is None or prepared[0] != counter or prepared[1] is not self.schedule.deriver_for(counter):
+                self.prepare(counter)
+            _, _, seed, keymap, self.table = self._prepared
+            self.last_counter = counter
+        metrics.ROTATIONS.inc()
+        now = self.clock()
+        print(f"\n[KEYMAP ROTATED] Counter={counter}, Seed={seed.hex()[:12]}...")
+        print(f"  Time: {now:.2f}, Base: {self.base_time}, Adjusted: {now - (self.base_time + TIME_OFFSET):.2f}s")
+        print(f"  Sample: a→{keymap.get('a', '?')}, !→{keymap.get('!', '?')}\n")
+    
+    def handle(self, record):
+        """Forward one key record - a dict lookup and a report in steady state"""
+        kind = self.classify(record)
+        if kind is not None:
+            output = self.map(record, kind)
+            if output is not None:
+                self.emit(record, kind, output)
+    
+    def classify(self, record):
+        """RELEASE, PASS_THROUGH or MAPPED; rotates the keymap when the epoch changed"""
+        if record.state == KEY_UP:
+            return RELEASE
+        
+        if not USE_EPOCH_MARKERS:
+            # Check if we're too close to a rotation
+            time_until_rotation = get_time_until_rotation(self.base_time, self.clock())
+            
+            if time_until_rotation < BUFFER_WINDOW:
+                # Too close to rotation - wait for new counter
+                print(f"[BUFFER] {time_until_rotation:.2f}s until rotation - waiting...")
+                metrics.GUARD_STALLS.observe(time_until_rotation + POST_ROTATION_GUARD)
+                self.sleep(time_until_rotation + POST_ROTATION_GUARD)  # Wait plus small margin
+                print("[BUFFER] Rotation complete, resuming...")
+        
+        # Update keymap if interval changed
+        counter = get_current_counter(self.base_time, self.clock())
+        if counter != self.last_counter:
+            self.rotate(counter)
+        return MAPPED if record.key in self.table else PASS_THROUGH
+    
+    def map(self, record, kind):
+        """
+        What to send for the record: for a release the HID code its press
+        pinned, otherwise (hid_key, modifier, original_char, scrambled_char,
+        scrambled_evdev), the chars None when passed through.
+        """
+        key = record.key
+        if kind == RELEASE:
+            # Release exactly what this key pressed, even across a rotation
+            return self.held.pop((record.fd, key), None)
+        
+        if kind == PASS_THROUGH:
+            # Special keys (Enter, Tab, Backspace, etc.) - send as-is
+            hid_key = get_hid_code(key)
+            if not hid_key:
+                return None
+            return hid_key, calculate_modifier(key, record.shift, record.caps_lock, record.ctrl), None, None, key
+        
+        # Keys caps lock shifts on the layout: caps XOR shift; everything else: shift
+        caps, outputs = self.table[key]
+        upper = (record.shift ^ record.caps_lock) if caps else record.shift
+        output = outputs[upper | record.ctrl << 1]
+        if output is None:
+            print(f"[ERROR] No scrambled output for {key} (shift={record.shift}, caps={record.caps_lock})")
+        return output
+    
+    def emit(self, record, kind, output):
+        """Write the report(s) for map()'s output"""
+        key = record.key
+        hid = self.hid
+        if kind == RELEASE:
+            # Another keyboard may still hold the same HID code
+            if output not in self.held.values():
+                hid.release(output, key)
+            return output
+        
+        hid_key, modifier, original_char, scrambled_char, scrambled_evdev = output
+        if kind == PASS_THROUGH:
+            if VERBOSE:
+                print(f"[PASS-THROUGH] {key}")
+        elif USE_EPOCH_MARKERS and self.last_counter != self.last_marked_counter:
+            # First scrambled key of a new epoch: announce it in-band
+            counter = self.last_counter
+            hid.tap(0, marker_hid(counter), marker_key(counter))
+            self.last_marked_counter = counter
+            print(f"[EPOCH] Marker {marker_key(counter)} for counter {counter}")
+        
+        # Press the key; it stays down until the physical key is released
+        hid.press(modifier, hid_key, scrambled_evdev)
+        self.held[record.fd, key] = hid_key
+        if VERBOSE and kind == MAPPED:
+            print(f"[SCRAMBLE] '{original_char}' → '{scrambled_char}' "
+                  f"(evdev={scrambled_evdev}, HID=0x{hid_key:02x}, mod=0x{modifier:02x})")
+        return output
+
+def main(low_latency=LOW_LATENCY, trace=TRACE_FILE, runtime=RUNTIME, observers=()):
+    """
+    Args:
+        observers: hooked onto the key pipeline's stages (see UTILS.pipeline),
+            e.g. the timing of tests/research/shared_timer.py
+    """
+    startup.mark("imports")
+    startup.preload("SENDER.keyboard_reader", "UTILS.rekey")
+    from SENDER.dhe_time import get_symmetric_key, get_base_time, get_serial, reopen_serial
+    layout = layouts.load(KEYBOARD_LAYOUT)
+    
     # Initialize encryption
     print("[SENDER] Initializing secure connection...")
     sym_key = get_symmetric_key()
     base_time = get_base_time()
+    startup.mark("key exchange")
+    
+    # Caps lock must shift the keys it shifts on the host, whose layout types the decoded keys
+    peer = layouts.confirm(get_serial(), layout, "SENDER", first=True)
+    if peer and peer[1] != layout['fingerprint']:
+        layout = layouts.load(peer[0])
+        print(f"[SENDER] Using the host's keyboard layout: {layout['layout']}")
+    use_layout(layout)
     
     print(f"[SENDER] Symmetric key: {sym_key.hex()[:16]}...")
     print(f"[SENDER] Base time: {base_time}")
     print(f"[SENDER] Current time: {time.time():.2f}")
     print(f"[SENDER] Time offset: {TIME_OFFSET}s")
-    print(f"[SENDER] Buffer window: {BUFFER_WINDOW}s")
+    if USE_EPOCH_MARKERS:
+        print("[SENDER] Epoch markers: on (no rotation stalls)")
+    else:
+        print(f"[SENDER] Buffer window: {BUFFER_WINDOW}s")
     print(f"[SENDER] Initial counter: {get_current_counter(base_time)}")
     
-    reader = KeyboardReader()
-    current_keymap = None
-    last_counter = None
+    # Before any thread starts, so they all inherit the policy
+    idle_gc = None
+    if low_latency:
+        from UTILS.realtime import enable_low_latency, IdleCollector
+        enable_low_latency("SENDER")
+        idle_gc = IdleCollector().start()
+    observers = (metrics.enable("SENDER", METRICS_ADDRESS), *observers)
+    
+    from SENDER.keyboard_reader import KeyboardReader
+    from UTILS.rekey import KeySchedule, SenderRekeyer
+    from UTILS.resync import DriftClock, SenderResync
+    from UTILS.heartbeat import SenderHeartbeat
+    recorder = None
+    if trace:
+        from UTILS.trace import TraceWriter
+        recorder = TraceWriter(trace)
+        print(f"[SENDER] Recording key events to {trace}")
+    
+    if runtime == "asyncio":
+        from SENDER.async_runtime import AsyncSender
+        try:
+            AsyncSender(sym_key, base_time, get_serial(), reopen_serial, recorder, idle_gc, observers).run()
+        finally:
+            if recorder:
+                recorder.close()
+        return
+    
+    reader = KeyboardReader(recorder)
+    # Reopened with backoff if the link drops; the HID path never waits on it
+    channel = ControlChannel(get_serial(), "SENDER", reopen=reopen_serial)
+    SenderHeartbeat(channel).start()
+    startup.mark("reader ready")
+    
+    if TRANSPORT == "serial":
+        try:
+            run_serial_transport(sym_key, reader, channel)
+        except KeyboardInterrupt:
+            print("\n[SENDER] Stopped by user.")
+        return
+    
+    # Key in force per epoch; rekeys land here from the control channel
+    schedule = KeySchedule(sym_key)
+    # Wall clock corrected for drift measured by each resync
+    clock = DriftClock()
+    counter_fn = lambda: get_current_counter(base_time, clock.now())
+    rekeyer = None
+    if USE_REKEY:
+        rekeyer = SenderRekeyer(channel, schedule, counter_fn, epoch_length=INTERVAL)
+        rekeyer.start()
+    resync = SenderResync(channel, schedule, counter_fn, clock, rekeyer)
+    channel.start()
+    resync.request()  # Clock offset baseline that later resyncs keep
+    
+    hid = BurstHIDWriter() if BURST_MODE else HIDReportWriter()
+    scrambler = Scrambler(schedule, base_time, hid, clock=clock.now, observers=observers)
     
     print("[SENDER] Starting keyboard with rotating scrambler...")
     print("[SENDER] Press Ctrl+C to stop.\n")
     
     try:
-        for key_event, caps_lock, shift, ctrl in reader.read_events():
-            # Check if we're too close to a rotation
-            time_until_rotation = get_time_until_rotation(base_time)
-            
-            if time_until_rotation < BUFFER_WINDOW:
-                # Too close to rotation - wait for new counter
-                print(f"[BUFFER] {time_until_rotation:.2f}s until rotation - waiting...")
-                time.sleep(time_until_rotation + POST_ROTATION_GUARD)  # Wait plus small margin
-                print("[BUFFER] Rotation complete, resuming...")
-            
-            # Update keymap if interval changed
-            counter = get_current_counter(base_time)
-            
-            if counter != last_counter:
-                last_counter = counter
-                seed = generate_seed(sym_key, counter)
-                current_keymap = seed_to_keymap(seed)
-                now = time.time()
-                print(f"\n[KEYMAP ROTATED] Counter={counter}, Seed={seed.hex()[:12]}...")
-                print(f"  Time: {now:.2f}, Base: {base_time}, Adjusted: {now - (base_time + TIME_OFFSET):.2f}s")
-                print(f"  Sample: a→{current_keymap.get('a', '?')}, !→{current_keymap.get('!', '?')}\n")
-            
-            key = key_event.keycode
-            state = key_event.keystate
-            
-            if state == key_event.key_down or state == key_event.key_hold:
-                # Check if this key can be scrambled
-                if not is_mappable_key(key):
-                    # Special keys (Enter, Tab, Backspace, etc.) - send as-is
-                    print(f"[PASS-THROUGH] {key}")
-                    hid_key = get_hid_code(key)
-                    if hid_key:
-                        modifier = calculate_modifier(key, shift, caps_lock, ctrl)
-                        send_key(modifier, hid_key, key)
-                    continue
-                
-                # Figure out what character the user is typing
-                base_char = EVDEV_TO_CHAR.get(key)
-                if not base_char:
-                    continue
-                
-                # Determine the actual character being typed
-                if base_char.isalpha():
-                    # Letter: use caps XOR shift for uppercase
-                    if shift ^ caps_lock:
-                        original_char = base_char.upper()
-                    else:
-                        original_char = base_char.lower()
-                elif shift and base_char in SHIFT_MAP:
-                    # Shifted symbol: 1→!, 2→@, etc.
-                    original_char = SHIFT_MAP[base_char]
-                else:
-                    # Unshifted symbol or number
-                    original_char = base_char
-                
-                print(f"[INPUT] '{original_char}' (key={key}, base='{base_char}', shift={shift}, caps={caps_lock})")
-                
-                # Scramble the character
-                # CRITICAL: Always use lowercase for keymap lookup
-                scrambled_char = current_keymap.get(original_char.lower(), original_char.lower())
-                
-                # Preserve case: if input was uppercase, output must be uppercase
-                if original_char.isupper():
-                    if scrambled_char.isalpha():
-                        scrambled_char = scrambled_char.upper()
-                    else:
-                        # This shouldn't happen with separated letter/symbol pools
-                        print(f"[ERROR] Uppercase letter '{original_char}' mapped to non-letter '{scrambled_char}'!")
-                        continue
-                
-                print(f"[SCRAMBLE] '{original_char}' → '{scrambled_char}'")
-                
-                # Convert scrambled character back to key + shift state
-                scrambled_evdev, needs_shift = char_to_evdev(scrambled_char)
-                if not scrambled_evdev:
-                    print(f"[ERROR] Can't map '{scrambled_char}' to evdev key\n")
-                    continue
-                
-                # Get HID code
-                hid_key = get_hid_code(scrambled_evdev)
-                if not hid_key:
-                    print(f"[ERROR] No HID code for {scrambled_evdev}\n")
-                    continue
-                
-                # Build modifier byte
-                modifier = 0
-                if needs_shift:
-                    modifier |= MOD_LSHIFT
-                if ctrl:
-                    modifier |= MOD_LCTRL
-                
-                # Send scrambled key
-                send_key(modifier, hid_key, scrambled_evdev)
-                print(f"[SENT] '{scrambled_char}' (evdev={scrambled_evdev}, HID=0x{hid_key:02x}, mod=0x{modifier:02x})\n")
+        events = Hooks(*observers).events(reader.read_events())
+        scrambler.handle(next(events))
+        startup.first_keystroke("SENDER")
+        for record in events:
+            if idle_gc:
+                idle_gc.touch()
+            scrambler.handle(record)
     
     except KeyboardInterrupt:
         print("\n[SENDER] Stopped by user.")
+        print_reader_stats(reader)
+    finally:
+        hid.release_all()
+        hid.close()
+        if recorder:
+            recorder.close()
 
 if __name__ == "__main__":
-    main()
+    trace = sys.argv[sys.argv.index("--trace") + 1] if "--trace" in sys.argv[:-1] else TRACE_FILE
+    main(low_latency=LOW_LATENCY or "--low-latency" in sys.argv, trace=trace,
+         runtime="asyncio" if "--asyncio" in sys.argv else RUNTIME)
@@ -0,0 +1,180 @@
+"""ControlChannel driven by an asyncio event loop instead of a reader thread"""
+import asyncio
+import os
+import time
+from UTILS import spans
+from UTILS.control_channel import ControlChannel, BACKOFF_MIN, BACKOFF_MAX
+from UTILS.link import pack_message, unpack_messages
+
+READ_SIZE = 4096  # Bytes taken from the port per readable event
+
+
+class LatencyStats:
+    """Count, mean and max of one stage's latency"""
+
+    __slots__ = ('count', 'total', 'max')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'avg_ms': (self.total / self.count * 1000) if self.count else 0.0,
+            'max_ms': self.max * 1000,
+        }
+
+
+class AsyncControlChannel(ControlChannel):
+    """
+    The port's fd is watched with loop.add_reader() and every complete frame
+    is dispatched on the loop. send() queues the frame and writes what the
+    port takes without blocking, the rest when it drains. A lost link is
+    reopened with backoff by a task; the open itself runs in the default
+    executor, since pyserial's open blocks.
+
+    Handlers run on the loop, so they must not block, and send() must be
+    called from the loop's thread.
+    """
+
+    def __init__(self, ser, name, reopen=None):
+        super().__init__(ser, name, reopen)
+        self.loop = None
+        self.latency = LatencyStats()  # Frame read → its handler done
+        self._fd = None
+        self._inbox = bytearray()
+        self._outbox = bytearray()
+        self._writing = False
+        self._reopening = None
+
+    def start(self):
+        """Start dispatching on the running loop"""
+        self.loop = asyncio.get_running_loop()
+        self._attach()
+
+    def send(self, msg_type, payload: bytes, queue=False):
+        """
+        Queue one typed message for the port, never blocking.
+
+        While a reopen is pending the message is dropped, or with queue=True
+        kept (up to BACKLOG, oldest dropped first) and sent on reconnect.
+
+        Returns:
+            True if it was handed to the port
+        """
+        if self.connected:
+            with spans.message("send", msg_type):
+                self._outbox += pack_message(msg_type, payload)
+                if not self._writing:
+                    self._flush()
+            if self.connected:
+                return True
+        if queue:
+            self._backlog.append((msg_type, payload))
+        return False
+
+    def _attach(self):
+        self._fd = self.ser.fileno()
+        os.set_blocking(self._fd, False)
+        self.loop.add_reader(self._fd, self._on_readable)
+
+    def _detach(self):
+        self.loop.remove_reader(self._fd)
+        if self._writing:
+            self.loop.remove_writer(self._fd)
+            self._writing = False
+        self._inbox.clear()
+        self._outbox.clear()
+
+    def _flush(self):
+        try:
+            written = os.write(self._fd, self._outbox)
+        except BlockingIOError:
+            written = 0
+        except OSError as e:
+            self._lost(f"on write: {e}")
+            return
+        del self._outbox[:written]
+        # Wait for the port to drain only while something is left
+        if self._outbox and not self._writing:
+            self.loop.add_writer(self._fd, self._flush)
+            self._writing = True
+        elif not self._outbox and self._writing:
+            self.loop.remove_writer(self._fd)
+            self._writing = False
+
+    def _on_readable(self):
+        try:
+            data = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self._lost(f": {e}")
+            return
+        if not data:
+            self._lost(": port hung up")
+            return
+
+        received = time.perf_counter()
+        self._inbox += data
+        for msg_type, payload in unpack_messages(self._inbox):
+            self._dispatch(msg_type, payload)
+            self.latency.add(time.perf_counter() - received)
+            if not self.connected:
+                # A handler's send() lost the link; the rest left with the port
+                return
+
+    def _lost(self, reason):
+        self._detach()
+        self._mark_lost()
+        if self.reopen is None:
+            print(f"[{self.name}] Control channel stopped{reason}")
+            return
+        print(f"[{self.name}] Serial link lost{reason}")
+        if self._reopening is None:
+            self._reopening = self.loop.create_task(self._reopen(), name=f"{self.name}-reopen")
+
+    async def _reopen(self):
+        """Reopen the port with backoff, flush the backlog, then run the reconnect handlers"""
+        try:
+            self.ser.close()
+        except (IOError, OSError):
+            pass
+
+        delay = BACKOFF_MIN
+        while True:
+            try:
+                ser = await self.loop.run_in_executor(None, self.reopen)
+                break
+            except (IOError, OSError) as e:
+                print(f"[{self.name}] Reopen failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, BACKOFF_MAX)
+
+        self.ser = ser
+        self._reopening = None
+        self.connected = True
+        self._attach()
+        while self._backlog:
+            self._outbox += pack_message(*self._backlog.popleft())
+        self._flush()
+        if not self.connected:
+            print(f"[{self.name}] Serial link lost again while flushing")
+            return
+        outage = time.perf_counter() - self.lost_at
+        self.outages.append(outage)
+        print(f"[{self.name}] Serial link back after {outage:.2f}s")
+
+        for handler in self.reconnect_handlers:
+            try:
+                handler()
+            except Exception as e:
+                print(f"[{self.name}] Error in reconnect handler: {e}")
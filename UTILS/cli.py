@@ -0,0 +1,168 @@
+"""
+omg-mitigation command line
+
+    omg-mitigation sender [--low-latency] [--trace FILE] [--timing] [--spans FILE] [--asyncio]
+    omg-mitigation endpoint [--low-latency] [--trace FILE] [--timing] [--spans FILE]
+    omg-mitigation bench {alloc,bulk_decode,burst,cadence,plausibility,rekey,routing,seedgen,startup,transport,uinput}
+    omg-mitigation simulate [--rate N] [--skew S] [--latency S] [--jitter S] [--link-drops N]
+    omg-mitigation sweep [--interval N ...] [--time-offset S ...] [--skew S ...] [--workers N]
+    omg-mitigation replay TRACE [--side {sender,endpoint}] [--speed X] [--key HEX] [--base-time T] [--session PORT]
+    omg-mitigation decode TRACE --key HEX --base-time T [--workers N] [--device NAME] [--session PORT] [--out FILE]
+    omg-mitigation keymaps [--epochs N] [--workers N] [--key HEX]
+    omg-mitigation analyze [--compare]
+    omg-mitigation timeline SENDER_SPANS ENDPOINT_SPANS [--out FILE]
+
+Each subcommand imports only what it needs, so starting the SENDER after a
+reboot does not pay for the research tooling (or vice versa).
+"""
+from UTILS import startup  # First, so startup milestones start from here
+import argparse
+import importlib
+import sys
+
+BENCHMARKS = ("alloc", "bulk_decode", "burst", "cadence", "plausibility", "rekey", "routing", "seedgen",
+              "startup", "transport", "uinput")
+
+
+def _observers(args, device_name):
+    """Pipeline observers the flags ask for (see UTILS.pipeline)"""
+    observers = []
+    if args.timing:
+        from tests.research.shared_timer import stage_timer
+        observers.append(stage_timer(device_name, args.low_latency))
+    if args.spans:
+        from UTILS import spans
+        observers.append(spans.enable(device_name, args.spans))
+    return tuple(observers)
+
+
+def _sender(args):
+    from SENDER.main import main, RUNTIME
+    main(low_latency=args.low_latency, trace=args.trace, runtime="asyncio" if args.asyncio else RUNTIME,
+         observers=_observers(args, "SENDER"))
+
+
+def _endpoint(args):
+    from ENDPOINT.main import main
+    main(low_latency=args.low_latency, trace=args.trace, observers=_observers(args, "ENDPOINT"))
+
+
+def _bench(args):
+    importlib.import_module(f"tests.research.bench_{args.name}").main()
+
+
+def _simulate(args):
+    from tests.research import simulator
+    simulator.main(args.extra)
+
+
+def _sweep(args):
+    from tests.research import sweep
+    sweep.main(args.extra)
+
+
+def _replay(args):
+    from tests.research import replay
+    replay.main(args.extra)
+
+
+def _decode(args):
+    from tests.research import bulk_decode
+    bulk_decode.main(args.extra)
+
+
+def _keymaps(args):
+    from tests.research import keymap_analysis
+    keymap_analysis.main(args.extra)
+
+
+def _analyze(args):
+    from tests.research import analyze_timing
+    if args.compare:
+        analyze_timing.compare_modes()
+    else:
+        analyze_timing.main()
+
+
+def _timeline(args):
+    from UTILS import spans
+    spans.merge_files(args.sender, args.endpoint, args.out)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="omg-mitigation",
+        description="O.MG Cable mitigation with rotating keymaps",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    for name, handler, help_text in (
+        ("sender", _sender, "run on the Pi between the keyboard and the cable"),
+        ("endpoint", _endpoint, "run on the host the cable plugs into"),
+    ):
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--low-latency", action="store_true",
+                             help="SCHED_FIFO, CPU pinning, locked memory, idle-only GC")
+        command.add_argument("--trace", metavar="FILE",
+                             help="record every key event read, for replay")
+        command.add_argument("--timing", action="store_true",
+                             help="log each key press's stage times, for analyze")
+        command.add_argument("--spans", metavar="FILE",
+                             help="keep recent spans, written as Chrome trace JSON on SIGUSR2 and exit")
+        command.set_defaults(handler=handler)
+    commands.choices["sender"].add_argument("--asyncio", action="store_true",
+                                            help="run every stage as a task of one event loop")
+
+    command = commands.add_parser("bench", help="run a benchmark from tests/research")
+    command.add_argument("name", choices=BENCHMARKS)
+    command.set_defaults(handler=_bench)
+
+    # Options are the simulator's own (see tests/research/simulator.py --help)
+    command = commands.add_parser("simulate", help="SENDER → ENDPOINT loopback on a virtual clock",
+                                  add_help=False)
+    command.set_defaults(handler=_simulate)
+
+    # Options are the sweep's own (see tests/research/sweep.py --help)
+    command = commands.add_parser("sweep", help="simulate a grid of rotation settings in parallel",
+                                  add_help=False)
+    command.set_defaults(handler=_sweep)
+
+    # Options are the replay driver's own (see tests/research/replay.py --help)
+    command = commands.add_parser("replay", help="feed a recorded key trace through SENDER or ENDPOINT",
+                                  add_help=False)
+    command.set_defaults(handler=_replay)
+
+    # Options are the bulk decoder's own (see tests/research/bulk_decode.py --help)
+    command = commands.add_parser("decode", help="decode a whole ENDPOINT trace offline (NumPy)",
+                                  add_help=False)
+    command.set_defaults(handler=_decode)
+
+    # Options are the analysis tool's own (see tests/research/keymap_analysis.py --help)
+    command = commands.add_parser("keymaps", help="round-trip and uniformity check over many epochs",
+                                  add_help=False)
+    command.set_defaults(handler=_keymaps)
+
+    command = commands.add_parser("analyze", help="latency analysis of the --timing log")
+    command.add_argument("--compare", action="store_true",
+                         help="default vs --low-latency histograms")
+    command.set_defaults(handler=_analyze)
+
+    command = commands.add_parser("timeline", help="merge both devices' --spans files onto one timeline")
+    command.add_argument("sender", metavar="SENDER_SPANS")
+    command.add_argument("endpoint", metavar="ENDPOINT_SPANS")
+    command.add_argument("--out", default="timeline.json", help="merged trace (default: timeline.json)")
+    command.set_defaults(handler=_timeline)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args, extra = parser.parse_known_args(argv)
+    if extra and args.command not in ("simulate", "sweep", "replay", "decode", "keymaps"):
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    args.extra = extra
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,152 @@
+"""Background reader that dispatches typed serial messages to handlers"""
+import collections
+import threading
+import time
+from UTILS import spans
+from UTILS.link import send_message, recv_message
+
+BACKOFF_MIN = 0.1  # First retry after a failed reopen, seconds
+BACKOFF_MAX = 5.0  # Retries double up to this
+BACKLOG = 256  # Messages sent with queue=True kept while the link is down
+
+
+class ControlChannel:
+    def __init__(self, ser, name, reopen=None):
+        """
+        Args:
+            ser: serial port left open by the handshake
+            name: "SENDER" or "ENDPOINT", used as the log prefix
+            reopen: callable returning a freshly opened port. With it, a lost
+                link is reopened with backoff instead of stopping the channel.
+        """
+        self.ser = ser
+        self.name = name
+        self.reopen = reopen
+        self.handlers = {}
+        self.reconnect_handlers = []
+        self.connected = True
+        self.lost_at = None  # perf_counter() when the last outage was detected
+        self.outages = []  # Seconds from detecting each outage to the port being back
+        self._backlog = collections.deque(maxlen=BACKLOG)
+        self._write_lock = threading.Lock()
+        self._thread = None
+
+    def on(self, msg_type, handler):
+        """Register handler(payload) for a message type"""
+        self.handlers[msg_type] = handler
+
+    def on_reconnect(self, handler):
+        """Register handler() to run on the reader thread each time the port is back"""
+        self.reconnect_handlers.append(handler)
+
+    def send(self, msg_type, payload: bytes, queue=False):
+        """
+        Thread-safe send of one typed message.
+
+        While a reopen is pending the message is dropped, or with queue=True
+        kept (up to BACKLOG, oldest dropped first) and sent on reconnect.
+
+        Returns:
+            True if it was written to the port
+        """
+        with self._write_lock:
+            if self.connected:
+                try:
+                    with spans.message("send", msg_type):
+                        send_message(self.ser, msg_type, payload)
+                    return True
+                except (IOError, OSError) as e:
+                    if self.reopen is None:
+                        raise
+                    print(f"[{self.name}] Serial link lost on write: {e}")
+                    self._mark_lost()
+            if queue:
+                self._backlog.append((msg_type, payload))
+            return False
+
+    def start(self):
+        """Start dispatching on a daemon thread"""
+        self._thread = threading.Thread(target=self._run, name=f"{self.name}-control", daemon=True)
+        self._thread.start()
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _mark_lost(self):
+        """Caller holds the write lock"""
+        if self.connected:
+            self.connected = False
+            self.lost_at = time.perf_counter()
+
+    def _reconnect(self):
+        """Reopen the port with backoff, flush the backlog, then run the reconnect handlers"""
+        with self._write_lock:
+            self._mark_lost()
+        try:
+            self.ser.close()
+        except (IOError, OSError):
+            pass
+
+        delay = BACKOFF_MIN
+        while True:
+            try:
+                ser = self.reopen()
+                break
+            except (IOError, OSError) as e:
+                print(f"[{self.name}] Reopen failed ({e}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+                delay = min(delay * 2, BACKOFF_MAX)
+
+        with self._write_lock:
+            self.ser = ser
+            try:
+                while self._backlog:
+                    send_message(ser, *self._backlog[0])
+                    self._backlog.popleft()
+            except (IOError, OSError) as e:
+                print(f"[{self.name}] Serial link lost again while flushing: {e}")
+                return
+            self.connected = True
+            outage = time.perf_counter() - self.lost_at
+            self.outages.append(outage)
+        print(f"[{self.name}] Serial link back after {outage:.2f}s")
+
+        for handler in self.reconnect_handlers:
+            try:
+                handler()
+            except Exception as e:
+                print(f"[{self.name}] Error in reconnect handler: {e}")
+
+    def _run(self):
+        while True:
+            if not self.connected:
+                self._reconnect()
+                continue
+
+            try:
+                msg_type, payload = recv_message(self.ser)
+            except (IOError, OSError) as e:
+                if self.reopen is None:
+                    print(f"[{self.name}] Control channel stopped: {e}")
+                    return
+                print(f"[{self.name}] Serial link lost: {e}")
+                with self._write_lock:
+                    self._mark_lost()
+                continue
+
+            if msg_type is None:
+                continue
+            self._dispatch(msg_type, payload)
+
+    def _dispatch(self, msg_type, payload):
+        handler = self.handlers.get(msg_type)
+        if handler is None:
+            print(f"[{self.name}] Unhandled message type 0x{msg_type:02x}")
+            return
+
+        try:
+            with spans.message("recv", msg_type):
+                handler(payload)
+        except Exception as e:
+            print(f"[{self.name}] Error handling message 0x{msg_type:02x}: {e}")
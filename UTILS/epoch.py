@@ -0,0 +1,54 @@
+"""In-band epoch boundary markers shared by SENDER and ENDPOINT"""
+
+# Reserved keys the SENDER taps right before the first scrambled key of a new
+# epoch. The marker travels over the same HID link as the keystrokes, so it
+# always arrives in order with them. Each marker carries counter % 4, which is
+# enough for the ENDPOINT to tell the previous, current and next epoch apart.
+EPOCH_MARKER_KEYS = ('KEY_F13', 'KEY_F14', 'KEY_F15', 'KEY_F16')
+EPOCH_MARKER_HID = (0x68, 0x69, 0x6A, 0x6B)
+
+MARKER_MODULUS = len(EPOCH_MARKER_KEYS)
+MARKER_TAGS = {key: tag for tag, key in enumerate(EPOCH_MARKER_KEYS)}
+
+
+def marker_key(counter):
+    """evdev key name of the marker announcing `counter`"""
+    return EPOCH_MARKER_KEYS[counter % MARKER_MODULUS]
+
+
+def marker_hid(counter):
+    """HID usage code of the marker announcing `counter`"""
+    return EPOCH_MARKER_HID[counter % MARKER_MODULUS]
+
+
+def is_epoch_marker(key):
+    """Check if an evdev key name is a reserved epoch marker"""
+    return key in MARKER_TAGS
+
+
+def resolve_marker(key, local_counter):
+    """
+    Turn a marker back into a full counter.
+
+    Args:
+        key: evdev key name of the marker (e.g., 'KEY_F14')
+        local_counter: the receiver's own counter
+
+    Returns:
+        The counter within one epoch of local_counter that matches the
+        marker, or None if the marker is too far off to be trusted.
+    """
+    tag = MARKER_TAGS.get(key)
+    if tag is None:
+        return None
+
+    delta = (tag - local_counter) % MARKER_MODULUS
+    if delta == 0:
+        return local_counter
+    if delta == 1:
+        return local_counter + 1
+    if delta == MARKER_MODULUS - 1:
+        return local_counter - 1
+
+    # Two epochs away in either direction - clocks are badly out of sync
+    return None
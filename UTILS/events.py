@@ -0,0 +1,60 @@
+"""Reusable key event record passed from the readers through the main loops"""
+import fcntl
+import struct
+import time
+from UTILS import tables
+
+# evdev key states
+KEY_UP = 0
+KEY_DOWN = 1
+KEY_HOLD = 2
+
+# Keycode → name, the same strings categorize() would give (evdev.ecodes.keys)
+KEY_NAMES = tables.load('evdev')['key_names']
+
+# _IOW('E', 0xa0, int): which clock the kernel stamps this device's events with
+EVIOCSCLOCKID = 0x400445a0
+
+
+def use_monotonic_clock(fd):
+    """
+    Have the kernel stamp an evdev device's events with CLOCK_MONOTONIC
+    instead of wall time, so record.time is on time.monotonic()'s clock
+    and can be subtracted from stamps taken in userspace.
+
+    Returns:
+        False if the kernel refused; events then stay on wall time
+    """
+    try:
+        fcntl.ioctl(fd, EVIOCSCLOCKID, struct.pack('i', time.CLOCK_MONOTONIC))
+        return True
+    except OSError:
+        return False
+
+
+class KeyRecord:
+    """
+    One key event.
+
+    Readers fill a single record in place and yield it again for every
+    event, so a steady-state keystroke allocates nothing here. Consumers
+    must copy out the fields they need before asking for the next event.
+    """
+
+    __slots__ = ('key', 'code', 'state', 'shift', 'ctrl', 'alt', 'caps_lock', 'device', 'fd', 'time')
+
+    def __init__(self):
+        self.key = None  # evdev key name, e.g. 'KEY_A'
+        self.code = 0  # evdev keycode
+        self.state = KEY_UP
+        self.shift = False
+        self.ctrl = False
+        self.alt = False
+        self.caps_lock = False
+        self.device = None  # Name of the keyboard it came from
+        self.fd = -1  # File descriptor of that keyboard, for per-device routing
+        self.time = 0.0  # Kernel timestamp of the event, seconds on time.monotonic()'s clock
+
+    def __repr__(self):
+        return (f"KeyRecord(key={self.key}, state={self.state}, shift={self.shift}, "
+                f"ctrl={self.ctrl}, alt={self.alt}, caps_lock={self.caps_lock}, device={self.device!r})")
@@ -29,3 +29,13 @@ def get_keyboard():
     except subprocess.CalledProcessError as e:
         print(f"Error listing input devices: {e}")
         return None
+
+def get_keyboards():
+    # Invokes OS command to find names of all keyboard devices. Returns a list, empty if none exist.
+    try:
+        k_out = subprocess.check_output(["ls", "-l", "/dev/input/by-id"], text=True)
+        return [line.split()[-3] for line in k_out.splitlines() if "kbd" in line]
+    
+    except subprocess.CalledProcessError as e:
+        print(f"Error listing input devices: {e}")
+        return []
@@ -0,0 +1,58 @@
+"""Serial link heartbeat: the SENDER pings over the control channel and times the ENDPOINT's echo"""
+import struct
+import threading
+import time
+from UTILS import metrics
+from UTILS.link import MSG_HEARTBEAT, MSG_HEARTBEAT_ACK
+
+INTERVAL = 5.0  # Seconds between pings
+
+# <SENDER perf_counter() when sent:8>, echoed back unchanged
+PING_STRUCT = struct.Struct(">d")
+
+
+class SenderHeartbeat:
+    """Pings the ENDPOINT every INTERVAL; each echo's round trip goes to metrics.SERIAL_RTT"""
+
+    def __init__(self, channel, interval=INTERVAL):
+        """
+        Args:
+            channel: ControlChannel (or AsyncControlChannel) to the ENDPOINT
+        """
+        self.channel = channel
+        self.interval = interval
+        self.last_rtt = None  # Seconds, of the last echo
+        channel.on(MSG_HEARTBEAT_ACK, self._on_ack)
+
+    def ping(self):
+        """Send one ping; dropped while the link is down"""
+        return self.channel.send(MSG_HEARTBEAT, PING_STRUCT.pack(time.perf_counter()))
+
+    def start(self):
+        """Ping on a daemon thread (the threaded runtime; asyncio calls ping() from a task)"""
+        threading.Thread(target=self._run, name="SENDER-heartbeat", daemon=True).start()
+        return self
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.ping()
+
+    def _on_ack(self, payload):
+        sent, = PING_STRUCT.unpack_from(payload)
+        self.last_rtt = time.perf_counter() - sent
+        metrics.SERIAL_RTT.observe(self.last_rtt)
+
+
+class EndpointHeartbeat:
+    """Echoes the SENDER's pings"""
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.last_at = None  # time.monotonic() of the last ping
+        channel.on(MSG_HEARTBEAT, self._on_ping)
+
+    def _on_ping(self, payload):
+        self.last_at = time.monotonic()
+        metrics.HEARTBEATS.inc()
+        self.channel.send(MSG_HEARTBEAT_ACK, payload)
@@ -51,6 +51,19 @@ def seed_to_keymap(seed: bytes) -> dict:
     
     return keymap
 
+def seed_to_permutation(seed: bytes) -> list:
+    """
+    seed_to_keymap() as indices into KEYS: KEYS[i] maps to KEYS[perm[i]].
+
+    Shuffles index lists with the same RNG calls, so the two always agree.
+    """
+    rng = random.Random(int.from_bytes(seed, byteorder='big'))
+    letters = list(range(len(LETTERS)))
+    rng.shuffle(letters)
+    symbols = list(range(len(LETTERS), len(KEYS)))
+    rng.shuffle(symbols)
+    return letters + symbols
+
 def apply_keymap(text: str, keymap: dict) -> str:
     """Apply the keymap to scramble text"""
     return ''.join(keymap.get(c.lower(), c) for c in text)
@@ -0,0 +1,225 @@
+"""
+Keyboard layouts: the character every scrambled key types, per X11 layout
+
+The keymap permutes key positions, named by the US-QWERTY characters on
+them (US_BASE, US_SHIFT) - both sides agree on those whatever the layout,
+and the host's own layout turns the decoded keycodes back into text. The
+layout decides what that text is: which keys caps lock shifts (ö on
+German, not just a-z) and the characters the ENDPOINT's plausibility
+check reads. Tables come from the xkb symbols file get_key_mapping()
+names (levels 1 and 2, includes followed) and are cached on disk by
+UTILS.tables; both sides compare them right after the key exchange.
+"""
+import hashlib
+import os
+import re
+import subprocess
+import time
+from UTILS.link import send_frame, recv_frame
+
+XKB_SYMBOLS = "/usr/share/X11/xkb/symbols"
+KEYSYMDEF = "/usr/include/X11/keysymdef.h"  # Only for keysyms missing from KEYSYMS
+CONFIRM_TIMEOUT = 10.0  # Seconds to wait for the peer's layout after the key exchange
+
+# Every key the keymap scrambles: xkb name, evdev name, and what it types on US QWERTY
+XKB_KEYS = ("TLDE AE01 AE02 AE03 AE04 AE05 AE06 AE07 AE08 AE09 AE10 AE11 AE12 "
+            "AD01 AD02 AD03 AD04 AD05 AD06 AD07 AD08 AD09 AD10 AD11 AD12 BKSL "
+            "AC01 AC02 AC03 AC04 AC05 AC06 AC07 AC08 AC09 AC10 AC11 "
+            "AB01 AB02 AB03 AB04 AB05 AB06 AB07 AB08 AB09 AB10 SPCE").split()
+EVDEV_KEYS = ("KEY_GRAVE KEY_1 KEY_2 KEY_3 KEY_4 KEY_5 KEY_6 KEY_7 KEY_8 KEY_9 KEY_0 KEY_MINUS KEY_EQUAL "
+              "KEY_Q KEY_W KEY_E KEY_R KEY_T KEY_Y KEY_U KEY_I KEY_O KEY_P KEY_LEFTBRACE KEY_RIGHTBRACE "
+              "KEY_BACKSLASH KEY_A KEY_S KEY_D KEY_F KEY_G KEY_H KEY_J KEY_K KEY_L KEY_SEMICOLON "
+              "KEY_APOSTROPHE KEY_Z KEY_X KEY_C KEY_V KEY_B KEY_N KEY_M KEY_COMMA KEY_DOT KEY_SLASH "
+              "KEY_SPACE").split()
+US_BASE = "`1234567890-=" "qwertyuiop[]\\" "asdfghjkl;'" "zxcvbnm,./" " "
+US_SHIFT = "~!@#$%^&*()_+" "QWERTYUIOP{}|" 'ASDFGHJKL:"' "ZXCVBNM<>?" " "
+
+# The scramble's key space: evdev key -> unshifted character, and each character's shifted one
+EVDEV_TO_CHAR = dict(zip(EVDEV_KEYS, US_BASE))
+SHIFT_MAP = {base: shifted for base, shifted in zip(US_BASE, US_SHIFT) if not base.isalpha() and base != shifted}
+
+# keysym name -> character for Latin layouts' first two levels; the rest from keysymdef.h
+KEYSYMS = dict(zip(
+    "space exclam quotedbl numbersign dollar percent ampersand apostrophe parenleft parenright "
+    "asterisk plus comma minus period slash 0 1 2 3 4 5 6 7 8 9 colon semicolon less equal greater "
+    "question at A B C D E F G H I J K L M N O P Q R S T U V W X Y Z bracketleft backslash "
+    "bracketright asciicircum underscore grave a b c d e f g h i j k l m n o p q r s t u v w x y z "
+    "braceleft bar braceright asciitilde".split(),
+    map(chr, range(0x20, 0x7F))))
+KEYSYMS.update(zip(
+    "nobreakspace exclamdown cent sterling currency yen brokenbar section diaeresis copyright "
+    "ordfeminine guillemotleft notsign hyphen registered macron degree plusminus twosuperior "
+    "threesuperior acute mu paragraph periodcentered cedilla onesuperior masculine guillemotright "
+    "onequarter onehalf threequarters questiondown Agrave Aacute Acircumflex Atilde Adiaeresis Aring "
+    "AE Ccedilla Egrave Eacute Ecircumflex Ediaeresis Igrave Iacute Icircumflex Idiaeresis ETH Ntilde "
+    "Ograve Oacute Ocircumflex Otilde Odiaeresis multiply Oslash Ugrave Uacute Ucircumflex Udiaeresis "
+    "Yacute THORN ssharp".split(),
+    map(chr, range(0xA0, 0xE0))))
+KEYSYMS.update((name.lower(), chr(ord(char) + 0x20)) for name, char in list(KEYSYMS.items())
+               if 0xC0 <= ord(char) <= 0xDE and name != "multiply")
+KEYSYMS.update({
+    'division': '÷', 'ydiaeresis': 'ÿ', 'guillemetleft': '«', 'guillemetright': '»',
+    'ordmasculine': 'º', 'Ooblique': 'Ø', 'ooblique': 'ø', 'EuroSign': '€',
+    # Dead keys type their accent when followed by space
+    'dead_grave': '`', 'dead_acute': '´', 'dead_circumflex': '^', 'dead_tilde': '~',
+    'dead_diaeresis': '¨', 'dead_abovering': '°', 'dead_cedilla': '¸', 'dead_macron': '¯',
+    'dead_caron': 'ˇ', 'dead_breve': '˘', 'dead_doubleacute': '˝', 'dead_ogonek': '˛',
+    'dead_abovedot': '˙',
+})
+
+_ASSIGNMENT = re.compile(r'\w+(?:\[\w+\])?\s*=\s*(?:"[^"]*"|\[[^\]]*\]|\w+)')
+
+_keysymdef = None
+
+
+def keysym_char(name):
+    """Character a keysym types, or None (NoSymbol, function keys, unknown names)"""
+    char = KEYSYMS.get(name)
+    if char is not None:
+        return char
+    if re.fullmatch(r"U[0-9A-Fa-f]{4,6}", name):
+        return chr(int(name[1:], 16))
+    if re.fullmatch(r"0x100[0-9A-Fa-f]{4,5}", name):
+        return chr(int(name, 16) - 0x1000000)
+    global _keysymdef
+    if _keysymdef is None:
+        try:
+            with open(KEYSYMDEF) as f:
+                _keysymdef = dict(re.findall(r"#define XK_(\w+)\s+0x[0-9a-f]+\s*/\*[ (]*U\+([0-9A-F]+)", f.read()))
+        except OSError:
+            _keysymdef = {}
+    code = _keysymdef.get(name)
+    return chr(int(code, 16)) if code else None
+
+
+def _sections(path):
+    """({section: body}, default section) of an xkb symbols file"""
+    with open(path) as f:
+        text = re.sub(r"//[^\n]*", "", f.read())
+    sections = {}
+    default = None
+    for match in re.finditer(r'((?:\w+\s+)*)xkb_symbols\s+"([^"]+)"\s*\{', text):
+        depth, end = 1, match.end()
+        while depth and end < len(text):
+            depth += {"{": 1, "}": -1}.get(text[end], 0)
+            end += 1
+        sections[match.group(2)] = text[match.end():end - 1]
+        if default is None and "default" in match.group(1).split():
+            default = match.group(2)
+    return sections, default or next(iter(sections), None)
+
+
+def _symbols(spec, keys, depth=0):
+    """Merge the keys of `spec` ("file" or "file(section)") into `keys`: xkb name -> keysyms"""
+    name, _, section = spec.partition("(")
+    sections, default = _sections(os.path.join(XKB_SYMBOLS, name))
+    body = sections[section.rstrip(")") or default]
+    statement = re.compile(r'(?:(augment|override|replace)\s+)?include\s+"([^"]+)"'
+                           r'|(augment\s+)?(?:replace\s+|override\s+)?key\s+<(\w+)>\s*\{([^}]*)\}')
+    for match in statement.finditer(body):
+        if match.group(2):
+            if depth < 8:
+                for part in re.split(r"[+|]", match.group(2)):
+                    if part:
+                        _symbols(part, keys, depth + 1)
+            continue
+        key, definition = match.group(4), match.group(5)
+        # The first group's keysyms: `[ a, A ]`, or `symbols[Group1]= [ a, A ]` beside a type
+        group = (re.search(r"symbols\[Group1\]\s*=\s*\[([^\]]*)\]", definition)
+                 or re.search(r"\[([^\]]*)\]", _ASSIGNMENT.sub("", definition)))
+        if group is None or (match.group(3) and key in keys):
+            continue
+        keys[key] = [sym.strip() for sym in group.group(1).split(",")]
+    return keys
+
+
+def build(layout):
+    """
+    Tables of one layout: {'layout', 'chars', 'caps', 'fingerprint'}.
+
+    `chars` maps every scrambled evdev key to (unshifted, shifted) on that
+    layout; `caps` lists the keys caps lock shifts.
+    """
+    if layout == "us" and not os.path.isdir(XKB_SYMBOLS):
+        chars = {key: (base, shifted) for key, base, shifted in zip(EVDEV_KEYS, US_BASE, US_SHIFT)}
+    else:
+        symbols = _symbols(layout, {})
+        chars = {}
+        for xkb_key, evdev_key in zip(XKB_KEYS, EVDEV_KEYS):
+            levels = [keysym_char(sym) for sym in symbols.get(xkb_key, ())[:2]] + [None, None]
+            if xkb_key == "SPCE":
+                levels = [" ", " "]
+            chars[evdev_key] = (levels[0], levels[1] if levels[1] is not None else levels[0])
+    caps = [key for key, (base, shifted) in chars.items()
+            if base and base.isalpha() and shifted == base.upper()]
+    fingerprint = hashlib.sha256(repr(sorted(chars.items())).encode()).hexdigest()[:16]
+    return {'layout': layout, 'chars': chars, 'caps': caps, 'fingerprint': fingerprint}
+
+
+def detect():
+    """Layout id of this machine's keyboard ("de", "us(dvorak)"), "us" when unknown"""
+    from UTILS.get_device_info import get_key_mapping
+    try:
+        layout, variant = get_key_mapping()
+    except (OSError, subprocess.SubprocessError) as e:
+        print(f"[LAYOUT] Could not read the keyboard layout ({e}) - assuming us")
+        return "us"
+    if not layout:
+        return "us"
+    # "us,de" lists every layout configured; the first is the default
+    layout = layout.split(",")[0].strip()
+    variant = (variant or "").split(",")[0].strip()
+    return f"{layout}({variant})" if variant else layout
+
+
+def load(layout=None):
+    """Tables for `layout` (default: detect()), from the UTILS.tables cache"""
+    from UTILS import tables
+    layout = layout or detect()
+    try:
+        return tables.load(f"layout-{layout}")
+    except (OSError, KeyError) as e:
+        print(f"[LAYOUT] No xkb tables for {layout} ({e}) - using us")
+        return tables.load("layout-us")
+
+
+def display_map(layout_tables):
+    """{key-space character: character the layout types for it}; identity on us"""
+    shown = {}
+    for key, us_base, us_shifted in zip(EVDEV_KEYS, US_BASE, US_SHIFT):
+        base, shifted = layout_tables['chars'][key]
+        if base is not None:
+            shown[us_base] = base
+            shown[us_shifted] = shifted
+    return shown
+
+
+def confirm(ser, layout_tables, name, first):
+    """
+    Swap layout ids and fingerprints with the peer, right after the key exchange.
+
+    Args:
+        first: True on the side that speaks first (the SENDER)
+
+    Returns:
+        (peer layout, peer fingerprint), or None if the peer never answered
+    """
+    ours = f"{layout_tables['layout']} {layout_tables['fingerprint']}".encode()
+    if first:
+        send_frame(ser, ours)
+    deadline = time.monotonic() + CONFIRM_TIMEOUT
+    frame = recv_frame(ser)
+    while frame is None:
+        if time.monotonic() > deadline:
+            print(f"[{name}] Peer never sent its keyboard layout - keeping {layout_tables['layout']}")
+            return None
+        frame = recv_frame(ser)
+    if not first:
+        send_frame(ser, ours)
+
+    peer_layout, _, peer_fingerprint = frame.decode(errors="replace").partition(" ")
+    if peer_fingerprint == layout_tables['fingerprint']:
+        print(f"[{name}] Keyboard layout {layout_tables['layout']} confirmed by the peer")
+    else:
+        print(f"[{name}] Keyboard layouts differ: ours {layout_tables['layout']}, peer {peer_layout}")
+    return peer_layout, peer_fingerprint
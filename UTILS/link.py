@@ -0,0 +1,87 @@
+"""Length-prefixed framing and message types for the CDC serial link"""
+
+# Message types (first byte of every frame sent after the handshake)
+MSG_DATA = 0x44  # 'D' - AEAD-sealed batch of key events
+MSG_REKEY = 0x52  # 'R' - SENDER proposes a new key from a future epoch
+MSG_REKEY_ACK = 0x41  # 'A' - ENDPOINT derived it and waits for the confirm
+MSG_REKEY_CONFIRM = 0x43  # 'C' - SENDER scheduled it, ENDPOINT schedules it too
+MSG_REKEY_ABORT = 0x58  # 'X' - SENDER gave up, ENDPOINT drops the schedule
+MSG_RESYNC = 0x53  # 'S' - clock, epoch and key schedule after a reconnect (empty: please resync)
+MSG_RESYNC_ACK = 0x73  # 's' - ENDPOINT's side of the resync
+MSG_HEARTBEAT = 0x48  # 'H' - SENDER's ping, timestamped (see UTILS.heartbeat)
+MSG_HEARTBEAT_ACK = 0x68  # 'h' - the ENDPOINT echoes it back
+
+
+def send_frame(ser, data: bytes):
+    """Frame = <len:4 bytes><data>"""
+    ser.write(len(data).to_bytes(4, "big") + data)
+
+
+def _read_exact(ser, length):
+    data = ser.read(length)
+    while len(data) < length:
+        chunk = ser.read(length - len(data))
+        if not chunk:
+            raise IOError("Serial broke")
+        data += chunk
+    return data
+
+
+def recv_frame(ser, required=False):
+    """
+    Read 4-byte length, then payload.
+
+    Args:
+        required: raise IOError instead of returning None on a timeout (the handshake)
+
+    Returns:
+        The payload, or None if the port timed out with nothing pending
+    """
+    length_bytes = ser.read(4)
+    if not length_bytes:
+        if required:
+            raise IOError("Serial broke")
+        return None
+    if len(length_bytes) < 4:
+        length_bytes += _read_exact(ser, 4 - len(length_bytes))
+    length = int.from_bytes(length_bytes, "big")
+    return _read_exact(ser, length)
+
+
+def pack_message(msg_type, payload: bytes):
+    """A typed message framed as send_message() writes it, for non-blocking writers"""
+    return (len(payload) + 1).to_bytes(4, "big") + bytes((msg_type,)) + payload
+
+
+def unpack_messages(buffer: bytearray):
+    """
+    Generator yielding (msg_type, payload) for every complete frame at the
+    start of `buffer`, removing each from it; a partial frame stays for the
+    next read.
+    """
+    while len(buffer) >= 4:
+        end = 4 + int.from_bytes(buffer[:4], "big")
+        if len(buffer) < end:
+            return
+        frame = bytes(buffer[4:end])
+        del buffer[:end]
+        if frame:
+            yield frame[0], frame[1:]
+
+
+def send_message(ser, msg_type, payload: bytes):
+    """Send a typed message: <type:1><payload>"""
+    send_frame(ser, bytes((msg_type,)) + payload)
+
+
+def recv_message(ser):
+    """
+    Receive a typed message.
+
+    Returns:
+        (msg_type, payload) tuple, or (None, None) on an idle timeout
+    """
+    frame = recv_frame(ser)
+    if not frame:
+        return None, None
+    return frame[0], frame[1:]
@@ -0,0 +1,204 @@
+"""
+Live counters and latency histograms, served in Prometheus text format
+
+Each side keeps these in-process from startup: keys by kind (so the
+pass-through vs scrambled mix), key latency from the kernel's stamp to
+the HID or uinput write, keymap rotations, rotation guard stalls and how
+long they held typing, write errors, and the serial heartbeat's round
+trip (UTILS.heartbeat). Recording is an integer increment or two, plus a
+bisect for histograms; nothing is formatted until someone reads them.
+
+serve() answers on a unix socket path or a "host:port" with the current
+values, as plain text or, to an HTTP GET, as a scrape response:
+
+    curl --unix-socket /run/omg-mitigation/sender.sock http://localhost/metrics
+
+and SIGUSR1 prints them to stdout (kill -USR1 <pid>).
+
+Key counts and timing say when someone is typing, so the socket is the
+owner's only (run the scraper as the same user); a port is open to every
+local user. Keys per second is left to the scraper: rate(omg_keys_total[1m]).
+"""
+import bisect
+import os
+import signal
+import socketserver
+import threading
+import time
+from UTILS.pipeline import RELEASE
+
+# Upper bounds, seconds: sub-millisecond key handling up to multi-second stalls
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+STALL_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+CONNECT_TIMEOUT = 1.0  # Seconds a client gets to send a request line before plain text is sent
+
+_registry = []  # Every metric, in registration order
+
+
+class Counter:
+    __slots__ = ('name', 'help', 'labels', 'value')
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        yield self.name, self.labels, self.value
+
+
+class Histogram:
+    __slots__ = ('name', 'help', 'labels', 'bounds', 'counts', 'sum')
+
+    def __init__(self, name, help, labels, bounds):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # The last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def samples(self):
+        total = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            total += count
+            yield f"{self.name}_bucket", dict(self.labels, le="+Inf" if bound == float("inf") else repr(bound)), total
+        yield f"{self.name}_sum", self.labels, self.sum
+        yield f"{self.name}_count", self.labels, total
+
+
+def counter(name, help, **labels):
+    metric = Counter(name, help, labels)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name, help, bounds=LATENCY_BUCKETS, **labels):
+    metric = Histogram(name, help, labels, bounds)
+    _registry.append(metric)
+    return metric
+
+
+ROTATIONS = counter("omg_rotations_total", "Keymap rotations")
+GUARD_STALLS = histogram("omg_guard_stall_seconds", "Typing held back by the rotation guard", STALL_BUCKETS)
+WRITE_ERRORS = counter("omg_write_errors_total", "HID report or uinput writes that failed")
+SERIAL_RTT = histogram("omg_serial_rtt_seconds", "Serial control link heartbeat round trip")
+HEARTBEATS = counter("omg_heartbeats_total", "Heartbeats answered from the SENDER")
+
+
+class KeyMetrics:
+    """
+    Pipeline observer (see UTILS.pipeline) counting keys by kind and
+    timing each press from its kernel stamp to its write.
+    """
+
+    def __init__(self):
+        # Indexed by kind: RELEASE, PASS_THROUGH, MAPPED, MARKER
+        self.kinds = [counter("omg_keys_total", "Key events through the pipeline, by kind", kind=name)
+                      for name in ("release", "pass_through", "mapped", "marker")]
+        self.latency = histogram("omg_key_latency_seconds", "Key press: kernel event stamp to write returned")
+
+    def after_classify(self, record, kind, output):
+        self.kinds[kind].value += 1
+
+    def after_emit(self, record, kind, output):
+        if kind != RELEASE and record.time:
+            latency = time.monotonic() - record.time
+            # Negative if the kernel stamped wall time; never happens on monotonic stamps
+            if latency >= 0:
+                self.latency.observe(latency)
+
+
+def render():
+    """Every metric in Prometheus text exposition format"""
+    lines = []
+    described = set()
+    for metric in _registry:
+        if metric.name not in described:
+            described.add(metric.name)
+            kind = type(metric).__name__.lower()
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {kind}")
+        for name, labels, value in metric.samples():
+            label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+            lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    timeout = CONNECT_TIMEOUT
+
+    def handle(self):
+        try:
+            request = self.rfile.readline()
+        except OSError:
+            request = b""  # Nothing sent (nc -U, socat): plain text
+        body = render().encode()
+        if request.startswith(b"GET"):
+            while self.rfile.readline() not in (b"\r\n", b"\n", b""):
+                pass
+            self.wfile.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                             + f"Content-Length: {len(body)}\r\n\r\n".encode())
+        self.wfile.write(body)
+
+
+def serve(address):
+    """
+    Answer with render() on a unix socket path or "host:port", on a daemon thread.
+
+    Returns:
+        The server, or None if it could not bind (logged, never fatal)
+    """
+    try:
+        if "/" in address:
+            os.makedirs(os.path.dirname(address), mode=0o700, exist_ok=True)
+            if os.path.exists(address):
+                os.unlink(address)  # Left behind by the last run
+            server = socketserver.ThreadingUnixStreamServer(address, _Handler, bind_and_activate=False)
+            try:
+                server.server_bind()
+                # 0600 before listen(), so no other user can connect even for a moment
+                os.chmod(address, 0o600)
+                server.server_activate()
+            except OSError:
+                server.server_close()
+                raise
+        else:
+            host, _, port = address.rpartition(":")
+            server = _TCPServer((host or "127.0.0.1", int(port)), _Handler)
+    except (OSError, ValueError) as e:
+        print(f"[METRICS] Can't serve on {address}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    print(f"[METRICS] Serving on {address}")
+    return server
+
+
+def enable(name, address=None):
+    """
+    Print the metrics on SIGUSR1, and serve them on `address` if given.
+
+    Returns:
+        The KeyMetrics observer to pass to the main loop
+    """
+    keys = KeyMetrics()
+    try:
+        signal.signal(signal.SIGUSR1, lambda signum, frame: print(f"[{name}] Metrics:\n{render()}", flush=True))
+    except ValueError:
+        pass  # Not the main thread
+    if address:
+        serve(address)
+    return keys
@@ -0,0 +1,115 @@
+"""
+Key pipeline stages and the hooks that observe them
+
+Both main loops put every key event through the same four stages:
+
+    read      the reader yields a KeyRecord
+    classify  what kind of event it is (rotating the keymap on a new epoch)
+    map       what to send for it: the scrambled or decoded key, or what
+              its press pinned
+    emit      the write to the HID gadget or uinput
+
+classify and map return None when there is nothing further to do.
+
+An observer is any object with after_<stage>(record, kind, output)
+methods; kind and output are None for stages that come before them. A
+hook returning False on classify or map drops the event (detectors);
+anything else is ignored (timing, tracing). Hooks are bound when the
+loop is built, and a stage nothing observes stays the bare method, so
+an uninstrumented loop does exactly the work it did without them.
+"""
+
+STAGES = ("read", "classify", "map", "emit")
+
+# What classify() makes of an event
+RELEASE = 0  # A key going up: release what its press pinned
+PASS_THROUGH = 1  # Special keys (Enter, Tab, arrows) sent as they are
+MAPPED = 2  # Keys the keymap scrambles or decodes
+MARKER = 3  # Epoch marker from the SENDER, never typed
+
+
+class Hooks:
+    """The after_<stage>() hooks of a set of observers, per stage"""
+
+    def __init__(self, *observers):
+        """
+        Args:
+            observers: objects with after_<stage>() methods; None is skipped
+        """
+        self.after = {stage: [] for stage in STAGES}
+        for observer in observers:
+            if observer is not None:
+                self.attach(observer)
+
+    def attach(self, observer):
+        """Add every after_<stage>() method `observer` has"""
+        for stage in STAGES:
+            hook = getattr(observer, f"after_{stage}", None)
+            if hook is not None:
+                self.after[stage].append(hook)
+        return self
+
+    def add(self, stage, hook):
+        """Run hook(record, kind, output) after `stage`"""
+        self.after[stage].append(hook)
+        return self
+
+    def events(self, records):
+        """`records`, with the read hooks run on each one; the iterable itself if there are none"""
+        hooks = tuple(self.after["read"])
+        if not hooks:
+            return records
+        return _observed(records, hooks)
+
+    def bind(self, stages):
+        """
+        Shadow the classify, map and emit methods of `stages` with hooked
+        ones, for those stages that have hooks. The rest are left alone.
+        """
+        for stage in STAGES[1:]:
+            hooks = tuple(self.after[stage])
+            if hooks:
+                setattr(stages, stage, _WRAPPERS[stage](getattr(stages, stage), hooks))
+        return stages
+
+
+def _observed(records, hooks):
+    for record in records:
+        for hook in hooks:
+            hook(record, None, None)
+        yield record
+
+
+def _after_classify(classify, hooks):
+    def hooked(record):
+        kind = classify(record)
+        if kind is not None:
+            for hook in hooks:
+                if hook(record, kind, None) is False:
+                    return None
+        return kind
+    return hooked
+
+
+def _after_map(map, hooks):
+    def hooked(record, kind):
+        output = map(record, kind)
+        if output is not None:
+            for hook in hooks:
+                if hook(record, kind, output) is False:
+                    return None
+        return output
+    return hooked
+
+
+def _after_emit(emit, hooks):
+    def hooked(record, kind, output):
+        emit(record, kind, output)
+        for hook in hooks:
+            hook(record, kind, output)
+        return output
+    return hooked
+
+
+# One wrapper per stage signature: no *args to pack on every key
+_WRAPPERS = {"classify": _after_classify, "map": _after_map, "emit": _after_emit}
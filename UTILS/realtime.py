@@ -0,0 +1,100 @@
+"""Opt-in low-latency runtime: real-time scheduling, CPU pinning, locked memory, GC control"""
+import ctypes
+import ctypes.util
+import gc
+import os
+import threading
+import time
+
+RT_PRIORITY = 50  # SCHED_FIFO priority, above normal tasks, below kernel IRQ threads
+IDLE_GC_AFTER = 0.5  # Seconds without input before the collector may run
+
+MCL_CURRENT = 1
+MCL_FUTURE = 2
+
+
+def _lock_memory():
+    libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+    if libc.mlockall(MCL_CURRENT | MCL_FUTURE) != 0:
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno))
+
+
+def enable_low_latency(name, cpu=None, priority=RT_PRIORITY):
+    """
+    Switch the calling process into low-latency mode.
+
+    Call this at the top of main(), before any threads are started, so
+    they inherit the scheduling policy and affinity. Each step is best
+    effort: without root (or CAP_SYS_NICE / CAP_IPC_LOCK) it is skipped
+    with a warning.
+
+    Args:
+        name: log prefix, "SENDER" or "ENDPOINT"
+        cpu: CPU to pin to (default: the last one, away from IRQ-heavy CPU 0)
+        priority: SCHED_FIFO priority
+
+    Returns:
+        dict of step name -> True/False
+    """
+    applied = {}
+
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+        applied['sched_fifo'] = True
+    except (OSError, AttributeError) as e:
+        print(f"[{name}] Low latency: SCHED_FIFO unavailable: {e}")
+        applied['sched_fifo'] = False
+
+    try:
+        if cpu is None:
+            cpu = max(os.sched_getaffinity(0))
+        os.sched_setaffinity(0, {cpu})
+        applied['affinity'] = True
+    except (OSError, AttributeError) as e:
+        print(f"[{name}] Low latency: CPU pinning unavailable: {e}")
+        applied['affinity'] = False
+
+    try:
+        _lock_memory()
+        applied['mlockall'] = True
+    except (OSError, AttributeError, TypeError) as e:
+        print(f"[{name}] Low latency: mlockall unavailable: {e}")
+        applied['mlockall'] = False
+
+    # Everything allocated during startup is permanent - move it out of the
+    # collector's view and stop automatic collections in the hot loop
+    gc.collect()
+    gc.freeze()
+    gc.disable()
+    applied['gc_frozen'] = True
+
+    summary = ", ".join(f"{step}={'on' if ok else 'off'}" for step, ok in applied.items())
+    print(f"[{name}] Low-latency mode: {summary} (cpu={cpu}, priority={priority})")
+    return applied
+
+
+class IdleCollector:
+    """Runs the garbage collector only after input has gone quiet"""
+
+    def __init__(self, idle_after=IDLE_GC_AFTER):
+        self.idle_after = idle_after
+        self.last_activity = time.monotonic()
+        self.collections = 0
+        self._thread = threading.Thread(target=self._run, name="idle-gc", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def touch(self):
+        """Mark input activity - one attribute store, safe for the hot loop"""
+        self.last_activity = time.monotonic()
+
+    def _run(self):
+        while True:
+            time.sleep(self.idle_after)
+            idle = time.monotonic() - self.last_activity
+            if idle >= self.idle_after and gc.get_count()[0] > 0:
+                gc.collect()
+                self.collections += 1
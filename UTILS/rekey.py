@@ -0,0 +1,267 @@
+"""
+In-session rekeying with precomputed keypairs, pinned to a future epoch
+
+    SENDER    REKEY (effective, public key)  ->  ENDPOINT derives the key, holds it
+              <-  REKEY_ACK (its public key)
+    SENDER schedules it, CONFIRM (effective) ->  ENDPOINT schedules it
+
+Neither side switches on a key the other may not have: a proposal still
+unanswered one epoch before it takes effect is aborted, and a CONFIRM lost
+with the link is settled by the resync that follows (UTILS.resync).
+"""
+import queue
+import struct
+import threading
+import time
+from cryptography.hazmat.primitives.asymmetric.x25519 import (
+    X25519PrivateKey, X25519PublicKey
+)
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives import serialization
+from UTILS.link import MSG_REKEY, MSG_REKEY_ACK, MSG_REKEY_CONFIRM, MSG_REKEY_ABORT
+from UTILS.seedgen import SeedDeriver
+
+REKEY_INTERVAL = 300  # Seconds between rekeys
+REKEY_LEAD = 2  # New key takes effect this many epochs after the proposal
+EPOCH_LENGTH = 10  # Seconds per epoch, as SENDER.main.INTERVAL
+POOL_SIZE = 2  # Keypairs kept ready in the background
+
+# <effective counter:8><X25519 public key:32>
+REKEY_STRUCT = struct.Struct(">q32s")
+# <effective counter:8>, of CONFIRM and ABORT
+ABORT_STRUCT = struct.Struct(">q")
+
+
+def derive_next_key(current_key, shared_secret):
+    """Chain the new key off the old one so both must be known to derive it"""
+    kdf = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=current_key,
+        info=b"serial-rekey",
+    )
+    return kdf.derive(shared_secret)
+
+
+class KeypairPool:
+    """X25519 keypairs generated ahead of time so a rekey never waits on keygen"""
+
+    def __init__(self, size=POOL_SIZE):
+        self._ready = queue.Queue(maxsize=size)
+        self._thread = threading.Thread(target=self._fill, name="keypair-pool", daemon=True)
+        self._thread.start()
+
+    def _fill(self):
+        while True:
+            private_key = X25519PrivateKey.generate()
+            public_bytes = private_key.public_key().public_bytes(
+                encoding=serialization.Encoding.Raw,
+                format=serialization.PublicFormat.Raw
+            )
+            self._ready.put((private_key, public_bytes))  # Blocks while full
+
+    def take(self):
+        """Return a ready (private_key, public_bytes) pair"""
+        return self._ready.get()
+
+
+class KeySchedule:
+    """Which symmetric key (and keyed seed deriver) is in force for each epoch"""
+
+    def __init__(self, initial_key, keep=3, log=None):
+        """
+        Args:
+            keep: switches kept; older ones are superseded on both sides
+            log: UTILS.trace.KeyLog that gets every switch, to decode a trace later
+        """
+        self.keep = keep
+        self.log = log
+        self._entries = ((float("-inf"), SeedDeriver(initial_key)),)
+        self._lock = threading.Lock()
+
+    def deriver_for(self, counter):
+        """SeedDeriver in force at `counter` - lock-free, safe from the hot path"""
+        for start, deriver in reversed(self._entries):
+            if counter >= start:
+                return deriver
+        return self._entries[0][1]
+
+    def key_for(self, counter):
+        """Symmetric key in force at `counter`"""
+        return self.deriver_for(counter).symmetric_key
+
+    def entries(self):
+        """(start, key) of every switch kept, oldest first"""
+        return tuple((start, deriver.symmetric_key) for start, deriver in self._entries)
+
+    def schedule(self, start, key):
+        """Switch to `key` from epoch `start` onwards"""
+        deriver = SeedDeriver(key)
+        with self._lock:
+            entries = [entry for entry in self._entries if entry[0] < start]
+            entries.append((start, deriver))
+            self._entries = tuple(entries[-self.keep:])
+        if self.log:
+            self.log.scheduled(start, key)
+
+    def cancel(self, start):
+        """Drop a scheduled switch that the peer never confirmed"""
+        with self._lock:
+            entries = tuple(entry for entry in self._entries if entry[0] != start)
+            if entries:
+                self._entries = entries
+        if self.log and start != float("-inf"):
+            self.log.cancelled(start)
+
+
+def _call_later(delay, callback, *args):
+    timer = threading.Timer(delay, callback, args)
+    timer.daemon = True
+    timer.start()
+
+
+class SenderRekeyer:
+    """Periodically proposes a new key over the control channel"""
+
+    def __init__(self, channel, schedule, counter_fn, interval=REKEY_INTERVAL, lead=REKEY_LEAD,
+                 epoch_length=EPOCH_LENGTH, call_later=_call_later):
+        """
+        Args:
+            channel: ControlChannel to the ENDPOINT
+            schedule: KeySchedule shared with the keymap rotation
+            counter_fn: callable returning the SENDER's current counter
+            epoch_length: seconds per epoch, to time the check for an unanswered proposal
+            call_later: call_later(delay, callback, *args); loop.call_later under asyncio
+        """
+        self.channel = channel
+        self.schedule = schedule
+        self.counter_fn = counter_fn
+        self.interval = interval
+        self.lead = lead
+        self.epoch_length = epoch_length
+        self.call_later = call_later
+        self.pool = KeypairPool()
+        self.pending = {}  # effective counter -> (private_key, sent_at)
+        self.durations = []  # Proposal → scheduled, in seconds
+        channel.on(MSG_REKEY_ACK, self._on_ack)
+
+    def start(self):
+        thread = threading.Thread(target=self._run, name="sender-rekey", daemon=True)
+        thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.tick()
+
+    def tick(self, keypair=None):
+        """One rekey period: abort proposals left unanswered, then propose again"""
+        self._abort_stale()
+        self.initiate(keypair)
+
+    def initiate(self, keypair=None):
+        """
+        Propose a new key taking effect `lead` epochs from now
+
+        Args:
+            keypair: (private_key, public_bytes) already taken from the pool;
+                taken here, waiting for one if need be, when None
+        """
+        effective = self.counter_fn() + self.lead
+        private_key, public_bytes = keypair or self.pool.take()
+        self.pending[effective] = (private_key, time.perf_counter())
+        self.channel.send(MSG_REKEY, REKEY_STRUCT.pack(effective, public_bytes))
+        # Some time in epoch effective - 1: late enough for any answer, early enough to abort
+        self.call_later((self.lead - 1) * self.epoch_length, self._expire, effective)
+        print(f"[REKEY] Proposed new key for counter {effective}")
+        return effective
+
+    def abandon(self):
+        """Forget proposals in flight - a resync settles which ones the ENDPOINT kept"""
+        self.pending.clear()
+
+    def _abort_stale(self):
+        counter = self.counter_fn()
+        for effective in list(self.pending):
+            if counter >= effective - 1:
+                self._expire(effective)
+
+    def _expire(self, effective):
+        """Abort the proposal for `effective` if it is still unanswered"""
+        if self.pending.pop(effective, None) is not None:
+            self.channel.send(MSG_REKEY_ABORT, ABORT_STRUCT.pack(effective))
+            print(f"[REKEY] No answer for counter {effective} - aborted")
+
+    def _on_ack(self, payload):
+        effective, peer_public_bytes = REKEY_STRUCT.unpack(payload)
+        entry = self.pending.pop(effective, None)
+        if entry is None:
+            return
+        private_key, sent_at = entry
+
+        if self.counter_fn() >= effective:
+            # Too late to cut over cleanly - keep the old key on both sides
+            self.channel.send(MSG_REKEY_ABORT, ABORT_STRUCT.pack(effective))
+            print(f"[REKEY] Late answer for counter {effective} - aborted")
+            return
+
+        shared_secret = private_key.exchange(X25519PublicKey.from_public_bytes(peer_public_bytes))
+        new_key = derive_next_key(self.schedule.key_for(effective - 1), shared_secret)
+        self.schedule.schedule(effective, new_key)
+        self.channel.send(MSG_REKEY_CONFIRM, ABORT_STRUCT.pack(effective))
+
+        duration = time.perf_counter() - sent_at
+        self.durations.append(duration)
+        print(f"[REKEY] New key scheduled for counter {effective} ({duration * 1000:.2f} ms)")
+
+
+class EndpointRekeyer:
+    """Answers rekey proposals from the SENDER, and switches keys once it confirms"""
+
+    def __init__(self, channel, schedule, counter_fn):
+        """
+        Args:
+            channel: ControlChannel to the SENDER
+            schedule: KeySchedule shared with the EpochWindow
+            counter_fn: callable returning the ENDPOINT's current counter
+        """
+        self.channel = channel
+        self.schedule = schedule
+        self.counter_fn = counter_fn
+        self.pool = KeypairPool()
+        self.derived = {}  # effective counter -> key, answered but not yet confirmed
+        channel.on(MSG_REKEY, self._on_rekey)
+        channel.on(MSG_REKEY_CONFIRM, self._on_confirm)
+        channel.on(MSG_REKEY_ABORT, self._on_abort)
+
+    def _on_rekey(self, payload):
+        effective, peer_public_bytes = REKEY_STRUCT.unpack(payload)
+        counter = self.counter_fn()
+        if effective <= counter:
+            # Would rekey an epoch already being typed in; the SENDER aborts it unanswered
+            print(f"[REKEY] Rejected key for counter {effective} (local counter={counter})")
+            return
+        private_key, public_bytes = self.pool.take()
+
+        shared_secret = private_key.exchange(X25519PublicKey.from_public_bytes(peer_public_bytes))
+        # Answers the SENDER never confirmed or aborted (lost with the link) are dropped here
+        self.derived = {start: key for start, key in self.derived.items() if start > counter}
+        self.derived[effective] = derive_next_key(self.schedule.key_for(effective - 1), shared_secret)
+
+        self.channel.send(MSG_REKEY_ACK, REKEY_STRUCT.pack(effective, public_bytes))
+        print(f"[REKEY] New key derived for counter {effective}, waiting for the SENDER")
+
+    def _on_confirm(self, payload):
+        (effective,) = ABORT_STRUCT.unpack(payload)
+        new_key = self.derived.pop(effective, None)
+        if new_key is None:
+            return
+        self.schedule.schedule(effective, new_key)
+        print(f"[REKEY] New key scheduled for counter {effective}")
+
+    def _on_abort(self, payload):
+        (effective,) = ABORT_STRUCT.unpack(payload)
+        self.derived.pop(effective, None)
+        self.schedule.cancel(effective)
+        print(f"[REKEY] SENDER aborted key for counter {effective}")
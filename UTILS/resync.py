@@ -0,0 +1,183 @@
+"""Clock, epoch and key schedule resync after the serial link comes back"""
+import hashlib
+import hmac
+import struct
+import threading
+import time
+from UTILS import spans
+from UTILS.link import MSG_RESYNC, MSG_RESYNC_ACK
+
+MAX_SYNC_RTT = 0.1  # Round trips slower than this don't update the clock correction
+
+# <SENDER time:8><SENDER counter:8><entry count:1>, then the entries
+RESYNC_STRUCT = struct.Struct(">dqB")
+# <echoed SENDER time:8><ENDPOINT time:8><ENDPOINT counter:8><entry count:1>, then the entries
+RESYNC_ACK_STRUCT = struct.Struct(">ddqB")
+# <start counter:8><key fingerprint:8> per KeySchedule switch
+ENTRY_STRUCT = struct.Struct(">q8s")
+FIRST_START = -(2 ** 63)  # Wire value for the initial key, in force since -inf
+
+
+def key_fingerprint(key):
+    """Short tag that tells whether both sides hold the same key, without revealing it"""
+    return hmac.new(key, b"key-fingerprint", hashlib.sha256).digest()[:8]
+
+
+def pack_entries(schedule):
+    """(entry count, packed entries) of our schedule"""
+    entries = schedule.entries()
+    return len(entries), b"".join(
+        ENTRY_STRUCT.pack(FIRST_START if start == float("-inf") else start, key_fingerprint(key))
+        for start, key in entries
+    )
+
+
+def complete(payload, struct_, count_index=-1):
+    """Whether `payload` holds the header `struct_` and every entry it counts"""
+    if len(payload) < struct_.size:
+        return False
+    count = struct_.unpack_from(payload)[count_index]
+    return len(payload) >= struct_.size + count * ENTRY_STRUCT.size
+
+
+def unpack_entries(payload, offset, count):
+    """{start counter: fingerprint} of the peer's schedule"""
+    return dict(ENTRY_STRUCT.iter_unpack(payload[offset:offset + count * ENTRY_STRUCT.size]))
+
+
+def reconcile(schedule, peer_entries):
+    """
+    Drop switches the peer does not have, e.g. a rekey whose ACK or ABORT
+    was lost with the link, and report keys that differ.
+
+    Returns:
+        Start counters whose key differs from the peer's
+    """
+    oldest = min(peer_entries) if peer_entries else FIRST_START
+    diverged = []
+    for start, key in schedule.entries():
+        wire_start = FIRST_START if start == float("-inf") else start
+        fingerprint = peer_entries.get(wire_start)
+        if fingerprint is None:
+            # Older than anything the peer kept: superseded on both sides anyway
+            if wire_start > oldest:
+                schedule.cancel(start)
+                print(f"[RESYNC] Dropped key for counter {start} - the peer never scheduled it")
+        elif not hmac.compare_digest(fingerprint, key_fingerprint(key)):
+            diverged.append(start)
+    if diverged:
+        print(f"[RESYNC] Key differs from the peer's from counter {diverged[0]} - "
+              "restart both sides to rerun the key exchange")
+    return diverged
+
+
+class DriftClock:
+    """Local wall clock plus the drift correction measured by resyncs"""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self.correction = 0.0
+
+    def now(self):
+        return self.clock() + self.correction
+
+
+class SenderResync:
+    """Drives a resync from the SENDER whenever either side's port comes back"""
+
+    def __init__(self, channel, schedule, counter_fn, clock, rekeyer=None):
+        """
+        Args:
+            channel: ControlChannel to the ENDPOINT
+            schedule: KeySchedule shared with the keymap rotation
+            counter_fn: callable returning the SENDER's current counter
+            clock: DriftClock the scrambler and counter_fn read
+            rekeyer: SenderRekeyer whose proposals in flight a resync settles
+        """
+        self.channel = channel
+        self.schedule = schedule
+        self.counter_fn = counter_fn
+        self.clock = clock
+        self.rekeyer = rekeyer
+        self.baseline = None  # ENDPOINT minus SENDER clock at the first resync
+        self.recoveries = []  # Link loss detected → resync answered, in seconds
+        self.synced = threading.Event()  # Set on every answered resync
+        channel.on(MSG_RESYNC, self._on_request)
+        channel.on(MSG_RESYNC_ACK, self._on_ack)
+        channel.on_reconnect(self.request)
+
+    def request(self):
+        """Send our clock, counter and key schedule; the first call sets the clock baseline"""
+        if self.rekeyer is not None and self.rekeyer.pending:
+            self.rekeyer.abandon()
+        count, entries = pack_entries(self.schedule)
+        header = RESYNC_STRUCT.pack(self.clock.clock(), self.counter_fn(), count)
+        self.channel.send(MSG_RESYNC, header + entries)
+
+    def _on_request(self, payload):
+        """The ENDPOINT reopened its port and asks us to resync"""
+        self.request()
+
+    def _on_ack(self, payload):
+        received = self.clock.clock()
+        if not complete(payload, RESYNC_ACK_STRUCT):
+            print(f"[RESYNC] Ignored a truncated answer ({len(payload)} bytes)")
+            return
+        sent, endpoint_time, endpoint_counter, count = RESYNC_ACK_STRUCT.unpack_from(payload)
+        reconcile(self.schedule, unpack_entries(payload, RESYNC_ACK_STRUCT.size, count))
+
+        # Keep the offset the session started with: only undo drift since then
+        rtt = received - sent
+        if rtt <= MAX_SYNC_RTT:
+            offset = endpoint_time - (sent + received) / 2
+            if self.baseline is None:
+                self.baseline = offset
+            self.clock.correction = offset - self.baseline
+            spans.set_peer_offset(offset)
+
+        counter = self.counter_fn()
+        if abs(counter - endpoint_counter) > 1:
+            print(f"[RESYNC] Epochs apart: SENDER {counter}, ENDPOINT {endpoint_counter}")
+
+        if self.channel.lost_at is not None and self.channel.connected:
+            recovery = time.perf_counter() - self.channel.lost_at
+            self.channel.lost_at = None
+            self.recoveries.append(recovery)
+            print(f"[RESYNC] Recovered in {recovery * 1000:.0f} ms "
+                  f"(clock correction {self.clock.correction * 1000:+.1f} ms, rtt {rtt * 1000:.1f} ms)")
+        self.synced.set()
+
+
+class EndpointResync:
+    """Answers resyncs, and asks for one whenever our port comes back"""
+
+    def __init__(self, channel, schedule, counter_fn, clock=time.time):
+        """
+        Args:
+            channel: ControlChannel to the SENDER
+            schedule: KeySchedule shared with the EpochWindow
+            counter_fn: callable returning the ENDPOINT's current counter
+        """
+        self.channel = channel
+        self.schedule = schedule
+        self.counter_fn = counter_fn
+        self.clock = clock
+        channel.on(MSG_RESYNC, self._on_resync)
+        channel.on_reconnect(self.request)
+
+    def request(self):
+        self.channel.send(MSG_RESYNC, b"")
+
+    def _on_resync(self, payload):
+        if not payload:
+            # The SENDER asks us to ask: its side came back first
+            self.request()
+            return
+        if not complete(payload, RESYNC_STRUCT):
+            print(f"[RESYNC] Ignored a truncated resync ({len(payload)} bytes)")
+            return
+        sender_time, sender_counter, count = RESYNC_STRUCT.unpack_from(payload)
+        reconcile(self.schedule, unpack_entries(payload, RESYNC_STRUCT.size, count))
+        count, entries = pack_entries(self.schedule)
+        header = RESYNC_ACK_STRUCT.pack(sender_time, self.clock(), self.counter_fn(), count)
+        self.channel.send(MSG_RESYNC_ACK, header + entries)
@@ -0,0 +1,83 @@
+"""AEAD-sealed keystroke frames - an alternative to the scrambled HID path"""
+import struct
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# One key event on the wire: evdev keycode + value (0=up, 1=down, 2=hold)
+EVENT_STRUCT = struct.Struct(">HB")
+SEQ_STRUCT = struct.Struct(">Q")
+
+# Nonce = <direction:4><seq:8>. Each direction gets its own prefix so the
+# two sides can never reuse a nonce under the shared key.
+DIRECTION_SENDER = b"SND\x00"
+DIRECTION_ENDPOINT = b"END\x00"
+
+
+def derive_data_key(symmetric_key: bytes) -> bytes:
+    """Separate key for the data plane so it never touches the keymap seeds"""
+    kdf = HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b"serial-data-plane",
+    )
+    return kdf.derive(symmetric_key)
+
+
+def pack_events(events) -> bytes:
+    """Pack (keycode, value) pairs into wire format"""
+    return b"".join(EVENT_STRUCT.pack(code, value) for code, value in events)
+
+
+def unpack_events(data: bytes):
+    """Unpack wire format back into a list of (keycode, value) pairs"""
+    return list(EVENT_STRUCT.iter_unpack(data))
+
+
+class FrameSealer:
+    def __init__(self, symmetric_key, direction=DIRECTION_SENDER):
+        self.aead = ChaCha20Poly1305(derive_data_key(symmetric_key))
+        self.direction = direction
+        self.seq = 0
+
+    def seal(self, events) -> bytes:
+        """Encrypt a batch of key events into one frame: <seq:8><ciphertext>"""
+        self.seq += 1
+        header = SEQ_STRUCT.pack(self.seq)
+        ciphertext = self.aead.encrypt(self.direction + header, pack_events(events), header)
+        return header + ciphertext
+
+
+class FrameOpener:
+    def __init__(self, symmetric_key, direction=DIRECTION_SENDER):
+        self.aead = ChaCha20Poly1305(derive_data_key(symmetric_key))
+        self.direction = direction
+        self.last_seq = 0
+
+    def open(self, frame: bytes):
+        """
+        Authenticate and decrypt a frame.
+
+        Returns:
+            List of (keycode, value) pairs
+
+        Raises:
+            ValueError: frame is forged, corrupted or replayed
+        """
+        if len(frame) < SEQ_STRUCT.size:
+            raise ValueError("Frame too short")
+
+        header = frame[:SEQ_STRUCT.size]
+        (seq,) = SEQ_STRUCT.unpack(header)
+        if seq <= self.last_seq:
+            raise ValueError(f"Replayed frame (seq={seq}, last={self.last_seq})")
+
+        try:
+            plaintext = self.aead.decrypt(self.direction + header, frame[SEQ_STRUCT.size:], header)
+        except InvalidTag:
+            raise ValueError(f"Frame failed authentication (seq={seq})")
+
+        self.last_seq = seq
+        return unpack_events(plaintext)
@@ -0,0 +1,60 @@
+"""Seed derivation shared by SENDER and ENDPOINT: HMAC-SHA256(key, counter)"""
+import struct
+from hashlib import sha256
+
+COUNTER_STRUCT = struct.Struct(">Q")
+BLOCK_SIZE = 64  # SHA-256 block size
+_IPAD = bytes(x ^ 0x36 for x in range(256))
+_OPAD = bytes(x ^ 0x5C for x in range(256))
+
+
+class SeedDeriver:
+    """
+    HMAC-SHA256 keyed once per session.
+
+    The inner and outer pads are absorbed up front (RFC 2104), so each seed
+    only copies two hash states and hashes 8 counter bytes plus one digest.
+    Output is identical to hmac.new(key, counter_bytes, sha256).digest().
+    """
+
+    def __init__(self, symmetric_key: bytes):
+        self.symmetric_key = symmetric_key
+        key = symmetric_key
+        if len(key) > BLOCK_SIZE:
+            key = sha256(key).digest()
+        key = key.ljust(BLOCK_SIZE, b"\x00")
+        self._inner = sha256(key.translate(_IPAD))
+        self._outer = sha256(key.translate(_OPAD))
+
+    def seed(self, counter: int) -> bytes:
+        """Seed for one epoch counter"""
+        inner = self._inner.copy()
+        inner.update(COUNTER_STRUCT.pack(counter))
+        outer = self._outer.copy()
+        outer.update(inner.digest())
+        return outer.digest()
+
+    def seeds_for_range(self, start: int, count: int) -> list:
+        """Seeds for counters start .. start + count - 1, in order"""
+        inner_copy = self._inner.copy
+        outer_copy = self._outer.copy
+        pack = COUNTER_STRUCT.pack
+        seeds = []
+        append = seeds.append
+        for counter in range(start, start + count):
+            inner = inner_copy()
+            inner.update(pack(counter))
+            outer = outer_copy()
+            outer.update(inner.digest())
+            append(outer.digest())
+        return seeds
+
+
+def generate_seed(symmetric_key: bytes, counter: int) -> bytes:
+    """gen a seed every interval seconds"""
+    return SeedDeriver(symmetric_key).seed(counter)
+
+
+def seeds_for_range(symmetric_key: bytes, start: int, count: int) -> list:
+    """Seeds for a run of consecutive counters under one key"""
+    return SeedDeriver(symmetric_key).seeds_for_range(start, count)
@@ -0,0 +1,258 @@
+"""
+Per-keystroke spans as Chrome trace-event JSON, merged across both devices
+
+With --spans FILE, a SpanRecorder keeps the last BUFFER spans in memory:
+every key's pipeline stages (read, classify, map, then the HID or uinput
+write, see UTILS.pipeline), keymap rotations and control messages. It is
+written to FILE on SIGUSR2 and at exit, for chrome://tracing or
+ui.perfetto.dev. Spans are taken on time.monotonic(), the clock of the
+kernel's key event stamps, and written on the wall clock; the SENDER's
+file also carries the ENDPOINT-minus-SENDER clock offset its resync
+measured right after the handshake. merge() puts both files on the
+ENDPOINT's clock and links each SENDER keystroke to the ENDPOINT
+keystroke it became, by the key that crossed the wire. While nothing
+records, span() and message() hand back one shared no-op context.
+"""
+import atexit
+import collections
+import contextlib
+import json
+import os
+import signal
+import threading
+import time
+from UTILS import link
+from UTILS.pipeline import RELEASE, PASS_THROUGH, MAPPED, MARKER
+
+BUFFER = 200_000  # Spans kept; the oldest are dropped first
+LINK_WINDOW = 0.5  # Seconds from a SENDER write to the ENDPOINT reading what it wrote
+LINK_SLACK = 0.005  # Seconds an ENDPOINT read may seem to come first: clock offset error
+PIDS = {"SENDER": 1, "ENDPOINT": 2}
+WRITE_SPANS = {"SENDER": "HID write", "ENDPOINT": "uinput write"}
+KIND_NAMES = {RELEASE: "release", PASS_THROUGH: "pass-through", MAPPED: "mapped", MARKER: "marker"}
+MESSAGE_NAMES = {value: name[4:].lower() for name, value in vars(link).items() if name.startswith("MSG_")}
+
+recorder = None  # The SpanRecorder enable() started, if any
+_NO_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    __slots__ = ('recorder', 'name', 'category', 'args', 'start')
+
+    def __init__(self, recorder, name, category, args):
+        self.recorder = recorder
+        self.name = name
+        self.category = category
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        return self
+
+    def __exit__(self, *exc):
+        self.recorder.add(self.name, self.category, self.start, time.monotonic(), self.args)
+        return False
+
+
+class SpanRecorder:
+    """
+    Bounded buffer of spans, and a pipeline observer that fills it.
+
+    Spans are appended from any thread (deque appends are atomic); the
+    stage hooks keep per-key state and run on the main loop only.
+    """
+
+    def __init__(self, device, capacity=BUFFER):
+        """
+        Args:
+            device: "SENDER" or "ENDPOINT", the process in the trace
+        """
+        self.device = device
+        self.spans = collections.deque(maxlen=capacity)
+        self.added = 0
+        self.peer_offset = None  # Peer minus our wall clock, seconds; set by the SENDER's resync
+        self.keystrokes = 0
+        self.write_span = WRITE_SPANS.get(device, "write")
+        # What crossed the wire: the scrambled key the SENDER wrote, the one the ENDPOINT read
+        self.sends = device == "SENDER"
+        self.read_at = self.classified_at = self.mapped_at = 0.0
+
+    def add(self, name, category, start, end, args=None):
+        """One span, both ends on time.monotonic()"""
+        self.spans.append((name, category, start, end, threading.get_ident(), args))
+        self.added += 1
+
+    def after_read(self, record, kind, output):
+        now = self.read_at = time.monotonic()
+        # Kernel stamp → userspace has it (no span if the kernel stamped wall time)
+        if 0 < record.time <= now:
+            self.add("read", "key", record.time, now, {'key': record.key})
+
+    def after_classify(self, record, kind, output):
+        now = self.classified_at = time.monotonic()
+        self.add("classify", "key", self.read_at, now, {'kind': KIND_NAMES[kind]})
+
+    def after_map(self, record, kind, output):
+        now = self.mapped_at = time.monotonic()
+        self.add("map", "key", self.classified_at, now)
+
+    def after_emit(self, record, kind, output):
+        now = time.monotonic()
+        self.add(self.write_span, "key", self.mapped_at, now)
+        if kind != RELEASE:
+            # The whole press, kernel stamp to write; merge() links the two devices' by wire key
+            self.keystrokes += 1
+            start = record.time if 0 < record.time <= now else self.read_at
+            self.add("keystroke", "keystroke", start, now,
+                     {'key': record.key, 'kind': KIND_NAMES[kind], 'seq': self.keystrokes,
+                      'wire': output[4] if self.sends else record.key})
+
+    def trace(self):
+        """The buffer as a Chrome trace-event document"""
+        spans = list(self.spans)  # One C-level copy: safe against appends from other threads
+        offset = time.time() - time.monotonic()
+        pid = PIDS.get(self.device, 0)
+        threads = {thread.ident: thread.name for thread in threading.enumerate()}
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': self.device}}]
+        events += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                    'args': {'name': threads.get(tid, str(tid))}}
+                   for tid in {span[4] for span in spans}]
+        for name, category, start, end, tid, args in spans:
+            event = {'name': name, 'cat': category, 'ph': 'X', 'pid': pid, 'tid': tid,
+                     'ts': round((start + offset) * 1e6, 3), 'dur': round((end - start) * 1e6, 3)}
+            if args:
+                event['args'] = args
+            events.append(event)
+        return {
+            'traceEvents': events,
+            'displayTimeUnit': 'ms',
+            'otherData': {'device': self.device, 'peer_offset': self.peer_offset,
+                          'dropped': self.added - len(spans)},
+        }
+
+    def dump(self, path):
+        """Write trace() to `path`, replacing it whole"""
+        trace = self.trace()
+        with open(f"{path}.tmp", 'w') as f:
+            json.dump(trace, f)
+        os.replace(f"{path}.tmp", path)
+        print(f"[SPANS] {len(trace['traceEvents'])} trace events written to {path}")
+
+
+def enable(device, path, capacity=BUFFER):
+    """
+    Start recording spans, written to `path` on SIGUSR2 and at exit.
+
+    Returns:
+        The SpanRecorder, to pass to main() as a pipeline observer
+    """
+    global recorder
+    recorder = SpanRecorder(device, capacity)
+    atexit.register(recorder.dump, path)
+    try:
+        signal.signal(signal.SIGUSR2, lambda signum, frame: recorder.dump(path))
+    except ValueError:
+        pass  # Not the main thread: dumped at exit only
+    print(f"[SPANS] Recording spans, written to {path} on SIGUSR2 (kill -USR2 {os.getpid()}) and at exit")
+    return recorder
+
+
+def span(name, category, **args):
+    """Context manager recording the block it wraps; a no-op while nothing records"""
+    if recorder is None:
+        return _NO_SPAN
+    return _Span(recorder, name, category, args or None)
+
+
+def message(direction, msg_type):
+    """span() of sending ("send") or handling ("recv") one control message"""
+    if recorder is None:
+        return _NO_SPAN
+    return _Span(recorder, f"{direction} {MESSAGE_NAMES.get(msg_type, hex(msg_type))}", "control", None)
+
+
+def set_peer_offset(seconds):
+    """Peer minus local wall clock, for merge(); measured by the SENDER's resync"""
+    if recorder is not None:
+        recorder.peer_offset = seconds
+
+
+def merge(sender_trace, endpoint_trace):
+    """
+    One timeline from both devices' trace() documents.
+
+    SENDER events move onto the ENDPOINT's clock by the SENDER's
+    peer_offset, and each SENDER keystroke gets a flow arrow to the first
+    ENDPOINT keystroke after it, within LINK_WINDOW, of the same wire key.
+    Keystrokes either side dropped (cadence or plausibility blocks, a full
+    queue, a link loss) stay unlinked and are counted, instead of shifting
+    every later pair.
+    """
+    shift = (sender_trace['otherData'].get('peer_offset') or 0.0) * 1e6
+    events = [dict(event, ts=event['ts'] + shift) if 'ts' in event else event
+              for event in sender_trace['traceEvents']]
+    events += endpoint_trace['traceEvents']
+
+    def keystrokes(trace_events):
+        return sorted((event for event in trace_events if event['name'] == 'keystroke' and event['ph'] == 'X'),
+                      key=lambda event: event['ts'])
+
+    sent = keystrokes(events[:len(sender_trace['traceEvents'])])
+    received = keystrokes(endpoint_trace['traceEvents'])
+    links = link_keystrokes(sent, received)
+    for start, end in links:
+        seq = start['args']['seq']
+        events.append({'name': 'keystroke', 'cat': 'keystroke', 'ph': 's', 'id': seq,
+                       'pid': start['pid'], 'tid': start['tid'], 'ts': start['ts'] + start['dur']})
+        events.append({'name': 'keystroke', 'cat': 'keystroke', 'ph': 'f', 'bp': 'e', 'id': seq,
+                       'pid': end['pid'], 'tid': end['tid'], 'ts': end['ts']})
+    return {
+        'traceEvents': events,
+        'displayTimeUnit': 'ms',
+        'otherData': {'clock': 'ENDPOINT', 'sender_shift_us': shift,
+                      'unlinked': {'SENDER': len(sent) - len(links), 'ENDPOINT': len(received) - len(links)},
+                      'dropped': {'SENDER': sender_trace['otherData'].get('dropped', 0),
+                                  'ENDPOINT': endpoint_trace['otherData'].get('dropped', 0)}},
+    }
+
+
+def link_keystrokes(sent, received):
+    """
+    (SENDER keystroke, ENDPOINT keystroke) pairs, both lists in time order:
+    each SENDER one takes the first unclaimed ENDPOINT one with its wire
+    key in [written - LINK_SLACK, written + LINK_WINDOW]. Pairs never cross.
+    """
+    links = []
+    first = 0  # ENDPOINT keystrokes before this are linked or too early for any later SENDER one
+    for start in sent:
+        written = start['ts'] + start['dur']
+        while first < len(received) and received[first]['ts'] < written - LINK_SLACK * 1e6:
+            first += 1
+        for index in range(first, len(received)):
+            end = received[index]
+            if end['ts'] > written + LINK_WINDOW * 1e6:
+                break
+            if end['args'].get('wire') == start['args'].get('wire'):
+                links.append((start, end))
+                first = index + 1
+                break
+    return links
+
+
+def merge_files(sender_path, endpoint_path, out_path):
+    """merge() two dump() files into `out_path`"""
+    with open(sender_path) as f:
+        sender_trace = json.load(f)
+    with open(endpoint_path) as f:
+        endpoint_trace = json.load(f)
+    merged = merge(sender_trace, endpoint_trace)
+    with open(out_path, 'w') as f:
+        json.dump(merged, f)
+    flows = sum(1 for event in merged['traceEvents'] if event.get('ph') == 's')
+    if sender_trace['otherData'].get('peer_offset') is None:
+        print("[SPANS] The SENDER trace has no clock offset (no resync answered) - timelines not aligned")
+    unlinked = merged['otherData']['unlinked']
+    if unlinked['SENDER'] or unlinked['ENDPOINT']:
+        print(f"[SPANS] Unlinked keystrokes: {unlinked['SENDER']} SENDER (never decoded), "
+              f"{unlinked['ENDPOINT']} ENDPOINT (not from this SENDER's trace)")
+    print(f"[SPANS] {flows} keystrokes linked across devices, written to {out_path}")
@@ -0,0 +1,79 @@
+"""Startup milestones from process start to the first forwarded keystroke"""
+import os
+import threading
+import time
+
+
+def _process_age():
+    """Seconds since this process was exec'd, interpreter startup included"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 (starttime) in clock ticks since boot; skip past "(comm)"
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        return system_uptime() - start_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+def system_uptime():
+    """Seconds since the OS booted"""
+    with open("/proc/uptime") as f:
+        return float(f.read().split()[0])
+
+
+# perf_counter() value at process start
+_origin = time.perf_counter() - _process_age()
+_milestones = [("interpreter", time.perf_counter() - _origin)]
+_reported = False
+
+
+def mark(name):
+    """Record that startup reached `name`"""
+    _milestones.append((name, time.perf_counter() - _origin))
+
+
+def preload(*modules):
+    """
+    Import modules on a background thread.
+
+    Used to pull in heavy packages (evdev, cryptography) while the main
+    thread is blocked on the key exchange. The import lock makes a later
+    import of the same module on the main thread wait for this one.
+    """
+    def _run():
+        for module in modules:
+            try:
+                __import__(module)
+            except ImportError as e:
+                print(f"[STARTUP] Preload of {module} failed: {e}")
+    thread = threading.Thread(target=_run, name="preload", daemon=True)
+    thread.start()
+    return thread
+
+
+def summary():
+    """Milestones as (name, seconds since the previous one), plus totals"""
+    steps = []
+    previous = 0.0
+    for name, at in _milestones:
+        steps.append((name, at - previous))
+        previous = at
+    return {
+        'steps': steps,
+        'process_to_last': previous,
+        'uptime': system_uptime(),
+    }
+
+
+def first_keystroke(name):
+    """Mark and print the startup timeline once, on the first forwarded key"""
+    global _reported
+    if _reported:
+        return
+    _reported = True
+    mark("first keystroke")
+    report = summary()
+    steps = ", ".join(f"{step} {seconds * 1000:.0f} ms" for step, seconds in report['steps'])
+    print(f"[{name}] Startup: {steps}")
+    print(f"[{name}] Process start → first keystroke: {report['process_to_last']:.3f} s, "
+          f"boot → first keystroke: {report['uptime']:.2f} s")
@@ -0,0 +1,121 @@
+"""Static key tables, flattened once and loaded from a marshal cache at startup"""
+import importlib.util
+import marshal
+import os
+import sys
+
+CACHE_VERSION = 1
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.expanduser("~/.cache"), "omg-mitigation"
+)
+
+_loaded = {}
+
+
+def _build_hid():
+    """HID usage per key name, as `from hidpi.keyboard_keys import *` would give"""
+    from hidpi import keyboard_keys
+    return {
+        'hid_codes': {
+            name: value for name, value in vars(keyboard_keys).items()
+            if not name.startswith('_') and isinstance(value, int)
+        },
+    }
+
+
+def _build_evdev():
+    """Key names and codes from evdev.ecodes"""
+    from evdev import ecodes
+    return {
+        'key_names': dict(ecodes.keys),  # code -> name, or tuple of aliases
+        'key_codes': {
+            name: value for name, value in vars(ecodes).items()
+            if name.startswith(('KEY_', 'BTN_')) and isinstance(value, int)
+        },
+    }
+
+
+def _build_ngram():
+    """Trigram cost table trained on stdlib docstrings"""
+    from ENDPOINT import plausibility
+    return plausibility.build_tables(plausibility.stdlib_corpus())
+
+
+# section -> (module the tables come from, builder)
+SECTIONS = {
+    'hid': ('hidpi', _build_hid),
+    'evdev': ('evdev', _build_evdev),
+    'ngram': ('ENDPOINT.plausibility', _build_ngram),
+}
+
+
+def _source(section):
+    """(package, builder) of a section; layout-<id> sections are built by UTILS.layouts"""
+    if section.startswith('layout-'):
+        from UTILS import layouts
+        return 'UTILS.layouts', lambda: layouts.build(section[len('layout-'):])
+    return SECTIONS[section]
+
+
+def _stamp(package):
+    """Identifies the installed package without importing it"""
+    spec = importlib.util.find_spec(package)
+    origin = spec.origin if spec and spec.origin else ""
+    try:
+        mtime = os.stat(origin).st_mtime_ns
+    except OSError:
+        mtime = 0
+    return (CACHE_VERSION, sys.version, origin, mtime)
+
+
+def cache_path(section):
+    return os.path.join(CACHE_DIR, f"{section}-v{CACHE_VERSION}.marshal")
+
+
+def rebuild(section):
+    """Import the source package, flatten its tables and write the cache"""
+    package, builder = _source(section)
+    tables = builder()
+    path = cache_path(section)
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(marshal.dumps({'stamp': _stamp(package), 'tables': tables}))
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"[TABLES] Could not write cache {path}: {e}")
+    _loaded[section] = tables
+    return tables
+
+
+def load(section):
+    """
+    Tables for `section`, from the cache when it matches the installed package.
+
+    Falls back to importing the package (and refreshing the cache) when the
+    cache is missing, stale or unreadable.
+    """
+    tables = _loaded.get(section)
+    if tables is not None:
+        return tables
+
+    package, _ = _source(section)
+    try:
+        with open(cache_path(section), "rb") as f:
+            cached = marshal.loads(f.read())
+        if cached['stamp'] == _stamp(package):
+            _loaded[section] = cached['tables']
+            return cached['tables']
+    except (OSError, EOFError, ValueError, TypeError, KeyError):
+        pass
+    return rebuild(section)
+
+
+if __name__ == "__main__":
+    for name in SECTIONS:
+        try:
+            rebuild(name)
+            print(f"[TABLES] {name}: {cache_path(name)}")
+        except ImportError as e:
+            print(f"[TABLES] {name}: skipped ({e})")
@@ -0,0 +1,238 @@
+"""Binary key event traces: recorded by the readers, memory-mapped for replay"""
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"OMGTRACE"
+VERSION = 1
+EV_KEY = 1  # evdev.ecodes.EV_KEY, without importing evdev to read a trace
+MAX_DEVICES = 32  # Device slots in the header, filled as keyboards attach
+NAME_SIZE = 64
+FLUSH_INTERVAL = 0.5  # Seconds of events buffered before they reach the file
+
+# magic, version, device count, realtime minus monotonic at start, wall time at start
+HEADER = struct.Struct("<8sHHdd")
+# fd while recorded, name (utf-8, NUL padded)
+DEVICE = struct.Struct(f"<i{NAME_SIZE}s")
+# kernel time (time.monotonic() clock), device slot, type, code, value
+RECORD = struct.Struct("<dHHHxxi")
+RECORDS_AT = HEADER.size + MAX_DEVICES * DEVICE.size
+
+# Rekeys land in a sidecar next to the trace: the keys to decode it once the first one is in force
+KEYS_SUFFIX = ".keys"
+SCHEDULED, CANCELLED = b"S", b"C"
+SESSION_SIZE = 16
+# SCHEDULED or CANCELLED, start counter, key (zeros when cancelled), session (utf-8, NUL padded)
+KEY_ENTRY = struct.Struct(f"<cq32s{SESSION_SIZE}s")
+
+
+class TraceEvent:
+    """Replayed evdev event: what the readers use of evdev.InputEvent"""
+
+    __slots__ = ('type', 'code', 'value', 'time')
+
+    def __init__(self, type, code, value, time):
+        self.type = type
+        self.code = code
+        self.value = value
+        self.time = time
+
+    def timestamp(self):
+        return self.time
+
+
+class TraceDevice:
+    """Replayed keyboard: what the readers use of evdev.InputDevice"""
+
+    def __init__(self, fd, name):
+        self.fd = fd
+        self.name = name
+        self.path = f"trace:{name}"
+
+    def read(self):
+        return ()
+
+
+class KeyLog:
+    """
+    One session's key switches (see UTILS.rekey.KeySchedule), appended to
+    a trace's KEYS_SUFFIX sidecar as they happen
+    """
+
+    def __init__(self, fd, session):
+        self.fd = fd
+        self.session = session.encode()[:SESSION_SIZE]
+
+    def scheduled(self, start, key):
+        os.write(self.fd, KEY_ENTRY.pack(SCHEDULED, start, key, self.session))
+
+    def cancelled(self, start):
+        os.write(self.fd, KEY_ENTRY.pack(CANCELLED, start, bytes(32), self.session))
+
+
+class TraceWriter:
+    """
+    Appends every EV_KEY event a reader reads to a trace file: 20 bytes a
+    record, buffered, flushed every FLUSH_INTERVAL of input.
+
+    Only the reader's polling thread writes, so there is no locking.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # Every keystroke typed, passwords included: readable by the owner only
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        self.file = os.fdopen(fd, 'wb', buffering=1 << 16)
+        self.slots = {}  # fd -> device slot
+        self.names = {}  # fd -> device name
+        self.devices = 0  # Slots used, including those of fds since reused
+        self.file.write(HEADER.pack(MAGIC, VERSION, 0, time.time() - time.monotonic(), time.time()))
+        self.file.write(bytes(MAX_DEVICES * DEVICE.size))
+        self.flushed_at = 0.0
+        self.records = 0
+        self.keys_fd = None
+
+    def add_device(self, fd, name):
+        """Name a device in the header; its events are recorded from now on"""
+        if self.names.get(fd) == name or self.devices >= MAX_DEVICES:
+            return
+        # A new fd, or one reused by a keyboard plugged in since: its own slot either way
+        slot = self.devices
+        self.devices += 1
+        self.slots[fd] = slot
+        self.names[fd] = name
+        self.file.flush()
+        self.file.seek(HEADER.size + slot * DEVICE.size)
+        self.file.write(DEVICE.pack(fd, name.encode()[:NAME_SIZE]))
+        self.file.seek(10)  # Device count
+        self.file.write(struct.pack("<H", self.devices))
+        self.file.seek(0, 2)
+
+    def key_log(self, session):
+        """
+        KeyLog for `session` in the trace's key sidecar. It holds session
+        keys, so it is readable by its owner only.
+        """
+        if self.keys_fd is None:
+            self.keys_fd = os.open(f"{self.path}{KEYS_SUFFIX}", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        return KeyLog(self.keys_fd, session)
+
+    def write(self, fd, events):
+        """Record a batch of evdev events read from one device"""
+        slot = self.slots.get(fd)
+        if slot is None:
+            return
+        write = self.file.write
+        last = self.flushed_at
+        for event in events:
+            if event.type == EV_KEY:
+                last = event.timestamp()
+                write(RECORD.pack(last, slot, EV_KEY, event.code, event.value))
+                self.records += 1
+        if last - self.flushed_at > FLUSH_INTERVAL:
+            self.file.flush()
+            self.flushed_at = last
+
+    def close(self):
+        self.file.close()
+        if self.keys_fd is not None:
+            os.close(self.keys_fd)
+        print(f"[TRACE] {self.records} events recorded to {self.path}")
+
+
+class Trace:
+    """
+    A recorded trace, memory-mapped: records are unpacked straight out of
+    the page cache, so a long recording opens instantly.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, self.clock_offset, self.started = HEADER.unpack_from(self.map)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} key trace")
+        self.devices = []
+        for slot in range(count):
+            fd, name = DEVICE.unpack_from(self.map, HEADER.size + slot * DEVICE.size)
+            self.devices.append(TraceDevice(fd, name.rstrip(b"\0").decode(errors="replace")))
+        # A trace cut off mid-record (power loss) keeps its whole records
+        self.count = (len(self.map) - RECORDS_AT) // RECORD.size
+        self.path = str(path)
+
+    def __len__(self):
+        return self.count
+
+    def span(self):
+        """Seconds between the first and last recorded event"""
+        if not self.count:
+            return 0.0
+        first = RECORD.unpack_from(self.map, RECORDS_AT)[0]
+        last = RECORD.unpack_from(self.map, RECORDS_AT + (self.count - 1) * RECORD.size)[0]
+        return last - first
+
+    def records(self):
+        """(time, slot, type, code, value) of every event, in recorded order"""
+        return RECORD.iter_unpack(memoryview(self.map)[RECORDS_AT:RECORDS_AT + self.count * RECORD.size])
+
+    def batches(self, speed=None, clock=time.monotonic, sleep=time.sleep):
+        """
+        Events grouped as the reader read them: (TraceDevice, [TraceEvent]),
+        one batch per device and kernel timestamp.
+
+        Args:
+            speed: None replays as fast as possible; 1.0 in real time, 2.0 twice as fast
+        """
+        devices = self.devices
+        batch = []
+        batch_key = None
+        first = None
+        started = clock()
+        for when, slot, type, code, value in self.records():
+            if (slot, when) != batch_key:
+                if batch:
+                    yield devices[batch_key[0]], batch
+                    batch = []
+                batch_key = (slot, when)
+                if speed:
+                    if first is None:
+                        first = when
+                    delay = (when - first) / speed - (clock() - started)
+                    if delay > 0:
+                        sleep(delay)
+            batch.append(TraceEvent(type, code, value, when))
+        if batch:
+            yield devices[batch_key[0]], batch
+
+    def key_switches(self, session=None):
+        """
+        (start counter, key) of every rekey `session` kept, oldest first,
+        from the trace's key sidecar; empty if it has none.
+
+        Args:
+            session: the ENDPOINT's port for that SENDER; may be left out if only one rekeyed
+        """
+        try:
+            with open(f"{self.path}{KEYS_SUFFIX}", 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        entries = list(KEY_ENTRY.iter_unpack(data[:len(data) - len(data) % KEY_ENTRY.size]))
+        sessions = {name.rstrip(b"\0").decode(errors="replace") for _, _, _, name in entries}
+        if session is None:
+            if len(sessions) > 1:
+                raise ValueError(f"Keys of several sessions recorded ({', '.join(sorted(sessions))}) - pick one")
+            session = next(iter(sessions), None)
+        keys = {}
+        for op, start, key, name in entries:
+            if name.rstrip(b"\0").decode(errors="replace") != session:
+                continue
+            if op == SCHEDULED:
+                keys[start] = key
+            else:
+                keys.pop(start, None)
+        return sorted(keys.items())
+
+    def close(self):
+        self.map.close()
@@ -11,4 +11,9 @@ setup(
         'pyserial',
         # Add other dependencies from requirements.txt
     ],
+    entry_points={
+        'console_scripts': [
+            'omg-mitigation = UTILS.cli:main',
+        ],
+    },
 )
@@ -28,6 +28,10 @@ source .venv/bin/activate
 
 pip install --upgrade pip
 pip install -r requirements.txt
+pip install -e .
+
+# Precompile the key tables so startup never imports hidpi/evdev just for constants
+python -m UTILS.tables
 
 echo "[5/5] Configuring USB serial for DHE key exchange..."
 
@@ -122,7 +126,7 @@ echo ""
 echo "Next steps:"
 echo "1. Reboot the Pi: sudo reboot"
 echo "2. After reboot, activate venv: source .venv/bin/activate"
-echo "3. Run main.py: python3 main.py"
+echo "3. Start the SENDER: omg-mitigation sender"
 echo ""
 echo "USB HID: Will appear as 'Rikka HIDPi' keyboard"
 echo "USB Serial: /dev/ttyGS0 on Pi, /dev/ttyACM0 on host"
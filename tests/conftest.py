@@ -0,0 +1,51 @@
+"""Stand-ins shared by the tests: a session key, writers and a control channel"""
+from ENDPOINT.main import Decoder, build_decode_table
+from ENDPOINT.epoch_window import EpochWindow
+from UTILS.rekey import KeySchedule
+
+SYM_KEY = bytes(range(32))
+
+
+class NullWriter:
+    """ENDPOINT writer stand-in - no /dev/uinput needed"""
+
+    def press_key(self, keycode, modifier=0):
+        pass
+
+    def release_key(self, keycode, modifier=0):
+        pass
+
+
+class LoopbackChannel:
+    """ControlChannel stand-in that delivers straight to the peer's handlers, minus any type in `lose`"""
+
+    def __init__(self):
+        self.peer = None
+        self.handlers = {}
+        self.lose = set()
+        self.connected = True
+        self.lost_at = None
+
+    def on(self, msg_type, handler):
+        self.handlers[msg_type] = handler
+
+    def on_reconnect(self, handler):
+        pass
+
+    def send(self, msg_type, payload, queue=False):
+        if msg_type not in self.lose:
+            self.peer.handlers[msg_type](payload)
+        return True
+
+
+def loopback_pair():
+    """(SENDER channel, ENDPOINT channel), each delivering to the other"""
+    sender_channel, endpoint_channel = LoopbackChannel(), LoopbackChannel()
+    sender_channel.peer, endpoint_channel.peer = endpoint_channel, sender_channel
+    return sender_channel, endpoint_channel
+
+
+def make_decoder(*observers, writer=None):
+    """ENDPOINT Decoder on SYM_KEY from counter 0, writing to `writer` or nowhere"""
+    window = EpochWindow(KeySchedule(SYM_KEY), table_builder=build_decode_table)
+    return Decoder(window, 0, writer or NullWriter(), observers=observers)
@@ -7,6 +7,7 @@ Run this after collecting timing data from SENDER and ENDPOINT
 
 import json
 import statistics
+import sys
 from collections import defaultdict
 from pathlib import Path
 
@@ -16,7 +17,7 @@ def load_timing_log(log_file='tests/research/results/timing_log.jsonl'):
     
     if not Path(log_file).exists():
         print(f"ERROR: Log file not found: {log_file}")
-        print("Make sure you ran run_sender_timed.py and run_endpoint_timed.py first")
+        print("Make sure you ran both sides with --timing first (omg-mitigation sender --timing)")
         return events
     
     with open(log_file, 'r') as f:
@@ -34,69 +35,71 @@ def load_timing_log(log_file='tests/research/results/timing_log.jsonl'):
     print(f"Loaded {len(events)} timing events")
     return events
 
+# Per-keystroke segments, in pipeline order: (name, label, kind)
+# kind says who to blame: the kernel, Python, or the USB link
+SEGMENTS = (
+    ('sender_kernel_to_user', 'SENDER kernel → userspace', 'kernel'),
+    ('sender_lookup', 'SENDER keymap lookup', 'python'),
+    ('sender_write', 'SENDER HID write', 'kernel'),
+    ('link', 'Link (USB + ENDPOINT kernel)', 'usb'),
+    ('endpoint_kernel_to_user', 'ENDPOINT kernel → userspace', 'kernel'),
+    ('endpoint_lookup', 'ENDPOINT keymap lookup', 'python'),
+    ('endpoint_write', 'ENDPOINT uinput write', 'kernel'),
+)
+
 def group_events_by_key(events):
     """
-    Group events by key presses to match capture → send → receive → inject
+    Pair each SENDER keystroke with the ENDPOINT keystroke it became
     """
-    # Separate by device
-    sender_events = [e for e in events if e['device'] == 'SENDER']
-    endpoint_events = [e for e in events if e['device'] == 'ENDPOINT']
-    
-    print(f"  SENDER events: {len(sender_events)}")
-    print(f"  ENDPOINT events: {len(endpoint_events)}")
-    
-    # Match SENDER captures with ENDPOINT receives
-    sender_captures = [e for e in sender_events if e['event'] == 'capture']
-    sender_sends = [e for e in sender_events if e['event'] == 'encrypt_send']
-    endpoint_receives = [e for e in endpoint_events if e['event'] == 'receive']
-    endpoint_injects = [e for e in endpoint_events if e['event'] == 'decrypt_inject']
-    
-    print(f"\n  Captures: {len(sender_captures)}")
-    print(f"  Sends: {len(sender_sends)}")
-    print(f"  Receives: {len(endpoint_receives)}")
-    print(f"  Injects: {len(endpoint_injects)}")
-    
-    # Match events in sequence (assume same order)
-    min_length = min(len(sender_captures), len(sender_sends), 
-                     len(endpoint_receives), len(endpoint_injects))
-    
-    matched_sequences = []
-    for i in range(min_length):
-        sequence = {
-            'capture': sender_captures[i],
-            'send': sender_sends[i],
-            'receive': endpoint_receives[i],
-            'inject': endpoint_injects[i]
-        }
-        matched_sequences.append(sequence)
+    sender_keys = [e for e in events if e['device'] == 'SENDER' and e['event'] == 'stages']
+    endpoint_keys = [e for e in events if e['device'] == 'ENDPOINT' and e['event'] == 'stages']
+    
+    print(f"  SENDER keystrokes: {len(sender_keys)}")
+    print(f"  ENDPOINT keystrokes: {len(endpoint_keys)}")
+    
+    # Match keystrokes in sequence (assume same order)
+    matched_sequences = [
+        {'sender': sender, 'endpoint': endpoint}
+        for sender, endpoint in zip(sender_keys, endpoint_keys)
+    ]
     
     print(f"\nMatched {len(matched_sequences)} complete keystroke sequences")
     return matched_sequences
 
 def calculate_latencies(sequences):
-    """Calculate latency metrics from matched sequences"""
+    """
+    Split each keystroke's latency into SEGMENTS, in ms
+    
+    Stamps within a device share its monotonic clock, so those segments
+    are exact. The link segment crosses devices: both sides are moved onto
+    their wall clock with the offset logged next to the stamps, so it is
+    only as good as the two clocks' agreement.
+    """
     latencies = []
     
     for seq in sequences:
         try:
-            capture_ts = seq['capture']['timestamp']
-            send_ts = seq['send']['timestamp']
-            receive_ts = seq['receive']['timestamp']
-            inject_ts = seq['inject']['timestamp']
+            sender = seq['sender']['stages']
+            endpoint = seq['endpoint']['stages']
+            # SENDER monotonic → ENDPOINT monotonic, via both wall clocks
+            shift = seq['sender']['clock_offset'] - seq['endpoint']['clock_offset']
             
+            segments = {
+                'sender_kernel_to_user': sender['capture'] - sender['kernel'],
+                'sender_lookup': sender['lookup'] - sender['capture'],
+                'sender_write': sender['write'] - sender['lookup'],
+                'link': endpoint['kernel'] - (sender['write'] + shift),
+                'endpoint_kernel_to_user': endpoint['capture'] - endpoint['kernel'],
+                'endpoint_lookup': endpoint['lookup'] - endpoint['capture'],
+                'endpoint_write': endpoint['write'] - endpoint['lookup'],
+            }
             latency = {
-                'key': seq['capture']['key'],
-                'encryption_time_ms': (send_ts - capture_ts) * 1000,
-                'transmission_time_ms': (receive_ts - send_ts) * 1000,
-                'decryption_time_ms': (inject_ts - receive_ts) * 1000,
-                'total_latency_ms': (inject_ts - capture_ts) * 1000,
-                'timestamps': {
-                    'capture': capture_ts,
-                    'send': send_ts,
-                    'receive': receive_ts,
-                    'inject': inject_ts
-                }
+                'key': seq['sender']['key'],
+                'total_latency_ms': (endpoint['write'] - (sender['kernel'] + shift)) * 1000,
             }
+            for name, value in segments.items():
+                latency[f'{name}_ms'] = value * 1000
+            latency['stages'] = {'sender': sender, 'endpoint': endpoint, 'clock_shift': shift}
             
             latencies.append(latency)
         except KeyError as e:
@@ -104,15 +107,20 @@ def calculate_latencies(sequences):
     
     return latencies
 
+def summarize(values):
+    return {
+        'mean': statistics.mean(values),
+        'median': statistics.median(values),
+        'p95': percentile(values, 0.95),
+        'max': max(values),
+    }
+
 def calculate_statistics(latencies):
     """Calculate statistical measures from latency data"""
     if not latencies:
         return None
     
     total_latencies = [l['total_latency_ms'] for l in latencies]
-    encryption_times = [l['encryption_time_ms'] for l in latencies]
-    transmission_times = [l['transmission_time_ms'] for l in latencies]
-    decryption_times = [l['decryption_time_ms'] for l in latencies]
     
     stats = {
         'count': len(latencies),
@@ -124,20 +132,18 @@ def calculate_statistics(latencies):
             'max': max(total_latencies),
             'p95': sorted(total_latencies)[int(len(total_latencies) * 0.95)] if len(total_latencies) > 20 else None
         },
-        'encryption_overhead': {
-            'mean': statistics.mean(encryption_times),
-            'median': statistics.median(encryption_times)
-        },
-        'transmission_time': {
-            'mean': statistics.mean(transmission_times),
-            'median': statistics.median(transmission_times)
+        'segments': {
+            name: summarize([l[f'{name}_ms'] for l in latencies])
+            for name, _, _ in SEGMENTS
         },
-        'decryption_overhead': {
-            'mean': statistics.mean(decryption_times),
-            'median': statistics.median(decryption_times)
-        }
     }
     
+    # Who the time goes to: the kernel, Python, or the link
+    blame = defaultdict(float)
+    for name, _, kind in SEGMENTS:
+        blame[kind] += stats['segments'][name]['mean']
+    stats['attribution'] = dict(blame)
+    
     return stats
 
 def print_results(stats):
@@ -151,7 +157,7 @@ def print_results(stats):
     print("="*70)
     print(f"\nTotal Keystrokes Analyzed: {stats['count']}")
     
-    print(f"\n{'END-TO-END LATENCY (Physical Key Press → Virtual Keyboard)':-^70}")
+    print(f"\n{'END-TO-END LATENCY (SENDER Kernel Event → ENDPOINT uinput Write)':-^70}")
     print(f"  Mean:             {stats['total_latency']['mean']:>8.2f} ms")
     print(f"  Median:           {stats['total_latency']['median']:>8.2f} ms")
     print(f"  Std Deviation:    {stats['total_latency']['stdev']:>8.2f} ms")
@@ -160,10 +166,23 @@ def print_results(stats):
     if stats['total_latency']['p95']:
         print(f"  95th Percentile:  {stats['total_latency']['p95']:>8.2f} ms")
     
-    print(f"\n{'BREAKDOWN BY COMPONENT':-^70}")
-    print(f"  Encryption (SENDER):     {stats['encryption_overhead']['mean']:>8.2f} ms")
-    print(f"  Transmission (USB):      {stats['transmission_time']['mean']:>8.2f} ms")
-    print(f"  Decryption (ENDPOINT):   {stats['decryption_overhead']['mean']:>8.2f} ms")
+    print(f"\n{'BREAKDOWN BY STAGE':-^70}")
+    print(f"  {'':<32}{'mean':>9}{'median':>9}{'p95':>9}{'max':>9}")
+    for name, label, _ in SEGMENTS:
+        seg = stats['segments'][name]
+        print(f"  {label:<32}{seg['mean']:>6.3f} ms{seg['median']:>6.3f} ms"
+              f"{seg['p95']:>6.3f} ms{seg['max']:>6.3f} ms")
+    if stats['segments']['link']['median'] < 0:
+        print("  (Negative link time: the two wall clocks disagree - sync them and rerun)")
+    
+    blame = stats['attribution']
+    total = sum(blame.values()) or 1
+    print(f"\n{'WHERE THE TIME GOES (mean)':-^70}")
+    for kind, label in (('kernel', 'Kernel (evdev wakeup, read, write syscalls)'),
+                        ('python', 'Python (keymap lookup)'),
+                        ('usb', 'USB link')):
+        print(f"  {label:<46}{blame.get(kind, 0):>8.3f} ms  {blame.get(kind, 0) / total * 100:>5.1f} %")
+    print(f"  Bottleneck: {max(blame, key=blame.get)}")
     
     print("\n" + "="*70)
     print("\nFOR YOUR PAPER:")
@@ -171,6 +190,86 @@ def print_results(stats):
     print(f"  Standard deviation: {stats['total_latency']['stdev']:.2f} ms")
     print("="*70 + "\n")
 
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def latency_histogram(values, bucket_ms=1.0, max_ms=None):
+    """
+    Bucket latencies into fixed-width bins
+    
+    Returns:
+        list of (low_ms, high_ms, count); the last bin collects everything >= max_ms
+    """
+    if max_ms is None:
+        max_ms = percentile(values, 0.99) + bucket_ms
+    bucket_count = max(1, int(max_ms / bucket_ms))
+    counts = [0] * (bucket_count + 1)
+    for value in values:
+        counts[min(int(value / bucket_ms), bucket_count)] += 1
+    bins = [(i * bucket_ms, (i + 1) * bucket_ms, counts[i]) for i in range(bucket_count)]
+    bins.append((bucket_count * bucket_ms, float('inf'), counts[-1]))
+    return bins
+
+def print_histogram(label, bins, width=40):
+    """ASCII histogram of latency_histogram() output"""
+    print(f"\n  {label}")
+    peak = max(count for _, _, count in bins) or 1
+    for low, high, count in bins:
+        span = f"{low:>6.1f}+     " if high == float('inf') else f"{low:>6.1f}-{high:<5.1f}"
+        print(f"  {span} ms |{'#' * round(count / peak * width):<{width}}| {count}")
+
+def load_latencies(log_file):
+    """Log file → per-keystroke end-to-end latencies in ms"""
+    events = load_timing_log(log_file)
+    if not events:
+        return []
+    return [l['total_latency_ms'] for l in calculate_latencies(group_events_by_key(events))]
+
+def compare_modes(baseline_file='tests/research/results/timing_log.jsonl',
+                  low_latency_file='tests/research/results/timing_log_lowlat.jsonl',
+                  bucket_ms=1.0):
+    """
+    Side-by-side latency of the default runtime vs --low-latency
+    
+    Both runs are bucketed on the same scale so the tails line up.
+    """
+    runs = {}
+    for label, log_file in (("default", baseline_file), ("low-latency", low_latency_file)):
+        print(f"\nLoading {label} run...")
+        runs[label] = load_latencies(log_file)
+        if not runs[label]:
+            print(f"No keystrokes in {log_file}")
+            return None
+    
+    max_ms = max(percentile(values, 0.99) for values in runs.values()) + bucket_ms
+    
+    print("\n" + "="*70)
+    print("LATENCY: DEFAULT vs LOW-LATENCY MODE")
+    print("="*70)
+    print(f"\n  {'':<10}{'default':>14}{'low-latency':>14}")
+    rows = (
+        ("Count", len),
+        ("Mean", statistics.mean),
+        ("Median", statistics.median),
+        ("p95", lambda v: percentile(v, 0.95)),
+        ("p99", lambda v: percentile(v, 0.99)),
+        ("Max", max),
+        ("Std Dev", lambda v: statistics.stdev(v) if len(v) > 1 else 0),
+    )
+    for name, fn in rows:
+        cells = [fn(runs[label]) for label in ("default", "low-latency")]
+        if name == "Count":
+            print(f"  {name:<10}{cells[0]:>14}{cells[1]:>14}")
+        else:
+            print(f"  {name:<10}{cells[0]:>11.2f} ms{cells[1]:>11.2f} ms")
+    
+    for label, values in runs.items():
+        print_histogram(f"{label} ({len(values)} keys)", latency_histogram(values, bucket_ms, max_ms))
+    print("\n" + "="*70 + "\n")
+    return runs
+
 def save_results(stats, latencies, output_file='tests/research/results/latency_results.json'):
     """Save results to JSON file"""
     results = {
@@ -205,9 +304,14 @@ def main():
     stats = calculate_statistics(latencies)
     
     print_results(stats)
+    print_histogram("End-to-end latency histogram",
+                    latency_histogram([l['total_latency_ms'] for l in latencies]))
     save_results(stats, latencies)
     
     return stats, latencies
 
 if __name__ == "__main__":
-    main()
+    if "--compare" in sys.argv:
+        compare_modes()
+    else:
+        main()
@@ -0,0 +1,124 @@
+"""
+tests/research/bench_alloc.py
+
+Allocations per keystroke in the SENDER and ENDPOINT main loops
+Feeds a reused KeyRecord through Scrambler.handle / Decoder.handle and
+measures, with tracemalloc, the peak transient and retained bytes per key.
+Also shows what a fresh dict per event and VERBOSE logging cost.
+"""
+
+import contextlib
+import os
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import SENDER.main as sender_main
+import ENDPOINT.main as endpoint_main
+from SENDER.key_sender import HIDReportWriter
+from ENDPOINT.epoch_window import EpochWindow
+from UTILS.events import KeyRecord, KEY_NAMES, KEY_DOWN, KEY_UP
+from UTILS.rekey import KeySchedule
+
+SYM_KEY = bytes(range(32))
+TEXT = "the quick brown fox jumps over the lazy dog 1234567890 "
+ROUNDS = 20
+# A session that started a while ago and rotated just now, like a live one
+BASE_TIME = int(time.time()) - 100 * sender_main.INTERVAL - 1
+
+class NullKeyboardWriter:
+    """ENDPOINT writer stand-in - no /dev/uinput needed"""
+
+    def press_key(self, keycode, modifier=0):
+        pass
+
+    def release_key(self, keycode, modifier=0):
+        pass
+
+def key_stream():
+    """(key name, keycode, state) for typing TEXT: press then release"""
+    codes = {name: code for code, name in KEY_NAMES.items() if isinstance(name, str)}
+    stream = []
+    for char in TEXT:
+        key = 'KEY_SPACE' if char == ' ' else f"KEY_{char.upper()}"
+        stream.append((key, codes[key], KEY_DOWN))
+        stream.append((key, codes[key], KEY_UP))
+    return stream
+
+def measure(handle, stream, record_factory):
+    """Mean/max transient peak and retained bytes per event"""
+    # Warm up: first rotation builds the tables
+    for key, code, state in stream:
+        handle(record_factory(key, code, state))
+
+    peaks = []
+    retained = 0
+    tracemalloc.start()
+    for _ in range(ROUNDS):
+        for key, code, state in stream:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            handle(record_factory(key, code, state))
+            current, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - before)
+            retained += current - before
+    tracemalloc.stop()
+    return sum(peaks) / len(peaks), max(peaks), retained / len(peaks)
+
+def reused_record():
+    record = KeyRecord()
+    def fill(key, code, state):
+        record.key = key
+        record.code = code
+        record.state = state
+        return record
+    return fill
+
+def fresh_record(key, code, state):
+    """What the readers used to yield: a new object per event"""
+    record = KeyRecord()
+    record.key = key
+    record.code = code
+    record.state = state
+    record.device = {'key': key, 'shift': False, 'ctrl': False, 'alt': False,
+                     'state': state, 'key_event': None, 'device': 'bench'}
+    return record
+
+def sender_handle():
+    hid = HIDReportWriter(os.devnull)
+    return sender_main.Scrambler(KeySchedule(SYM_KEY), BASE_TIME, hid).handle
+
+def endpoint_handle():
+    window = EpochWindow(KeySchedule(SYM_KEY), table_builder=endpoint_main.build_decode_table)
+    return endpoint_main.Decoder(window, BASE_TIME, NullKeyboardWriter()).handle
+
+def main():
+    stream = key_stream()
+    print("=" * 70)
+    print(f"ALLOCATIONS PER KEY EVENT: {len(stream) * ROUNDS:,} events (press + release)")
+    print("=" * 70)
+    print(f"  {'':<40}{'mean peak':>11}{'max peak':>11}{'retained':>11}")
+
+    for side, module, make_handle in (
+        ("SENDER", sender_main, sender_handle),
+        ("ENDPOINT", endpoint_main, endpoint_handle),
+    ):
+        for label, factory, verbose in (
+            ("reused record", reused_record, False),
+            ("fresh record + dict per event", lambda: fresh_record, False),
+            ("reused record, VERBOSE", reused_record, True),
+        ):
+            module.VERBOSE = verbose
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                mean_peak, max_peak, retained = measure(make_handle(), stream, factory())
+            print(f"  {side + ' ' + label:<40}{mean_peak:>9.0f} B{max_peak:>9.0f} B{retained:>9.1f} B")
+        module.VERBOSE = False
+
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+tests/research/bench_bulk_decode.py
+
+Offline decoding of a week of typing: bulk NumPy decoder vs per-key paths
+The trace is synthetic (bulk_decode.encode_records): random text at human
+speed, epoch markers from a SENDER 0.4 s ahead. Per-key paths are timed on
+a slice and scaled up.
+"""
+
+import contextlib
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import ENDPOINT.main as endpoint_main
+from ENDPOINT.epoch_window import EpochWindow
+from ENDPOINT.keyboard_reader import key_records
+from UTILS.keymap import seed_to_keymap, decrypt_text
+from UTILS.rekey import KeySchedule
+from UTILS.seedgen import generate_seed
+from UTILS.trace import Trace, TraceWriter
+from tests.research import bulk_decode
+from tests.research.replay import DecodedText
+
+SYM_KEY = bytes(range(32))
+BASE_TIME = 1_700_000_000
+KEYSTROKES = 2_000_000
+MEAN_GAP = 0.3  # Seconds between keys: ~7 days of typing
+SLICE = 5000  # Keys timed on the per-key paths
+ALPHABET = "abcdefghijklmnopqrstuvwxyz ABCDEFGHIJKLMNOPQRSTUVWXYZ 0123456789 .,!?-_@#$%&*()[]{}:;\"'/\\|+=<>~`"
+
+def synthetic_trace(path, rng):
+    """Write a KEYSTROKES-long ENDPOINT trace; returns the typed text"""
+    chars = np.frombuffer(ALPHABET.encode(), np.uint8)
+    text = chars[rng.integers(0, len(chars), KEYSTROKES)].tobytes().decode()
+    wall = BASE_TIME + 1000.0 + np.cumsum(rng.exponential(MEAN_GAP, KEYSTROKES) + 0.03)
+    writer = TraceWriter(path)
+    writer.add_device(3, "HIDPi Keyboard")
+    writer.close()
+    trace = Trace(path)
+    records = bulk_decode.encode_records(text, wall, BASE_TIME, [(0, SYM_KEY)], clock_offset=trace.clock_offset)
+    trace.close()
+    with open(path, 'ab') as f:
+        f.write(records.tobytes())
+    return text
+
+def per_char_decrypt(text, epochs):
+    """What verifying a session costs without tooling: a keymap and decrypt_text per char"""
+    start = time.perf_counter()
+    for char, counter in zip(text, epochs):
+        decrypt_text(char, seed_to_keymap(generate_seed(SYM_KEY, counter)))
+    return (time.perf_counter() - start) / len(text)
+
+def live_decoder(trace, count):
+    """Decoder.handle per record, as replay.py runs it"""
+    output = DecodedText()
+    now = [0.0]
+    window = EpochWindow(KeySchedule(SYM_KEY), table_builder=endpoint_main.build_decode_table)
+    decoder = endpoint_main.Decoder(window, BASE_TIME, output, clock=lambda: now[0])
+    offset = trace.clock_offset
+    presses = 0
+    start = time.perf_counter()
+    for record in key_records(trace.batches()):
+        now[0] = record.time + offset
+        decoder.handle(record)
+        presses += record.state == 1
+        if presses >= count:
+            break
+    return (time.perf_counter() - start) / presses
+
+def main():
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "week.trace")
+        text = synthetic_trace(path, rng)
+        trace = Trace(path)
+
+        with contextlib.redirect_stdout(open(os.devnull, 'w')):
+            live = live_decoder(trace, SLICE)
+            epochs = (np.arange(SLICE) * MEAN_GAP // endpoint_main.INTERVAL).astype(int).tolist()
+            naive = per_char_decrypt(text[:SLICE], epochs)
+        runs = {}
+        pools = [("1 process", 1)]
+        if os.cpu_count() > 1:
+            pools.append((f"{os.cpu_count()} processes", os.cpu_count()))
+        for label, workers in pools:
+            result = bulk_decode.decode_records(bulk_decode.load_records(trace), trace.clock_offset,
+                                                BASE_TIME, [(0, SYM_KEY)], workers=workers)
+            runs[label] = result
+        trace.close()
+
+    keys = len(text)
+    print("=" * 70)
+    print(f"BULK DECODE: {keys:,} keystrokes, {result['epochs']:,} epochs "
+          f"({keys * MEAN_GAP / 86400:.1f} days of typing)")
+    print("=" * 70)
+    print(f"  {'Path':<34}{'keys/s':>12}{'whole trace':>14}")
+    print(f"  {'seed_to_keymap + decrypt_text':<34}{1 / naive:>12,.0f}{naive * keys:>12.1f} s")
+    print(f"  {'Decoder.handle (replay)':<34}{1 / live:>12,.0f}{live * keys:>12.1f} s")
+    for label, result in runs.items():
+        total = result['timings']['total']
+        ok = "exact" if result['text'] == text else "MISMATCH"
+        print(f"  {'bulk, ' + label:<34}{keys / total:>12,.0f}{total:>12.2f} s  {ok}")
+        phases = ", ".join(f"{name} {result['timings'][name] * 1000:.0f} ms"
+                           for name in ('modifiers', 'epochs', 'keymaps', 'decode'))
+        print(f"      {phases}")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
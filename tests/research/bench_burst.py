@@ -0,0 +1,104 @@
+"""
+tests/research/bench_burst.py
+
+Sustained keys/s of the single-key HID writer vs 6KRO burst packing
+A paced fake /dev/hidg0 accepts one report per USB poll, like f_hidg does,
+and a host emulator replays the reports to check typing order
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from SENDER.key_sender import HIDReportWriter, BurstHIDWriter
+
+POLL_MS = 1  # Full-speed HID, bInterval = 1
+TEXT = "Hello World 1234567890 the quick brown fox jumps over the lazy dog AAbbCC " * 4
+
+MOD_LSHIFT = 0x02
+LETTERS = "abcdefghijklmnopqrstuvwxyz"
+DIGITS = "1234567890"
+
+def char_to_hid(char):
+    """(modifier, usage) for the characters in TEXT"""
+    if char == " ":
+        return 0, 0x2C
+    if char.lower() in LETTERS:
+        return (MOD_LSHIFT if char.isupper() else 0), 0x04 + LETTERS.index(char.lower())
+    return 0, 0x1E + DIGITS.index(char)
+
+def hid_to_char(modifier, usage):
+    if usage == 0x2C:
+        return " "
+    if 0x04 <= usage <= 0x1D:
+        char = LETTERS[usage - 0x04]
+        return char.upper() if modifier & MOD_LSHIFT else char
+    return DIGITS[usage - 0x1E]
+
+class PacedHidg(HIDReportWriter):
+    """Fake gadget: each write blocks until the next poll, reports are kept"""
+
+    def __init__(self):
+        super().__init__(os.devnull)
+        self.reports = []
+        self.next_poll = time.perf_counter()
+
+    def write_report(self, report):
+        now = time.perf_counter()
+        if now < self.next_poll:
+            time.sleep(self.next_poll - now)
+        self.next_poll = max(now, self.next_poll) + POLL_MS / 1000
+        self.reports.append(report)
+
+def host_decode(reports):
+    """What the host would type: new keys of each report, in array order"""
+    typed = []
+    previous = set()
+    for report in reports:
+        modifier = report[0]
+        keys = [k for k in report[2:] if k]
+        for key in keys:
+            if key not in previous:
+                typed.append(hid_to_char(modifier, key))
+        previous = set(keys)
+    return "".join(typed)
+
+def run(writer, device):
+    start = time.perf_counter()
+    for char in TEXT:
+        modifier, usage = char_to_hid(char)
+        writer.tap(modifier, usage, char)
+    if isinstance(writer, BurstHIDWriter):
+        writer.close()
+    elapsed = time.perf_counter() - start
+    return elapsed, device.reports
+
+def main():
+    print("=" * 70)
+    print(f"HID OUTPUT BENCHMARK: {len(TEXT)} keys, {POLL_MS} ms poll")
+    print("=" * 70)
+
+    single = PacedHidg()
+    single_time, single_reports = run(single, single)
+
+    paced = PacedHidg()
+    burst = BurstHIDWriter(paced)
+    burst_time, burst_reports = run(burst, paced)
+
+    for label, elapsed, reports in (
+        ("single-key", single_time, single_reports),
+        ("6KRO burst", burst_time, burst_reports),
+    ):
+        typed = host_decode(reports)
+        print(f"  {label:<11} {len(TEXT) / elapsed:>8.0f} keys/s   "
+              f"{len(reports):>5} reports   order preserved: {typed == TEXT}")
+
+    print(f"\n  Speedup: {single_time / burst_time:.1f}x")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
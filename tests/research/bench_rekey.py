@@ -0,0 +1,108 @@
+"""
+tests/research/bench_rekey.py
+
+Measure in-session rekey duration and its effect on keystroke latency
+Both sides run their real rekey logic over a pty stand-in for the serial link
+"""
+
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from tests.research.pty_link import open_pty_pair
+from UTILS.seedgen import generate_seed
+from UTILS.control_channel import ControlChannel
+from UTILS.keymap import seed_to_keymap
+from UTILS.rekey import KeySchedule, SenderRekeyer, EndpointRekeyer
+
+SYM_KEY = bytes(range(32))
+REKEYS = 50
+KEYSTROKES = 20000
+
+def keystroke_latencies(schedule, counter, stop=None):
+    """Time the per-key path: key lookup, then keymap lookup"""
+    keymap = seed_to_keymap(generate_seed(schedule.key_for(counter), counter))
+    samples = []
+    for i in range(KEYSTROKES):
+        start = time.perf_counter()
+        schedule.key_for(counter)
+        keymap.get('a')
+        samples.append(time.perf_counter() - start)
+        if stop is not None and stop.is_set():
+            break
+    return samples
+
+def summarize(label, samples):
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2] * 1e6
+    p99 = samples[int(len(samples) * 0.99)] * 1e6
+    worst = samples[-1] * 1e6
+    print(f"  {label:<22} p50={p50:>7.2f} us  p99={p99:>7.2f} us  max={worst:>8.2f} us")
+
+def main():
+    print("=" * 70)
+    print("REKEY BENCHMARK")
+    print("=" * 70)
+
+    sender_port, endpoint_port = open_pty_pair(timeout=0.5)
+    counter = [1000]
+
+    sender_schedule = KeySchedule(SYM_KEY)
+    endpoint_schedule = KeySchedule(SYM_KEY)
+    sender_channel = ControlChannel(sender_port, "SENDER")
+    endpoint_channel = ControlChannel(endpoint_port, "ENDPOINT")
+    rekeyer = SenderRekeyer(sender_channel, sender_schedule, lambda: counter[0])
+    EndpointRekeyer(endpoint_channel, endpoint_schedule, lambda: counter[0])
+    sender_channel.start()
+    endpoint_channel.start()
+
+    # Let both keypair pools fill before measuring
+    time.sleep(0.2)
+
+    baseline = keystroke_latencies(sender_schedule, counter[0])
+
+    # Keystrokes on the main thread while rekeys run concurrently
+    done = threading.Event()
+    def drive_rekeys():
+        for _ in range(REKEYS):
+            expected = len(rekeyer.durations) + 1
+            effective = rekeyer.initiate()
+            while len(rekeyer.durations) < expected:
+                time.sleep(0.0005)
+            # Move past the cut-over so the next proposal chains from it
+            counter[0] = effective
+        done.set()
+
+    thread = threading.Thread(target=drive_rekeys, daemon=True)
+    thread.start()
+    during = []
+    while not done.is_set():
+        during.extend(keystroke_latencies(sender_schedule, counter[0], done))
+    thread.join()
+
+    durations_ms = [d * 1000 for d in rekeyer.durations]
+    in_sync = all(
+        sender_schedule.key_for(c) == endpoint_schedule.key_for(c)
+        for c in range(counter[0] - 5, counter[0] + 5)
+    )
+
+    print(f"\n{'REKEY DURATION (proposal → scheduled, both sides)':-^70}")
+    print(f"  Rekeys:   {len(durations_ms)}")
+    print(f"  Mean:     {statistics.mean(durations_ms):>8.2f} ms")
+    print(f"  Median:   {statistics.median(durations_ms):>8.2f} ms")
+    print(f"  Max:      {max(durations_ms):>8.2f} ms")
+    print(f"  Schedules in sync: {in_sync}")
+
+    print(f"\n{'KEYSTROKE PATH LATENCY':-^70}")
+    summarize("no rekey", baseline)
+    summarize("rekeys in flight", during)
+
+    print("\n" + "=" * 70)
+
+if __name__ == "__main__":
+    main()
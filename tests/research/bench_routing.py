@@ -0,0 +1,84 @@
+"""
+tests/research/bench_routing.py
+
+Per-event cost of ENDPOINT routing as SENDERs are added
+Each SENDER is a session with its own key schedule and decoder; events
+from all of them are interleaved and dispatched by fd, as main() does.
+"""
+
+import contextlib
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import ENDPOINT.main as endpoint_main
+from ENDPOINT.epoch_window import EpochWindow
+from ENDPOINT.routing import PassThrough
+from UTILS.events import KeyRecord, KEY_NAMES, KEY_DOWN, KEY_UP
+from UTILS.rekey import KeySchedule
+
+SESSIONS = (1, 4, 16, 64)
+EVENTS = 200000
+BASE_TIME = int(time.time()) - 100 * endpoint_main.INTERVAL - 1
+
+class NullKeyboardWriter:
+    """ENDPOINT writer stand-in - no /dev/uinput needed"""
+
+    def press_key(self, keycode, modifier=0):
+        pass
+
+    def release_key(self, keycode, modifier=0):
+        pass
+
+def handlers_for(count, writer):
+    """fd -> handler for `count` SENDERs plus one trusted keyboard"""
+    handlers = {}
+    for fd in range(count):
+        window = EpochWindow(KeySchedule(os.urandom(32)), table_builder=endpoint_main.build_decode_table)
+        handlers[100 + fd] = endpoint_main.Decoder(window, BASE_TIME, writer).handle
+    handlers[99] = PassThrough(writer).handle
+    return handlers
+
+def event_stream(fds, rng):
+    codes = {name: code for code, name in KEY_NAMES.items() if isinstance(name, str)}
+    keys = [f"KEY_{c}" for c in "ABCDEFGHIJKLMNOPQRSTUVWXYZ"]
+    stream = []
+    for _ in range(EVENTS // 2):
+        fd = rng.choice(fds)
+        key = rng.choice(keys)
+        stream += [(fd, key, codes[key], KEY_DOWN), (fd, key, codes[key], KEY_UP)]
+    return stream
+
+def measure(count):
+    rng = random.Random(count)
+    handlers = handlers_for(count, NullKeyboardWriter())
+    stream = event_stream(list(handlers), rng)
+    record = KeyRecord()
+
+    def run():
+        for fd, key, code, state in stream:
+            record.fd, record.key, record.code, record.state = fd, key, code, state
+            handlers[record.fd](record)
+
+    run()  # Builds every session's tables
+    start = time.perf_counter()
+    run()
+    return (time.perf_counter() - start) / len(stream) * 1e6
+
+def main():
+    print("=" * 70)
+    print("ENDPOINT ROUTING: per-event cost by number of SENDER sessions")
+    print("=" * 70)
+    with contextlib.redirect_stdout(open(os.devnull, 'w')):
+        results = [(count, measure(count)) for count in SESSIONS]
+    for count, us in results:
+        print(f"  {count:>3} sessions + 1 trusted keyboard   {us:>6.2f} us/event")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
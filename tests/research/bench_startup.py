@@ -0,0 +1,63 @@
+"""
+tests/research/bench_startup.py
+
+Cold-start cost before the key exchange can begin, in fresh interpreters
+Compares importing every dependency up front (what the entry points used to
+do) with the lazy entry points, and the table cache with rebuilding it.
+The live boot → first keystroke timeline is printed by the SENDER and
+ENDPOINT themselves on their first key (see UTILS.startup).
+"""
+
+import importlib.util
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+
+RUNS = 9
+
+EAGER_DEPS = (
+    "import evdev, serial; "
+    "from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey; "
+    "from cryptography.hazmat.primitives.ciphers.aead import ChaCha20Poly1305; "
+)
+
+CASES = [
+    ("python -c pass", "pass", None),
+    ("ENDPOINT: eager deps + main", EAGER_DEPS + "import ENDPOINT.main", None),
+    ("ENDPOINT: lazy main", "import ENDPOINT.main", None),
+    ("SENDER: eager deps + main", EAGER_DEPS + "import hidpi.keyboard_keys; import SENDER.main", "hidpi"),
+    ("SENDER: lazy main", "import SENDER.main", "hidpi"),
+    ("CLI: parse only", "import UTILS.cli as c; c.build_parser().parse_args(['sender'])", None),
+    ("evdev tables: rebuild", "from UTILS import tables; tables.rebuild('evdev')", None),
+    ("evdev tables: cache", "from UTILS import tables; tables.load('evdev')", None),
+]
+
+def run_ms(code):
+    """Median wall time of a fresh interpreter running `code`, in ms"""
+    samples = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=project_root, capture_output=True, check=True,
+        )
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    print("=" * 70)
+    print(f"STARTUP COST: median wall time of {RUNS} fresh interpreters")
+    print("=" * 70)
+    for label, code, needs in CASES:
+        if needs and importlib.util.find_spec(needs) is None:
+            print(f"  {label:<32} skipped ({needs} not installed)")
+            continue
+        print(f"  {label:<32} {run_ms(code):>8.1f} ms")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
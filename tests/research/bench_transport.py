@@ -0,0 +1,108 @@
+"""
+tests/research/bench_transport.py
+
+Benchmark the scrambled-HID path against the AEAD serial data plane
+No hardware needed: the serial side runs over a pty pair
+"""
+
+import sys
+import threading
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from tests.research.pty_link import open_pty_pair
+from UTILS.keymap import seed_to_keymap, reverse_keymap
+from UTILS.link import send_message, recv_message, MSG_DATA
+from UTILS.secure_link import FrameSealer, FrameOpener
+
+SYM_KEY = bytes(range(32))
+TEXT = "The quick brown fox jumps over the lazy dog 1234567890 !@#$%"
+
+# HID gadget pacing: every scrambled key costs a press report and a release
+# report, one report per poll interval (HIDPi uses the boot keyboard default)
+HID_POLL_MS = 8
+EVENTS_PER_KEY = 2  # press + release
+
+ITERATIONS = 20000
+BATCH_SIZES = (1, 8, 64)
+PTY_KEYS = 50000
+
+def bench_hid_cpu():
+    """Per-key CPU cost of scramble (SENDER) + unscramble (ENDPOINT)"""
+    keymap = seed_to_keymap(bytes(32))
+    reverse = reverse_keymap(keymap)
+    chars = [c.lower() for c in TEXT]
+
+    start = time.perf_counter()
+    for i in range(ITERATIONS):
+        c = chars[i % len(chars)]
+        reverse.get(keymap.get(c, c), c)
+    elapsed = time.perf_counter() - start
+    return elapsed / ITERATIONS
+
+def bench_aead_cpu(batch_size):
+    """Per-key CPU cost of seal (SENDER) + open (ENDPOINT) at a batch size"""
+    sealer = FrameSealer(SYM_KEY)
+    opener = FrameOpener(SYM_KEY)
+    batch = [(30 + i % 20, i % 2) for i in range(batch_size)]
+    frames = ITERATIONS // batch_size
+
+    start = time.perf_counter()
+    for _ in range(frames):
+        opener.open(sealer.seal(batch))
+    elapsed = time.perf_counter() - start
+    return elapsed / (frames * batch_size)
+
+def bench_aead_pty(batch_size):
+    """End-to-end key events/s through a real serial stack on a pty pair"""
+    tx, rx = open_pty_pair()
+    sealer = FrameSealer(SYM_KEY)
+    opener = FrameOpener(SYM_KEY)
+    batch = [(30 + i % 20, i % 2) for i in range(batch_size)]
+    frames = PTY_KEYS // batch_size
+    received = [0]
+
+    def receive():
+        while received[0] < frames * batch_size:
+            msg_type, payload = recv_message(rx)
+            if msg_type == MSG_DATA:
+                received[0] += len(opener.open(payload))
+
+    thread = threading.Thread(target=receive, daemon=True)
+    start = time.perf_counter()
+    thread.start()
+    for _ in range(frames):
+        send_message(tx, MSG_DATA, sealer.seal(batch))
+    thread.join()
+    elapsed = time.perf_counter() - start
+
+    tx.close()
+    rx.close()
+    return received[0] / elapsed
+
+def main():
+    print("=" * 70)
+    print("TRANSPORT BENCHMARK: scrambled HID vs AEAD serial")
+    print("=" * 70)
+
+    hid_cpu = bench_hid_cpu()
+    hid_wire = 1000 / (HID_POLL_MS * EVENTS_PER_KEY)
+    print(f"\n{'SCRAMBLED HID':-^70}")
+    print(f"  CPU per key:          {hid_cpu * 1e6:>10.2f} us")
+    print(f"  Wire limit:           {hid_wire:>10.0f} keys/s  ({HID_POLL_MS} ms poll, {EVENTS_PER_KEY} reports/key)")
+    print("  Plus stalls/markers around each rotation, printable keys only")
+
+    print(f"\n{'AEAD SERIAL':-^70}")
+    for batch_size in BATCH_SIZES:
+        cpu = bench_aead_cpu(batch_size)
+        pty = bench_aead_pty(batch_size)
+        print(f"  batch={batch_size:<3}  CPU per event: {cpu * 1e6:>8.2f} us   "
+              f"pty throughput: {pty:>10.0f} events/s  ({pty / hid_wire:.0f}x HID)")
+
+    print("\n" + "=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+tests/research/bench_uinput.py
+
+Syscalls and microseconds per injected key: evdev UInput.write() vs one batched write()
+Both ENDPOINT writers type the same text, as Decoder does (press_key then
+release_key) and as a whole write_key(). With a writable /dev/uinput the
+real virtual keyboard is used; otherwise a stand-in whose fd is /dev/null,
+which keeps every syscall but skips the input core. write() counts come
+from /proc/self/io; python-evdev adds an fcntl() per event on top.
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from evdev import UInput
+from ENDPOINT.key_mapper import char_to_keycode
+from ENDPOINT.keyboard_writer import KeyboardWriter, BatchedKeyboardWriter
+
+TEXT = "Hello World! The Quick Brown Fox: jumps over the LAZY dog (42 times). "
+REPEATS = 300
+
+class NullUInput(UInput):
+    """UInput on an already open fd - /dev/null here, a socket in tests"""
+
+    def __init__(self, fd=None):
+        self.fd = os.open(os.devnull, os.O_RDWR) if fd is None else fd
+        self.device = None
+
+    def close(self):
+        os.close(self.fd)
+
+def write_syscalls():
+    with open("/proc/self/io") as f:
+        return int(next(line for line in f if line.startswith("syscw")).split()[1])
+
+def make(writer_class, real):
+    ui = None if real else NullUInput()
+    return writer_class(ui)
+
+def run(writer, keys, whole):
+    """(seconds, write syscalls) to type `keys` REPEATS times"""
+    syscalls = write_syscalls()
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        if whole:
+            for keycode, modifier in keys:
+                writer.write_key(keycode, modifier)
+        else:
+            for keycode, modifier in keys:
+                writer.press_key(keycode, modifier)
+                writer.release_key(keycode, modifier)
+    elapsed = time.perf_counter() - start
+    return elapsed, write_syscalls() - syscalls
+
+def main():
+    real = os.access("/dev/uinput", os.W_OK)
+    keys = [char_to_keycode(char) for char in TEXT]
+    count = len(keys) * REPEATS
+    shifted = sum(1 for _, modifier in keys if modifier) / len(keys)
+
+    print("=" * 70)
+    print(f"UINPUT WRITER BENCHMARK: {count} keys ({shifted:.0%} shifted), "
+          f"{'/dev/uinput' if real else '/dev/null stand-in (no writable /dev/uinput)'}")
+    print("=" * 70)
+    print(f"  {'writer':<9} {'calls':<21} {'us/key':>8} {'write()/key':>12}")
+    results = {}
+    for label, writer_class in (("evdev", KeyboardWriter), ("batched", BatchedKeyboardWriter)):
+        writer = make(writer_class, real)
+        for calls, whole in (("press_key+release_key", False), ("write_key", True)):
+            elapsed, syscalls = run(writer, keys, whole)
+            results[label, whole] = elapsed
+            print(f"  {label:<9} {calls:<21} {elapsed / count * 1e6:>8.2f} {syscalls / count:>12.2f}")
+        writer.close()
+
+    print()
+    for calls, whole in (("press_key+release_key", False), ("write_key", True)):
+        print(f"  Speedup, {calls}: {results['evdev', whole] / results['batched', whole]:.1f}x")
+    print("=" * 70)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+tests/research/bulk_decode.py
+
+Offline bulk decoder for recorded ENDPOINT traces (NumPy)
+Decodes a whole trace at once instead of one Decoder.handle() per key:
+modifier state, epoch markers and epoch selection are computed as array
+operations, each epoch's keymap is derived once as a 68-entry permutation
+(keymap_batch, in a process pool for multi-day traces), and every
+keystroke is decoded with one fancy-indexing pass. Matches the live
+Decoder's output, minus the cadence and plausibility screens. Keys pressed
+with Ctrl held are shortcuts, not text: they are counted, not shown. The
+keys of later rekeys come from the trace's .keys sidecar (UTILS.trace).
+
+    python tests/research/bulk_decode.py TRACE --key HEX --base-time T [--workers N] [--session PORT]
+"""
+
+import os
+import sys
+import time
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from ENDPOINT.epoch_window import GRACE_WINDOW
+from ENDPOINT.key_mapper import KEY_CODES, char_to_keycode
+from ENDPOINT.main import EVDEV_TO_CHAR, SHIFT_MAP, INTERVAL
+from UTILS.epoch import EPOCH_MARKER_KEYS, MARKER_MODULUS
+from UTILS.keymap import KEYS
+from UTILS.seedgen import SeedDeriver
+from UTILS.trace import Trace, RECORD, RECORDS_AT, EV_KEY
+from tests.research import keymap_batch
+
+# UTILS.trace.RECORD as a NumPy dtype, so a trace maps straight into an array
+RECORD_DTYPE = np.dtype([('time', '<f8'), ('slot', '<u2'), ('type', '<u2'),
+                         ('code', '<u2'), ('pad', 'V2'), ('value', '<i4')])
+assert RECORD_DTYPE.itemsize == RECORD.size
+
+KEY_CNT = max(KEY_CODES.values()) + 1
+POOL_MIN_EPOCHS = 4000  # Fewer epochs than this derive faster than a pool starts
+CHUNKS_PER_WORKER = 4
+TEXT_KEYS = {'KEY_ENTER': '\n', 'KEY_TAB': '\t'}  # Pass-through keys shown in the text
+
+def _tables():
+    """
+    Epoch-independent lookup arrays, indexed by keycode * 2 + shift:
+    which scrambled character a key sends, as the live decode table sees it
+    """
+    key_index = {char: i for i, char in enumerate(KEYS)}
+    is_char = np.zeros(KEY_CNT * 2, bool)
+    scrambled_index = np.full(KEY_CNT * 2, -1, np.int16)  # Into KEYS, -1: decodes to itself
+    scrambled_cp = np.zeros(KEY_CNT * 2, np.uint32)  # Lowercase codepoint, for the -1 case
+    scrambled_upper = np.zeros(KEY_CNT * 2, bool)
+    for key, base_char in EVDEV_TO_CHAR.items():
+        for shift in (0, 1):
+            # Same as build_decode_table()
+            if base_char.isalpha():
+                scrambled = base_char.upper() if shift else base_char
+            elif shift and base_char in SHIFT_MAP:
+                scrambled = SHIFT_MAP[base_char]
+            else:
+                scrambled = base_char
+            entry = KEY_CODES[key] * 2 + shift
+            is_char[entry] = True
+            scrambled_index[entry] = key_index.get(scrambled.lower(), -1)
+            scrambled_cp[entry] = ord(scrambled.lower())
+            scrambled_upper[entry] = scrambled.isupper()
+
+    has_keycode = np.array([char_to_keycode(chr(cp))[0] is not None for cp in range(128)])
+    marker_tag = np.full(KEY_CNT, -1, np.int8)
+    for tag, key in enumerate(EPOCH_MARKER_KEYS):
+        marker_tag[KEY_CODES[key]] = tag
+    text_cp = np.zeros(KEY_CNT, np.uint32)
+    for key, char in TEXT_KEYS.items():
+        text_cp[KEY_CODES[key]] = ord(char)
+    return {
+        'is_char': is_char,
+        'scrambled_index': scrambled_index,
+        'scrambled_cp': scrambled_cp,
+        'scrambled_upper': scrambled_upper,
+        'key_cp': np.array([ord(char) for char in KEYS], np.uint32),
+        'has_keycode': has_keycode,
+        'marker_tag': marker_tag,
+        'text_cp': text_cp,
+    }
+
+TABLES = _tables()
+IS_SHIFT = np.zeros(KEY_CNT, bool)
+IS_SHIFT[[KEY_CODES['KEY_LEFTSHIFT'], KEY_CODES['KEY_RIGHTSHIFT']]] = True
+IS_CTRL = np.zeros(KEY_CNT, bool)
+IS_CTRL[[KEY_CODES['KEY_LEFTCTRL'], KEY_CODES['KEY_RIGHTCTRL']]] = True
+IS_MODIFIER = IS_SHIFT | IS_CTRL
+IS_MODIFIER[[KEY_CODES[k] for k in ('KEY_LEFTALT', 'KEY_RIGHTALT')]] = True
+
+def load_records(trace):
+    """A Trace's records as a structured array over its memory map - no copy"""
+    return np.frombuffer(trace.map, RECORD_DTYPE, count=len(trace), offset=RECORDS_AT)
+
+def _inverse_chunk(entries, counters):
+    """Inverse keymap permutations of `counters` under a key schedule's (start, key) entries"""
+    starts = [start for start, _ in entries]
+    derivers = [SeedDeriver(key) for _, key in entries]
+    seeds = [derivers[max(0, bisect_right(starts, counter) - 1)].seed(counter)
+             for counter in counters.tolist()]
+    perms = keymap_batch.permutations(seeds)
+    # argsort of a permutation is its inverse: scrambled index -> original index
+    return np.argsort(perms, axis=1).astype(np.uint8)
+
+def inverse_permutations(counters, entries, workers=None):
+    """
+    Inverse permutation of every epoch in `counters`, one row each
+
+    Args:
+        counters: sorted unique epoch counters
+        entries: KeySchedule.entries() of the session, or [(0, sym_key)]
+        workers: processes to split epochs across (default: all CPUs for
+            long traces, none for short ones)
+    """
+    keymap_batch.check()
+    if workers is None:
+        workers = os.cpu_count() if len(counters) >= POOL_MIN_EPOCHS else 1
+    if workers <= 1 or len(counters) < 2:
+        return _inverse_chunk(entries, counters)
+    chunks = np.array_split(counters, workers * CHUNKS_PER_WORKER)
+    with ProcessPoolExecutor(workers) as pool:
+        return np.concatenate(list(pool.map(_inverse_chunk, [entries] * len(chunks), chunks)))
+
+def _held(code, value, slot, is_modifier):
+    """Whether a modifier (is_modifier[code]) is held at each event, per device - as the reader tracks it"""
+    held = np.zeros(len(code), bool)
+    is_mod = is_modifier[code]
+    devices = np.flatnonzero(np.bincount(slot))
+    for device in devices:
+        idx = slice(None) if len(devices) == 1 else np.flatnonzero(slot == device)
+        mod = is_mod[idx]
+        last = np.where(mod, np.arange(len(mod)), -1)
+        np.maximum.accumulate(last, out=last)
+        held[idx] = (last >= 0) & (value[idx][np.maximum(last, 0)] != 0)
+    return held
+
+def decode_records(records, clock_offset, base_time, entries, workers=None, slots=None):
+    """
+    Decode a trace's records to the text the host was typed
+
+    Args:
+        records: structured array of RECORD_DTYPE (see load_records)
+        clock_offset: Trace.clock_offset, realtime minus monotonic when recorded
+        base_time: session base time
+        entries: KeySchedule.entries() of the session, or [(0, sym_key)];
+            a session that rekeyed needs every switch
+        workers: processes for keymap derivation (see inverse_permutations)
+        slots: device slots to decode as the session's keyboard (default: all)
+
+    Returns:
+        dict with the text, counts and the time each phase took
+    """
+    timings = {}
+    started = time.perf_counter()
+    t = TABLES
+
+    # Traces only hold EV_KEY; copying the records is the slow part, so skip it
+    wanted = records['type'] == EV_KEY
+    if slots is not None:
+        wanted &= np.isin(records['slot'], slots)
+    keys = records if wanted.all() else records[wanted]
+    code = keys['code'].astype(np.intp)
+    value = keys['value']
+    shift = _held(code, value, keys['slot'], IS_SHIFT)
+    ctrl = _held(code, value, keys['slot'], IS_CTRL)
+    press = np.flatnonzero((value == 1) & ~IS_MODIFIER[code])
+    chord = ctrl[press]
+    code = code[press]
+    wall = keys['time'][press] + clock_offset
+    timings['modifiers'] = time.perf_counter() - started
+
+    # Epoch of each press: the local clock, overridden by the SENDER's last
+    # accepted marker exactly as EpochWindow.select() does
+    phase = time.perf_counter()
+    local = (np.floor(wall).astype(np.int64) - base_time) // INTERVAL
+    seconds_into = (wall - base_time) % INTERVAL
+    tag = t['marker_tag'][code]
+    is_marker = tag >= 0
+    delta = (tag - local) % MARKER_MODULUS
+    accepted = is_marker & (delta != 2)
+    resolved = local + np.where(delta == MARKER_MODULUS - 1, -1, delta)
+    last = np.where(accepted, np.arange(len(code)), -1)
+    np.maximum.accumulate(last, out=last)
+    active = resolved[np.maximum(last, 0)]
+    use_active = (last >= 0) & (
+        (active == local) | (active == local + 1) | ((active == local - 1) & (seconds_into < GRACE_WINDOW))
+    )
+    counter = np.where(use_active, active, local)
+    timings['epochs'] = time.perf_counter() - phase
+
+    # One keymap per epoch
+    phase = time.perf_counter()
+    entry = code * 2 + shift[press]
+    chars = np.flatnonzero(t['is_char'][entry])
+    epochs, epoch_row = np.unique(counter[chars], return_inverse=True)
+    inverse = inverse_permutations(epochs, entries, workers)
+    timings['keymaps'] = time.perf_counter() - phase
+
+    # Every keystroke at once
+    phase = time.perf_counter()
+    entry = entry[chars]
+    index = t['scrambled_index'][entry]
+    original = np.where(
+        index >= 0,
+        t['key_cp'][inverse[epoch_row, np.maximum(index, 0)]],
+        t['scrambled_cp'][entry],
+    )
+    is_lower = (original >= ord('a')) & (original <= ord('z'))
+    original = np.where(t['scrambled_upper'][entry] & is_lower, original - 32, original)
+    typed = np.zeros(len(code), np.uint32)
+    typed[chars] = np.where(t['has_keycode'][original], original, 0)
+    typed = np.where(typed == 0, t['text_cp'][code], typed)
+    typed[chord] = 0  # Shortcuts type nothing
+    text = typed[typed != 0].astype('<u4').tobytes().decode('utf-32-le')
+    timings['decode'] = time.perf_counter() - phase
+    timings['total'] = time.perf_counter() - started
+
+    return {
+        'text': text,
+        'events': len(records),
+        'presses': len(code),
+        'chars': len(chars),
+        'epochs': len(epochs),
+        'shortcuts': int(chord.sum()),
+        'markers': int(is_marker.sum()),
+        'rejected_markers': int((is_marker & ~accepted).sum()),
+        'timings': timings,
+    }
+
+def encode_records(text, wall_times, base_time, entries, lead=0.4, clock_offset=0.0, workers=None):
+    """
+    The SENDER side in reverse, vectorized: the records an ENDPOINT would
+    trace for `text` typed at `wall_times`, epoch markers included.
+    For benchmarks and tests.
+
+    Args:
+        text: characters of KEYS, uppercase letters or shifted symbols
+        wall_times: SENDER wall clock of each key press, ascending
+        lead: how far the SENDER's rotation runs ahead (-TIME_OFFSET)
+    """
+    t = TABLES
+    key_index = {char: i for i, char in enumerate(KEYS)}
+    index = np.array([key_index.get(char.lower(), -1) for char in text], np.int16)
+    upper = np.array([char.isupper() for char in text])
+    cps = np.array([ord(char) for char in text], np.uint32)
+
+    # Scrambled character -> the (keycode, shift) entry that types it
+    entry_of = np.zeros(128, np.intp)
+    for entry in np.flatnonzero(t['is_char']):
+        cp = t['scrambled_cp'][entry]
+        entry_of[cp - 32 if t['scrambled_upper'][entry] else cp] = entry
+
+    counter = np.floor((wall_times - (base_time - lead)) / INTERVAL).astype(np.int64)
+    epochs, epoch_row = np.unique(counter, return_inverse=True)
+    forward = np.argsort(inverse_permutations(epochs, entries, workers), axis=1)
+    scrambled = np.where(index >= 0, t['key_cp'][forward[epoch_row, np.maximum(index, 0)]], cps)
+    scrambled = np.where(upper & (scrambled >= ord('a')) & (scrambled <= ord('z')), scrambled - 32, scrambled)
+    entry = entry_of[scrambled]
+    code = entry // 2
+    needs_shift = (entry % 2).astype(bool)
+    new_epoch = np.concatenate(([True], counter[1:] != counter[:-1]))
+
+    # Seven slots a key: marker down/up, shift down, key down/up, shift up, (unused)
+    n = len(text)
+    marker_code = np.array([KEY_CODES[key] for key in EPOCH_MARKER_KEYS])[counter % MARKER_MODULUS]
+    shift_code = KEY_CODES['KEY_LEFTSHIFT']
+    slots = [
+        (new_epoch, marker_code, 1, -0.003), (new_epoch, marker_code, 0, -0.002),
+        (needs_shift, shift_code, 1, -0.001), (True, code, 1, 0.0), (True, code, 0, 0.05),
+        (needs_shift, shift_code, 0, 0.051),
+    ]
+    records = np.zeros((n, len(slots)), RECORD_DTYPE)
+    keep = np.zeros((n, len(slots)), bool)
+    for column, (present, slot_code, slot_value, dt) in enumerate(slots):
+        keep[:, column] = present
+        records['time'][:, column] = wall_times + dt - clock_offset
+        records['type'][:, column] = EV_KEY
+        records['code'][:, column] = slot_code
+        records['value'][:, column] = slot_value
+    return records[keep]
+
+def decode_trace(path, sym_key, base_time, entries=None, workers=None, device=None, session=None):
+    """
+    decode_records() of a trace file
+
+    Args:
+        entries: (start, key) of every switch; default `sym_key` and the
+            rekeys in the trace's key sidecar, of `session` if several rekeyed
+        device: picks keyboards by name substring
+    """
+    trace = Trace(path)
+    slots = None
+    if device is not None:
+        slots = [slot for slot, dev in enumerate(trace.devices) if device in dev.name]
+    if entries is None:
+        entries = [(float("-inf"), sym_key), *trace.key_switches(session)]
+    result = decode_records(load_records(trace), trace.clock_offset, base_time,
+                            entries, workers, slots)
+    result['rekeys'] = len(entries) - 1
+    return result
+
+def print_result(result):
+    timings = result['timings']
+    print("=" * 70)
+    print(f"BULK DECODE: {result['presses']} key presses over {result['epochs']} epochs "
+          f"in {timings['total'] * 1000:.1f} ms")
+    print("=" * 70)
+    print(f"  Throughput:  {result['presses'] / max(timings['total'], 1e-9) / 1e6:>8.2f} M keys/s")
+    for phase in ('modifiers', 'epochs', 'keymaps', 'decode'):
+        print(f"    {phase:<10} {timings[phase] * 1000:>8.1f} ms")
+    print(f"  Markers:     {result['markers']:>8} ({result['rejected_markers']} rejected)")
+    print(f"  Rekeys:      {result.get('rekeys', 0):>8}")
+    print(f"  Shortcuts:   {result['shortcuts']:>8} (Ctrl held, not in the text)")
+    print(f"\n  Text:  {result['text'][:70]!r}")
+    print("=" * 70)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[2])
+    parser.add_argument("trace", help="ENDPOINT trace recorded with --trace FILE")
+    parser.add_argument("--key", required=True, help="session key, hex")
+    parser.add_argument("--base-time", type=int, required=True, help="session base time")
+    parser.add_argument("--workers", type=int, help="processes for keymap derivation")
+    parser.add_argument("--device", help="decode only keyboards whose name contains this")
+    parser.add_argument("--session", help="the SENDER's port, if the key sidecar has several")
+    parser.add_argument("--out", help="write the decoded text here")
+    args = parser.parse_args(argv)
+
+    result = decode_trace(args.trace, bytes.fromhex(args.key), args.base_time,
+                          workers=args.workers, device=args.device, session=args.session)
+    print_result(result)
+    if args.out:
+        Path(args.out).write_text(result['text'])
+        print(f"Decoded text saved to: {args.out}")
+    return result
+
+if __name__ == "__main__":
+    main()
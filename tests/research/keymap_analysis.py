@@ -0,0 +1,317 @@
+"""
+tests/research/keymap_analysis.py
+
+Verify and measure keymaps over millions of epochs (NumPy)
+
+Round trip: every mappable key, with and without shift, caps lock and ctrl,
+goes through the SENDER's scramble table (char_to_evdev, SHIFT_MAP, case
+handling), the host's HID → evdev mapping and the ENDPOINT's decode table
+(EVDEV_TO_CHAR, char_to_keycode), and must come out as the character the
+SENDER read. Whether it does depends only on the key and on where the
+epoch's keymap sends its character, so the real tables are built once for
+every (character → scrambled character) pair and each epoch is checked with
+one lookup per key.
+
+Uniformity: how often each character lands on each position, how the
+positions of two characters correlate, and how often a mapping survives
+into the next epoch - each against what a uniform shuffle gives.
+
+Epochs are split across a process pool; keymaps come from keymap_batch.
+
+    python tests/research/keymap_analysis.py [--epochs N] [--workers N] [--key HEX]
+"""
+
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import ENDPOINT.main as endpoint_main
+from SENDER.key_mapper import EVDEV_TO_CHAR, SHIFT_MAP, build_scramble_table
+from UTILS.keymap import LETTERS, KEYS, reverse_keymap
+from UTILS.seedgen import SeedDeriver
+from tests.research import keymap_batch
+from tests.research.simulator import USAGE_TO_KEY, KEYCODE_TO_CHARS, HID_MOD_SHIFT, HID_MOD_CTRL
+
+EPOCHS = 1_000_000
+SYM_KEY = bytes(range(32))
+CHUNK = 65536  # Epochs per pool task
+LIMIT = 6.0  # Sigma: thousands of cells are tested, so ~4 turns up by chance
+POOLS = (("letters", slice(0, len(LETTERS))), ("symbols", slice(len(LETTERS), len(KEYS))))
+
+def _pool_of(index):
+    return 0 if index < len(LETTERS) else 1
+
+def _rotation(shift):
+    """A real keymap with every character moved `shift` places within its pool"""
+    keymap = {}
+    for _, pool in POOLS:
+        chars = KEYS[pool]
+        for i, char in enumerate(chars):
+            keymap[char] = chars[(i + shift) % len(chars)]
+    return keymap
+
+def inputs():
+    """Every (key, shift, caps, ctrl) the SENDER scrambles, with the character it reads"""
+    cases = []
+    for key, base_char in EVDEV_TO_CHAR.items():
+        for shift in (False, True):
+            for caps in (False, True):
+                for ctrl in (False, True):
+                    # As Scrambler.handle() picks the table entry
+                    upper = shift ^ caps if base_char.isalpha() else shift
+                    if base_char.isalpha():
+                        char = base_char.upper() if upper else base_char
+                    elif upper and base_char in SHIFT_MAP:
+                        char = SHIFT_MAP[base_char]
+                    else:
+                        char = base_char
+                    cases.append((key, shift, caps, ctrl, upper, char))
+    return cases
+
+def _through(scramble_table, decode_table, key, upper, ctrl):
+    """What the host types for one key through real tables, or why nothing is typed"""
+    _, outputs = scramble_table[key]
+    output = outputs[upper | ctrl << 1]
+    if output is None:
+        return None, "SENDER has no scrambled output"
+    hid_key, modifier, _, _, _ = output
+    host_key = USAGE_TO_KEY.get(hid_key)
+    if host_key is None:
+        return None, f"host has no key for HID 0x{hid_key:02x}"
+    host_shift = bool(modifier & HID_MOD_SHIFT)
+    host_ctrl = bool(modifier & HID_MOD_CTRL)
+    decoded = decode_table.get(host_key)
+    if decoded is None:
+        return None, f"ENDPOINT passes {host_key} through"
+    decoded = decoded[host_shift | host_ctrl << 1]
+    if decoded is None:
+        return None, f"ENDPOINT can't decode {host_key}"
+    (keycode, out_modifier), _, _ = decoded
+    chars = KEYCODE_TO_CHARS.get(keycode)
+    if chars is None:
+        return None, f"ENDPOINT types keycode {keycode}"
+    typed = chars[1] if out_modifier & 0x02 and chars[1] else chars[0]
+    if bool(out_modifier & 0x01) != ctrl:
+        return typed, "ctrl lost" if ctrl else "ctrl added"
+    return typed, None
+
+def round_trip_table(cases):
+    """
+    ok[case, j]: whether `case` survives a keymap sending its character to
+    KEYS[j], from the real tables of one rotation keymap per shift (every
+    pair within a pool is some rotation). Also the case's index into KEYS,
+    -1 if its character is never scrambled, and the failures seen.
+    """
+    index = np.array([KEYS.index(char.lower()) if char.lower() in KEYS else -1
+                      for *_, char in cases], np.intp)
+    ok = np.zeros((len(cases), len(KEYS)), bool)
+    failures = {}
+    for shift in range(max(len(KEYS[pool]) for _, pool in POOLS)):
+        keymap = _rotation(shift)
+        scramble = build_scramble_table(keymap)
+        decode = endpoint_main.build_decode_table(reverse_keymap(keymap))
+        for row, (key, _, _, ctrl, upper, char) in enumerate(cases):
+            if index[row] < 0:
+                if shift:
+                    continue
+                targets = range(len(KEYS))  # Unscrambled: the same for every keymap
+            else:
+                pool = KEYS[POOLS[_pool_of(index[row])][1]]
+                if shift >= len(pool):
+                    continue
+                targets = [KEYS.index(keymap[char.lower()])]
+            typed, problem = _through(scramble, decode, key, upper, ctrl)
+            passed = problem is None and typed == char
+            for j in targets:
+                ok[row, j] = passed
+            if not passed:
+                failures.setdefault(row, (keymap.get(char.lower(), char), typed, problem))
+    return index, ok, failures
+
+def _chunk(sym_key, start, count, bad):
+    """
+    Derive `count` epochs from `start`: uniformity sums, and the epochs
+    whose keymap sends some character to a target in `bad[char, target]`
+    """
+    started = time.perf_counter()
+    perms = keymap_batch.permutations(SeedDeriver(sym_key).seeds_for_range(start, count))
+    derived = time.perf_counter() - started
+
+    size = len(KEYS)
+    cells = perms + np.arange(0, size * size, size, dtype=np.intp)
+    failing = np.flatnonzero(bad.ravel()[cells].any(axis=1)) if bad.any() else np.empty(0, np.intp)
+    values = perms.astype(np.float64)
+    return {
+        'failing_epochs': len(failing),
+        'first_failing': start + int(failing[0]) if len(failing) else None,
+        'position': np.bincount(cells.ravel(), minlength=size * size).reshape(size, size),
+        'sum': values.sum(axis=0),
+        'products': values.T @ values,
+        'repeats': (perms[1:] == perms[:-1]).sum(axis=0),
+        'first': perms[0],
+        'last': perms[-1],
+        'derive': derived,
+        'check': time.perf_counter() - started - derived,
+    }
+
+def analyze(epochs=EPOCHS, sym_key=SYM_KEY, start=0, workers=None):
+    """Round-trip and uniformity results over `epochs` consecutive epochs"""
+    started = time.perf_counter()
+    keymap_batch.check()
+    cases = inputs()
+    index, ok, failures = round_trip_table(cases)
+    scrambled = np.flatnonzero(index >= 0)
+    bad = np.zeros((len(KEYS), len(KEYS)), bool)
+    np.logical_or.at(bad, index[scrambled], ~ok[scrambled])
+    tables = time.perf_counter() - started
+
+    starts = range(start, start + epochs, CHUNK)
+    counts = [min(CHUNK, start + epochs - chunk) for chunk in starts]
+    if workers is None:
+        workers = os.cpu_count() if len(counts) > 1 else 1
+    args = ([sym_key] * len(counts), starts, counts, [bad] * len(counts))
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_chunk, *args))
+    else:
+        parts = list(map(_chunk, *args))
+
+    total = {name: sum(part[name] for part in parts)
+             for name in ('failing_epochs', 'position', 'sum', 'products', 'repeats', 'derive', 'check')}
+    for before, after in zip(parts, parts[1:]):
+        total['repeats'] = total['repeats'] + (before['last'] == after['first'])
+    first_failing = [part['first_failing'] for part in parts if part['first_failing'] is not None]
+
+    # A case fails in every epoch that sends its character to a bad target;
+    # unscrambled characters fail always or never
+    case_failures = np.where(ok[:, 0], 0, epochs)
+    case_failures[scrambled] = (total['position'][index[scrambled]] * ~ok[scrambled]).sum(axis=1)
+    if (index < 0).any() and not ok[index < 0, 0].all():
+        total['failing_epochs'] = epochs
+        first_failing = [start]
+    return {
+        'epochs': epochs,
+        'cases': cases,
+        'case_failures': case_failures,
+        'failure_examples': failures,
+        'failing_epochs': total['failing_epochs'],
+        'first_failing': min(first_failing) if first_failing else None,
+        'uniformity': uniformity(epochs, total['position'], total['sum'], total['products'],
+                                 total['repeats']),
+        'timings': {
+            'tables': tables,
+            'derive': total['derive'],
+            'check': total['check'],
+            'total': time.perf_counter() - started,
+        },
+        'workers': workers,
+    }
+
+def uniformity(epochs, position, sums, products, repeats):
+    """
+    Deviation of each statistic from a uniform shuffle, in sigma. Within a
+    pool of n, a character lands on each position 1/n of the time, two
+    characters' positions correlate at -1/(n - 1) (they can't collide), and
+    a mapping repeats in the next epoch 1/n of the time; across pools
+    positions are independent.
+    """
+    mean = sums / epochs
+    cov = products / epochs - np.outer(mean, mean)
+    sd = np.sqrt(np.diag(cov))
+    corr = cov / np.outer(sd, sd)
+    pool_of = np.array([_pool_of(i) for i in range(len(KEYS))])
+    pool_size = np.array([len(KEYS[POOLS[p][1]]) for p in pool_of])
+    same_pool = pool_of[:, None] == pool_of[None, :]
+    off_diagonal = ~np.eye(len(KEYS), dtype=bool)
+
+    results = {}
+    for name, pool in POOLS:
+        n = pool.stop - pool.start
+        cells = position[pool, pool]
+        expected = epochs / n
+        cell_z = (cells - expected) / np.sqrt(expected * (1 - 1 / n))
+        chi2 = ((cells - expected) ** 2 / expected).sum()
+        dof = n * (n - 1)
+        repeat_rate = repeats[pool].sum() / ((epochs - 1) * n)
+        repeat_z = (repeat_rate - 1 / n) / np.sqrt((1 / n) * (1 - 1 / n) / ((epochs - 1) * n))
+        results[name] = {
+            'chi2_z': (chi2 - dof) / np.sqrt(2 * dof),
+            'cell_z': np.abs(cell_z).max(),
+            'cell_spread': (cells.min() / expected, cells.max() / expected),
+            'repeat_rate': repeat_rate,
+            'repeat_z': abs(repeat_z),
+        }
+    expected_corr = np.where(same_pool, -1 / (pool_size[:, None] - 1), 0.0)
+    corr_z = np.abs(corr - expected_corr) * np.sqrt(epochs)
+    results['corr_z_within'] = corr_z[same_pool & off_diagonal].max()
+    results['corr_z_across'] = corr_z[~same_pool].max()
+    results['passed'] = max(
+        [results['corr_z_within'], results['corr_z_across']]
+        + [results[name][stat] for name, _ in POOLS for stat in ('chi2_z', 'cell_z', 'repeat_z')]
+    ) < LIMIT
+    return results
+
+def print_result(result):
+    timings = result['timings']
+    epochs = result['epochs']
+    cases = result['cases']
+    failing = np.flatnonzero(result['case_failures'])
+    print("=" * 70)
+    print(f"KEYMAP ANALYSIS: {epochs:,} epochs x {len(cases)} key states "
+          f"({result['workers']} process{'es' if result['workers'] > 1 else ''})")
+    print("=" * 70)
+    print(f"  Round-trip tables:  {timings['tables'] * 1000:>8.1f} ms")
+    print(f"  Keymaps:            {timings['derive']:>8.2f} s  ({timings['derive'] / epochs * 1e6:.1f} us/epoch, CPU)")
+    print(f"  Checks and stats:   {timings['check']:>8.2f} s")
+    print(f"  Wall:               {timings['total']:>8.2f} s  ({epochs / timings['total']:,.0f} epochs/s)")
+
+    print(f"\n  Round trips:        {epochs * len(cases):,}")
+    if not len(failing):
+        print("  ✓ Every key state decodes to what the SENDER read, in every epoch")
+    else:
+        print(f"  ✗ {result['failing_epochs']:,} epochs lose keys "
+              f"(first: counter {result['first_failing']})")
+        for row in failing[:10]:
+            key, shift, caps, ctrl, _, char = cases[row]
+            scrambled, typed, problem = result['failure_examples'].get(row, ('?', None, None))
+            state = "+".join(name for name, on in (("shift", shift), ("caps", caps), ("ctrl", ctrl)) if on)
+            print(f"    {key:<16}{state or '-':<16}{char!r} → {scrambled!r} → "
+                  f"{typed!r}  {problem or ''}  in {result['case_failures'][row] / epochs:.1%} of epochs")
+
+    stats = result['uniformity']
+    print(f"\n  Uniformity (sigma from a uniform shuffle; over {LIMIT:.0f} fails):")
+    for name, _ in POOLS:
+        pool = stats[name]
+        low, high = pool['cell_spread']
+        print(f"    {name:<8} position chi2 {pool['chi2_z']:>6.2f}   worst cell {pool['cell_z']:>5.2f} "
+              f"({low:.3f}-{high:.3f}x)   repeat next epoch {pool['repeat_rate']:.4f} ({pool['repeat_z']:.2f})")
+    print(f"    pair correlation: within pools {stats['corr_z_within']:.2f}, "
+          f"across pools {stats['corr_z_across']:.2f}")
+    print(f"  {'✓ Uniform' if stats['passed'] else '✗ NOT uniform'}")
+    print("=" * 70)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[2])
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--start", type=int, default=0, help="first epoch counter")
+    parser.add_argument("--key", help="session key, hex (default: a fixed test key)")
+    parser.add_argument("--workers", type=int, help="processes (default: all CPUs)")
+    args = parser.parse_args(argv)
+
+    sym_key = bytes.fromhex(args.key) if args.key else SYM_KEY
+    result = analyze(args.epochs, sym_key, args.start, args.workers)
+    print_result(result)
+    if result['case_failures'].any() or not result['uniformity']['passed']:
+        sys.exit(1)
+    return result
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+tests/research/keymap_batch.py
+
+UTILS.keymap.seed_to_permutation() for many seeds at once (NumPy)
+seed_to_keymap() seeds random.Random with the 256-bit seed and shuffles the
+letter and symbol pools. Almost all of its ~35 us is CPython's Mersenne
+Twister: init_by_array() over 624 words, then ~100 draws for the two
+shuffles. Here those steps run column-wise over a block of seeds -
+each of the ~1900 sequential MT steps is one vector operation across every
+seed - so a million keymaps cost seconds instead of half a minute.
+
+This re-implements CPython internals (Modules/_randommodule.c,
+Random.shuffle, Random._randbelow_with_getrandbits). check() compares
+against the real seed_to_permutation() and every caller runs it first, so
+an interpreter that changes them fails loudly instead of decoding wrong.
+"""
+
+import random
+import sys
+from pathlib import Path
+
+import numpy as np
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from UTILS.keymap import LETTERS, KEYS, seed_to_permutation
+
+N = 624
+M = 397
+MATRIX_A = np.uint32(0x9908B0DF)
+UPPER_MASK = np.uint32(0x80000000)
+LOWER_MASK = np.uint32(0x7FFFFFFF)
+BLOCK = 8192  # Seeds per vector pass: 624 x BLOCK uint32 of state, ~20 MB
+DRAWS = 160  # Outputs generated per seed; the two shuffles take ~90 (more: slow path)
+
+def _init_genrand(s):
+    """CPython init_genrand(): the state init_by_array() starts from"""
+    mt = [0] * N
+    mt[0] = s
+    for i in range(1, N):
+        mt[i] = (1812433253 * (mt[i - 1] ^ (mt[i - 1] >> 30)) + i) & 0xFFFFFFFF
+    return np.array(mt, np.uint32)
+
+GENRAND_19650218 = _init_genrand(19650218)
+
+def _key_words(seeds):
+    """
+    init_by_array() keys: the seed int as little-endian 32-bit words.
+    Seeds are 32 bytes, so 8 words - fewer when the top words are zero
+    (CPython drops them), which happens once in ~4 billion seeds.
+    """
+    words = np.frombuffer(b"".join(seeds), ">u4").reshape(-1, 8)[:, ::-1].astype(np.uint32)
+    lengths = np.full(len(seeds), 8)
+    for top in range(7, 0, -1):
+        lengths = np.where((lengths == top + 1) & (words[:, top] == 0), top, lengths)
+    return words, lengths
+
+def _seed_state(words, key_length):
+    """CPython init_by_array() for seeds sharing one key length; state is (N, seeds)"""
+    count = len(words)
+    mt = np.empty((N, count), np.uint32)
+    mt[:] = GENRAND_19650218[:, None]
+    key = [words[:, j] + np.uint32(j) for j in range(key_length)]
+    i, j = 1, 0
+    for _ in range(max(N, key_length)):
+        prev = mt[i - 1]
+        mt[i] = (mt[i] ^ ((prev ^ (prev >> 30)) * np.uint32(1664525))) + key[j]
+        i += 1
+        j += 1
+        if i >= N:
+            mt[0] = mt[N - 1]
+            i = 1
+        if j >= key_length:
+            j = 0
+    for _ in range(N - 1):
+        prev = mt[i - 1]
+        mt[i] = (mt[i] ^ ((prev ^ (prev >> 30)) * np.uint32(1566083941))) - np.uint32(i)
+        i += 1
+        if i >= N:
+            mt[0] = mt[N - 1]
+            i = 1
+    mt[0] = UPPER_MASK
+    return mt
+
+def _outputs(mt, draws):
+    """
+    The first `draws` outputs of the next MT19937 twist, tempered. Row kk
+    of the twist only reads rows kk + 1 and kk + M (or kk + M - N, already
+    twisted), so just as many rows need regenerating as are drawn.
+    """
+    def mix(rows, following, source):
+        y = mt[rows] & UPPER_MASK
+        y |= following & LOWER_MASK
+        odd = y & 1
+        odd *= MATRIX_A
+        y >>= 1
+        y ^= source
+        y ^= odd
+        return y
+
+    head = min(draws, N - M)
+    y = [mix(slice(0, head), mt[1:head + 1], mt[M:M + head])]
+    if draws > head:
+        y.append(mix(slice(head, draws), mt[head + 1:draws + 1], y[0][:draws - head]))
+    y = np.concatenate(y) if len(y) > 1 else y[0]
+    y ^= y >> 11
+    y ^= (y << 7) & np.uint32(0x9D2C5680)
+    y ^= (y << 15) & np.uint32(0xEFC60000)
+    y ^= y >> 18
+    return y
+
+def _shuffle(outputs, pos, size, offset):
+    """
+    Random.shuffle() of range(offset, offset + size) per seed, drawing from
+    `outputs` (DRAWS, seeds) at each seed's own position; rejection sampling as
+    _randbelow_with_getrandbits() does it.
+    """
+    count = outputs.shape[1]
+    columns = np.arange(count)
+    x = np.tile(np.arange(offset, offset + size, dtype=np.uint8), (count, 1))
+    for i in range(size - 1, 0, -1):
+        n = i + 1
+        shift = 32 - n.bit_length()
+        r = outputs[np.minimum(pos, DRAWS - 1), columns] >> shift
+        rejected = np.flatnonzero(r >= n)
+        while len(rejected):
+            pos[rejected] += 1
+            r[rejected] = outputs[np.minimum(pos[rejected], DRAWS - 1), rejected] >> shift
+            rejected = rejected[r[rejected] >= n]
+        pos += 1
+        j = r.astype(np.intp)
+        swapped = x[columns, j]
+        x[columns, j] = x[:, i]
+        x[:, i] = swapped
+    return x
+
+def _block(seeds):
+    words, lengths = _key_words(seeds)
+    perms = np.empty((len(seeds), len(KEYS)), np.uint8)
+    for key_length in np.unique(lengths):
+        rows = np.flatnonzero(lengths == key_length)
+        mt = _seed_state(words[rows], int(key_length))
+        outputs = _outputs(mt, DRAWS)
+        pos = np.zeros(len(rows), np.intp)
+        letters = _shuffle(outputs, pos, len(LETTERS), 0)
+        symbols = _shuffle(outputs, pos, len(KEYS) - len(LETTERS), len(LETTERS))
+        if pos.max() >= DRAWS:
+            # More draws than generated (never seen): the slow path
+            for row in np.flatnonzero(pos >= DRAWS):
+                letters[row], symbols[row] = np.split(
+                    np.array(seed_to_permutation(seeds[rows[row]]), np.uint8), [len(LETTERS)])
+        perms[rows] = np.concatenate([letters, symbols], axis=1)
+    return perms
+
+def permutations(seeds):
+    """seed_to_permutation() of every seed, one uint8 row each"""
+    if not len(seeds):
+        return np.empty((0, len(KEYS)), np.uint8)
+    return np.concatenate([_block(seeds[start:start + BLOCK]) for start in range(0, len(seeds), BLOCK)])
+
+def check(samples=64):
+    """Raise if this interpreter's random module no longer matches the vectorized copy"""
+    rng = random.Random(samples)
+    seeds = [rng.randbytes(32) for _ in range(samples)] + [bytes(4) + rng.randbytes(28)]
+    expected = np.array([seed_to_permutation(seed) for seed in seeds], np.uint8)
+    if not np.array_equal(permutations(seeds), expected):
+        raise RuntimeError(f"keymap_batch does not match random.Random on Python {sys.version.split()[0]}")
@@ -0,0 +1,58 @@
+"""
+tests/research/pty_link.py
+
+pty pair standing in for the /dev/ttyGS0 <-> /dev/ttyACM0 CDC link
+One end is a real pyserial port, the other a minimal serial-like wrapper
+"""
+
+import os
+import select
+import tty
+
+import serial
+
+class PtyPort:
+    """Serial-like read/write over the master side of a pty"""
+
+    def __init__(self, fd, timeout=2):
+        self.fd = fd
+        self.timeout = timeout
+
+    def read(self, size):
+        """Read up to `size` bytes, b'' on timeout (like pyserial)"""
+        data = b""
+        while len(data) < size:
+            r, _, _ = select.select([self.fd], [], [], self.timeout)
+            if not r:
+                break
+            chunk = os.read(self.fd, size - len(data))
+            if not chunk:
+                break
+            data += chunk
+        return data
+
+    def write(self, data):
+        view = memoryview(data)
+        while view:
+            written = os.write(self.fd, view)
+            view = view[written:]
+        return len(data)
+
+    def fileno(self):
+        return self.fd
+
+    def close(self):
+        os.close(self.fd)
+
+def open_pty_pair(timeout=2):
+    """
+    Returns:
+        (sender_side, endpoint_side) - a pyserial port and a PtyPort
+    """
+    master, slave = os.openpty()
+    # Raw mode so the line discipline passes bytes through untouched
+    tty.setraw(master)
+    tty.setraw(slave)
+    sender_side = serial.Serial(os.ttyname(slave), 115200, timeout=timeout)
+    os.close(slave)
+    return sender_side, PtyPort(master, timeout)
@@ -0,0 +1,237 @@
+"""
+tests/research/replay.py
+
+Replay a recorded key trace through the real SENDER or ENDPOINT logic
+A trace (UTILS.trace, recorded with --trace FILE) is read memory-mapped and
+fed through the reader's own record builder, then the Scrambler or Decoder,
+as fast as possible or in real time. No keyboard, gadget or uinput needed.
+
+  --side sender    SENDER trace → Scrambler → emulated host → Decoder, on the
+                   simulator's virtual clock; compares what was typed with
+                   what came out, so a misdecode shows up with its context
+  --side endpoint  ENDPOINT trace → Decoder, with the session's --key and
+                   --base-time to reproduce what the host saw; the keys of
+                   later rekeys come from the trace's .keys sidecar
+"""
+
+import contextlib
+import os
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+from UTILS.trace import Trace
+from UTILS.events import KEY_DOWN
+
+CONTEXT = 20  # Characters shown either side of the first misdecode
+
+class DecodedText:
+    """
+    ENDPOINT writer stand-in collecting what the host would see typed - the
+    simulator's OutputKeyboard, minus its SENDER imports (no hidpi on a host)
+    """
+
+    def __init__(self):
+        from ENDPOINT.key_mapper import CHAR_TO_KEYCODE, SHIFTED_CHARS
+        self.chars = {keycode: [char, char.upper() if char.isalpha() else None]
+                      for char, keycode in CHAR_TO_KEYCODE.items()}
+        for shifted, base in SHIFTED_CHARS.items():
+            self.chars[CHAR_TO_KEYCODE[base]][1] = shifted
+        self.typed = []
+
+    def press_key(self, keycode, modifier=0):
+        chars = self.chars.get(keycode)
+        # Ctrl held: a shortcut, nothing typed
+        if chars and not modifier & 0x01:
+            self.typed.append(chars[1] if modifier & 0x02 and chars[1] else chars[0])
+
+    def release_key(self, keycode, modifier=0):
+        pass
+
+def typed_char(record, evdev_to_char, shift_map):
+    """Character a SENDER key record types, or None for special and Ctrl keys"""
+    base = evdev_to_char.get(record.key)
+    if base is None or record.ctrl:
+        return None
+    if base.isalpha():
+        return base.upper() if record.shift ^ record.caps_lock else base
+    return shift_map.get(base, base) if record.shift else base
+
+def replay_sender(trace, speed=None, sym_key=None, base_time=None, latency=None, verbose=False):
+    """
+    Type a SENDER trace through the loopback simulator
+
+    Returns:
+        dict with typed and received text, error count and timings
+    """
+    from SENDER.keyboard_reader import KeyboardDevice, key_records
+    from SENDER.key_mapper import EVDEV_TO_CHAR, SHIFT_MAP
+    from tests.research import simulator
+
+    # By device, not fd: a keyboard plugged in later may have reused one
+    devices = {dev: KeyboardDevice(dev.path, dev) for dev in trace.devices}
+    if base_time is None:
+        base_time = int(trace.started) - 100 * simulator.sender_main.INTERVAL
+    sim = simulator.Simulation(
+        latency=simulator.LATENCY if latency is None else latency,
+        base_time=base_time,
+        sym_key=sym_key or simulator.SYM_KEY,
+    )
+    sim.sender_now = sim.endpoint_now = trace.started
+    offset = trace.clock_offset
+    batches = ((devices[dev], events) for dev, events in trace.batches(speed))
+
+    typed = []
+    events = 0
+    started = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(open(os.devnull, 'w')))
+        for record in key_records(batches):
+            events += 1
+            if record.state == KEY_DOWN:
+                char = typed_char(record, EVDEV_TO_CHAR, SHIFT_MAP)
+                if char is not None:
+                    typed.append(char)
+            # Stalls (markers off) push later keys back, as on the device
+            sim.sender_now = max(sim.sender_now, record.time + offset)
+            encode_started = time.perf_counter()
+            sim.scrambler.handle(record)
+            sim.encode_time += time.perf_counter() - encode_started
+    elapsed = time.perf_counter() - started
+
+    sent = "".join(typed)
+    received = "".join(sim.output.typed)
+    first_error = next((i for i, (a, b) in enumerate(zip(sent, received)) if a != b), None)
+    if first_error is None and len(sent) != len(received):
+        first_error = min(len(sent), len(received))
+    errors = sum(1 for a, b in zip(sent, received) if a != b) + abs(len(sent) - len(received))
+    return {
+        'side': 'sender',
+        'events': events,
+        'elapsed': elapsed,
+        'sent': sent,
+        'received': received,
+        'errors': errors,
+        'first_error': first_error,
+        'encode_us_per_key': sim.encode_time / max(events, 1) * 1e6,
+        'decode_us_per_key': sim.decode_time / max(events, 1) * 1e6,
+    }
+
+def trace_schedule(trace, sym_key, session=None):
+    """KeySchedule of the recorded session: `sym_key`, then every rekey in the trace's key sidecar"""
+    from UTILS.rekey import KeySchedule
+    switches = trace.key_switches(session)
+    schedule = KeySchedule(sym_key, keep=len(switches) + 1)
+    for start, key in switches:
+        schedule.schedule(start, key)
+    return schedule
+
+def replay_endpoint(trace, sym_key, base_time, speed=None, verbose=False, session=None):
+    """
+    Decode an ENDPOINT trace as the session with `sym_key` would have
+
+    Args:
+        session: the SENDER's port, if the trace's sidecar has rekeys of several
+
+    Returns:
+        dict with the decoded text, drops by each check and timings
+    """
+    import ENDPOINT.main as endpoint_main
+    from ENDPOINT.keyboard_reader import key_records
+    from ENDPOINT.epoch_window import EpochWindow
+
+    now = [trace.started]
+    output = DecodedText()
+    cadence, plausibility = endpoint_main.build_checks()
+    schedule = trace_schedule(trace, sym_key, session)
+    window = EpochWindow(schedule, table_builder=endpoint_main.build_decode_table)
+    decoder = endpoint_main.Decoder(window, base_time, output, clock=lambda: now[0],
+                                    cadence=cadence, plausibility=plausibility)
+    offset = trace.clock_offset
+
+    events = 0
+    decode_time = 0.0
+    started = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            stack.enter_context(contextlib.redirect_stdout(open(os.devnull, 'w')))
+        for record in key_records(trace.batches(speed)):
+            events += 1
+            now[0] = record.time + offset
+            decode_started = time.perf_counter()
+            decoder.handle(record)
+            decode_time += time.perf_counter() - decode_started
+    elapsed = time.perf_counter() - started
+
+    return {
+        'side': 'endpoint',
+        'events': events,
+        'elapsed': elapsed,
+        'received': "".join(output.typed),
+        'rekeys': len(schedule.entries()) - 1,
+        'cadence_blocked': cadence.blocked if cadence else 0,
+        'plausibility_alerts': plausibility.alerts if plausibility else 0,
+        'plausibility_blocked': plausibility.blocked if plausibility else 0,
+        'decode_us_per_key': decode_time / max(events, 1) * 1e6,
+    }
+
+def print_result(trace, result):
+    span = trace.span()
+    print("=" * 70)
+    print(f"REPLAY ({result['side'].upper()}): {result['events']} key events, "
+          f"{span:.1f} s recorded, replayed in {result['elapsed']:.3f} s")
+    print("=" * 70)
+    print(f"  Devices:  {', '.join(dev.name for dev in trace.devices) or 'none'}")
+    print(f"  Rate:     {result['events'] / max(result['elapsed'], 1e-9):>10.0f} events/s")
+    if result['side'] == 'sender':
+        print(f"  Encode:   {result['encode_us_per_key']:>10.1f} us/event")
+        print(f"  Decode:   {result['decode_us_per_key']:>10.1f} us/event")
+        print(f"  Typed:    {len(result['sent']):>10} chars")
+        print(f"  Errors:   {result['errors']:>10}")
+        index = result['first_error']
+        if index is not None:
+            low = max(0, index - CONTEXT)
+            print(f"\n  First misdecode at char {index}:")
+            print(f"    Typed:    {result['sent'][low:index + CONTEXT]!r}")
+            print(f"    Received: {result['received'][low:index + CONTEXT]!r}")
+    else:
+        print(f"  Decode:   {result['decode_us_per_key']:>10.1f} us/event")
+        print(f"  Rekeys:   {result['rekeys']:>10}")
+        print(f"  Cadence:  {result['cadence_blocked']:>10} presses dropped")
+        print(f"  Plausibility: {result['plausibility_alerts']} alerts, "
+              f"{result['plausibility_blocked']} chars dropped")
+        print(f"\n  Decoded:  {result['received'][:70]!r}")
+    print("=" * 70)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[2])
+    parser.add_argument("trace", help="trace recorded with --trace FILE")
+    parser.add_argument("--side", choices=("sender", "endpoint"), default="sender",
+                        help="which device recorded it")
+    parser.add_argument("--speed", type=float, default=None,
+                        help="1 replays in real time, 2 twice as fast (default: as fast as possible)")
+    parser.add_argument("--key", help="session key, hex (required for --side endpoint)")
+    parser.add_argument("--base-time", type=int, help="session base time")
+    parser.add_argument("--session", help="ENDPOINT side: the SENDER's port, if several rekeyed")
+    parser.add_argument("--latency", type=float, help="SENDER side: link latency, s")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show SENDER/ENDPOINT logs")
+    args = parser.parse_args(argv)
+
+    trace = Trace(args.trace)
+    sym_key = bytes.fromhex(args.key) if args.key else None
+    if args.side == "sender":
+        result = replay_sender(trace, args.speed, sym_key, args.base_time, args.latency, args.verbose)
+    else:
+        if sym_key is None or args.base_time is None:
+            parser.error("--side endpoint needs the session's --key and --base-time")
+        result = replay_endpoint(trace, sym_key, args.base_time, args.speed, args.verbose, args.session)
+    print_result(trace, result)
+    return result
+
+if __name__ == "__main__":
+    main()
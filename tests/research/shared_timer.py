@@ -2,15 +2,24 @@
 tests/research/shared_timer.py
 
 Shared timing logger for latency measurements
-Both SENDER and ENDPOINT log timestamps to correlate later
+Both SENDER and ENDPOINT log timestamps to correlate later. StageTimer
+attaches it to the production main loop's pipeline hooks (see
+UTILS.pipeline): run both sides with --timing, e.g.
+`omg-mitigation sender --timing`, then `omg-mitigation analyze`.
 """
 
 import time
 import json
 from pathlib import Path
 
+from UTILS.pipeline import RELEASE, PASS_THROUGH
+
+LOG_FILE = 'tests/research/results/timing_log.jsonl'
+# --low-latency runs log separately, for analyze_timing.py --compare
+LOW_LATENCY_LOG_FILE = 'tests/research/results/timing_log_lowlat.jsonl'
+
 class SharedTimer:
-    def __init__(self, device_name, log_file='tests/research/results/timing_log.jsonl'):
+    def __init__(self, device_name, log_file=LOG_FILE):
         """
         Initialize timer for a device
         
@@ -69,6 +78,47 @@ class SharedTimer:
         
         return timestamp
     
+    def log_stages(self, key, stages, metadata=None):
+        """
+        Log one keystroke's per-stage stamps
+        
+        Take the stamps inline with time.monotonic() and log them once the
+        key has been written, so file I/O never lands between two stages.
+        
+        Args:
+            key: The key being processed
+            stages: dict of stage -> time.monotonic() stamp; 'kernel' is the
+                evdev event time (record.time)
+            metadata: Optional dict with extra info
+        """
+        if not self.enabled:
+            return
+        
+        # Realtime minus monotonic: puts these stamps on the wall clock so
+        # the other device's can be compared with them
+        clock_offset = time.time() - time.monotonic()
+        kernel = stages.get('kernel')
+        if kernel is not None and kernel > clock_offset / 2:
+            # The kernel refused CLOCK_MONOTONIC and stamped wall time
+            stages = dict(stages, kernel=kernel - clock_offset)
+        
+        event = {
+            'session': self.session_id,
+            'device': self.device,
+            'event': 'stages',
+            'key': str(key),
+            'stages': stages,
+            'clock_offset': clock_offset,
+            'wall_time': time.time(),
+            'metadata': metadata or {}
+        }
+        
+        try:
+            with open(self.log_file, 'a') as f:
+                f.write(json.dumps(event) + '\n')
+        except Exception as e:
+            print(f"[{self.device}] ERROR logging event: {e}")
+    
     def disable(self):
         """Stop logging events"""
         self.enabled = False
@@ -78,3 +128,43 @@ class SharedTimer:
         """Resume logging events"""
         self.enabled = True
         print(f"[{self.device}] Timing logger enabled")
+
+
+class StageTimer:
+    """
+    Pipeline observer that logs each key press with SharedTimer.log_stages
+
+    Stamps are taken on time.monotonic() when userspace has the record
+    (read), when the keymap lookup is done (map) and when the HID or
+    uinput write has returned (emit), next to the kernel's event time.
+    The log line is written after the write, so file I/O never lands
+    between two stages. Dropped keys, releases and epoch markers are not
+    logged, which keeps the two devices' presses in step.
+    """
+
+    def __init__(self, timer):
+        self.timer = timer
+        self.captured = 0.0
+        self.looked_up = 0.0
+
+    def after_read(self, record, kind, output):
+        self.captured = time.monotonic()
+
+    def after_map(self, record, kind, output):
+        self.looked_up = time.monotonic()
+
+    def after_emit(self, record, kind, output):
+        written = time.monotonic()
+        if kind == RELEASE:
+            return
+        self.timer.log_stages(record.key, {
+            'kernel': record.time, 'capture': self.captured,
+            'lookup': self.looked_up, 'write': written,
+        }, {'passthrough': True} if kind == PASS_THROUGH else None)
+
+
+def stage_timer(device_name, low_latency=False):
+    """StageTimer logging to the default log, or the low-latency one"""
+    log_file = LOW_LATENCY_LOG_FILE if low_latency else LOG_FILE
+    print(f"[TIMING] {device_name} timing enabled - logging to {log_file}")
+    return StageTimer(SharedTimer(device_name, log_file))
@@ -0,0 +1,429 @@
+"""
+tests/research/simulator.py
+
+Loopback simulator: SENDER Scrambler → emulated USB host → ENDPOINT Decoder
+Runs both sides in one process on a virtual clock, so a minute of typing
+across several rotations takes well under a second and needs no hardware.
+Clock skew, link latency and jitter are parameters.
+
+With --link-drops, the serial control link (a pty pair) is also unplugged
+repeatedly while typing goes on, to time the reconnect and resync.
+"""
+
+import contextlib
+import itertools
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import SENDER.main as sender_main
+import ENDPOINT.main as endpoint_main
+from SENDER.key_sender import HIDReportWriter
+from SENDER.key_mapper import char_to_evdev, HID_CODES, KEY_MAPPING
+from ENDPOINT.epoch_window import EpochWindow
+from ENDPOINT.key_mapper import CHAR_TO_KEYCODE, SHIFTED_CHARS, KEY_CODES
+from UTILS.epoch import EPOCH_MARKER_KEYS, EPOCH_MARKER_HID
+from UTILS.events import KeyRecord, KEY_DOWN, KEY_UP
+from UTILS.control_channel import ControlChannel
+from UTILS.rekey import KeySchedule
+from UTILS.resync import DriftClock, SenderResync, EndpointResync
+from tests.research.pty_link import open_pty_pair
+
+SYM_KEY = bytes(range(32))
+TEXT = "The quick brown fox jumps over the lazy dog! 1234567890 (test) "
+CHARS = 600  # ~75 s at 8 keys/s: several rotations
+RATE = 8.0  # Keys per second
+DWELL = 0.08  # Seconds a key is held
+LATENCY = 0.004  # SENDER write → ENDPOINT read, seconds
+LINK_DROPS = 5
+OUTAGE = 0.5  # Seconds the serial link stays unplugged
+PORT_TIMEOUT = 0.05  # Read timeout of the pty ports, bounds loss detection
+
+HID_MOD_SHIFT = 0x22  # Left | right shift
+HID_MOD_CTRL = 0x11  # Left | right ctrl
+
+# HID usage → evdev key name, as the host's hid-input driver maps it
+USAGE_TO_KEY = {}
+for name, usage in list(HID_CODES.items()) + list(KEY_MAPPING.items()):
+    if name.startswith('KEY_'):
+        USAGE_TO_KEY.setdefault(usage, name)
+USAGE_TO_KEY.update(zip(EPOCH_MARKER_HID, EPOCH_MARKER_KEYS))
+
+# evdev keycode → (plain char, shifted char) for reading the ENDPOINT output
+KEYCODE_TO_CHARS = {}
+for char, keycode in CHAR_TO_KEYCODE.items():
+    shifted = char.upper() if char.isalpha() else None
+    KEYCODE_TO_CHARS[keycode] = [char, shifted]
+for shifted, base in SHIFTED_CHARS.items():
+    KEYCODE_TO_CHARS[CHAR_TO_KEYCODE[base]][1] = shifted
+
+class Link:
+    """USB link: delivery times are SENDER time + latency + jitter, never reordered"""
+
+    def __init__(self, latency, jitter, rng):
+        self.latency = latency
+        self.jitter = jitter
+        self.rng = rng
+        self.last_delivery = float('-inf')
+
+    def delivery_time(self, sent_at):
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        self.last_delivery = max(self.last_delivery, sent_at + delay)
+        return self.last_delivery
+
+class EmulatedHost(HIDReportWriter):
+    """
+    /dev/hidg0 stand-in that plays the USB host: turns each report into
+    key records, exactly as the ENDPOINT's kernel would, and feeds them to
+    the decoder at the report's delivery time.
+    """
+
+    def __init__(self, sim):
+        super().__init__(os.devnull)
+        self.sim = sim
+        self.previous = []
+        self.record = KeyRecord()
+        self.reports = 0
+
+    def write_report(self, report):
+        self.reports += 1
+        sim = self.sim
+        sim.endpoint_now = sim.link.delivery_time(sim.sender_now)
+        modifier = report[0]
+        keys = [k for k in report[2:] if k]
+        record = self.record
+        record.shift = bool(modifier & HID_MOD_SHIFT)
+        record.ctrl = bool(modifier & HID_MOD_CTRL)
+        for usage in self.previous:
+            if usage not in keys:
+                self._emit(usage, KEY_UP)
+        for usage in keys:
+            if usage not in self.previous:
+                self._emit(usage, KEY_DOWN)
+        self.previous = keys
+
+    def _emit(self, usage, state):
+        key = USAGE_TO_KEY.get(usage)
+        if key is None:
+            return
+        self.record.key = key
+        self.record.code = KEY_CODES.get(key, 0)
+        self.record.state = state
+        started = time.perf_counter()
+        self.sim.decoder.handle(self.record)
+        self.sim.decode_time += time.perf_counter() - started
+
+class OutputKeyboard:
+    """ENDPOINT virtual keyboard stand-in: collects what the host would see typed"""
+
+    def __init__(self, clock=None):
+        self.typed = []
+        self.clock = clock
+        self.times = []  # clock() at each typed char, if given
+
+    def press_key(self, keycode, modifier=0):
+        chars = KEYCODE_TO_CHARS.get(keycode)
+        if chars:
+            self.typed.append(chars[1] if modifier & 0x02 and chars[1] else chars[0])
+            if self.clock is not None:
+                self.times.append(self.clock())
+
+    def release_key(self, keycode, modifier=0):
+        pass
+
+class DroppablePort:
+    """Serial port whose cable can be pulled: reads and writes fail once dropped"""
+
+    def __init__(self, port):
+        self.port = port
+        self.dropped = False
+
+    def read(self, size):
+        if self.dropped:
+            raise OSError("link dropped")
+        data = self.port.read(size)
+        if self.dropped:
+            raise OSError("link dropped")
+        return data
+
+    def write(self, data):
+        if self.dropped:
+            raise OSError("link dropped")
+        return self.port.write(data)
+
+    def close(self):
+        self.port.close()
+
+class FlakyLink:
+    """
+    pty pair standing in for the CDC serial link, which can be unplugged.
+    Each side's reopen() fails until the outage is over, then returns its
+    end of a fresh pair, as the re-enumerated /dev/ttyGS0 and /dev/ttyACM0
+    would be.
+    """
+
+    def __init__(self, timeout=PORT_TIMEOUT):
+        self.timeout = timeout
+        self.restore_at = 0.0
+        self.generation = 0
+        self.claimed = {'SENDER': 0, 'ENDPOINT': 0}  # Generation each side holds
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        sender_side, endpoint_side = open_pty_pair(self.timeout)
+        self.ports = {'SENDER': DroppablePort(sender_side), 'ENDPOINT': DroppablePort(endpoint_side)}
+
+    def unplug(self, outage):
+        with self._lock:
+            self.restore_at = time.perf_counter() + outage
+            for port in self.ports.values():
+                port.dropped = True
+
+    def reopen(self, side):
+        with self._lock:
+            if time.perf_counter() < self.restore_at:
+                raise OSError(f"{side} serial device not present")
+            if self.claimed[side] == self.generation:
+                self.generation += 1
+                self._open()
+            self.claimed[side] = self.generation
+            return self.ports[side]
+
+class Simulation:
+    def __init__(self, skew=0.0, latency=LATENCY, jitter=0.0, seed=0, base_time=None, sym_key=SYM_KEY):
+        """
+        Args:
+            skew: SENDER clock minus ENDPOINT clock, seconds
+            latency: fixed link delay, seconds
+            jitter: extra uniform random delay up to this many seconds
+            seed: RNG seed for the jitter
+            base_time: agreed base time (default: a session 1000 epochs old)
+            sym_key: session key both sides start from
+        """
+        self.skew = skew
+        self.link = Link(latency, jitter, random.Random(seed))
+        self.base_time = base_time if base_time is not None else 1_700_000_000
+        self.sender_now = float(self.base_time + 1000 * sender_main.INTERVAL)
+        self.endpoint_now = self.sender_now
+        self.stalled = 0.0
+        self.keys = []  # (char, pressed at, sent at or None, char typed or None) per typed char
+        self.encode_time = 0.0
+        self.decode_time = 0.0
+
+        self.sender_schedule = KeySchedule(sym_key)
+        self.endpoint_schedule = KeySchedule(sym_key)
+        self.host = EmulatedHost(self)
+        self.scrambler = sender_main.Scrambler(
+            self.sender_schedule, self.base_time, self.host,
+            clock=lambda: self.sender_now + self.skew,
+            sleep=self._sleep,
+        )
+        # Output is written within the report that carries it, so the SENDER
+        # clock at that point is when the key was sent
+        self.output = OutputKeyboard(clock=lambda: self.sender_now)
+        window = EpochWindow(self.endpoint_schedule, table_builder=endpoint_main.build_decode_table)
+        self.decoder = endpoint_main.Decoder(
+            window, self.base_time, self.output, clock=lambda: self.endpoint_now
+        )
+        self.record = KeyRecord()
+
+    def _sleep(self, seconds):
+        """Rotation stall: typing is blocked, later keys queue up behind it"""
+        self.sender_now += seconds
+        self.stalled += seconds
+
+    def _key(self, key, shift, state, at):
+        self.sender_now = max(self.sender_now, at)
+        record = self.record
+        record.key = key
+        record.state = state
+        record.shift = shift
+        started = time.perf_counter()
+        self.scrambler.handle(record)
+        self.encode_time += time.perf_counter() - started
+
+    def type_text(self, text, rate=RATE, dwell=DWELL, gaps=None):
+        """
+        Type `text` at `rate` keys/s, or with `gaps` seconds between presses
+        (one per char); returns what came out of the ENDPOINT
+        """
+        at = self.sender_now
+        if gaps is None:
+            gaps = itertools.repeat(1.0 / rate)
+        for char, gap in zip(text, gaps):
+            key, shift = char_to_evdev(char)
+            if key is None:
+                continue
+            # The host's output happens inside the SENDER's handle(), so
+            # whatever was typed meanwhile came from this key
+            before = len(self.output.typed)
+            self._key(key, shift, KEY_DOWN, at)
+            self._key(key, shift, KEY_UP, at + min(dwell, 0.5 * gap))
+            if len(self.output.typed) > before:
+                self.keys.append((char, at, self.output.times[before], self.output.typed[before]))
+            else:
+                self.keys.append((char, at, None, None))
+            at += gap
+        return "".join(self.output.typed)
+
+def simulate(text=None, rate=RATE, skew=0.0, latency=LATENCY, jitter=0.0, seed=0, verbose=False):
+    """
+    Run one loopback session.
+
+    Returns:
+        dict with the typed and received text, error count and timings
+    """
+    if text is None:
+        text = (TEXT * (CHARS // len(TEXT) + 1))[:CHARS]
+    sim = Simulation(skew=skew, latency=latency, jitter=jitter, seed=seed)
+    start_time = sim.sender_now
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            devnull = stack.enter_context(open(os.devnull, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        received = sim.type_text(text, rate)
+
+    errors = sum(1 for sent, got in zip(text, received) if sent != got)
+    errors += abs(len(text) - len(received))
+    return {
+        'sent': text,
+        'received': received,
+        'chars': len(text),
+        'errors': errors,
+        'accuracy': 1 - errors / len(text) if text else 1.0,
+        'simulated_seconds': sim.sender_now - start_time,
+        'stalled_seconds': sim.stalled,
+        'reports': sim.host.reports,
+        'encode_us_per_key': sim.encode_time / len(text) * 1e6 if text else 0.0,
+        'decode_us_per_key': sim.decode_time / len(text) * 1e6 if text else 0.0,
+    }
+
+def simulate_link_recovery(drops=LINK_DROPS, outage=OUTAGE, rate=RATE, verbose=False):
+    """
+    Unplug the serial link `drops` times for `outage` seconds each while
+    typing continues on the HID path, and time each recovery.
+
+    The link runs in real time over a pty pair with the real ControlChannel
+    reconnect and resync; the typing runs on the virtual clock as in
+    simulate(), interleaved with the outage.
+
+    Returns:
+        dict with recovery times (unplug → resync answered), the serial
+        outages the channels saw, and the typing done meanwhile
+    """
+    sim = Simulation()
+    link = FlakyLink()
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            devnull = stack.enter_context(open(os.devnull, 'w'))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+
+        sender_channel = ControlChannel(link.ports['SENDER'], "SENDER",
+                                        reopen=lambda: link.reopen('SENDER'))
+        endpoint_channel = ControlChannel(link.ports['ENDPOINT'], "ENDPOINT",
+                                          reopen=lambda: link.reopen('ENDPOINT'))
+        clock = DriftClock()
+        resync = SenderResync(
+            sender_channel, sim.sender_schedule,
+            lambda: sender_main.get_current_counter(sim.base_time, clock.now()), clock,
+        )
+        EndpointResync(endpoint_channel, sim.endpoint_schedule,
+                       lambda: endpoint_main.get_current_counter(sim.base_time))
+        sender_channel.start()
+        endpoint_channel.start()
+        resync.request()
+        if not resync.synced.wait(2):
+            raise RuntimeError("initial resync unanswered")
+
+        text = ""
+        recoveries = []
+        for _ in range(drops):
+            resync.synced.clear()
+            unplugged = time.perf_counter()
+            link.unplug(outage)
+            while not resync.synced.is_set():
+                if time.perf_counter() - unplugged > outage + 30:
+                    raise RuntimeError("link never recovered")
+                sim.type_text(TEXT, rate)
+                text += TEXT
+                time.sleep(0.005)  # Let the link threads run
+            recoveries.append(time.perf_counter() - unplugged)
+
+    received = "".join(sim.output.typed)
+    errors = sum(1 for sent, got in zip(text, received) if sent != got)
+    errors += abs(len(text) - len(received))
+    return {
+        'drops': drops,
+        'outage': outage,
+        'recoveries': recoveries,
+        'sender_outages': sender_channel.outages,
+        'endpoint_outages': endpoint_channel.outages,
+        'chars': len(text),
+        'errors': errors,
+        'accuracy': 1 - errors / len(text) if text else 1.0,
+    }
+
+def print_recovery(result):
+    recoveries = [r * 1000 for r in result['recoveries']]
+    outage_ms = result['outage'] * 1000
+    print("=" * 70)
+    print(f"LINK RECOVERY: {result['drops']} unplugs of {outage_ms:.0f} ms")
+    print("=" * 70)
+    print(f"  Unplug → resynced: mean={statistics.mean(recoveries):>7.1f} ms  "
+          f"max={max(recoveries):>7.1f} ms")
+    print(f"  Beyond the outage: mean={statistics.mean(recoveries) - outage_ms:>7.1f} ms  "
+          f"(loss detection, reopen backoff, resync round trip)")
+    for side in ('sender', 'endpoint'):
+        outages = result[f'{side}_outages']
+        print(f"  {side.upper():<8} port down {len(outages)} times, "
+              f"mean {statistics.mean(outages) * 1000 if outages else 0:.1f} ms")
+    print(f"  Typed meanwhile:   {result['chars']} chars, "
+          f"accuracy {result['accuracy'] * 100:.2f} % ({result['errors']} errors)")
+    print("=" * 70)
+
+def print_result(result):
+    print("=" * 70)
+    print(f"LOOPBACK SIMULATION: {result['chars']} chars over {result['simulated_seconds']:.1f} s simulated")
+    print("=" * 70)
+    print(f"  Accuracy:        {result['accuracy'] * 100:>8.2f} %  ({result['errors']} errors)")
+    print(f"  Rotation stalls: {result['stalled_seconds']:>8.2f} s")
+    print(f"  HID reports:     {result['reports']:>8}")
+    print(f"  Encode:          {result['encode_us_per_key']:>8.1f} us/key")
+    print(f"  Decode:          {result['decode_us_per_key']:>8.1f} us/key")
+    if result['errors']:
+        print(f"\n  Sent:     {result['sent'][:70]!r}")
+        print(f"  Received: {result['received'][:70]!r}")
+    print("=" * 70)
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[2])
+    parser.add_argument("--text", help="text to type (default: a pangram, repeated)")
+    parser.add_argument("--rate", type=float, default=RATE, help="keys per second")
+    parser.add_argument("--skew", type=float, default=0.0, help="SENDER clock ahead of ENDPOINT, s")
+    parser.add_argument("--latency", type=float, default=LATENCY, help="link latency, s")
+    parser.add_argument("--jitter", type=float, default=0.0, help="max extra random latency, s")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--link-drops", type=int, default=0,
+                        help="unplug the serial link this many times and time the recovery")
+    parser.add_argument("--outage", type=float, default=OUTAGE, help="seconds each unplug lasts")
+    parser.add_argument("-v", "--verbose", action="store_true", help="show SENDER/ENDPOINT logs")
+    args = parser.parse_args(argv)
+    if args.link_drops:
+        result = simulate_link_recovery(args.link_drops, args.outage, args.rate, args.verbose)
+        print_recovery(result)
+        return result
+    result = simulate(args.text, args.rate, args.skew, args.latency, args.jitter, args.seed, args.verbose)
+    print_result(result)
+    return result
+
+if __name__ == "__main__":
+    main()
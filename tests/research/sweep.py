@@ -0,0 +1,210 @@
+"""
+tests/research/sweep.py
+
+Parameter sweep over the rotation settings, on the loopback simulator
+Every combination of INTERVAL, TIME_OFFSET, BUFFER_WINDOW and
+POST_ROTATION_GUARD (with and without epoch markers) is typed through the
+real Scrambler and Decoder on the simulator's virtual clock, under each
+clock skew, link jitter and typing profile, in a pool of worker processes.
+One table comes out: misdecode rate, latency added before the key is sent
+and the fraction of time typing was stalled.
+
+    python tests/research/sweep.py [--interval 5 10 ...] [--skew 0 0.3 ...] [--workers N]
+
+Grid options take several values each; --out writes every row as CSV.
+"""
+
+import contextlib
+import csv
+import itertools
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+project_root = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(project_root))
+
+import SENDER.main as sender_main
+import ENDPOINT.main as endpoint_main
+from tests.research import simulator
+
+CHARS = 1500
+REPEATS = 2  # Runs per grid point, each with its own jitter and start phase
+TEXT = simulator.TEXT
+
+# Default grid: around today's settings (10, -0.4, 0.4, 0.4)
+GRID = {
+    'interval': [5, 10, 30],
+    'time_offset': [0.0, -0.2, -0.4, -0.8],
+    'buffer_window': [0.2, 0.4],
+    'guard': [0.2, 0.4],
+    'markers': [True, False],
+    'skew': [-0.3, 0.0, 0.3, 0.8],
+    'jitter': [0.0, 0.02],
+    'profile': ['steady', 'human', 'burst'],
+}
+
+def _steady(rng, count):
+    """8 keys/s, metronome"""
+    return [1 / 8] * count
+
+def _human(rng, count):
+    """~5 keys/s: log-normal gaps, a pause after every word or so"""
+    return [rng.lognormvariate(-1.9, 0.5) + (rng.uniform(0.4, 2.0) if rng.random() < 0.15 else 0.0)
+            for _ in range(count)]
+
+def _burst(rng, count):
+    """Bursts of ~20 keys at 25 keys/s (a fast typist, a password manager), then a pause"""
+    return [rng.uniform(1.0, 4.0) if i % 20 == 19 else rng.uniform(0.03, 0.05) for i in range(count)]
+
+PROFILES = {'steady': _steady, 'human': _human, 'burst': _burst}
+
+def grid_points(grid):
+    """
+    Every combination of `grid`'s values. With markers on, BUFFER_WINDOW
+    and POST_ROTATION_GUARD are unused, so only their first values run.
+    """
+    names = list(grid)
+    seen = set()
+    for values in itertools.product(*(grid[name] for name in names)):
+        point = dict(zip(names, values))
+        if point['markers']:
+            point['buffer_window'] = grid['buffer_window'][0]
+            point['guard'] = grid['guard'][0]
+        key = tuple(point.values())
+        if key not in seen:
+            seen.add(key)
+            yield point
+
+def run(point, chars=CHARS, repeats=REPEATS):
+    """One grid point; the settings are module globals, so only in a worker (or a scratch process)"""
+    sender_main.INTERVAL = endpoint_main.INTERVAL = point['interval']
+    sender_main.TIME_OFFSET = point['time_offset']
+    sender_main.BUFFER_WINDOW = point['buffer_window']
+    sender_main.POST_ROTATION_GUARD = point['guard']
+    sender_main.USE_EPOCH_MARKERS = point['markers']
+
+    text = (TEXT * (chars // len(TEXT) + 1))[:chars]
+    errors = 0
+    added = []
+    stalled = 0.0
+    elapsed = 0.0
+    for seed in range(repeats):
+        rng = random.Random(seed)
+        sim = simulator.Simulation(skew=point['skew'], jitter=point['jitter'], seed=seed)
+        # Start anywhere in an epoch, not on its boundary
+        sim.sender_now += rng.uniform(0, point['interval'])
+        sim.endpoint_now = sim.sender_now
+        start = sim.sender_now
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            sim.type_text(text, gaps=PROFILES[point['profile']](rng, len(text)))
+        for char, pressed_at, sent_at, typed in sim.keys:
+            errors += typed != char
+            if sent_at is not None:
+                added.append(sent_at - pressed_at)
+        stalled += sim.stalled
+        elapsed += sim.sender_now - start
+
+    added.sort()
+    return dict(point,
+                misdecode=errors / len(sim.keys) / repeats,
+                added_mean=sum(added) / len(added) if added else float('nan'),
+                added_p99=added[int(len(added) * 0.99)] if added else float('nan'),
+                stall=stalled / elapsed if elapsed else 0.0)
+
+def sweep(grid=GRID, workers=None, chars=CHARS, repeats=REPEATS):
+    """run() over every grid point, in parallel; rows in grid order"""
+    points = list(grid_points(grid))
+    workers = workers or os.cpu_count()
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(run, points, itertools.repeat(chars), itertools.repeat(repeats),
+                             chunksize=max(1, len(points) // (workers * 8))))
+
+# (row field, heading, width, format); latencies are shown in ms
+COLUMNS = (
+    ('interval', 'INTERVAL', 8, 'g'),
+    ('time_offset', 'OFFSET', 7, 'g'),
+    ('markers', 'MARKERS', 7, ''),
+    ('buffer_window', 'BUFFER', 6, 'g'),
+    ('guard', 'GUARD', 6, 'g'),
+    ('skew', 'SKEW', 6, 'g'),
+    ('jitter', 'JITTER', 6, 'g'),
+    ('profile', 'TYPING', 7, ''),
+    ('misdecode', 'MISDECODE', 10, '.2%'),
+    ('added_mean', 'ADDED ms', 9, '.1f'),
+    ('added_p99', 'p99 ms', 8, '.1f'),
+    ('stall', 'STALL', 7, '.2%'),
+)
+
+def print_table(rows, limit=None):
+    """Rows best first: fewest misdecodes, then least added latency"""
+    rows = sorted(rows, key=lambda row: (row['misdecode'], row['added_mean'], row['stall']))
+    header = " ".join(f"{title:>{width}}" for _, title, width, _ in COLUMNS)
+    print(header)
+    print("-" * len(header))
+    for row in rows[:limit]:
+        cells = []
+        for name, _, width, spec in COLUMNS:
+            value = row[name] * 1000 if name.startswith('added') else row[name]
+            cells.append(f"{format(value, spec) if spec else str(value):>{width}}")
+        print(" ".join(cells))
+    if limit and len(rows) > limit:
+        print(f"... {len(rows) - limit} more rows (--out FILE for all)")
+
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[2])
+    parser.add_argument("--interval", type=int, nargs="+", default=GRID['interval'])
+    parser.add_argument("--time-offset", type=float, nargs="+", default=GRID['time_offset'])
+    parser.add_argument("--buffer-window", type=float, nargs="+", default=GRID['buffer_window'])
+    parser.add_argument("--guard", type=float, nargs="+", default=GRID['guard'],
+                        help="POST_ROTATION_GUARD values")
+    parser.add_argument("--markers", choices=("on", "off"), nargs="+", default=["on", "off"])
+    parser.add_argument("--skew", type=float, nargs="+", default=GRID['skew'],
+                        help="SENDER clock ahead of ENDPOINT, s")
+    parser.add_argument("--jitter", type=float, nargs="+", default=GRID['jitter'],
+                        help="max extra random link latency, s")
+    parser.add_argument("--profile", choices=PROFILES, nargs="+", default=GRID['profile'])
+    parser.add_argument("--chars", type=int, default=CHARS, help="chars typed per run")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="runs per grid point")
+    parser.add_argument("--workers", type=int, help="processes (default: all CPUs)")
+    parser.add_argument("--top", type=int, default=40, help="rows shown")
+    parser.add_argument("--out", help="write every row here as CSV")
+    args = parser.parse_args(argv)
+
+    grid = {
+        'interval': args.interval,
+        'time_offset': args.time_offset,
+        'buffer_window': args.buffer_window,
+        'guard': args.guard,
+        'markers': [value == "on" for value in args.markers],
+        'skew': args.skew,
+        'jitter': args.jitter,
+        'profile': args.profile,
+    }
+    points = sum(1 for _ in grid_points(grid))
+    workers = args.workers or os.cpu_count()
+    print("=" * 70)
+    print(f"PARAMETER SWEEP: {points} grid points x {args.repeats} runs x {args.chars} chars, "
+          f"{workers} processes")
+    print("=" * 70)
+    started = time.perf_counter()
+    rows = sweep(grid, workers, args.chars, args.repeats)
+    elapsed = time.perf_counter() - started
+    print_table(rows, args.top)
+    print("=" * 70)
+    print(f"  {len(rows)} grid points in {elapsed:.1f} s "
+          f"({elapsed / len(rows) * workers * 1000:.0f} ms of CPU each)")
+    if args.out:
+        with open(args.out, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"  Rows saved to: {args.out}")
+    return rows
+
+if __name__ == "__main__":
+    main()
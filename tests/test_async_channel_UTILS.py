@@ -0,0 +1,63 @@
+import asyncio
+import socket
+
+from UTILS.async_channel import AsyncControlChannel
+from UTILS.link import MSG_DATA, MSG_RESYNC
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline
+        await asyncio.sleep(0.001)
+
+def test_frames_cross_without_blocking():
+    async def run():
+        left, right = socket.socketpair()
+        sender, receiver = AsyncControlChannel(left, "SENDER"), AsyncControlChannel(right, "ENDPOINT")
+        received = []
+        receiver.on(MSG_DATA, received.append)
+        sender.start()
+        receiver.start()
+
+        # Far more than the socket buffer: send() queues the rest instead of blocking
+        payloads = [bytes([i]) * 50_000 for i in range(40)]
+        for payload in payloads:
+            assert sender.send(MSG_DATA, payload)
+        assert sender._outbox
+        await wait_for(lambda: len(received) == len(payloads))
+        assert received == payloads and not sender._outbox
+        assert receiver.latency.count == len(payloads)
+    asyncio.run(run())
+
+def test_lost_link_reopened_and_backlog_flushed():
+    async def run():
+        left, right = socket.socketpair()
+        spare_left, spare_right = socket.socketpair()
+        opens = []
+
+        def reopen():
+            opens.append(1)
+            if len(opens) == 1:
+                raise OSError("not back yet")
+            return spare_left
+
+        channel = AsyncControlChannel(left, "SENDER", reopen=reopen)
+        reconnects = []
+        channel.on_reconnect(lambda: reconnects.append(channel.send(MSG_RESYNC, b"")))
+        channel.start()
+
+        right.close()  # The peer hangs up
+        await wait_for(lambda: not channel.connected)
+        assert not channel.send(MSG_DATA, b"dropped")
+        assert not channel.send(MSG_DATA, b"kept", queue=True)
+        await wait_for(lambda: channel.connected)
+        assert len(opens) == 2 and reconnects == [True] and len(channel.outages) == 1
+
+        peer = AsyncControlChannel(spare_right, "ENDPOINT")
+        received = []
+        peer.on(MSG_DATA, lambda payload: received.append(payload))
+        peer.on(MSG_RESYNC, lambda payload: received.append("resync"))
+        peer.start()
+        await wait_for(lambda: len(received) == 2)
+        assert received == [b"kept", "resync"]
+    asyncio.run(run())
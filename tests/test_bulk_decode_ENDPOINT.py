@@ -0,0 +1,87 @@
+import contextlib
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import ENDPOINT.main as endpoint_main
+from ENDPOINT.epoch_window import EpochWindow
+from ENDPOINT.keyboard_reader import key_records
+from UTILS.keymap import KEYS, seed_to_keymap, seed_to_permutation
+from UTILS.rekey import KeySchedule
+from UTILS.seedgen import generate_seed
+from UTILS.trace import Trace, TraceWriter
+from tests.research import bulk_decode
+from tests.research.replay import DecodedText
+
+SYM_KEY = b"test_symmetric_key_12345678901234"
+BASE_TIME = 1_700_000_000
+
+def test_permutation_matches_keymap():
+    for counter in (0, 1, 977):
+        seed = generate_seed(SYM_KEY, counter)
+        keymap = seed_to_keymap(seed)
+        assert [KEYS[i] for i in seed_to_permutation(seed)] == [keymap[key] for key in KEYS]
+
+def test_bulk_decode_matches_live_decoder(tmp_path):
+    rng = np.random.default_rng(3)
+    alphabet = "abcXYZ 019.,!?-_@()[]{}:;\"'/\\|+=<>~`"
+    text = "".join(rng.choice(list(alphabet), 600))
+    wall = BASE_TIME + 100.0 + np.cumsum(rng.uniform(0.05, 0.6, len(text)))
+
+    path = tmp_path / "endpoint.trace"
+    writer = TraceWriter(path)
+    writer.add_device(3, "HIDPi Keyboard")
+    writer.close()
+    trace = Trace(path)
+    records = bulk_decode.encode_records(text, wall, BASE_TIME, [(0, SYM_KEY)], clock_offset=trace.clock_offset)
+    trace.close()
+    with open(path, 'ab') as f:
+        f.write(records.tobytes())
+
+    trace = Trace(path)
+    result = bulk_decode.decode_records(bulk_decode.load_records(trace), trace.clock_offset,
+                                        BASE_TIME, [(0, SYM_KEY)], workers=1)
+    assert result['text'] == text
+    assert result['epochs'] > 10 and result['rejected_markers'] == 0
+
+    output = DecodedText()
+    now = [0.0]
+    window = EpochWindow(KeySchedule(SYM_KEY), table_builder=endpoint_main.build_decode_table)
+    decoder = endpoint_main.Decoder(window, BASE_TIME, output, clock=lambda: now[0])
+    with contextlib.redirect_stdout(io.StringIO()):
+        for record in key_records(trace.batches()):
+            now[0] = record.time + trace.clock_offset
+            decoder.handle(record)
+    trace.close()
+    assert "".join(output.typed) == text
+
+def test_rekeyed_trace_decoded_from_key_sidecar(tmp_path):
+    text = "rekeyed mid-session, shortcut skipped"
+    wall = BASE_TIME + 100.0 + np.arange(len(text)) * 1.5
+    rekey_at = (int(wall[len(text) // 2]) - BASE_TIME) // endpoint_main.INTERVAL
+    new_key = bytes(range(32))
+
+    path = tmp_path / "endpoint.trace"
+    writer = TraceWriter(path)
+    writer.add_device(3, "HIDPi Keyboard")
+    KeySchedule(SYM_KEY, log=writer.key_log("/dev/ttyACM0")).schedule(rekey_at, new_key)
+    writer.close()
+    trace = Trace(path)
+    records = bulk_decode.encode_records(text, wall, BASE_TIME, [(float("-inf"), SYM_KEY), (rekey_at, new_key)],
+                                         clock_offset=trace.clock_offset)
+    trace.close()
+
+    # Ctrl held around the last character's press
+    ctrl = np.zeros(2, bulk_decode.RECORD_DTYPE)
+    ctrl['time'] = wall[-1] - 0.01 - trace.clock_offset, wall[-1] + 0.01 - trace.clock_offset
+    ctrl['type'], ctrl['code'], ctrl['value'] = 1, bulk_decode.KEY_CODES['KEY_LEFTCTRL'], (1, 0)
+    records = np.concatenate((records, ctrl))
+    records = records[np.argsort(records['time'], kind='stable')]
+    with open(path, 'ab') as f:
+        f.write(records.tobytes())
+
+    result = bulk_decode.decode_trace(path, SYM_KEY, BASE_TIME, workers=1)
+    assert result['rekeys'] == 1
+    assert result['text'] == text[:-1] and result['shortcuts'] == 1
@@ -0,0 +1,90 @@
+from evdev import ecodes
+from ENDPOINT.main import Decoder, build_decode_table, get_current_counter
+from ENDPOINT.cadence import CadenceDetector
+from ENDPOINT.epoch_window import EpochWindow
+from ENDPOINT.key_mapper import char_to_keycode
+from UTILS.events import KeyRecord, KEY_DOWN, KEY_UP
+from UTILS.keymap import seed_to_keymap, reverse_keymap
+from UTILS.rekey import KeySchedule
+from UTILS.seedgen import generate_seed
+
+SYM_KEY = b"test_symmetric_key_12345678901234"
+
+class RecordingWriter:
+	def __init__(self):
+		self.calls = []
+
+	def press_key(self, keycode, modifier=0):
+		self.calls.append(("press", keycode, modifier))
+
+	def release_key(self, keycode, modifier=0):
+		self.calls.append(("release", keycode, modifier))
+
+def test_decode_table_matches_reverse_map():
+	reverse = reverse_keymap(seed_to_keymap(generate_seed(SYM_KEY, 7)))
+	table = build_decode_table(reverse)
+	(keycode, modifier), scrambled, original = table['KEY_A'][1]
+	assert scrambled == 'A'
+	assert original == reverse['a'].upper()
+	assert (keycode, modifier) == char_to_keycode(original)
+	(_, ctrl_modifier), _, _ = table['KEY_1'][3]
+	assert ctrl_modifier & 0x01
+
+def test_decoder_reuses_record_and_pins_release():
+	writer = RecordingWriter()
+	window = EpochWindow(KeySchedule(SYM_KEY), table_builder=build_decode_table)
+	decoder = Decoder(window, 0, writer)
+	record = KeyRecord()
+
+	record.key, record.code, record.state = 'KEY_Q', ecodes.KEY_Q, KEY_DOWN
+	decoder.handle(record)
+	record.state = KEY_UP
+	decoder.handle(record)
+
+	counter = get_current_counter(0)
+	original = reverse_keymap(seed_to_keymap(generate_seed(SYM_KEY, counter)))['q']
+	keycode, modifier = char_to_keycode(original)
+	assert writer.calls == [("press", keycode, modifier), ("release", keycode, modifier)]
+	assert decoder.held == {}
+
+def test_decoder_blocks_scripted_burst():
+	writer = RecordingWriter()
+	window = EpochWindow(KeySchedule(SYM_KEY), table_builder=build_decode_table)
+	decoder = Decoder(window, 0, writer, cadence=CadenceDetector(block=True))
+	record = KeyRecord()
+	record.key, record.code, record.device = 'KEY_Q', ecodes.KEY_Q, "cable"
+
+	# 20 presses 5 ms apart: only the ones before the verdict get through
+	for i in range(20):
+		record.time = 1000 + i * 0.005
+		record.state = KEY_DOWN
+		decoder.handle(record)
+		record.state = KEY_UP
+		decoder.handle(record)
+	presses = [call for call in writer.calls if call[0] == "press"]
+	assert 0 < len(presses) <= 6
+	assert decoder.held == {}
+
+	# A pause starts a new burst, judged afresh
+	record.time = 1010
+	record.state = KEY_DOWN
+	decoder.handle(record)
+	assert writer.calls[-1][0] == "press"
+
+def test_decoder_only_flags_burst_packed_input():
+	# BURST_MODE packs up to six keys into one report, all with its timestamp
+	writer = RecordingWriter()
+	window = EpochWindow(KeySchedule(SYM_KEY), table_builder=build_decode_table)
+	cadence = CadenceDetector(block=False)
+	decoder = Decoder(window, 0, writer, cadence=cadence)
+	record = KeyRecord()
+	record.key, record.code, record.device = 'KEY_Q', ecodes.KEY_Q, "cable"
+
+	for i in range(18):
+		record.time = 1000 + i // 6 * 0.001
+		record.state = KEY_DOWN
+		decoder.handle(record)
+		record.state = KEY_UP
+		decoder.handle(record)
+	assert cadence.bursts == 1
+	assert len([call for call in writer.calls if call[0] == "press"]) == 18
@@ -0,0 +1,52 @@
+from ENDPOINT.epoch_window import EpochWindow
+from UTILS.seedgen import generate_seed
+from UTILS.epoch import marker_key, resolve_marker, is_epoch_marker
+from UTILS.keymap import seed_to_keymap
+from UTILS.rekey import KeySchedule
+
+SYM_KEY = b"test_symmetric_key_12345678901234"
+
+def test_marker_round_trip():
+	for counter in range(100, 110):
+		key = marker_key(counter)
+		assert is_epoch_marker(key)
+		assert resolve_marker(key, counter) == counter
+		assert resolve_marker(key, counter - 1) == counter
+		assert resolve_marker(key, counter + 1) == counter
+		assert resolve_marker(key, counter + 2) is None
+
+def test_window_follows_marker_across_rotation():
+	window = EpochWindow(KeySchedule(SYM_KEY), grace_window=1.0)
+	window.prepare(41)
+
+	# SENDER is ahead and already on 42
+	window.on_marker(marker_key(42), 41)
+	assert window.select(41, 9.8) == 42
+
+	# Previous epoch stays usable only inside the grace window
+	window.on_marker(marker_key(41), 42)
+	assert window.select(42, 0.5) == 41
+	assert window.select(42, 1.5) == 42
+
+def test_window_decodes_with_announced_map():
+	window = EpochWindow(KeySchedule(SYM_KEY))
+	window.prepare(7)
+	window.on_marker(marker_key(8), 7)
+	counter = window.select(7, 9.9)
+
+	keymap = seed_to_keymap(generate_seed(SYM_KEY, 8))
+	reverse = window.reverse_map(counter)
+	for original in "hello world 123!":
+		assert reverse[keymap[original]] == original
+
+def test_window_picks_up_scheduled_key():
+	schedule = KeySchedule(SYM_KEY)
+	window = EpochWindow(schedule)
+	window.prepare(10)
+
+	new_key = bytes(range(32))
+	schedule.schedule(11, new_key)
+
+	keymap = seed_to_keymap(generate_seed(new_key, 11))
+	assert window.reverse_map(11)[keymap['a']] == 'a'
+	assert schedule.key_for(10) == SYM_KEY
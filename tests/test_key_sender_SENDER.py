@@ -0,0 +1,35 @@
+import os
+
+from SENDER.key_sender import HIDReportWriter, BurstHIDWriter, build_report
+
+SHIFT = 0x02
+KEY_A, KEY_B = 0x04, 0x05
+
+class RecordingWriter(HIDReportWriter):
+    def __init__(self):
+        super().__init__(os.devnull)
+        self.reports = []
+
+    def write_report(self, report):
+        self.reports.append(report)
+
+def test_held_key_never_changes_modifier():
+    hid = RecordingWriter()
+    hid.press(SHIFT, KEY_A, "KEY_A")
+    hid.press(0, KEY_B, "KEY_B")
+    # A goes up rather than autorepeating unshifted
+    assert hid.reports == [build_report(SHIFT, [KEY_A]), build_report(0, [KEY_B])]
+    hid.release(KEY_B, "KEY_B")
+    hid.press(SHIFT, KEY_A, "KEY_A")
+    hid.press(SHIFT, KEY_B, "KEY_B")
+    assert hid.reports[-1] == build_report(SHIFT, [KEY_A, KEY_B])
+    hid.close()
+
+def test_burst_releases_keys_held_with_another_modifier():
+    recorder = RecordingWriter()
+    burst = BurstHIDWriter(recorder)
+    burst.press(SHIFT, KEY_A, "KEY_A")
+    burst.press(0, KEY_B, "KEY_B")
+    burst.close()
+    assert build_report(0, [KEY_A, KEY_B]) not in recorder.reports
+    assert recorder.reports[-1] == build_report(0, [KEY_B])
@@ -0,0 +1,96 @@
+import time
+
+import pytest
+
+from SENDER.keyboard_reader import KeyboardDevice, key_records
+from UTILS.events import KEY_NAMES, KEY_DOWN, KEY_UP
+from UTILS.trace import TraceDevice, TraceEvent, EV_KEY
+
+CODES = {name: code for code, name in KEY_NAMES.items() if isinstance(name, str)}
+
+def key(name, value):
+    return TraceEvent(EV_KEY, CODES[name], value, time.monotonic())
+
+class RecordingHID:
+    def __init__(self):
+        self.down = set()
+
+    def press(self, modifier, hid_key, key_name):
+        self.down.add(hid_key)
+
+    def release(self, hid_key, key_name):
+        self.down.discard(hid_key)
+
+    def tap(self, modifier, hid_key, key_name):
+        pass
+
+def test_unplugged_keyboard_releases_what_it_held():
+    device = KeyboardDevice("trace:desk", TraceDevice(3, "Desk Keyboard"))
+    device.note([key('KEY_A', KEY_DOWN), key('KEY_LEFTSHIFT', KEY_DOWN), key('KEY_B', KEY_DOWN), key('KEY_B', KEY_UP)])
+    releases = device.releases()
+    assert sorted(event.code for event in releases) == sorted((CODES['KEY_A'], CODES['KEY_LEFTSHIFT']))
+    assert all(event.value == KEY_UP for event in releases)
+
+def test_same_key_held_on_two_keyboards():
+    pytest.importorskip("hidpi")  # SENDER scramble tables
+    from SENDER.main import Scrambler
+    from UTILS.rekey import KeySchedule
+
+    hid = RecordingHID()
+    scrambler = Scrambler(KeySchedule(bytes(32)), 0, hid, clock=lambda: 1000.0)
+    desk = KeyboardDevice("trace:desk", TraceDevice(3, "Desk Keyboard"))
+    travel = KeyboardDevice("trace:travel", TraceDevice(4, "Travel Keyboard"))
+    batches = [(desk, [key('KEY_A', KEY_DOWN)]), (travel, [key('KEY_A', KEY_DOWN)]), (desk, [key('KEY_A', KEY_UP)])]
+    for record in key_records(batches):
+        scrambler.handle(record)
+    # The travel keyboard still holds it
+    assert len(hid.down) == 1
+
+    travel.note([key('KEY_A', KEY_DOWN)])
+    for record in key_records([(travel, travel.releases())]):
+        scrambler.handle(record)
+    assert not hid.down and not scrambler.held
+
+class PluggedDevice(TraceDevice):
+    """TraceDevice that reads the events it is given, until it is closed"""
+
+    def __init__(self, fd, name):
+        super().__init__(fd, name)
+        self.pending = []
+
+    def read(self):
+        pending, self.pending = self.pending, []
+        return pending
+
+    def close(self):
+        pass
+
+class NoLoop:
+    def add_reader(self, fd, callback, *args):
+        pass
+
+    def remove_reader(self, fd):
+        pass
+
+def test_async_reader_releases_unplugged_keyboard(monkeypatch):
+    pytest.importorskip("hidpi")  # SENDER.async_runtime imports SENDER.main
+    from SENDER import async_runtime
+
+    dev = PluggedDevice(3, "Desk Keyboard")
+    monkeypatch.setattr(async_runtime.get_device_info, "get_keyboards", lambda: ["desk"])
+    monkeypatch.setattr(async_runtime, "KeyboardDevice", lambda path: KeyboardDevice(path, dev))
+    reader = async_runtime.AsyncKeyboardReader(NoLoop(), queue_size=2)
+    dev.pending = [key('KEY_A', KEY_DOWN), key('KEY_B', KEY_DOWN), key('KEY_B', KEY_UP)]
+    reader._read(3)
+    reader.detach(3)
+    reader.queue.get_nowait()  # What it typed
+    _, device, releases = reader.queue.get_nowait()
+    assert [(event.code, event.value) for event in releases] == [(CODES['KEY_A'], KEY_UP)]
+    assert not reader.overflowed
+
+    # No room for the releases: the scrambler releases everything instead
+    reader = async_runtime.AsyncKeyboardReader(NoLoop(), queue_size=1)
+    dev.pending = [key('KEY_A', KEY_DOWN)]
+    reader._read(3)
+    reader.detach(3)
+    assert reader.queue.qsize() == 1 and reader.overflowed
@@ -0,0 +1,26 @@
+import socket
+
+from ENDPOINT.keyboard_writer import KeyboardWriter, BatchedKeyboardWriter, INPUT_EVENT
+from tests.research.bench_uinput import NullUInput
+
+KEY_A, KEY_1, KEY_ENTER = 30, 2, 28
+
+def injected(writer_class):
+    """(type, code, value) of every event written, and the number of write() calls"""
+    ours, theirs = socket.socketpair()
+    writer = writer_class(NullUInput(ours.detach()))
+    writer.write_key(KEY_A, 0x02)
+    writer.press_key(KEY_1, 0x03)
+    writer.press_key(KEY_A, 0x02)
+    writer.release_key(KEY_1, 0x03)
+    writer.release_key(KEY_A, 0x02)
+    writer.write_events([(KEY_ENTER, 1), (KEY_ENTER, 2), (KEY_ENTER, 0)])
+    writer.close()
+    data = b"".join(iter(lambda: theirs.recv(65536), b""))
+    return [event[2:] for event in INPUT_EVENT.iter_unpack(data)]
+
+def test_batched_writer_injects_same_events():
+    expected = injected(KeyboardWriter)
+    assert injected(BatchedKeyboardWriter) == expected
+    # Shift stays down until the last hold that needs it lets go
+    assert expected[-12:-6] == [(1, KEY_1, 0), (1, 29, 0), (0, 0, 0), (1, KEY_A, 0), (1, 42, 0), (0, 0, 0)]
@@ -1,4 +1,4 @@
-from SENDER.seedgen import generate_seed
+from UTILS.seedgen import generate_seed
 from SENDER.dhe_time import get_symmetric_key, get_base_time
 from UTILS.keymap import seed_to_keymap, apply_keymap, decrypt_text
 
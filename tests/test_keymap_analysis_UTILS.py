@@ -0,0 +1,32 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from UTILS.keymap import seed_to_permutation
+from UTILS.seedgen import SeedDeriver
+from tests.research import keymap_batch
+
+SYM_KEY = b"test_symmetric_key_12345678901234"
+
+def test_batch_permutations_match_random_module():
+    seeds = SeedDeriver(SYM_KEY).seeds_for_range(1000, 3000)
+    expected = np.array([seed_to_permutation(seed) for seed in seeds], np.uint8)
+    assert np.array_equal(keymap_batch.permutations(seeds), expected)
+
+def test_every_key_state_round_trips(monkeypatch):
+    pytest.importorskip("hidpi")  # SENDER scramble tables
+    import ENDPOINT.main as endpoint_main
+    from tests.research import keymap_analysis
+
+    result = keymap_analysis.analyze(8192, SYM_KEY, workers=1)
+    assert not result['case_failures'].any()
+    assert result['uniformity']['passed']
+
+    # A decode table that forgets shift+/ loses each symbol in the epochs it scrambles to '?'
+    shift_map = dict(endpoint_main.SHIFT_MAP)
+    del shift_map['/']
+    monkeypatch.setattr(endpoint_main, 'SHIFT_MAP', shift_map)
+    result = keymap_analysis.analyze(8192, SYM_KEY, workers=1)
+    failing = {result['cases'][row][5] for row in np.flatnonzero(result['case_failures'])}
+    assert {'1', '!', '?'} <= failing and not any(char.isalpha() for char in failing)
+    assert 0 < result['case_failures'].max() < 8192
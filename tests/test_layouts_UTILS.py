@@ -0,0 +1,47 @@
+import socket
+import threading
+
+import pytest
+
+from UTILS import layouts
+
+needs_xkb = pytest.mark.skipif(not layouts.os.path.isdir(layouts.XKB_SYMBOLS), reason="no xkb symbols")
+
+class SocketPort:
+    """Serial stand-in over one end of a socketpair"""
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def write(self, data):
+        self.sock.sendall(data)
+
+    def read(self, size):
+        return self.sock.recv(size)
+
+def test_us_matches_key_space():
+    us = layouts.build("us")
+    assert us['chars'] == {key: (base, shifted) for key, base, shifted
+                           in zip(layouts.EVDEV_KEYS, layouts.US_BASE, layouts.US_SHIFT)}
+    assert sorted(us['caps']) == sorted(key for key, char in layouts.EVDEV_TO_CHAR.items() if char.isalpha())
+    assert all(char == shown for char, shown in layouts.display_map(us).items())
+
+@needs_xkb
+def test_german_keys_and_caps():
+    de = layouts.build("de")
+    assert de['chars']['KEY_Y'] == ("z", "Z") and de['chars']['KEY_SEMICOLON'] == ("ö", "Ö")
+    assert "KEY_SEMICOLON" in de['caps'] and "KEY_1" not in de['caps']
+    assert layouts.display_map(de)[";"] == "ö"
+    assert de['fingerprint'] != layouts.build("us")['fingerprint']
+
+def test_confirm_swaps_layouts():
+    left, right = socket.socketpair()
+    us = layouts.build("us")
+    peer = dict(us, layout="us(custom)", fingerprint="0" * 16)
+    answers = {}
+    thread = threading.Thread(target=lambda: answers.update(
+        endpoint=layouts.confirm(SocketPort(right), peer, "ENDPOINT", first=False)))
+    thread.start()
+    answers['sender'] = layouts.confirm(SocketPort(left), us, "SENDER", first=True)
+    thread.join()
+    assert answers == {'sender': ("us(custom)", "0" * 16), 'endpoint': ("us", us['fingerprint'])}
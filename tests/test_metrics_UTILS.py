@@ -0,0 +1,49 @@
+import os
+import socket
+import time
+
+from evdev import ecodes
+from UTILS import metrics
+from UTILS.events import KeyRecord, KEY_DOWN, KEY_UP
+from UTILS.heartbeat import SenderHeartbeat, EndpointHeartbeat
+from tests.conftest import loopback_pair, make_decoder
+
+def sample(text, line):
+	return float(next(row for row in text.splitlines() if row.startswith(line + " ")).split()[-1])
+
+def test_keys_rotations_and_latency_exposed(tmp_path):
+	keys = metrics.KeyMetrics()
+	decoder = make_decoder(keys)
+	rotations = metrics.ROTATIONS.value
+	record = KeyRecord()
+	for key in ('KEY_Q', 'KEY_W', 'KEY_ENTER'):
+		for state in (KEY_DOWN, KEY_UP):
+			record.key, record.code, record.state, record.time = key, getattr(ecodes, key), state, time.monotonic()
+			decoder.handle(record)
+
+	server = metrics.serve(str(tmp_path / "metrics.sock"))
+	assert os.stat(tmp_path / "metrics.sock").st_mode & 0o077 == 0
+	client = socket.socket(socket.AF_UNIX)
+	client.connect(str(tmp_path / "metrics.sock"))
+	client.sendall(b"GET /metrics HTTP/1.0\r\n\r\n")
+	response = b"".join(iter(lambda: client.recv(65536), b"")).decode()
+	server.shutdown()
+	server.server_close()
+
+	assert response.startswith("HTTP/1.0 200 OK")
+	assert "# TYPE omg_key_latency_seconds histogram" in response
+	assert keys.kinds[2].value == 2 and keys.kinds[1].value == 1 and keys.kinds[0].value == 3
+	assert 'omg_keys_total{kind="mapped"} 2' in response
+	assert sample(response, 'omg_key_latency_seconds_bucket{le="+Inf"}') == 3
+	assert sample(response, "omg_rotations_total") == rotations + 1
+
+def test_heartbeat_round_trip():
+	sender_channel, endpoint_channel = loopback_pair()
+	heartbeat = SenderHeartbeat(sender_channel)
+	echo = EndpointHeartbeat(endpoint_channel)
+	pings, answered = metrics.SERIAL_RTT.counts[:], metrics.HEARTBEATS.value
+
+	assert heartbeat.ping()
+	assert 0 <= heartbeat.last_rtt < 0.1 and echo.last_at is not None
+	assert sum(metrics.SERIAL_RTT.counts) == sum(pings) + 1
+	assert metrics.HEARTBEATS.value == answered + 1
@@ -0,0 +1,56 @@
+from evdev import ecodes
+from UTILS.events import KeyRecord, KEY_DOWN, KEY_UP
+from UTILS.pipeline import Hooks, RELEASE, PASS_THROUGH, MAPPED
+from tests.conftest import make_decoder
+
+class StageLog:
+	def __init__(self, drop=None):
+		self.calls = []
+		self.drop = drop
+
+	def after_read(self, record, kind, output):
+		self.calls.append(("read", record.key))
+
+	def after_classify(self, record, kind, output):
+		self.calls.append(("classify", kind))
+		return kind != self.drop
+
+	def after_emit(self, record, kind, output):
+		self.calls.append(("emit", kind))
+
+def key_events():
+	"""Press and release Q, then Enter, in one reused record as the readers do"""
+	record = KeyRecord()
+	for key in ('KEY_Q', 'KEY_ENTER'):
+		for state in (KEY_DOWN, KEY_UP):
+			record.key, record.code, record.state = key, getattr(ecodes, key), state
+			yield record
+
+def type_keys(decoder, hooks):
+	for record in hooks.events(key_events()):
+		decoder.handle(record)
+
+def test_unobserved_stages_stay_bare():
+	decoder = make_decoder()
+	assert not {'classify', 'map', 'emit'} & set(vars(decoder))
+	records = iter(())
+	assert Hooks().events(records) is records
+
+	decoder = make_decoder(StageLog())
+	assert {'classify', 'emit'} <= set(vars(decoder)) and 'map' not in vars(decoder)
+
+def test_hooks_see_every_stage_and_can_drop():
+	log = StageLog()
+	decoder = make_decoder(log)
+	type_keys(decoder, Hooks(log))
+	assert log.calls == [("read", 'KEY_Q'), ("classify", MAPPED), ("emit", MAPPED),
+	                     ("read", 'KEY_Q'), ("classify", RELEASE), ("emit", RELEASE),
+	                     ("read", 'KEY_ENTER'), ("classify", PASS_THROUGH), ("emit", PASS_THROUGH),
+	                     ("read", 'KEY_ENTER'), ("classify", RELEASE), ("emit", RELEASE)]
+
+	# A dropped press pins nothing, so its release is a no-op too
+	log = StageLog(drop=MAPPED)
+	decoder = make_decoder(log)
+	type_keys(decoder, Hooks())
+	assert [kind for stage, kind in log.calls if stage == "emit"] == [PASS_THROUGH, RELEASE]
+	assert decoder.held == {}
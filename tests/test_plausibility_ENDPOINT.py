@@ -0,0 +1,16 @@
+from ENDPOINT.plausibility import PlausibilityScorer
+from UTILS.keymap import seed_to_keymap, reverse_keymap
+from UTILS.seedgen import generate_seed
+
+TEXT = "please restart the web server after the config change and check the logs"
+
+def test_text_passes_and_decoded_plain_text_is_quarantined():
+	scorer = PlausibilityScorer(block=True)
+	assert all(scorer.observe(char) for char in TEXT)
+	assert scorer.alerts == 0
+
+	# Plain text typed through the decoder comes out substituted
+	reverse = reverse_keymap(seed_to_keymap(generate_seed(bytes(32), 1)))
+	results = [scorer.observe(reverse.get(char, char)) for char in TEXT]
+	assert scorer.alerts == 1
+	assert not results[-1]
@@ -0,0 +1,55 @@
+from UTILS.link import MSG_REKEY_ACK, MSG_REKEY_CONFIRM
+from UTILS.rekey import KeySchedule, SenderRekeyer, EndpointRekeyer
+from UTILS.resync import pack_entries, unpack_entries, reconcile
+from tests.conftest import SYM_KEY, loopback_pair
+
+def make_pair(counter):
+    sender_channel, endpoint_channel = loopback_pair()
+    timers = []
+    sender_schedule, endpoint_schedule = KeySchedule(SYM_KEY), KeySchedule(SYM_KEY)
+    rekeyer = SenderRekeyer(sender_channel, sender_schedule, lambda: counter[0],
+                            call_later=lambda delay, callback, *args: timers.append((delay, callback, args)))
+    EndpointRekeyer(endpoint_channel, endpoint_schedule, lambda: counter[0])
+    return rekeyer, sender_schedule, endpoint_schedule, sender_channel, endpoint_channel, timers
+
+def test_rekey_switches_both_sides():
+    counter = [100]
+    rekeyer, sender_schedule, endpoint_schedule, _, _, _ = make_pair(counter)
+    effective = rekeyer.initiate()
+    assert sender_schedule.key_for(effective) != SYM_KEY
+    assert sender_schedule.key_for(effective) == endpoint_schedule.key_for(effective)
+
+def test_lost_ack_aborted_before_effective():
+    counter = [100]
+    rekeyer, sender_schedule, endpoint_schedule, _, endpoint_channel, timers = make_pair(counter)
+    endpoint_channel.lose.add(MSG_REKEY_ACK)
+    effective = rekeyer.initiate()
+    # The ENDPOINT holds the key back until the SENDER confirms it
+    assert endpoint_schedule.key_for(effective) == SYM_KEY
+
+    (delay, callback, args), = timers
+    assert delay == rekeyer.epoch_length
+    counter[0] = effective - 1
+    callback(*args)
+    assert not rekeyer.pending
+    assert sender_schedule.key_for(effective) == endpoint_schedule.key_for(effective) == SYM_KEY
+
+def test_lost_confirm_leaves_endpoint_on_old_key_until_resync():
+    counter = [100]
+    rekeyer, sender_schedule, endpoint_schedule, sender_channel, _, _ = make_pair(counter)
+    sender_channel.lose.add(MSG_REKEY_CONFIRM)
+    effective = rekeyer.initiate()
+    assert endpoint_schedule.key_for(effective) == SYM_KEY
+
+    # The resync after the link comes back drops the switch the ENDPOINT never made
+    count, entries = pack_entries(endpoint_schedule)
+    reconcile(sender_schedule, unpack_entries(entries, 0, count))
+    assert sender_schedule.key_for(effective) == SYM_KEY
+
+def test_proposal_for_current_epoch_rejected():
+    counter = [100]
+    rekeyer, _, endpoint_schedule, _, _, _ = make_pair(counter)
+    rekeyer.lead = 0
+    effective = rekeyer.initiate()
+    assert effective in rekeyer.pending
+    assert endpoint_schedule.key_for(effective) == SYM_KEY
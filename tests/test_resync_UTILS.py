@@ -0,0 +1,47 @@
+from UTILS.rekey import KeySchedule
+from UTILS.link import MSG_RESYNC, MSG_RESYNC_ACK
+from UTILS.resync import DriftClock, SenderResync, EndpointResync
+from tests.conftest import SYM_KEY, loopback_pair
+
+def make_pair(sender_schedule, endpoint_schedule, endpoint_clock):
+    sender_channel, endpoint_channel = loopback_pair()
+    sender_time = [1000.0]
+    clock = DriftClock(lambda: sender_time[0])
+    resync = SenderResync(sender_channel, sender_schedule, lambda: 100, clock)
+    EndpointResync(endpoint_channel, endpoint_schedule, lambda: 100, endpoint_clock)
+    return resync, clock, sender_time
+
+def test_unconfirmed_rekey_dropped():
+    sender_schedule = KeySchedule(SYM_KEY)
+    endpoint_schedule = KeySchedule(SYM_KEY)
+    # The ENDPOINT scheduled a rekey but its ACK was lost with the link
+    endpoint_schedule.schedule(105, b"n" * 32)
+    resync, _, _ = make_pair(sender_schedule, endpoint_schedule, lambda: 1000.0)
+    resync.request()
+    assert endpoint_schedule.key_for(110) == SYM_KEY
+    assert resync.synced.is_set()
+
+def test_clock_drift_corrected_from_baseline():
+    endpoint_time = [1000.5]
+    resync, clock, sender_time = make_pair(
+        KeySchedule(SYM_KEY), KeySchedule(SYM_KEY), lambda: endpoint_time[0]
+    )
+    resync.request()
+    assert clock.correction == 0.0  # The session's starting offset is kept
+
+    # The SENDER's clock falls 0.3 s further behind
+    endpoint_time[0] += 60.3
+    sender_time[0] += 60.0
+    resync.request()
+    assert abs(clock.now() - 1060.3) < 1e-6
+
+def test_short_payloads_ignored():
+    resync, _, _ = make_pair(KeySchedule(SYM_KEY), KeySchedule(SYM_KEY), lambda: 1000.0)
+    endpoint_channel = resync.channel.peer
+    # Empty asks the SENDER to resync; a truncated header or entry list is dropped
+    endpoint_channel.handlers[MSG_RESYNC](b"")
+    assert resync.synced.is_set()
+    resync.synced.clear()
+    endpoint_channel.handlers[MSG_RESYNC](b"\x00" * 5)
+    resync.channel.handlers[MSG_RESYNC_ACK](b"\x00" * 24 + b"\x02")
+    assert not resync.synced.is_set()
@@ -0,0 +1,36 @@
+from types import SimpleNamespace
+from ENDPOINT.routing import plan_routes, DECODE, PASS, BLOCK
+
+USB = {
+	"/dev/input/event3": "/sys/devices/pci0000:00/usb1/1-2",  # SENDER A's gadget
+	"/dev/input/event4": "/sys/devices/pci0000:00/usb1/1-3",  # SENDER B's gadget
+	"/dev/input/event5": "/sys/devices/pci0000:00/usb1/1-4",  # Unknown USB keyboard
+	"/dev/input/event6": "/sys/devices/pci0000:00/usb1/1-5",  # Trusted USB keyboard
+	"/dev/input/event0": None,  # Laptop keyboard (i8042)
+}
+
+def device(fd, path, name, vendor=0x1d6b, product=0x0104):
+	return SimpleNamespace(fd=fd, path=path, name=name, info=SimpleNamespace(vendor=vendor, product=product))
+
+def test_devices_routed_by_usb_pairing_and_trust():
+	devices = [
+		device(10, "/dev/input/event3", "HIDPi Keyboard"),
+		device(11, "/dev/input/event4", "HIDPi Keyboard"),
+		device(12, "/dev/input/event5", "Generic Keyboard"),
+		device(13, "/dev/input/event6", "Desk Keyboard", 0x046d, 0xc31c),
+		device(14, "/dev/input/event0", "AT Translated Set 2 keyboard"),
+	]
+	session_usb = ["/sys/devices/pci0000:00/usb1/1-3", "/sys/devices/pci0000:00/usb1/1-2"]
+	routes = plan_routes(devices, session_usb, trusted=("046d:c31c",), usb_of=USB.get)
+	assert routes == {
+		10: (DECODE, 1),
+		11: (DECODE, 0),
+		12: (BLOCK, None),
+		13: (PASS, None),
+		14: (PASS, None),
+	}
+
+def test_single_session_without_pairing_decodes_usb_keyboards():
+	devices = [device(10, "/dev/input/event5", "Generic Keyboard"), device(14, "/dev/input/event0", "AT keyboard")]
+	routes = plan_routes(devices, [None], usb_of=USB.get)
+	assert routes == {10: (DECODE, 0), 14: (PASS, None)}
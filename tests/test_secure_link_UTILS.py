@@ -0,0 +1,33 @@
+import pytest
+from UTILS.secure_link import FrameSealer, FrameOpener
+
+SYM_KEY = bytes(range(32))
+
+def test_round_trip():
+    sealer = FrameSealer(SYM_KEY)
+    opener = FrameOpener(SYM_KEY)
+    batch = [(30, 1), (30, 0), (42, 1), (59, 1), (59, 0), (42, 0)]
+    assert opener.open(sealer.seal(batch)) == batch
+    assert opener.open(sealer.seal([])) == []
+
+def test_replay_rejected():
+    sealer = FrameSealer(SYM_KEY)
+    opener = FrameOpener(SYM_KEY)
+    frame = sealer.seal([(30, 1)])
+    opener.open(frame)
+    with pytest.raises(ValueError):
+        opener.open(frame)
+
+def test_tampered_frame_rejected():
+    sealer = FrameSealer(SYM_KEY)
+    opener = FrameOpener(SYM_KEY)
+    frame = bytearray(sealer.seal([(30, 1)]))
+    frame[-1] ^= 0x01
+    with pytest.raises(ValueError):
+        opener.open(bytes(frame))
+
+def test_wrong_key_rejected():
+    sealer = FrameSealer(SYM_KEY)
+    opener = FrameOpener(bytes(32))
+    with pytest.raises(ValueError):
+        opener.open(sealer.seal([(30, 1)]))
@@ -1,5 +1,5 @@
 import time
-from ENDPOINT.seedgen_ENDPOINT import generate_seed
+from UTILS.seedgen import generate_seed
 from ENDPOINT.dhe_time_ENDPOINT import get_symmetric_key, get_base_time
 
 INTERVAL = 10
@@ -1,5 +1,5 @@
 import time
-from SENDER.seedgen import generate_seed
+from UTILS.seedgen import generate_seed
 from SENDER.dhe_time import get_symmetric_key, get_base_time
 
 INTERVAL = 10
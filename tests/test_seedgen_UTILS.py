@@ -0,0 +1,23 @@
+import hmac
+import struct
+from hashlib import sha256
+from UTILS.seedgen import SeedDeriver, generate_seed, seeds_for_range
+
+KEYS = [bytes(range(32)), b"test_symmetric_key_12345678901234", b"", b"k" * 100]
+
+def reference_seed(key, counter):
+    return hmac.new(key, struct.pack(">Q", counter), sha256).digest()
+
+def test_matches_stdlib_hmac():
+    for key in KEYS:
+        deriver = SeedDeriver(key)
+        for counter in (0, 1, 5, 2**40, 2**64 - 1):
+            assert deriver.seed(counter) == reference_seed(key, counter)
+            assert generate_seed(key, counter) == reference_seed(key, counter)
+
+def test_range_matches_single_seeds():
+    key = KEYS[0]
+    seeds = seeds_for_range(key, 1000, 50)
+    assert len(seeds) == 50
+    assert seeds == [reference_seed(key, c) for c in range(1000, 1050)]
+    assert seeds_for_range(key, 7, 0) == []
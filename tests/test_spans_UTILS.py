@@ -0,0 +1,67 @@
+import time
+
+from evdev import ecodes
+from UTILS import spans
+from UTILS.events import KeyRecord, KEY_DOWN, KEY_UP
+from UTILS.pipeline import Hooks, MAPPED
+from tests.conftest import make_decoder
+
+def record_keys(device, monkeypatch, keys=('KEY_Q', 'KEY_W')):
+	"""Trace of a Decoder typing `keys`, with rotations recorded too"""
+	recorder = spans.SpanRecorder(device)
+	monkeypatch.setattr(spans, "recorder", recorder)
+	decoder = make_decoder(recorder)
+
+	def events():
+		record = KeyRecord()
+		for key in keys:
+			for state in (KEY_DOWN, KEY_UP):
+				record.key, record.code, record.state = key, getattr(ecodes, key), state
+				record.time = time.monotonic()
+				yield record
+
+	for record in Hooks(recorder).events(events()):
+		decoder.handle(record)
+	return recorder.trace()
+
+def test_spans_cover_each_stage(monkeypatch):
+	trace = record_keys("ENDPOINT", monkeypatch)
+	names = [event['name'] for event in trace['traceEvents'] if event['ph'] == 'X']
+	assert names.count("rotate") == 1
+	assert names.count("uinput write") == 4 and names.count("map") == 4
+	keystrokes = [event for event in trace['traceEvents'] if event['name'] == 'keystroke']
+	assert [event['args']['seq'] for event in keystrokes] == [1, 2]
+	assert all(event['dur'] >= 0 and event['pid'] == spans.PIDS["ENDPOINT"] for event in keystrokes)
+
+def send_keys(monkeypatch, keys):
+	"""Trace of the SENDER writing `keys` (scrambled) to the HID gadget"""
+	recorder = spans.SpanRecorder("SENDER")
+	monkeypatch.setattr(spans, "recorder", recorder)
+	record = KeyRecord()
+	for key in keys:
+		record.key, record.state, record.time = 'KEY_A', KEY_DOWN, time.monotonic()
+		recorder.after_read(record, None, None)
+		recorder.after_classify(record, MAPPED, None)
+		output = (0x04, 0, 'a', key[4:].lower(), key)
+		recorder.after_map(record, MAPPED, output)
+		recorder.after_emit(record, MAPPED, output)
+	return recorder.trace()
+
+def test_merge_shifts_sender_and_links_keystrokes(monkeypatch):
+	# KEY_W never reached the host: blocked, or lost with the link
+	sender = send_keys(monkeypatch, ('KEY_Q', 'KEY_W', 'KEY_E'))
+	sender['otherData']['peer_offset'] = 0.001
+	endpoint = record_keys("ENDPOINT", monkeypatch, keys=('KEY_Q', 'KEY_E'))
+	merged = spans.merge(sender, endpoint)
+
+	before = next(event for event in sender['traceEvents'] if event['name'] == 'keystroke')
+	after = next(event for event in merged['traceEvents']
+	             if event['name'] == 'keystroke' and event['ph'] == 'X' and event['pid'] == spans.PIDS["SENDER"])
+	assert abs(after['ts'] - before['ts'] - 1e3) < 1e-3
+	flows = [(event['ph'], event['id'], event['pid']) for event in merged['traceEvents'] if event['ph'] in "sf"]
+	assert flows == [('s', 1, 1), ('f', 1, 2), ('s', 3, 1), ('f', 3, 2)]
+	assert merged['otherData']['unlinked'] == {'SENDER': 1, 'ENDPOINT': 0}
+
+def test_disabled_spans_are_shared_no_ops(monkeypatch):
+	monkeypatch.setattr(spans, "recorder", None)
+	assert spans.span("rotate", "rotation", counter=1) is spans.message("send", 0x44)
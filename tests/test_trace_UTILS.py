@@ -0,0 +1,92 @@
+import os
+
+from ENDPOINT.keyboard_reader import key_records
+from UTILS.events import KEY_NAMES, KEY_DOWN, KEY_UP
+from UTILS.trace import Trace, TraceWriter, TraceEvent, EV_KEY
+
+CODES = {name: code for code, name in KEY_NAMES.items() if isinstance(name, str)}
+
+def key(name, value, at):
+    return TraceEvent(EV_KEY, CODES[name], value, at)
+
+def test_trace_round_trip_replays_through_reader(tmp_path):
+    path = tmp_path / "keys.trace"
+    writer = TraceWriter(path)
+    writer.add_device(5, "Desk Keyboard")
+    writer.write(5, [key('KEY_LEFTSHIFT', KEY_DOWN, 10.0)])
+    writer.write(5, [key('KEY_A', KEY_DOWN, 10.1), TraceEvent(0, 0, 0, 10.1)])  # EV_SYN is not kept
+    writer.write(9, [key('KEY_Q', KEY_DOWN, 10.15)])  # Unknown device is not kept
+    writer.add_device(9, "Hotplugged")
+    writer.write(5, [key('KEY_A', KEY_UP, 10.2), key('KEY_LEFTSHIFT', KEY_UP, 10.2)])
+    writer.write(9, [key('KEY_B', KEY_DOWN, 10.3)])
+    writer.close()
+    assert os.stat(path).st_mode & 0o077 == 0
+
+    trace = Trace(path)
+    assert [(dev.fd, dev.name) for dev in trace.devices] == [(5, "Desk Keyboard"), (9, "Hotplugged")]
+    assert len(trace) == 5
+    assert abs(trace.span() - 0.3) < 1e-9
+    assert [len(events) for _, events in trace.batches()] == [1, 1, 2, 1]
+
+    replayed = [(r.fd, r.key, r.state, r.shift, r.time) for r in key_records(trace.batches())]
+    assert replayed == [
+        (5, 'KEY_A', KEY_DOWN, True, 10.1),
+        (5, 'KEY_A', KEY_UP, True, 10.2),
+        (9, 'KEY_B', KEY_DOWN, False, 10.3),
+    ]
+    trace.close()
+
+def test_real_time_replay_keeps_recorded_spacing(tmp_path):
+    path = tmp_path / "keys.trace"
+    writer = TraceWriter(path)
+    writer.add_device(5, "Desk Keyboard")
+    for i in range(3):
+        writer.write(5, [key('KEY_A', KEY_DOWN, 100 + i * 0.5)])
+    writer.close()
+
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    trace = Trace(path)
+    list(trace.batches(speed=2.0, clock=lambda: now[0], sleep=sleep))
+    assert sleeps == [0.25, 0.25]
+    trace.close()
+
+def test_reused_fd_gets_its_own_slot(tmp_path):
+    path = tmp_path / "keys.trace"
+    writer = TraceWriter(path)
+    writer.add_device(5, "Desk Keyboard")
+    writer.write(5, [key('KEY_A', KEY_DOWN, 10.0)])
+    writer.add_device(5, "Desk Keyboard")  # Rescan: nothing new
+    writer.add_device(5, "Travel Keyboard")  # Unplugged, and its fd reused
+    writer.write(5, [key('KEY_B', KEY_DOWN, 10.1)])
+    writer.close()
+
+    trace = Trace(path)
+    assert [(dev.fd, dev.name) for dev in trace.devices] == [(5, "Desk Keyboard"), (5, "Travel Keyboard")]
+    assert [dev.name for dev, _ in trace.batches()] == ["Desk Keyboard", "Travel Keyboard"]
+    trace.close()
+
+def test_rekeys_recorded_next_to_the_trace(tmp_path):
+    from UTILS.rekey import KeySchedule
+    from tests.research.replay import trace_schedule
+    path = tmp_path / "keys.trace"
+    writer = TraceWriter(path)
+    schedule = KeySchedule(b"k" * 32, log=writer.key_log("/dev/ttyACM0"))
+    for start in range(100, 110, 2):
+        schedule.schedule(start, bytes([start]) * 32)
+    schedule.cancel(108)  # Aborted by the SENDER
+    writer.close()
+
+    trace = Trace(path)
+    assert [start for start, _ in trace.key_switches()] == [100, 102, 104, 106]
+    # Every key of the session, not just the last few the ENDPOINT kept
+    replayed = trace_schedule(trace, b"k" * 32)
+    assert replayed.key_for(99) == b"k" * 32
+    assert replayed.key_for(101) == bytes([100]) * 32 and replayed.key_for(109) == bytes([106]) * 32
+    assert os.stat(f"{path}.keys").st_mode & 0o077 == 0
+    trace.close()